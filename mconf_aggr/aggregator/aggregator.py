@@ -7,12 +7,35 @@ this module.
 """
 
 import itertools
+import os
+import pickle
 import queue
 import reprlib
 import threading
+import time
+import zlib
 from collections import namedtuple
 
+from mconf_aggr.aggregator.retry import Failure, RetryScheduler
+from mconf_aggr.aggregator.spool import SpillFile, SpoolLog
 from mconf_aggr.logger import get_logger
+from mconf_aggr.metrics import metrics
+
+channel_wait_seconds = metrics.histogram(
+    "mconf_aggr_channel_wait_seconds",
+    "Seconds data waited in a channel before being popped.",
+    ("channel",),
+)
+retries_total = metrics.counter(
+    "mconf_aggr_retries_total",
+    "Runs of data retried after a transient failure.",
+    ("channel",),
+)
+dead_letters_total = metrics.counter(
+    "mconf_aggr_dead_letters_total",
+    "Data given up on and handed to dead_letter.",
+    ("channel",),
+)
 
 
 class AggregatorNotRunning(Exception):
@@ -32,9 +55,17 @@ class CallbackError(Exception):
     It should be raised by callbacks (or Writers) when something goes wrong.
     As an example of unexpected behavior that should trigger this error is
     database operational error.
+
+    Attributes
+    ----------
+    failures : list of retry.Failure
+        The data that failed and whether it may be retried. If None, all the
+        data handed to the callback failed and is not retried.
     """
 
-    pass
+    def __init__(self, *args, failures=None):
+        super().__init__(*args)
+        self.failures = failures
 
 
 class SetupError(Exception):
@@ -58,6 +89,31 @@ class PublishError(Exception):
     pass
 
 
+class ChannelFull(PublishError):
+    """Raised if data is refused because its channel is full.
+
+    Publishing the data again later may succeed.
+    """
+
+    pass
+
+
+"""What a bounded channel does with data published while it is full:
+
+* `block`: wait for room, up to a timeout, then refuse the data.
+* `reject`: refuse the data at once.
+* `drop-oldest`: drop the oldest data of the channel to make room.
+* `spill`: keep the data in a temporary file until there is room.
+
+Refused data raises `ChannelFull`.
+"""
+OVERFLOW_BLOCK = "block"
+OVERFLOW_REJECT = "reject"
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+OVERFLOW_SPILL = "spill"
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_REJECT, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL)
+
+
 """Represent a subscriber of the aggregator.
 
 It encapsulates a `Channel` object and a callback in a single
@@ -69,8 +125,24 @@ Attributes
         The channel where the subscriber received data from.
     callback : `AggregatorCallback` subclass
         The callback that processes the data.
+    batch_size : int
+        Maximum number of elements handed to the callback at once. If it is
+        greater than 1, the callback receives data through `run_batch`.
+        Defaults to 1.
+    batch_timeout : float
+        Maximum time in seconds to wait for a batch to fill up after its first
+        element arrives. Defaults to 0 (only data already queued is batched).
+    retry_policy : retry.RetryPolicy
+        How data failing transiently is retried. Defaults to None (never).
+    retry_key : callable
+        Function returning the key of data, whose order is kept while data is
+        retried. Defaults to None (no order is kept).
 """
-Subscriber = namedtuple("Subscriber", ("channel", "callback"))
+Subscriber = namedtuple(
+    "Subscriber",
+    ("channel", "callback", "batch_size", "batch_timeout", "retry_policy", "retry_key"),
+    defaults=(1, 0, None, None),
+)
 
 
 class AggregatorCallback:
@@ -124,6 +196,58 @@ class AggregatorCallback:
         """
         raise NotImplementedError()
 
+    def run_batch(self, batch):
+        """This method is called by the aggregator to send a batch of data.
+
+        It is called instead of `run` when the callback is registered with a
+        batch size greater than 1. Implementing it is optional: by default, it
+        calls `run` for each element of the batch, so it only needs to be
+        overridden by callbacks that can handle a whole batch more efficiently.
+
+        Parameters
+        ----------
+        batch : list
+            Data popped from the channel, in the order it was published.
+
+        Raises
+        ------
+        CallbackError
+            If any element of the batch failed, with the failures of all of
+            them. The remaining elements are still processed.
+        """
+        failures = []
+
+        for data in batch:
+            try:
+                self.run(data)
+            except CallbackError as err:
+                failures.extend(err.failures or [Failure(data, err, False)])
+
+        if failures:
+            raise CallbackError(
+                f"{len(failures)} of {len(batch)} element(s) failed", failures=failures
+            )
+
+    def dead_letter(self, data, error, attempts):
+        """This method is called by the aggregator with data given up on.
+
+        Data is given up on when it fails permanently, or transiently more
+        times than its retry policy allows. Implementing it is optional: by
+        default, the data is only logged.
+
+        Parameters
+        ----------
+        data
+            Data that failed.
+        error : Exception
+            The last error of the data, or None if it was never run.
+        attempts : int
+            Number of times the data was run.
+        """
+        get_logger(__name__).error(
+            f"Giving up on {reprlib.repr(data)} after {attempts} attempt(s): {error!r}"
+        )
+
 
 class SubscriberThread(threading.Thread):
     """This class represents the thread to be run for a subscriber."""
@@ -140,31 +264,136 @@ class SubscriberThread(threading.Thread):
         """
         threading.Thread.__init__(self, **kwargs)
         self.subscriber = subscriber
+        self.retry = RetryScheduler(subscriber.retry_policy, subscriber.retry_key)
         self._errorevent = errorevent
+        self._retries = retries_total.labels(subscriber.channel.name)
+        self._dead_letters = dead_letters_total.labels(subscriber.channel.name)
         self._stopevent = threading.Event()
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
     def run(self):
         """Run thread's main loop.
 
         It runs while the thread is signaled to exit (by calling its `exit`
         method). The data is popped out from the `subscriber`'s channel and
-        sent to the `subscriber`'s callback `run` method. When signaled to
-        exit, it simply returns and the thread is done.
+        sent to the `subscriber`'s callback `run` method. If the subscriber
+        has a batch size greater than 1, data is popped in batches and sent to
+        the callback `run_batch` method instead. When signaled to exit, it
+        simply returns and the thread is done.
+
+        Data the callback fails on is retried as its retry policy allows, in
+        between popping data, and is otherwise handed to the callback
+        `dead_letter` method. The channel is acknowledged only while no data
+        is waiting to be retried, so that a channel on disk keeps it.
+
+        Data left in the channel when the thread exits is handed to
+        `dead_letter` too, unless the channel keeps it for the next start.
         """
         self.logger.debug(f"Running thread with callback {format(self.subscriber.callback)}")
 
+        batch_size = self.subscriber.batch_size
+        batch_timeout = self.subscriber.batch_timeout
+
         while not self._stopevent.is_set():
+            self._run_retries()
+
+            # Data is done with, whether the callback succeeded or not. It is
+            # checked after retries too, as a retry may be the last data
+            # pending before the channel goes idle.
+            if not self.retry.pending():
+                self.subscriber.channel.ack()
+
+            wait = self.retry.next_due_in()
+            batch = []
+
             try:
-                data = self.subscriber.channel.pop()
-                self.subscriber.callback.run(data)
-            except ChannelClosed:
+                if batch_size > 1:
+                    batch = self.subscriber.channel.pop_batch(batch_size, batch_timeout, wait)
+                    batch = [data for data in batch if not self.retry.hold(data)]
+
+                    if batch:
+                        self.subscriber.callback.run_batch(batch)
+                else:
+                    batch = [self.subscriber.channel.pop(wait)]
+
+                    if not self.retry.hold(batch[0]):
+                        self.subscriber.callback.run(batch[0])
+            except (ChannelClosed, queue.Empty):
                 continue
-            except CallbackError:
+            except CallbackError as err:
                 self.logger.info("An error occurred while running a subscriber.")
+                self._schedule_retries(err, batch)
+
+        self._give_up_retries()
+        self._give_up_leftovers()
 
         return
 
+    def _run_retries(self):
+        """Run the data whose retry is due, one at a time."""
+        for key, data, attempts in self.retry.due():
+            if attempts:
+                self._retries.inc()
+
+            try:
+                self.subscriber.callback.run(data)
+            except Exception as err:
+                self.logger.info("An error occurred while retrying data.")
+                given_up = self.retry.retry_failed(key, _failure_of(data, err))
+
+                if given_up:
+                    self._dead_letter(*given_up)
+            else:
+                if attempts:
+                    self.logger.info(f"Data succeeded after {attempts} failed attempt(s).")
+
+                self.retry.succeeded(key)
+
+    def _schedule_retries(self, err, batch):
+        failures = err.failures
+
+        if failures is None:
+            failures = [Failure(data, err, False) for data in batch]
+
+        for failure in failures:
+            given_up = self.retry.failed(failure)
+
+            if given_up:
+                self._dead_letter(*given_up)
+
+    def _give_up_retries(self):
+        """Give up on the data still waiting when the thread exits."""
+        waiting = self.retry.drain()
+
+        if waiting:
+            self.logger.warning(f"Giving up on {len(waiting)} element(s) waiting to be retried.")
+
+            for data, error, attempts in waiting:
+                self._dead_letter(data, error, attempts)
+
+        self.subscriber.channel.ack()
+
+    def _give_up_leftovers(self):
+        """Give up on the data left in the channel when the thread exits."""
+        leftovers = self.subscriber.channel.leftovers()
+
+        if leftovers:
+            self.logger.warning(
+                f"Giving up on {len(leftovers)} element(s) left in channel "
+                f"{self.subscriber.channel.name}."
+            )
+
+            for data in leftovers:
+                self._dead_letter(data, None, 0)
+
+    def _dead_letter(self, data, error, attempts):
+        self._dead_letters.inc()
+
+        try:
+            self.subscriber.callback.dead_letter(data, error, attempts)
+        except Exception as err:
+            self.logger.error(f"Unable to hand data to dead letter: {err}")
+
     def exit(self):
         """Exit the thread.
 
@@ -179,6 +408,19 @@ class SubscriberThread(threading.Thread):
         self.logger.debug(f"Thread with callback {self.subscriber.callback} exited with success.")
 
 
+def _failure_of(data, err):
+    """The failure of `data` reported by `err`, permanent if it is not clear which."""
+    failures = getattr(err, "failures", None) or []
+
+    if len(failures) > 1:
+        failures = [failure for failure in failures if failure.data is data]
+
+    if len(failures) == 1:
+        return failures[0]
+
+    return Failure(data, err, False)
+
+
 class Channel:
     """Channel to send and receive data.
 
@@ -186,7 +428,7 @@ class Channel:
     aggregator and its subscribers.
     """
 
-    def __init__(self, name, maxsize=0, logger=None):
+    def __init__(self, name, maxsize=0, overflow=OVERFLOW_BLOCK, timeout=None, logger=None):
         """Constructor of the Channel class.
 
         Parameters
@@ -196,23 +438,59 @@ class Channel:
         maxsize : int
             The maximum size of the channel. If it is zero or negative, the
             channel accepts any number of elements.
+        overflow : str
+            One of `OVERFLOW_POLICIES`, applied when the channel is full.
+            Defaults to `block`.
+        timeout : float
+            Maximum time in seconds to wait for room with the `block` policy.
+            If None, it waits as long as needed.
         logger : loguru.Logger
             If not supplied, it will instantiate a new logger.
+
+        Raises
+        ------
+        ValueError
+            If `overflow` is unknown.
         """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy '{overflow}', expected one of: "
+                + ", ".join(OVERFLOW_POLICIES)
+            )
+
         self.name = name
         self.queue = queue.Queue(maxsize=maxsize)
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
+        self.overflow = overflow
+        self.timeout = timeout
+        self.dropped = 0
+
+        # Elements popped but not acknowledged yet. Only the consumer pops.
+        self._unacked = 0
+        self._lock = threading.Lock()
+        self._wait = channel_wait_seconds.labels(name)
+        self._spill = SpillFile() if overflow == OVERFLOW_SPILL and maxsize > 0 else None
+        self._put = {
+            OVERFLOW_BLOCK: self._put_blocking,
+            OVERFLOW_REJECT: self._put_rejecting,
+            OVERFLOW_DROP_OLDEST: self._put_dropping_oldest,
+            OVERFLOW_SPILL: self._put_spilling,
+        }[overflow]
 
     def close(self):
         """Close the channel.
 
         It simply puts None in the queue to signal that the channel must be
-        closed.
+        closed. Data still in the channel is consumed before it.
         """
         self.logger.debug(f"Closing channel {self.name}.")
         if not self.empty():
             self.logger.warning(f"There is data not consumed in channel {self.name}.")
-        self.queue.put(None)
+
+        if self._spill is not None:
+            self._put_spilling(None)
+        else:
+            self.queue.put(None)
 
     def publish(self, data):
         """Publish data to channel.
@@ -221,18 +499,29 @@ class Channel:
         ----------
         data
             Any data to be sent over the channel.
+
+        Raises
+        ------
+        ChannelFull
+            If the channel is full and its overflow policy refuses the data.
         """
         self.logger.debug("Putting data into the channel.")
-        self.queue.put(data)
+        self._put((time.monotonic(), data))
         self.logger.debug(f"Channel {self.name} has {self.qsize()} element(s).")
 
-    def pop(self):
+    def pop(self, timeout=None):
         """Pop data from the channel.
 
         It reads data from the channel's queue.
         If None is read from the queue, it raises a `ChannelClosed` exception
         to signal the caller that the channel was closed.
 
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in seconds to wait for data. If None, it waits as
+            long as needed.
+
         Returns
         -------
         data
@@ -242,20 +531,130 @@ class Channel:
         ------
         ChannelClosed
             If the channel was closed.
+        queue.Empty
+            If no data arrived within `timeout`.
         """
         self.logger.debug("Popping data from the channel.")
-        data = self.queue.get()
+        item = self.queue.get(timeout=timeout)
 
-        if data is None:
+        if item is None:
             self.logger.debug(
                 f"Signaling closing channel {self.name} for clients. \
                               Waiting for data."
             )
             raise ChannelClosed()
 
-        self.queue.task_done()
+        self._unacked += 1
 
-        return data
+        return self._unwrap(item)
+
+    def pop_batch(self, max_items, timeout=0, wait=None):
+        """Pop a batch of data from the channel.
+
+        It blocks until at least one element is available, just like `pop`.
+        Then it keeps collecting elements until `max_items` are collected or
+        `timeout` seconds have passed since the first one, whichever comes
+        first. If the channel is closed while a batch is being collected, the
+        elements collected so far are returned.
+
+        Parameters
+        ----------
+        max_items : int
+            Maximum number of elements in the batch.
+        timeout : float
+            Maximum time in seconds to wait for the batch to fill up.
+        wait : float
+            Maximum time in seconds to wait for the first element. If None, it
+            waits as long as needed.
+
+        Returns
+        -------
+        list
+            Data received by the channel, in the order it was published.
+
+        Raises
+        ------
+        ChannelClosed
+            If the channel was closed before any data was received.
+        queue.Empty
+            If no data arrived within `wait`.
+        """
+        batch = [self.pop(wait)]
+        deadline = time.monotonic() + timeout
+
+        while len(batch) < max_items:
+            remaining = deadline - time.monotonic()
+
+            try:
+                if remaining > 0:
+                    item = self.queue.get(timeout=remaining)
+                else:
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                self.logger.debug(f"Channel {self.name} closed while collecting a batch.")
+                break
+
+            self._unacked += 1
+            batch.append(self._unwrap(item))
+
+        self.logger.debug(f"Popped batch of {len(batch)} element(s) from channel {self.name}.")
+
+        return batch
+
+    def ack(self):
+        """Acknowledge all data popped so far as done with.
+
+        Acknowledged data no longer holds `join` back.
+        """
+        for _ in range(self._unacked):
+            self.queue.task_done()
+
+        self._unacked = 0
+
+    def join(self, timeout=None):
+        """Wait until all data published is popped and acknowledged.
+
+        It must be called before the channel is closed.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in seconds to wait. If None, it waits as long as
+            needed.
+
+        Returns
+        -------
+        bool
+            True if all data was acknowledged, False if `timeout` expired.
+        """
+        done = self.queue.all_tasks_done
+
+        with done:
+            return done.wait_for(lambda: not self.queue.unfinished_tasks, timeout)
+
+    def leftovers(self):
+        """Take the data left in the channel once its consumer has stopped.
+
+        Returns
+        -------
+        list
+            Data not popped, in the order it was published.
+        """
+        leftovers = []
+
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is not None:
+                leftovers.append(self._unwrap(item))
+
+        return leftovers
 
     def qsize(self):
         """Current size of the channel.
@@ -290,9 +689,462 @@ class Channel:
         """
         return self.queue.full()
 
+    @property
+    def partitions(self):
+        """Channels to be consumed, one thread each.
+
+        A plain channel is consumed as a whole by a single thread.
+
+        Returns
+        -------
+        list
+            A list with the channel itself.
+        """
+        return [self]
+
+    def oldest_age(self):
+        """Seconds since the oldest data in the channel was published.
+
+        Returns
+        -------
+        float
+            The age of the oldest data, or 0 if the channel is empty.
+        """
+        try:
+            item = self.queue.queue[0]
+        except IndexError:
+            return 0
+
+        if item is None:
+            return 0
+
+        return time.monotonic() - self._published_at(item)
+
+    def _unwrap(self, item):
+        """Get the data of an element taken from the queue."""
+        if self._spill is not None:
+            self._refill()
+
+        published_at, data = item
+        self._wait.observe(time.monotonic() - published_at)
+
+        return data
+
+    def _published_at(self, item):
+        return item[0]
+
+    def _put_blocking(self, data):
+        try:
+            self.queue.put(data, timeout=self.timeout)
+        except queue.Full:
+            raise ChannelFull(f"channel {self.name} is full") from None
+
+    def _put_rejecting(self, data):
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            raise ChannelFull(f"channel {self.name} is full") from None
+
+    def _put_dropping_oldest(self, data):
+        # Publishers take turns so that dropping one element makes room.
+        with self._lock:
+            while True:
+                try:
+                    self.queue.put_nowait(data)
+                    return
+                except queue.Full:
+                    self._drop_oldest()
+
+    def _put_spilling(self, data):
+        with self._lock:
+            # Once data is spilled, newer data follows it to keep the order.
+            if not self._spill:
+                try:
+                    self.queue.put_nowait(data)
+                    return
+                except queue.Full:
+                    pass
+
+            try:
+                self._spill.put(data)
+            except OSError as err:
+                self.logger.error(f"Unable to spill data of channel {self.name}: {err}")
+                raise PublishError() from err
+
+    def _drop_oldest(self):
+        try:
+            oldest = self.queue.get_nowait()
+        except queue.Empty:
+            return
+
+        self.queue.task_done()
+
+        if oldest is None:
+            # Never drop the closing signal.
+            self.queue.put_nowait(None)
+            raise ChannelFull(f"channel {self.name} is closed")
+
+        self.dropped += 1
+
+        if self.dropped % 1000 == 1:
+            self.logger.warning(
+                f"Channel {self.name} is full, {self.dropped} element(s) dropped so far."
+            )
+
+    def _refill(self):
+        """Move spilled data to the queue while there is room."""
+        with self._lock:
+            while self._spill and not self.queue.full():
+                self.queue.put_nowait(self._spill.get())
+
     def __repr__(self):
-        return "{!s}(name={!r}, maxsize={!r})".format(
-            self.__class__.__name__, self.name, self.queue.maxsize
+        return "{!s}(name={!r}, maxsize={!r}, overflow={!r})".format(
+            self.__class__.__name__, self.name, self.queue.maxsize, self.overflow
+        )
+
+
+class SpoolChannel(Channel):
+    """Channel whose data is also kept in a log on disk until acknowledged.
+
+    Published data is appended to a `SpoolLog` in `directory`/`name` as it is
+    queued, and is acknowledged in the log once its consumer is done with it.
+    Data not acknowledged when the process stops is queued again when the
+    channel is created, so it survives restarts.
+
+    Data is stored with pickle, so it must be picklable and its classes must
+    still exist when it is replayed.
+
+    Only the `block` and `reject` overflow policies are supported: dropped
+    data would come back after a restart, and data is already on disk.
+    """
+
+    def __init__(
+        self,
+        name,
+        directory,
+        maxsize=0,
+        overflow=OVERFLOW_BLOCK,
+        timeout=None,
+        segment_bytes=64 * 1024 * 1024,
+        fsync_interval=0.01,
+        logger=None,
+    ):
+        """Constructor of the SpoolChannel class.
+
+        Parameters
+        ----------
+        name : str
+            An identifier of the channel.
+        directory : str
+            Directory where the log of the channel is created.
+        maxsize : int
+            The maximum size of the channel. If it is zero or negative, the
+            channel accepts any number of elements. Replayed data is always
+            queued.
+        overflow : str
+            `block` or `reject`, applied when the channel is full.
+        timeout : float
+            Maximum time in seconds to wait for room with the `block` policy.
+            If None, it waits as long as needed.
+        segment_bytes : int
+            Size from which the log starts a new segment file.
+        fsync_interval : float
+            Seconds between writes of the log to disk. Publishing returns once
+            the data is written, so it waits up to this interval, while all
+            data published meanwhile is written at once. Zero or less writes
+            on every publish.
+        logger : loguru.Logger
+            If not supplied, it will instantiate a new logger.
+
+        Raises
+        ------
+        ValueError
+            If `overflow` is not supported.
+        """
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_REJECT):
+            raise ValueError(f"Overflow policy '{overflow}' is not supported by spool channels")
+
+        super().__init__(name, overflow=overflow, timeout=timeout, logger=logger)
+
+        self.log = SpoolLog(
+            os.path.join(directory, name),
+            segment_bytes,
+            fsync_interval,
+            encode=_pickle_dumps,
+            logger=self.logger,
+        )
+        self._room = threading.Condition(threading.Lock())
+        self._popped = None
+
+        for offset, payload in self.log.replay():
+            try:
+                self.queue.put((offset, time.monotonic(), pickle.loads(payload)))
+            except Exception as err:
+                self.logger.error(f"Dropping unreadable data {offset} of channel {name}: {err}")
+
+        if self.queue.qsize():
+            self.logger.info(f"Replaying {self.queue.qsize()} element(s) in channel {name}.")
+
+        self.queue.maxsize = maxsize
+        self.log.start()
+
+    def close(self):
+        """Close the channel and write its log to disk."""
+        super().close()
+        self.log.close()
+
+    def publish(self, data):
+        """Publish data to the channel and append it to the log.
+
+        It returns once the data is written to disk with the next write of
+        the log. Data is pickled then, not here, so it must not be changed
+        after being published.
+
+        Parameters
+        ----------
+        data
+            Any picklable data to be sent over the channel.
+
+        Raises
+        ------
+        ChannelFull
+            If the channel is full and its overflow policy refuses the data.
+        PublishError
+            If the data could not be written to the log. It may still be
+            consumed, as it is kept to be written again.
+        """
+        # Data is queued in the order of its offsets, which `ack` relies on,
+        # and only once there is room, so refused data is not in the log.
+        with self._room:
+            if self.queue.full():
+                timeout = self.timeout if self.overflow == OVERFLOW_BLOCK else 0
+
+                if not self._room.wait_for(lambda: not self.queue.full(), timeout):
+                    raise ChannelFull(f"channel {self.name} is full")
+
+            try:
+                offset = self.log.append(data)
+            except OSError as err:
+                self.logger.error(f"Unable to write to the log of channel {self.name}: {err}")
+                raise PublishError() from err
+
+            self.queue.put_nowait((offset, time.monotonic(), data))
+
+        # Other publishers go on meanwhile and are written in the same group.
+        try:
+            self.log.wait_synced(offset)
+        except OSError as err:
+            self.logger.error(f"Unable to write to the log of channel {self.name}: {err}")
+            raise PublishError() from err
+
+    def ack(self):
+        """Acknowledge in the log all data popped so far."""
+        if self._popped is not None:
+            self.log.ack(self._popped)
+
+        super().ack()
+
+    def leftovers(self):
+        """Data left in the channel stays in the log to be replayed.
+
+        Returns
+        -------
+        list
+            Always empty.
+        """
+        left = self.queue.qsize()
+
+        if left:
+            self.logger.info(f"Keeping {left} element(s) of channel {self.name} in its log.")
+
+        return []
+
+    def _unwrap(self, item):
+        self._popped, published_at, data = item
+        self._wait.observe(time.monotonic() - published_at)
+
+        if self.queue.maxsize > 0:
+            with self._room:
+                self._room.notify()
+
+        return data
+
+    def _published_at(self, item):
+        return item[1]
+
+
+class PartitionedChannel:
+    """Channel split into partitions, each one with its own queue.
+
+    It behaves as a single channel to the publisher, but data published to it
+    goes to exactly one of its partitions, chosen by hashing the key that
+    `key` extracts from the data. Data sharing the same key always lands on
+    the same partition and is popped in the order it was published, while
+    data with different keys can be consumed in parallel by one subscriber
+    thread per partition.
+    """
+
+    def __init__(
+        self,
+        name,
+        partitions,
+        key,
+        maxsize=0,
+        overflow=OVERFLOW_BLOCK,
+        timeout=None,
+        factory=None,
+        logger=None,
+    ):
+        """Constructor of the PartitionedChannel class.
+
+        Parameters
+        ----------
+        name : str
+            An identifier of the channel. Partitions are named after it.
+        partitions : int
+            Number of partitions (queues) of the channel.
+        key : callable
+            Function that receives the published data and returns its
+            partition key. Data whose key is None goes to the first partition.
+        maxsize : int
+            The maximum size of each partition. If it is zero or negative,
+            partitions accept any number of elements.
+        overflow : str
+            One of `OVERFLOW_POLICIES`, applied by each partition when full.
+        timeout : float
+            Maximum time in seconds to wait for room with the `block` policy.
+        factory : callable
+            Function creating each partition from its name, `maxsize`,
+            `overflow`, `timeout` and `logger`. Defaults to `Channel`.
+        logger : loguru.Logger
+            If not supplied, it will instantiate a new logger.
+        """
+        if partitions < 1:
+            raise ValueError("a partitioned channel needs at least one partition")
+
+        self.name = name
+        self.logger = logger or get_logger(__name__)
+        self._key = key
+        factory = factory or Channel
+        self._partitions = [
+            factory(
+                f"{name}-{index}",
+                maxsize=maxsize,
+                overflow=overflow,
+                timeout=timeout,
+                logger=self.logger,
+            )
+            for index in range(partitions)
+        ]
+
+    @property
+    def partitions(self):
+        """Channels to be consumed, one thread each.
+
+        Returns
+        -------
+        list
+            The partitions of this channel.
+        """
+        return self._partitions
+
+    def partition_for(self, data):
+        """Choose the partition for data.
+
+        The partition is chosen by a stable hash (CRC32) of the data key, so
+        the same key maps to the same partition across restarts.
+
+        Parameters
+        ----------
+        data
+            Any data to be sent over the channel.
+
+        Returns
+        -------
+        Channel
+            The partition the data must be published to.
+        """
+        key = self._key(data)
+
+        if key is None:
+            return self._partitions[0]
+
+        index = zlib.crc32(str(key).encode("utf-8")) % len(self._partitions)
+
+        return self._partitions[index]
+
+    def close(self):
+        """Close every partition of the channel."""
+        for partition in self._partitions:
+            partition.close()
+
+    def publish(self, data):
+        """Publish data to the partition its key maps to.
+
+        Parameters
+        ----------
+        data
+            Any data to be sent over the channel.
+        """
+        self.partition_for(data).publish(data)
+
+    def join(self, timeout=None):
+        """Wait until all data published to every partition is acknowledged.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in seconds to wait. If None, it waits as long as
+            needed.
+
+        Returns
+        -------
+        bool
+            True if all data was acknowledged, False if `timeout` expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        for partition in self._partitions:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+
+            if not partition.join(remaining):
+                return False
+
+        return True
+
+    def qsize(self):
+        """Current size of the channel.
+
+        Returns
+        -------
+        int
+            Number of elements in all partitions.
+        """
+        return sum(partition.qsize() for partition in self._partitions)
+
+    def empty(self):
+        """Is the channel empty?
+
+        Returns
+        -------
+        bool
+            True if every partition is empty. False, otherwise.
+        """
+        return all(partition.empty() for partition in self._partitions)
+
+    def full(self):
+        """Is any partition of the channel full?
+
+        Returns
+        -------
+        bool
+            True if at least one partition is full. False, otherwise.
+        """
+        return any(partition.full() for partition in self._partitions)
+
+    def __repr__(self):
+        return "{!s}(name={!r}, partitions={!r})".format(
+            self.__class__.__name__, self.name, len(self._partitions)
         )
 
 
@@ -309,7 +1161,7 @@ class Publisher:
         """
         self.channels = None
         self._running = True
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
     def update_channels(self, channels):
         """Update the channels to publish to.
@@ -381,6 +1233,10 @@ def error_handler(aggregator, errorevent):
     return
 
 
+def _pickle_dumps(data):
+    return pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+
 class Aggregator:
     """Aggregator main class.
 
@@ -403,7 +1259,7 @@ class Aggregator:
         self.threads = []
         self._error_thread = None
         self._running = False  # It is considered running only after its setup.
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
         self.logger.info("Aggregator created.")
 
@@ -441,7 +1297,18 @@ class Aggregator:
         self.threads = []
 
         for subscriber in self.subscribers:
-            self.threads.append(SubscriberThread(subscriber=subscriber, errorevent=errorevent))
+            # A partitioned channel gets one thread per partition, all of them
+            # sharing the same callback.
+            for partition in subscriber.channel.partitions:
+                self.threads.append(
+                    SubscriberThread(
+                        subscriber=subscriber._replace(channel=partition),
+                        errorevent=errorevent,
+                        name=f"subscriber-{partition.name}",
+                    )
+                )
+
+        self._register_metrics()
 
         # Create error-waiting thread.
         self._error_thread = threading.Thread(
@@ -451,6 +1318,35 @@ class Aggregator:
             daemon=True,
         )
 
+    def _register_metrics(self):
+        """Expose the state of the channels of the subscriber threads."""
+
+        def each_channel(value):
+            return lambda: [
+                ((thread.subscriber.channel.name,), value(thread.subscriber.channel))
+                for thread in self.threads
+            ]
+
+        metrics.callback(
+            "mconf_aggr_channel_depth",
+            "Data waiting in a channel.",
+            ("channel",),
+            each_channel(lambda channel: channel.qsize()),
+        )
+        metrics.callback(
+            "mconf_aggr_channel_oldest_age_seconds",
+            "Seconds since the oldest data waiting in a channel was published.",
+            ("channel",),
+            each_channel(lambda channel: channel.oldest_age()),
+        )
+        metrics.callback(
+            "mconf_aggr_channel_dropped_total",
+            "Data dropped by a full channel.",
+            ("channel",),
+            each_channel(lambda channel: channel.dropped),
+            kind="counter",
+        )
+
     def start(self):
         """Start the aggregator and its components.
 
@@ -490,12 +1386,62 @@ class Aggregator:
 
         self.logger.info("Aggregator running.")
 
+    def drain(self, timeout=None, progress_interval=5):
+        """Wait until the data published so far is handled by its callbacks.
+
+        Data is handled once its callback succeeded, gave up on it or was
+        handed it through `dead_letter`, including data being retried. The
+        number of elements left is logged every `progress_interval` seconds.
+
+        It must be called before `stop`, while publishers may still publish.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in seconds to wait. If None, it waits as long as
+            needed.
+        progress_interval : float
+            Seconds between two logs of the progress.
+
+        Returns
+        -------
+        bool
+            True if all data was handled, False if `timeout` expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        channels = [thread.subscriber.channel for thread in self.threads]
+
+        self.logger.info(f"Draining {len(channels)} channel(s).")
+
+        for channel in channels:
+            while True:
+                wait = progress_interval
+
+                if deadline is not None:
+                    wait = max(0, min(wait, deadline - time.monotonic()))
+
+                if channel.join(wait):
+                    break
+
+                left = sum(other.qsize() for other in channels)
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.logger.warning(f"Stopped draining with {left} element(s) left.")
+                    return False
+
+                self.logger.info(f"Draining: {left} element(s) left.")
+
+        self.logger.info("All channels drained.")
+
+        return True
+
     def stop(self):
         """Stop the aggregator.
 
-        It calls `teardown` method for each of its subscribers' callback and
-        stops all threads. The aggregator is considered to have stopped with
-        success if all threads exit properly.
+        It stops all threads and then calls `teardown` method for each of
+        its subscribers' callback. Data left in channels is handed to the
+        `dead_letter` method of their callbacks. The aggregator is considered
+        to have stopped with success if all threads exit properly.
         """
         if not self._running:
             self.logger.info("Aggregator already stopped.")
@@ -504,6 +1450,13 @@ class Aggregator:
 
         self.logger.info("Stopping aggregator.")
 
+        self.logger.info("Exiting threads.")
+        for thread in self.threads:
+            thread.exit()
+
+        if not any([thread.is_alive() for thread in self.threads]):
+            self.logger.info("All threads exited with success.")
+
         self.logger.info("Tearing down callbacks.")
         for subscriber in self.subscribers:
             try:
@@ -522,32 +1475,70 @@ class Aggregator:
                 )
                 continue
 
-        self.logger.info("Exiting threads.")
-        for thread in self.threads:
-            thread.exit()
-
-        if not any([thread.is_alive() for thread in self.threads]):
-            self.logger.info("All threads exited with success.")
-
         self.publisher.stop()
 
         self._running = False
 
         self.logger.info("Aggregator finished with success.")
 
-    def register_callback(self, callback, channel="default"):
+    def register_callback(
+        self,
+        callback,
+        channel="default",
+        partitions=1,
+        partition_key=None,
+        batch_size=1,
+        batch_timeout=0,
+        channel_factory=None,
+        maxsize=0,
+        overflow=OVERFLOW_BLOCK,
+        overflow_timeout=None,
+        retry_policy=None,
+    ):
         """Register a new callback.
 
         A callback is an instance of a class implementing the
         `AggregatorCallback` interface. Its purpose is to handle received data
         on a given channel.
 
+        If more than one partition is requested, the callback gets a
+        `PartitionedChannel` and one thread per partition, so its `run` method
+        must be safe to call from several threads at once.
+
         Parameters
         ----------
         callback : `AggregatorCallback` subclass
             The handler of the received data.
         channel : str
             Channel to subscribe. Defaults to 'default'.
+        partitions : int
+            Number of partitions (and threads) for the callback. Defaults to 1.
+        partition_key : callable
+            Function that extracts the partition key from published data.
+            Required if `partitions` is greater than 1.
+        batch_size : int
+            Maximum number of elements handed at once to the callback
+            `run_batch` method. Defaults to 1, which means data is handed one
+            element at a time to `run`.
+        batch_timeout : float
+            Maximum time in seconds to wait for a batch to fill up.
+            Defaults to 0.
+        channel_factory : callable
+            Function creating each channel (or partition) from its name, such
+            as a `functools.partial` of `SpoolChannel`. Defaults to `Channel`.
+        maxsize : int
+            The maximum size of the channel (or of each partition). Defaults
+            to 0, which means unbounded.
+        overflow : str
+            One of `OVERFLOW_POLICIES`, applied when the channel is full.
+            Defaults to `block`.
+        overflow_timeout : float
+            Maximum time in seconds to wait for room with the `block` policy.
+            Defaults to None, which means waiting as long as needed.
+        retry_policy : retry.RetryPolicy
+            How data the callback fails on transiently is retried. Data with
+            the same partition key keeps its order while it is retried.
+            Defaults to None, which means never retrying.
         """
         self.logger.debug(f"Registering new callback {callback}.")
 
@@ -557,8 +1548,27 @@ class Aggregator:
             self.logger.debug(f"Creating new list of subscribers for channel {channel}.")
             subscribers = []
 
-        channel_obj = Channel(channel)
-        subscriber = Subscriber(channel_obj, callback)
+        if partitions > 1:
+            if partition_key is None:
+                raise ValueError("a partition key is required for a partitioned channel")
+
+            channel_obj = PartitionedChannel(
+                channel,
+                partitions,
+                partition_key,
+                maxsize=maxsize,
+                overflow=overflow,
+                timeout=overflow_timeout,
+                factory=channel_factory,
+            )
+        else:
+            channel_obj = (channel_factory or Channel)(
+                channel, maxsize=maxsize, overflow=overflow, timeout=overflow_timeout
+            )
+
+        subscriber = Subscriber(
+            channel_obj, callback, batch_size, batch_timeout, retry_policy, partition_key
+        )
         subscribers.append(subscriber)
         self.channels[channel] = subscribers
 
@@ -42,10 +42,86 @@ class EnvConfig:
         self._config["MCONF_WEBHOOK_AUTH_REQUIRED"] = to_bool(
             os.getenv("MCONF_WEBHOOK_AUTH_REQUIRED", "True")
         )
+        self._config["MCONF_WEBHOOK_AUTH_CACHE_TTL"] = float(
+            os.getenv("MCONF_WEBHOOK_AUTH_CACHE_TTL") or "300"
+        )
+        self._config["MCONF_WEBHOOK_AUTH_CACHE_NEGATIVE_TTL"] = float(
+            os.getenv("MCONF_WEBHOOK_AUTH_CACHE_NEGATIVE_TTL") or "10"
+        )
+        self._config["MCONF_WEBHOOK_AUTH_CACHE_NEGATIVE_MAXSIZE"] = int(
+            os.getenv("MCONF_WEBHOOK_AUTH_CACHE_NEGATIVE_MAXSIZE") or "10000"
+        )
+        self._config["MCONF_WEBHOOK_AUTH_CACHE_REFRESH_INTERVAL"] = float(
+            os.getenv("MCONF_WEBHOOK_AUTH_CACHE_REFRESH_INTERVAL") or "60"
+        )
+        self._config["MCONF_WEBHOOK_REFERENCE_DATA_MAX_ROWS"] = int(
+            os.getenv("MCONF_WEBHOOK_REFERENCE_DATA_MAX_ROWS") or "50000"
+        )
+        self._config["MCONF_WEBHOOK_REFERENCE_DATA_REFRESH_INTERVAL"] = float(
+            os.getenv("MCONF_WEBHOOK_REFERENCE_DATA_REFRESH_INTERVAL") or "60"
+        )
+        self._config["MCONF_WEBHOOK_JSON_CODEC"] = os.getenv("MCONF_WEBHOOK_JSON_CODEC") or "auto"
         self._config["MCONF_WEBHOOK_LOG_LEVEL"] = os.getenv("MCONF_WEBHOOK_LOG_LEVEL")
         self._config["MCONF_WEBHOOK_DEPRECATED_EVENTS"] = (
             os.getenv("MCONF_WEBHOOK_DEPRECATED_EVENTS", "").replace(",", " ").split()
         )
+        self._config["MCONF_WEBHOOK_WRITER_THREADS"] = int(
+            os.getenv("MCONF_WEBHOOK_WRITER_THREADS") or "1"
+        )
+        self._config["MCONF_WEBHOOK_BATCH_SIZE"] = int(os.getenv("MCONF_WEBHOOK_BATCH_SIZE") or "1")
+        self._config["MCONF_WEBHOOK_BATCH_TIMEOUT_MS"] = int(
+            os.getenv("MCONF_WEBHOOK_BATCH_TIMEOUT_MS") or "0"
+        )
+        self._config["MCONF_WEBHOOK_CHANNEL_MAXSIZE"] = int(
+            os.getenv("MCONF_WEBHOOK_CHANNEL_MAXSIZE") or "0"
+        )
+        self._config["MCONF_WEBHOOK_CHANNEL_OVERFLOW"] = (
+            os.getenv("MCONF_WEBHOOK_CHANNEL_OVERFLOW") or "block"
+        )
+        self._config["MCONF_WEBHOOK_CHANNEL_TIMEOUT_MS"] = int(
+            os.getenv("MCONF_WEBHOOK_CHANNEL_TIMEOUT_MS") or "1000"
+        )
+        self._config["MCONF_WEBHOOK_RETRY_AFTER"] = int(
+            os.getenv("MCONF_WEBHOOK_RETRY_AFTER") or "5"
+        )
+        self._config["MCONF_WEBHOOK_RETRY_MAX_ATTEMPTS"] = int(
+            os.getenv("MCONF_WEBHOOK_RETRY_MAX_ATTEMPTS") or "8"
+        )
+        self._config["MCONF_WEBHOOK_RETRY_BASE_DELAY_MS"] = int(
+            os.getenv("MCONF_WEBHOOK_RETRY_BASE_DELAY_MS") or "500"
+        )
+        self._config["MCONF_WEBHOOK_RETRY_MAX_DELAY_MS"] = int(
+            os.getenv("MCONF_WEBHOOK_RETRY_MAX_DELAY_MS") or "30000"
+        )
+        self._config["MCONF_WEBHOOK_DEAD_LETTER_DIR"] = (
+            os.getenv("MCONF_WEBHOOK_DEAD_LETTER_DIR") or None
+        )
+        self._config["MCONF_WEBHOOK_SPOOL_DIR"] = os.getenv("MCONF_WEBHOOK_SPOOL_DIR") or None
+        self._config["MCONF_WEBHOOK_SPOOL_SEGMENT_BYTES"] = int(
+            os.getenv("MCONF_WEBHOOK_SPOOL_SEGMENT_BYTES") or "67108864"
+        )
+        self._config["MCONF_WEBHOOK_SPOOL_FSYNC_INTERVAL_MS"] = int(
+            os.getenv("MCONF_WEBHOOK_SPOOL_FSYNC_INTERVAL_MS") or "10"
+        )
+        # Only a deadline with a spool or a dead-letter directory to keep what is left.
+        self._config["MCONF_WEBHOOK_DRAIN_TIMEOUT_MS"] = int(
+            os.getenv("MCONF_WEBHOOK_DRAIN_TIMEOUT_MS") or "25000"
+        )
+        self._config["MCONF_WEBHOOK_DRAIN_PROGRESS_INTERVAL_MS"] = int(
+            os.getenv("MCONF_WEBHOOK_DRAIN_PROGRESS_INTERVAL_MS") or "5000"
+        )
+        self._config["MCONF_WEBHOOK_DEFERRED_MAPPING"] = to_bool(
+            os.getenv("MCONF_WEBHOOK_DEFERRED_MAPPING", "False")
+        )
+        self._config["MCONF_WEBHOOK_LIVE_MEETINGS_CACHE_SIZE"] = int(
+            os.getenv("MCONF_WEBHOOK_LIVE_MEETINGS_CACHE_SIZE") or "10000"
+        )
+        self._config["MCONF_WEBHOOK_ATTENDEES_RECOUNT_INTERVAL"] = int(
+            os.getenv("MCONF_WEBHOOK_ATTENDEES_RECOUNT_INTERVAL") or "100"
+        )
+        self._config["MCONF_WEBHOOK_ATTENDEES_STORE"] = (
+            os.getenv("MCONF_WEBHOOK_ATTENDEES_STORE") or "json"
+        )
 
     def __getitem__(self, key):
         """Make accessing configurations easier."""
@@ -0,0 +1,232 @@
+"""This module provides the retrying of data whose callback failed.
+
+A callback reports the data it failed on in the `CallbackError` it raises,
+telling transient failures (e.g. the database is unreachable) from permanent
+ones. A `RetryScheduler` runs transient failures again after a delay growing
+exponentially with every attempt, with jitter so that retries of many
+threads do not hit the database at once. Data is given up on, and handed to
+the `dead_letter` method of the callback, after a permanent failure or once
+the attempts run out.
+
+Data sharing a key (e.g. the meeting of an event) keeps its order: while
+data is waiting to be retried, later data with the same key is held back
+behind it and only runs after it succeeds or is given up on.
+"""
+import collections
+import heapq
+import itertools
+import random
+import time
+
+"""Data a callback failed on, and whether running it again may succeed."""
+Failure = collections.namedtuple("Failure", ("data", "error", "transient"))
+
+
+class RetryPolicy:
+    """How many times and how long after a transient failure data is retried.
+
+    The delay before the n-th retry is `base_delay * 2 ** (n - 1)`, capped at
+    `max_delay`, and then shortened by up to `jitter` times itself at random.
+    """
+
+    def __init__(self, max_attempts=8, base_delay=0.5, max_delay=30, jitter=0.5):
+        """Constructor of the RetryPolicy.
+
+        Parameters
+        ----------
+        max_attempts : int
+            Maximum number of runs of the same data, the first one included.
+            1 or less never retries.
+        base_delay : float
+            Seconds before the first retry.
+        max_delay : float
+            Maximum seconds between two runs.
+        jitter : float
+            Fraction of the delay, between 0 and 1, that may be cut at random.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempts):
+        """Seconds to wait before running data again after `attempts` runs."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+        return delay * (1 - self.jitter * random.random())
+
+    def __repr__(self):
+        return "{!s}(max_attempts={!r}, base_delay={!r}, max_delay={!r})".format(
+            self.__class__.__name__, self.max_attempts, self.base_delay, self.max_delay
+        )
+
+
+class RetryScheduler:
+    """Delay queue of data to be run again, one queue per key.
+
+    It is not thread-safe: each subscriber thread has its own.
+    """
+
+    def __init__(self, policy=None, key=None, clock=time.monotonic):
+        """Constructor of the RetryScheduler.
+
+        Parameters
+        ----------
+        policy : RetryPolicy
+            If not supplied, data is never retried.
+        key : callable
+            Function that receives data and returns its key. Data without key
+            is never held back.
+        clock : callable
+            Function returning the current time in seconds.
+        """
+        self.policy = policy or RetryPolicy(max_attempts=1)
+        self._key = key
+        self._clock = clock
+        # Key -> deque of [data, attempts, last error], the first one being
+        # the data waiting to be retried.
+        self._held = {}
+        self._due = []
+        self._sequence = itertools.count()
+
+    def hold(self, data):
+        """Hold data back if earlier data with the same key is waiting.
+
+        Returns
+        -------
+        bool
+            True if the data was held back and must not be run now.
+        """
+        if not self._held:
+            return False
+
+        key = self._key_of(data)
+        held = self._held.get(key)
+
+        if held is None:
+            return False
+
+        held.append([data, 0, None])
+
+        return True
+
+    def failed(self, failure, attempts=1):
+        """Record the failure of data run for the first time.
+
+        Returns
+        -------
+        tuple
+            The data, the error and the number of attempts if it is given up
+            on, None if it will be retried.
+        """
+        key = self._key_of(failure.data)
+        item = [failure.data, attempts, failure.error]
+        held = self._held.get(key)
+
+        if held is not None:
+            # Earlier data of the same batch with its key failed too, so it
+            # runs again after it, whatever its own failure was.
+            held.append(item)
+            return None
+
+        self._held[key] = collections.deque([item])
+
+        return self._retry_or_give_up(key, failure.transient)
+
+    def due(self):
+        """Take the data whose retry is due.
+
+        Each one must be reported with `succeeded` or `retry_failed`.
+
+        Returns
+        -------
+        list
+            Tuples of the key, the data and the number of runs so far.
+        """
+        now = self._clock()
+        ready = []
+
+        while self._due and self._due[0][0] <= now:
+            _, _, key = heapq.heappop(self._due)
+            data, attempts, _ = self._held[key][0]
+            ready.append((key, data, attempts))
+
+        return ready
+
+    def succeeded(self, key):
+        """Record that the data taken for `key` succeeded, releasing the next one."""
+        self._release(key)
+
+    def retry_failed(self, key, failure):
+        """Record that the data taken for `key` failed again.
+
+        Returns
+        -------
+        tuple
+            The data, the error and the number of attempts if it is given up
+            on, None if it will be retried.
+        """
+        head = self._held[key][0]
+        head[1] += 1
+        head[2] = failure.error
+
+        return self._retry_or_give_up(key, failure.transient)
+
+    def next_due_in(self):
+        """Seconds until the next retry is due, or None if none is waiting."""
+        if not self._due:
+            return None
+
+        return max(0, self._due[0][0] - self._clock())
+
+    def pending(self):
+        """Number of data waiting, retried or held back."""
+        return sum(len(held) for held in self._held.values())
+
+    def drain(self):
+        """Take all data waiting, leaving the scheduler empty.
+
+        Returns
+        -------
+        list
+            Tuples of the data, its last error (None if held back) and the
+            number of runs so far.
+        """
+        waiting = [tuple(item) for held in self._held.values() for item in held]
+        self._held.clear()
+        self._due.clear()
+
+        return waiting
+
+    def _retry_or_give_up(self, key, transient):
+        data, attempts, error = self._held[key][0]
+
+        if transient and attempts < self.policy.max_attempts:
+            self._schedule(key, self.policy.delay(attempts))
+            return None
+
+        self._release(key)
+
+        return data, error, attempts
+
+    def _release(self, key):
+        held = self._held[key]
+        held.popleft()
+
+        if held:
+            # The data held back behind it runs at once.
+            self._schedule(key, 0)
+        else:
+            del self._held[key]
+
+    def _schedule(self, key, delay):
+        heapq.heappush(self._due, (self._clock() + delay, next(self._sequence), key))
+
+    def _key_of(self, data):
+        key = self._key(data) if self._key is not None else None
+
+        if key is None:
+            # Data without key only waits behind itself.
+            return ("unkeyed", next(self._sequence))
+
+        return key
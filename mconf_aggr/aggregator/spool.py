@@ -0,0 +1,504 @@
+"""This module provides an append-only log of records on disk.
+
+A `SpoolLog` keeps records in a directory of segment files. Each record gets
+an offset, increasing by one with every record, and segments are named after
+the offset of their first record. A new segment is started when the current
+one grows past `segment_bytes`.
+
+Appending only gives the record its offset and buffers it. Buffered records
+are encoded, written and flushed to disk (fsync) in groups by a background
+thread every `fsync_interval` seconds, so appending costs about as much as
+putting into a queue. A record is only durable once its group is flushed:
+callers that must not lose it wait for that with `wait_synced`, so waiting
+takes up to one interval instead of one fsync per record, however many
+records are appended meanwhile (group commit). With a zero interval each
+record is written and flushed before `append` returns instead.
+
+Consumers acknowledge records by offset: acknowledging an offset
+acknowledges every record before it too. Segments whose records are all
+acknowledged are removed, and records not acknowledged when the log is
+opened again are replayed.
+
+Each record is stored as a header with its offset, the length and the CRC32
+of its payload, followed by the payload. A record cut short by a crash is
+detected by its header and dropped from the end of the log when it is opened.
+
+A `SpillFile` is a much simpler first-in first-out queue on disk, holding
+what does not fit in memory. It is not meant to survive the process.
+"""
+import collections
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import zlib
+
+from mconf_aggr.logger import get_logger
+
+HEADER = struct.Struct("<QII")
+ACK = struct.Struct("<q")
+ACK_FILE = "ack"
+SEGMENT_SUFFIX = ".log"
+
+
+class SpoolLog:
+    """Append-only log of records split into segment files."""
+
+    def __init__(
+        self,
+        directory,
+        segment_bytes=64 * 1024 * 1024,
+        fsync_interval=0.01,
+        encode=None,
+        logger=None,
+    ):
+        """Constructor of the SpoolLog.
+
+        It opens the log in `directory`, creating it if needed, and recovers
+        the records already in it.
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the segment files of the log.
+        segment_bytes : int
+            Size from which a new segment is started.
+        fsync_interval : float
+            Seconds between writes of the log to disk. Zero or less writes on
+            every append.
+        encode : callable
+            Function turning appended records into bytes when they are
+            written. If not supplied, records must be bytes.
+        logger : loguru.Logger
+            If not supplied, it will instantiate a new logger.
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.encode = encode
+        self.logger = logger or get_logger(__name__)
+
+        self.acked = -1
+        self.next_offset = 0
+        self.synced = -1
+
+        # `_lock` guards appends and acknowledgements, `_sync_lock` the files.
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_condition = threading.Condition(self._lock)
+        self._sync_failures = 0
+        self._sync_error = None
+        self._buffer = collections.deque()
+        self._ack_dirty = False
+        self._segments = []
+        self._fd = None
+        self._size = 0
+        self._flusher = None
+        self._stop = threading.Event()
+        self._closed = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def replay(self):
+        """Iterate over the records on disk not acknowledged.
+
+        Yields
+        ------
+        tuple
+            The offset and the payload (bytes) of each record, in order.
+        """
+        for first_offset, path in list(self._segments):
+            for offset, payload in self._read_segment(path, first_offset)[0]:
+                if offset > self.acked:
+                    yield offset, payload
+
+    def append(self, record):
+        """Append a record to the log.
+
+        Parameters
+        ----------
+        record
+            Content of the record, bytes unless the log has an `encode`
+            function.
+
+        Returns
+        -------
+        int
+            The offset of the record.
+
+        Raises
+        ------
+        OSError
+            If the log is closed or, when writing on every append, if the
+            record could not be written.
+        """
+        with self._lock:
+            if self._closed:
+                raise OSError(f"spool log '{self.directory}' is closed")
+
+            offset = self.next_offset
+            self.next_offset = offset + 1
+            self._buffer.append(record)
+
+        if self.fsync_interval <= 0:
+            self.sync()
+
+        return offset
+
+    def wait_synced(self, offset, timeout=None):
+        """Wait until the record at `offset` is written and flushed to disk.
+
+        If the log is not being written in background, it is written here.
+
+        Parameters
+        ----------
+        offset : int
+            Offset returned by `append`.
+        timeout : float
+            Maximum time in seconds to wait. If None, it waits as long as
+            needed.
+
+        Raises
+        ------
+        OSError
+            If the write covering the record failed, the log was closed
+            before writing it or `timeout` expired. The record is still
+            buffered and written by the next write that succeeds.
+        """
+        if self._flusher is None and self.synced < offset:
+            self.sync()
+
+        with self._synced_condition:
+            failures = self._sync_failures
+            self._synced_condition.wait_for(
+                lambda: self.synced >= offset
+                or self._sync_failures != failures
+                or (self._closed and self._flusher is None),
+                timeout,
+            )
+
+            if self.synced >= offset:
+                return
+
+            if self._sync_failures != failures:
+                raise OSError(f"unable to write spool log '{self.directory}': {self._sync_error}")
+
+        raise OSError(f"record {offset} of spool log '{self.directory}' was not written")
+
+    def ack(self, offset):
+        """Acknowledge all records up to `offset`, inclusive."""
+        with self._lock:
+            if offset <= self.acked:
+                return
+
+            self.acked = offset
+            self._ack_dirty = True
+            closed = self._closed
+
+        if self.fsync_interval <= 0 or closed:
+            self.sync()
+
+    def sync(self):
+        """Write the records and acknowledgements appended so far to disk.
+
+        Segments whose records are all acknowledged are removed afterwards.
+
+        Raises
+        ------
+        OSError
+            If the records could not be written. They are kept to be written
+            by the next call.
+        """
+        with self._sync_lock:
+            with self._lock:
+                first_offset = self.next_offset - len(self._buffer)
+                records = list(self._buffer)
+                self._buffer.clear()
+                acked = self.acked if self._ack_dirty else None
+                self._ack_dirty = False
+
+            try:
+                if records:
+                    self._write(first_offset, records)
+            except Exception as err:
+                with self._lock:
+                    self._buffer.extendleft(reversed(records))
+                    self._ack_dirty = self._ack_dirty or acked is not None
+                    self._sync_failures += 1
+                    self._sync_error = err
+                    self._synced_condition.notify_all()
+                raise
+
+            if records:
+                with self._lock:
+                    self.synced = first_offset + len(records) - 1
+                    self._synced_condition.notify_all()
+
+            if acked is not None:
+                self._write_ack(acked)
+                self._remove_acked_segments(acked)
+
+    def start(self):
+        """Start writing the log to disk in background."""
+        if self.fsync_interval <= 0 or self._flusher is not None:
+            return
+
+        self._stop.clear()
+        self._flusher = threading.Thread(
+            target=self._sync_forever, name=f"spool-{os.path.basename(self.directory)}", daemon=True
+        )
+        self._flusher.start()
+
+    def close(self):
+        """Write the log to disk and close it. Records can not be appended anymore."""
+        if self._flusher is not None:
+            self._stop.set()
+            self._flusher.join()
+            self._flusher = None
+
+        with self._lock:
+            self._closed = True
+
+        try:
+            self.sync()
+        finally:
+            # Waiters for records not written by now give up.
+            with self._lock:
+                self._synced_condition.notify_all()
+
+        with self._sync_lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def pending(self):
+        """Number of records not acknowledged."""
+        return self.next_offset - self.acked - 1
+
+    def _sync_forever(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except Exception as err:
+                self.logger.error(f"Unable to write spool log '{self.directory}': {err}")
+
+    def _write(self, first_offset, records):
+        if self._fd is None:
+            raise OSError(f"spool log '{self.directory}' is closed")
+
+        if self._size >= self.segment_bytes:
+            os.close(self._fd)
+            self._fd = None
+            self._open_segment(first_offset)
+
+        encode = self.encode
+        chunks = []
+
+        for offset, record in enumerate(records, first_offset):
+            payload = encode(record) if encode else record
+            chunks.append(HEADER.pack(offset, len(payload), zlib.crc32(payload)))
+            chunks.append(payload)
+
+        data = b"".join(chunks)
+        written = os.write(self._fd, data)
+
+        if written != len(data):
+            # Undo the partial write so the segment stays readable.
+            os.ftruncate(self._fd, self._size)
+            raise OSError(f"short write to spool log '{self.directory}'")
+
+        self._size += written
+        _fsync(self._fd)
+
+    def _recover(self):
+        self.acked = self._read_ack()
+        self.next_offset = self.acked + 1
+
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        self._segments = [
+            (int(os.path.splitext(name)[0]), os.path.join(self.directory, name)) for name in names
+        ]
+
+        for index, (first_offset, path) in enumerate(self._segments):
+            records, valid_size = self._read_segment(path, first_offset)
+
+            if valid_size != os.path.getsize(path):
+                if index == len(self._segments) - 1:
+                    self.logger.warning(
+                        f"Dropping incomplete record at the end of spool segment '{path}'."
+                    )
+                    os.truncate(path, valid_size)
+                else:
+                    self.logger.error(f"Skipping corrupt records of spool segment '{path}'.")
+
+            self.next_offset = max(self.next_offset, first_offset + len(records))
+
+        self.synced = self.next_offset - 1
+
+        if self._segments:
+            path = self._segments[-1][1]
+            self._fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+            self._size = os.path.getsize(path)
+        else:
+            self._open_segment(self.next_offset)
+
+        self.logger.info(
+            f"Opened spool log '{self.directory}' with {self.pending()} record(s) to replay."
+        )
+
+    def _read_segment(self, path, first_offset):
+        """Read the valid records of a segment and the size they take."""
+        records = []
+        position = 0
+
+        with open(path, "rb") as segment:
+            data = segment.read()
+
+        while position + HEADER.size <= len(data):
+            offset, length, crc = HEADER.unpack_from(data, position)
+            start = position + HEADER.size
+            end = start + length
+            payload = data[start:end]
+
+            if (
+                offset != first_offset + len(records)
+                or len(payload) != length
+                or zlib.crc32(payload) != crc
+            ):
+                break
+
+            records.append((offset, payload))
+            position = end
+
+        return records, position
+
+    def _open_segment(self, first_offset):
+        path = os.path.join(self.directory, f"{first_offset:020d}{SEGMENT_SUFFIX}")
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = 0
+        self._segments.append((first_offset, path))
+        _fsync_directory(self.directory)
+
+    def _remove_acked_segments(self, acked):
+        # A segment is done when the next one starts right after the
+        # acknowledged offset or before. The current one is never removed.
+        done = [
+            path
+            for (_, path), (next_offset, _) in zip(self._segments, self._segments[1:])
+            if next_offset <= acked + 1
+        ]
+        removed = len(done)
+        self._segments = self._segments[removed:]
+
+        for path in done:
+            os.remove(path)
+
+    def _read_ack(self):
+        try:
+            with open(os.path.join(self.directory, ACK_FILE), "rb") as ack_file:
+                return ACK.unpack(ack_file.read(ACK.size))[0]
+        except (FileNotFoundError, struct.error):
+            return -1
+
+    def _write_ack(self, acked):
+        fd = os.open(os.path.join(self.directory, ACK_FILE), os.O_WRONLY | os.O_CREAT, 0o644)
+
+        try:
+            os.pwrite(fd, ACK.pack(acked), 0)
+            _fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __repr__(self):
+        return "{!s}(directory={!r}, acked={!r}, next_offset={!r})".format(
+            self.__class__.__name__, self.directory, self.acked, self.next_offset
+        )
+
+
+class SpillFile:
+    """First-in first-out queue of objects kept in a temporary file.
+
+    Objects are pickled to the end of the file and read back from where the
+    last read stopped. The file is emptied whenever all objects are read. It
+    is not thread-safe.
+    """
+
+    def __init__(self, directory=None):
+        """Constructor of the SpillFile.
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the file. Defaults to the temporary directory of the
+            system (`TMPDIR`).
+        """
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._read_position = 0
+        self._count = 0
+
+    def put(self, data):
+        """Add an object to the end of the queue."""
+        self._file.seek(0, os.SEEK_END)
+        pickle.dump(data, self._file, pickle.HIGHEST_PROTOCOL)
+        self._count += 1
+
+    def get(self):
+        """Remove and return the object at the front of the queue.
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty.
+        """
+        if not self._count:
+            raise IndexError("get from an empty spill file")
+
+        self._file.seek(self._read_position)
+        data = pickle.load(self._file)
+        self._count -= 1
+
+        if self._count:
+            self._read_position = self._file.tell()
+        else:
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_position = 0
+
+        return data
+
+    def close(self):
+        """Close and delete the file."""
+        self._file.close()
+
+    def __len__(self):
+        return self._count
+
+
+def _fsync(fd):
+    """Flush a file to disk without blocking other greenlets under gevent."""
+    if _gevent_patched():
+        import gevent
+
+        gevent.get_hub().threadpool.apply(os.fsync, (fd,))
+    else:
+        os.fsync(fd)
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+
+    try:
+        _fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+
+    return monkey.is_module_patched("threading")
@@ -1,5 +1,11 @@
+import threading
 import time
 from contextlib import contextmanager
+from signal import SIGTERM
+
+from mconf_aggr.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 @contextmanager
@@ -44,33 +50,70 @@ class RequestTimeLogger:
     """
     current_requests_count = 0
 
+    """ Notified when the last request being handled is done
+    """
+    _idle = threading.Condition()
+
     @staticmethod
     @contextmanager
     def time_logger_requests(logger_func, msg, extra=dict(), **kw_format):
         """Provide a log for the elapsed time in the context block and handle
         statistics of requests."""
-        RequestTimeLogger.current_requests_count += 1
-
-        start_time = time.time()
-        yield None
-        end_time = time.time()
-
-        elapsed_time = round(end_time - start_time, 4)
-        kw_format.update({"elapsed": elapsed_time})
+        with RequestTimeLogger._idle:
+            RequestTimeLogger.current_requests_count += 1
 
         try:
-            logger_func(msg.format(**kw_format), extra=extra)
-        except Exception as err:
-            kw = ", ".join(["{}: {}".format(k, v) for k, v in kw_format.items()])
-            print("Error while logging elapsed time: {} ({}).".format(err, kw))
-
-        RequestTimeLogger.current_requests_count -= 1
+            start_time = time.time()
+            yield None
+            end_time = time.time()
+
+            elapsed_time = round(end_time - start_time, 4)
+            kw_format.update({"elapsed": elapsed_time})
+
+            try:
+                logger_func(msg.format(**kw_format), extra=extra)
+            except Exception as err:
+                kw = ", ".join(["{}: {}".format(k, v) for k, v in kw_format.items()])
+                print("Error while logging elapsed time: {} ({}).".format(err, kw))
+        finally:
+            with RequestTimeLogger._idle:
+                RequestTimeLogger.current_requests_count -= 1
 
+                if not RequestTimeLogger.current_requests_count:
+                    RequestTimeLogger._idle.notify_all()
 
-def signal_handler(aggregator, liveness_probe, signal):
+    @staticmethod
+    def wait_idle(timeout=None):
+        """Wait until no request is being handled.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in seconds to wait. If None, it waits as long as
+            needed.
+
+        Returns
+        -------
+        bool
+            True if no request is being handled, False if `timeout` expired.
+        """
+        with RequestTimeLogger._idle:
+            return RequestTimeLogger._idle.wait_for(
+                lambda: not RequestTimeLogger.current_requests_count, timeout
+            )
+
+
+def signal_handler(
+    aggregator, liveness_probe, signal, timeout=None, progress_interval=5, persistent=True
+):
     """Unix signals handler.
 
-    Handle signals, closing the application gracefully if the signal is a SIGTERM.
+    Handle signals, closing the application gracefully if the signal is a SIGTERM:
+    requests being handled are waited for, then the events they published,
+    for at most `timeout` seconds in all. Events still not handled then are
+    kept in the spool of their channel if it has one, or handed to the
+    `dead_letter` method of their callback. If they would not be persisted
+    there, there is no deadline: they are waited for as long as needed.
 
     Parameters
     ----------
@@ -80,17 +123,51 @@ def signal_handler(aggregator, liveness_probe, signal):
         The probe listener which handles the /health route.
     signal : signal
         The signal which was spawned in the main thread.
+    timeout : float
+        Maximum time in seconds to wait before stopping. If None, it waits
+        as long as needed.
+    progress_interval : float
+        Seconds between two logs of the progress.
+    persistent : bool
+        Whether events left at the deadline are persisted, in a spool or a
+        dead-letter store, to be handled later. If False, `timeout` is ignored.
     """
 
-    if signal == signal.SIGTERM:
+    if signal == SIGTERM:
         liveness_probe.close()
 
-        # Wait aggregator handle with all the received events before close it
-        while (
-            any([not x.channel.empty() for x in aggregator.subscribers])
-            or RequestTimeLogger.current_requests_count > 0
-        ):
-            print("There are events to handle yet.")
+        if timeout is not None and not persistent:
+            logger.warning(
+                "Draining without a deadline: there is no spool nor dead-letter store "
+                "to keep the events left."
+            )
+            timeout = None
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while not RequestTimeLogger.wait_idle(_wait(deadline, progress_interval)):
+            if _wait(deadline, progress_interval) == 0:
+                logger.warning(
+                    f"Stopping with {RequestTimeLogger.current_requests_count} request(s) "
+                    "still being handled."
+                )
+                break
 
+            logger.info(
+                f"Waiting for {RequestTimeLogger.current_requests_count} request(s) to be handled."
+            )
+
+        # Wait aggregator handle with all the received events before close it
+        aggregator.drain(_wait(deadline, None), progress_interval)
         aggregator.stop()
         exit(0)
+
+
+def _wait(deadline, interval):
+    """Seconds to wait for at most `interval`, without going past `deadline`."""
+    if deadline is None:
+        return interval
+
+    remaining = max(0, deadline - time.monotonic())
+
+    return remaining if interval is None else min(interval, remaining)
@@ -0,0 +1,79 @@
+"""This module provides the JSON codec used to decode requests and encode
+responses and log records.
+
+The codec is selected at startup by name:
+
+* `orjson`: the orjson library, which is much faster than the json module.
+* `json`: the json module of the standard library.
+* `auto`: orjson if it is installed, json otherwise.
+
+Both codecs take and return `str`, so they can be swapped without changes
+elsewhere.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CODECS = ("auto", "orjson", "json")
+
+
+class JsonCodec:
+    """JSON codec whose implementation is selected by name."""
+
+    def __init__(self, name="auto"):
+        """Constructor of the JsonCodec.
+
+        Parameters
+        ----------
+        name : str
+            One of `CODECS`.
+        """
+        self.use(name)
+
+    def use(self, name):
+        """Select the implementation of the codec.
+
+        Raises
+        ------
+        ValueError
+            If `name` is unknown or names a library that is not installed.
+        """
+        if name == "auto":
+            name = "json" if orjson is None else "orjson"
+
+        if name == "orjson":
+            if orjson is None:
+                raise ValueError("JSON codec 'orjson' is not installed")
+
+            self.loads = _orjson_loads
+            self.dumps = _orjson_dumps
+        elif name == "json":
+            self.loads = json.loads
+            self.dumps = json.dumps
+        else:
+            raise ValueError(f"Unknown JSON codec '{name}', expected one of: {', '.join(CODECS)}")
+
+        self.name = name
+
+    def __repr__(self):
+        return "{!s}(name={!r})".format(self.__class__.__name__, self.name)
+
+
+def _orjson_loads(data):
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # orjson is stricter than json (e.g. on NaN and big integers), so
+        # let json decide, raising its own json.JSONDecodeError if invalid.
+        return json.loads(data)
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj).decode()
+
+
+"""Codec shared by the whole process."""
+json_codec = JsonCodec()
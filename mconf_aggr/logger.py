@@ -1,9 +1,42 @@
-import json
+"""This module configures the logging of the process.
+
+Logging is set up once per process, on the first call to `get_logger`, from
+the following environment variables:
+
+* `LOGURU_LOG_LEVEL`: minimum level of the records written (default INFO).
+* `LOGURU_LOG_SINK`: `sys.stderr` or `sink_serializer` (default `sys.stderr`).
+* `LOGURU_LOG_LEVELS`: comma-separated `module=LEVEL` pairs overriding the
+  level of a module and its submodules, e.g.
+  `mconf_aggr.webhook.database_handler=DEBUG,mconf_aggr.aggregator=WARNING`.
+* `LOGURU_LOG_ENQUEUE`: if true, records are handed to a queue and written by a
+  background thread, so logging never waits for the sink.
+* `LOGURU_LOG_QUEUE_SIZE`: maximum number of records waiting in that queue
+  (default 10000). Records arriving when it is full are dropped and counted.
+
+Later calls to `get_logger` only return a child logger bound to a name, so
+they are cheap enough to be made anywhere.
+"""
+import atexit
 import os
+import queue
 import sys
+import threading
 
 from loguru import logger
 
+from mconf_aggr.json_codec import json_codec
+
+LOG_FORMAT = (
+    "<g>{time:YYYY-MM-DD HH:mm:ss.SSS ZZZ}</g> | <lvl>{level}</lvl> |"
+    + " <b>{name}</b>:{line}:<c>[{thread}]</c> | {message}"
+)
+
+_lock = threading.Lock()
+_init_lock = threading.Lock()
+_handler_id = None
+_queue_sink = None
+_children = {}
+
 
 def sink_serializer(message):
     record = message.record
@@ -15,31 +48,185 @@ def sink_serializer(message):
         "line": record["line"],
         "message": record["message"],
     }
-    serialized = json.dumps(simplified)
+    serialized = json_codec.dumps(simplified)
     print(serialized, file=sys.stderr)
 
 
-def get_logger():
-    LOG_LEVEL = str(os.environ.get("LOGURU_LOG_LEVEL"))
-    LOG_SINK = os.environ.get("LOGURU_LOG_SINK")
+def stderr_sink(message):
+    sys.stderr.write(message)
+
+
+SINKS = {"sys.stderr": stderr_sink, "sink_serializer": sink_serializer}
+
+
+class QueueSink:
+    """Sink handing messages to a background thread that writes them.
+
+    Putting a message in the queue never blocks: when the queue is full the
+    message is dropped and counted in `dropped`.
+    """
+
+    def __init__(self, sink, maxsize=10000):
+        """Constructor of the QueueSink.
+
+        Parameters
+        ----------
+        sink : callable
+            Sink actually writing the messages.
+        maxsize : int
+            Maximum number of messages waiting to be written.
+        """
+        self.sink = sink
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+        self._writer = threading.Thread(target=self._write_forever, name="log-writer", daemon=True)
+        self._writer.start()
+
+    def __call__(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write the messages still queued and stop the background thread."""
+        if not self._writer.is_alive():
+            return
+
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_forever(self):
+        while True:
+            message = self._queue.get()
+
+            if message is None:
+                return
+
+            try:
+                self.sink(message)
+            except Exception as err:
+                print(f"Unable to write log message: {err}", file=sys.stderr)
+
+
+class LevelFilter:
+    """Filter applying the minimum level of the module logging a record.
+
+    The level of a module is that of its longest configured prefix, falling
+    back to `level`. It is resolved once per module name.
+    """
+
+    def __init__(self, level, levels=None):
+        self.levels = {"": logger.level(level).no}
+        self.levels.update({name: logger.level(lvl).no for name, lvl in (levels or {}).items()})
+        self._resolved = {}
+
+    def __call__(self, record):
+        name = record["extra"].get("logger_name") or record["name"] or ""
+
+        try:
+            minimum = self._resolved[name]
+        except KeyError:
+            minimum = self._resolved[name] = self._resolve(name)
+
+        return record["level"].no >= minimum
+
+    def _resolve(self, name):
+        while name not in self.levels:
+            name = name.rpartition(".")[0]
+
+        return self.levels[name]
+
+
+def parse_levels(value):
+    """Parse comma-separated `module=LEVEL` pairs into a dict."""
+    levels = {}
+
+    for pair in (value or "").split(","):
+        if not pair.strip():
+            continue
+
+        name, _, level = pair.partition("=")
+        levels[name.strip()] = level.strip().upper()
+
+    return levels
+
+
+def setup_logger(level=None, sink=None, levels=None, enqueue=None, queue_size=None):
+    """Configure the sink of the process, replacing any previous one.
+
+    Arguments not supplied are read from the environment variables described
+    in the module documentation. Sinks added by others, e.g. by tests, are
+    kept.
+    """
+    global _handler_id, _queue_sink
+
+    level = level or os.environ.get("LOGURU_LOG_LEVEL") or "INFO"
+    sink_name = os.environ.get("LOGURU_LOG_SINK") or "sys.stderr"
+    if levels is None:
+        levels = parse_levels(os.environ.get("LOGURU_LOG_LEVELS"))
+    if enqueue is None:
+        enqueue = os.environ.get("LOGURU_LOG_ENQUEUE", "").lower() in ("true", "1", "yes")
+    if queue_size is None:
+        queue_size = int(os.environ.get("LOGURU_LOG_QUEUE_SIZE") or 10000)
+
+    if sink is None:
+        sink = SINKS.get(sink_name)
+
+        if sink is None:
+            print(f"Unknown LOGURU_LOG_SINK '{sink_name}', using sys.stderr", file=sys.stderr)
+            sink = stderr_sink
+
+    with _lock:
+        if _handler_id is None:
+            # Drop the default handler of loguru.
+            logger.remove()
+        else:
+            logger.remove(_handler_id)
+
+        if _queue_sink is not None:
+            _queue_sink.stop()
+            _queue_sink = None
+
+        if enqueue:
+            sink = _queue_sink = QueueSink(sink, queue_size)
+            atexit.register(_queue_sink.stop)
+
+        level_filter = LevelFilter(level, levels)
+
+        # Records below every configured level are dropped by loguru before
+        # being built, so the filter only sees records that may pass.
+        _handler_id = logger.add(
+            sink=sink,
+            level=min(level_filter.levels.values()),
+            format=LOG_FORMAT,
+            filter=level_filter,
+            colorize=True,
+        )
+
+
+def get_logger(name=None):
+    """Get a logger, configuring logging on the first call.
 
-    if LOG_SINK == "sys.stderr":
-        SINK = sys.stderr
-    elif LOG_SINK == "sink_serializer":
-        SINK = sink_serializer
-    else:
-        logger.error("Failed to get SINK variable")
+    Parameters
+    ----------
+    name : str
+        Name of the child logger, usually `__name__`. Its records are filtered
+        with the level of that module instead of the caller's.
 
-    logger.remove()
+    Returns
+    -------
+    loguru.Logger
+    """
+    if _handler_id is None:
+        with _init_lock:
+            if _handler_id is None:
+                setup_logger()
 
-    logger.add(
-        sink=SINK,
-        level=LOG_LEVEL,
-        format=(
-            "<g>{time:YYYY-MM-DD HH:mm:ss.SSS ZZZ}</g> | <lvl>{level}</lvl> |"
-            + " <b>{name}</b>:{line}:<c>[{thread}]</c> | {message}"
-        ),
-        colorize=True,
-    )
+    if name is None:
+        return logger
 
-    return logger
+    try:
+        return _children[name]
+    except KeyError:
+        return _children.setdefault(name, logger.bind(logger_name=name))
@@ -2,25 +2,35 @@ import gevent
 
 gevent.monkey.patch_all()
 
+import functools
 import signal
 import sys
 
 import falcon
 
 import mconf_aggr.aggregator.cfg as cfg
-from mconf_aggr.aggregator.aggregator import Aggregator, SetupError
+from mconf_aggr.aggregator.aggregator import Aggregator, SetupError, SpoolChannel
+from mconf_aggr.aggregator.retry import RetryPolicy
 from mconf_aggr.aggregator.utils import signal_handler
+from mconf_aggr.json_codec import json_codec
 from mconf_aggr.logger import get_logger
-from mconf_aggr.webhook.database import DatabaseConnector
+from mconf_aggr.webhook.attendee_store import get_attendee_store
+from mconf_aggr.webhook.database import DatabaseConnector, make_psycopg_cooperative
 from mconf_aggr.webhook.database_handler import WebhookDataWriter
+from mconf_aggr.webhook.dead_letter import DeadLetterStore
 from mconf_aggr.webhook.event_listener import WebhookEventHandler, WebhookEventListener
+from mconf_aggr.webhook.event_mapper import meeting_partition_key
 from mconf_aggr.webhook.hook_register import WebhookRegister
+from mconf_aggr.webhook.live_meetings import live_meetings
 from mconf_aggr.webhook.probe_listener import (
     LivenessProbeListener,
+    MetricsListener,
     ReadinessProbeListener,
 )
+from mconf_aggr.webhook.reference_data import reference_data
+from mconf_aggr.webhook.secret_cache import secret_cache
 
-logger = get_logger()
+logger = get_logger(__name__)
 
 # falcon.API instances are callable WSGI apps.
 app = falcon.App()
@@ -33,14 +43,59 @@ req_opt.auto_parse_form_urlencoded = True
 route = cfg.config["MCONF_WEBHOOK_ROUTE"]
 
 channel = "webhooks"
-webhook_writer = WebhookDataWriter()
+dead_letter_dir = cfg.config["MCONF_WEBHOOK_DEAD_LETTER_DIR"]
+webhook_writer = WebhookDataWriter(
+    reference_data_refresh_interval=cfg.config["MCONF_WEBHOOK_REFERENCE_DATA_REFRESH_INTERVAL"],
+    dead_letters=DeadLetterStore(dead_letter_dir) if dead_letter_dir else None,
+)
 aggregator = Aggregator()
 
 database = DatabaseConnector()
 
+live_meetings.maxsize = cfg.config["MCONF_WEBHOOK_LIVE_MEETINGS_CACHE_SIZE"]
+live_meetings.recount_interval = cfg.config["MCONF_WEBHOOK_ATTENDEES_RECOUNT_INTERVAL"]
+live_meetings.attendee_store = get_attendee_store(cfg.config["MCONF_WEBHOOK_ATTENDEES_STORE"])
+
+json_codec.use(cfg.config["MCONF_WEBHOOK_JSON_CODEC"])
+reference_data.max_rows = cfg.config["MCONF_WEBHOOK_REFERENCE_DATA_MAX_ROWS"]
+secret_cache.ttl = cfg.config["MCONF_WEBHOOK_AUTH_CACHE_TTL"]
+secret_cache.negative_ttl = cfg.config["MCONF_WEBHOOK_AUTH_CACHE_NEGATIVE_TTL"]
+secret_cache.negative_maxsize = cfg.config["MCONF_WEBHOOK_AUTH_CACHE_NEGATIVE_MAXSIZE"]
+
+make_psycopg_cooperative()
 database.connect()
 
-aggregator.register_callback(webhook_writer, channel=channel)
+secret_cache.start(cfg.config["MCONF_WEBHOOK_AUTH_CACHE_REFRESH_INTERVAL"])
+
+spool_dir = cfg.config["MCONF_WEBHOOK_SPOOL_DIR"]
+if spool_dir:
+    # Events survive restarts in a log on disk until they are handled.
+    channel_factory = functools.partial(
+        SpoolChannel,
+        directory=spool_dir,
+        segment_bytes=cfg.config["MCONF_WEBHOOK_SPOOL_SEGMENT_BYTES"],
+        fsync_interval=cfg.config["MCONF_WEBHOOK_SPOOL_FSYNC_INTERVAL_MS"] / 1000,
+    )
+else:
+    channel_factory = None
+
+aggregator.register_callback(
+    webhook_writer,
+    channel=channel,
+    partitions=cfg.config["MCONF_WEBHOOK_WRITER_THREADS"],
+    partition_key=meeting_partition_key,
+    batch_size=cfg.config["MCONF_WEBHOOK_BATCH_SIZE"],
+    batch_timeout=cfg.config["MCONF_WEBHOOK_BATCH_TIMEOUT_MS"] / 1000,
+    channel_factory=channel_factory,
+    maxsize=cfg.config["MCONF_WEBHOOK_CHANNEL_MAXSIZE"],
+    overflow=cfg.config["MCONF_WEBHOOK_CHANNEL_OVERFLOW"],
+    overflow_timeout=cfg.config["MCONF_WEBHOOK_CHANNEL_TIMEOUT_MS"] / 1000,
+    retry_policy=RetryPolicy(
+        max_attempts=cfg.config["MCONF_WEBHOOK_RETRY_MAX_ATTEMPTS"],
+        base_delay=cfg.config["MCONF_WEBHOOK_RETRY_BASE_DELAY_MS"] / 1000,
+        max_delay=cfg.config["MCONF_WEBHOOK_RETRY_MAX_DELAY_MS"] / 1000,
+    ),
+)
 
 livenessProbe = LivenessProbeListener()
 readinessProbe = ReadinessProbeListener()
@@ -49,18 +104,30 @@ try:
     aggregator.setup()
 
     # Create the signal handling for graceful shutdown
-    gevent.signal_handler(signal.SIGTERM, signal_handler, aggregator, livenessProbe, signal.SIGTERM)
+    gevent.signal_handler(
+        signal.SIGTERM,
+        signal_handler,
+        aggregator,
+        livenessProbe,
+        signal.SIGTERM,
+        cfg.config["MCONF_WEBHOOK_DRAIN_TIMEOUT_MS"] / 1000,
+        cfg.config["MCONF_WEBHOOK_DRAIN_PROGRESS_INTERVAL_MS"] / 1000,
+        persistent=bool(spool_dir or dead_letter_dir),
+    )
 except SetupError:
     sys.exit(1)
 
 publisher = aggregator.publisher
 
-event_handler = WebhookEventHandler(publisher, channel)
-hook = WebhookEventListener(event_handler)
+event_handler = WebhookEventHandler(
+    publisher, channel, deferred_mapping=cfg.config["MCONF_WEBHOOK_DEFERRED_MAPPING"]
+)
+hook = WebhookEventListener(event_handler, retry_after=cfg.config["MCONF_WEBHOOK_RETRY_AFTER"])
 
 app.add_route(route, hook)
 app.add_route("/health", livenessProbe)
 app.add_route("/ready", readinessProbe)
+app.add_route("/metrics", MetricsListener())
 
 should_register = cfg.config["MCONF_WEBHOOK_SHOULD_REGISTER"]
 if should_register:
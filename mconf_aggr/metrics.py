@@ -0,0 +1,343 @@
+"""This module provides the metrics of the process in the Prometheus text format.
+
+Metrics are created once, usually at import time, from the shared registry:
+
+    events = metrics.counter("mconf_webhook_events_total", "Events.", ("event_type",))
+    events.labels("user-joined").inc()
+
+and are rendered by `metrics.render()` for the `/metrics` route.
+
+Recording a value takes no lock: each metric keeps one shard of values per OS
+thread, written only by that thread, and shards are summed when metrics are
+rendered. Greenlets of the same OS thread share a shard, which is safe as
+they never switch in the middle of an update. Locks are only taken the first
+time a thread records a value or a label set is used.
+
+Values that are already kept elsewhere, such as the size of a queue, are read
+by callbacks when metrics are rendered instead of being recorded.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    # Shards are per OS thread even when threads are greenlets.
+    from gevent.monkey import get_original
+
+    _thread_ident = get_original("_thread", "get_ident")
+except ImportError:
+    from _thread import get_ident as _thread_ident
+
+"""Upper bounds in seconds of the buckets of latency histograms."""
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Shards:
+    """Numbers summed over one shard per OS thread."""
+
+    def __init__(self, size):
+        self._size = size
+        self._shards = {}
+        self._lock = threading.Lock()
+
+    def shard(self):
+        """The list of numbers of the calling OS thread."""
+        ident = _thread_ident()
+        shard = self._shards.get(ident)
+
+        if shard is None:
+            with self._lock:
+                shard = self._shards.setdefault(ident, [0] * self._size)
+
+        return shard
+
+    def values(self):
+        """The numbers summed over all shards."""
+        totals = [0] * self._size
+
+        for shard in list(self._shards.values()):
+            for index, value in enumerate(shard):
+                totals[index] += value
+
+        return totals
+
+
+class _Metric:
+    """Metric with one child per label set."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child of the metric for a label set.
+
+        Children are kept, so callers recording often should keep them too.
+
+        Raises
+        ------
+        ValueError
+            If the number of values does not match the label names.
+        """
+        child = self._children.get(values)
+
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"metric {self.name} expects labels {self.labelnames}, got {values}"
+                )
+
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+
+        return child
+
+    def samples(self):
+        """Samples of the metric as (name, labels, value) tuples."""
+        for values, child in sorted(self._children.items()):
+            labels = tuple(zip(self.labelnames, values))
+
+            for suffix, extra_labels, value in child.samples():
+                yield self.name + suffix, labels + extra_labels, value
+
+    def _new_child(self):
+        raise NotImplementedError()
+
+    def __repr__(self):
+        return "{!s}(name={!r}, labelnames={!r})".format(
+            self.__class__.__name__, self.name, self.labelnames
+        )
+
+
+class Counter(_Metric):
+    """Monotonically increasing number."""
+
+    kind = "counter"
+
+    def inc(self, amount=1):
+        """Increase the counter without labels."""
+        self.labels().inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = _Shards(1)
+
+    def inc(self, amount=1):
+        self._value.shard()[0] += amount
+
+    def get(self):
+        return self._value.values()[0]
+
+    def samples(self):
+        yield "", (), self.get()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over buckets, with their count and sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value):
+        """Observe a value without labels."""
+        self.labels().observe(value)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # One count per bucket plus +Inf, then the sum and the count.
+        self._value = _Shards(len(buckets) + 3)
+
+    def observe(self, value):
+        shard = self._value.shard()
+        shard[bisect.bisect_left(self._buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the seconds taken by the context block."""
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        values = self._value.values()
+        cumulative = 0
+
+        for bound, count in zip(self._buckets + (float("inf"),), values):
+            cumulative += count
+            yield "_bucket", (("le", _format_value(bound)),), cumulative
+
+        yield "_sum", (), values[-2]
+        yield "_count", (), values[-1]
+
+
+class Callback:
+    """Metric whose values are read by a function when metrics are rendered."""
+
+    def __init__(self, name, documentation, labelnames, function, kind="gauge"):
+        """Constructor of the Callback.
+
+        Parameters
+        ----------
+        name : str
+            Name of the metric.
+        documentation : str
+            Help text of the metric.
+        labelnames : tuple of str
+            Names of the labels of the metric.
+        function : callable
+            Function returning an iterable of (label values, value) pairs.
+        kind : str
+            `gauge` or `counter`.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        self._function = function
+
+    def samples(self):
+        for values, value in self._function():
+            yield self.name, tuple(zip(self.labelnames, values)), value
+
+    def __repr__(self):
+        return "{!s}(name={!r}, labelnames={!r})".format(
+            self.__class__.__name__, self.name, self.labelnames
+        )
+
+
+class Registry:
+    """Metrics of the process, by name."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        """Get or create a counter."""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Get or create a histogram."""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def callback(self, name, documentation, labelnames, function, kind="gauge"):
+        """Register a callback metric, replacing any metric with its name."""
+        metric = Callback(name, documentation, labelnames, function, kind)
+
+        with self._lock:
+            self._metrics[name] = metric
+
+        return metric
+
+    def get(self, name):
+        """The metric with a name, or None."""
+        return self._metrics.get(name)
+
+    def render(self):
+        """Render all metrics in the Prometheus text format."""
+        lines = []
+
+        for name, metric in sorted(self._metrics.items()):
+            try:
+                samples = list(metric.samples())
+            except Exception as err:
+                lines.append(f"# Unable to collect {name}: {err}")
+                continue
+
+            lines.append(f"# HELP {name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+
+            for sample_name, labels, value in samples:
+                lines.append(_format_sample(sample_name, labels, value))
+
+        return "\n".join(lines) + "\n"
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+
+                if metric is None:
+                    metric = cls(name, documentation, labelnames, **kwargs)
+                    self._metrics[name] = metric
+
+        if not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} already exists as {metric!r}")
+
+        return metric
+
+    def __repr__(self):
+        return "{!s}(metrics={!r})".format(self.__class__.__name__, len(self._metrics))
+
+
+def _format_sample(name, labels, value):
+    if labels:
+        pairs = ",".join(f'{label}="{_escape_label(str(text))}"' for label, text in labels)
+        return f"{name}{{{pairs}}} {_format_value(value)}"
+
+    return f"{name} {_format_value(value)}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+
+    return str(value)
+
+
+def _escape_label(text):
+    return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _escape_help(text):
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+"""Registry shared by the whole process."""
+metrics = Registry()
@@ -0,0 +1,306 @@
+"""This module provides the ways attendees of a running meeting are written.
+
+Attendees are stored in `meetings.attendees` as a list of dicts. An attendee
+store decides how a change to them becomes part of the UPDATE of the meeting:
+
+* `JsonAttendeeStore` sends the whole list on every update. It works with both
+  json and jsonb columns and is the default.
+* `JsonbAttendeeStore` sends only the attendee that changed and lets Postgres
+  apply it to the stored array. It requires `meetings.attendees` to be jsonb
+  (opt-in migration 5 of `mconf_aggr.webhook.schema`).
+* `TableAttendeeStore` keeps attendees in the `meeting_attendees` table, one
+  row per attendee, and adjusts the counters by the rows it changes. Readers
+  expecting the list format use the `meetings_attendees_view` view (opt-in
+  migration 6 of `mconf_aggr.webhook.schema`).
+"""
+from sqlalchemy import cast, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB, array, insert
+
+from mconf_aggr.webhook.database_model import MeetingAttendees, Meetings
+
+"""Kinds of change made to the attendees of a meeting."""
+ADDED, REMOVED, UPDATED = "added", "removed", "updated"
+
+"""Counters of `Meetings` derived from its attendees."""
+COUNTERS = (
+    "participant_count",
+    "transfer_count",
+    "moderator_count",
+    "listener_count",
+    "voice_participant_count",
+    "video_count",
+)
+
+
+def attendee_counters(attendee):
+    """Contribution of a single attendee to each of the `COUNTERS`."""
+    is_transfer = attendee["role"] == "TRANSFER"
+
+    return (
+        0 if is_transfer else 1,
+        1 if is_transfer else 0,
+        1 if attendee["role"] == "MODERATOR" else 0,
+        1 if attendee["is_listening_only"] else 0,
+        1 if attendee["has_joined_voice"] else 0,
+        1 if attendee["has_video"] else 0,
+    )
+
+
+class AttendeeStore:
+    """Interface of attendee stores."""
+
+    def load(self, session, live_meeting):
+        """Load the attendees of a meeting just read from `meetings`.
+
+        Returns
+        -------
+        list
+            Attendee dicts or None to use the ones in `meetings.attendees`,
+            which is the default.
+        """
+        return None
+
+    def write(self, session, live_meeting):
+        """Write attendee changes that are not part of the UPDATE of `meetings`.
+
+        It runs before that UPDATE. By default, nothing is done.
+
+        Returns
+        -------
+        dict
+            Values or SQL expressions to be set by the UPDATE because of what
+            was written, keyed by column name. Empty by default.
+        """
+        return {}
+
+    def values(self, live_meeting):
+        """Values to be written to the database for the attendees of a meeting.
+
+        Parameters
+        ----------
+        live_meeting : live_meetings.LiveMeeting
+            Meeting to be written. Its `attendees.changes` lists what changed
+            since the last write.
+
+        Returns
+        -------
+        dict
+            Values or SQL expressions to be set, keyed by column name.
+
+        Raises
+        ------
+        NotImplementedError
+            If called from an object of class AttendeeStore.
+        """
+        raise NotImplementedError()
+
+
+class JsonAttendeeStore(AttendeeStore):
+    """Attendee store that writes the whole list of attendees."""
+
+    def values(self, live_meeting):
+        """Implementation of abstract values method from AttendeeStore."""
+        return {"attendees": live_meeting.attendees.to_list()}
+
+
+class JsonbAttendeeStore(AttendeeStore):
+    """Attendee store that writes only the attendee that changed.
+
+    A single change is written as an in-database update of the jsonb array:
+    appending (`||`), removing the elements of a user (`jsonb_path_query_array`)
+    or replacing one element (`jsonb_set`). Several changes in the same write
+    fall back to writing the whole list, and so do attendees loaded from a
+    list holding a user more than once, whose positions do not match it.
+    """
+
+    """Elements of the attendees array not of the user `$id`."""
+    OTHER_ATTENDEES = "$[*] ? (@.internal_user_id != $id)"
+
+    def values(self, live_meeting):
+        """Implementation of abstract values method from AttendeeStore."""
+        attendees = live_meeting.attendees
+
+        if attendees.deduplicated or len(attendees.changes) > 1:
+            return {"attendees": _jsonb(attendees.to_list())}
+
+        if not attendees.changes:
+            return {}
+
+        kind, internal_user_id = attendees.changes[0]
+        stored = cast(Meetings.attendees, JSONB)
+
+        if kind == ADDED:
+            expression = stored.op("||", return_type=JSONB)(
+                _jsonb([attendees.get(internal_user_id)])
+            )
+        elif kind == REMOVED:
+            # Its position is gone along with it.
+            expression = func.jsonb_path_query_array(
+                stored, self.OTHER_ATTENDEES, _jsonb({"id": internal_user_id}), type_=JSONB
+            )
+        else:
+            expression = func.jsonb_set(
+                stored,
+                array([str(attendees.index(internal_user_id))]),
+                _jsonb(attendees.get(internal_user_id)),
+                type_=JSONB,
+            )
+
+        return {"attendees": expression}
+
+
+class TableAttendeeStore(AttendeeStore):
+    """Attendee store that keeps one row per attendee in `meeting_attendees`.
+
+    Each attendee change is a single-row INSERT, DELETE or UPDATE, so no
+    attendee document is read or rewritten. Each one returns the row it
+    changed, as it was before and after, and the UPDATE of the meeting adds
+    the difference it makes to each counter of `meetings`. When the counters
+    of the meeting were just recounted (it was loaded, or every
+    `recount_interval` writes), they are counted from the attendee rows
+    instead.
+    """
+
+    """Attendee keys changed by user events."""
+    FLAGS = ("is_presenter", "is_listening_only", "has_joined_voice", "has_video")
+
+    def load(self, session, live_meeting):
+        """Implementation of load method from AttendeeStore."""
+        rows = (
+            session.query(
+                *[getattr(MeetingAttendees, key) for key in MeetingAttendees.ATTENDEE_KEYS]
+            )
+            .filter(MeetingAttendees.meeting_id == live_meeting.id)
+            .order_by(MeetingAttendees.position)
+            .all()
+        )
+
+        return [dict(row._mapping) for row in rows]
+
+    def write(self, session, live_meeting):
+        """Implementation of write method from AttendeeStore."""
+        attendees = live_meeting.attendees
+        keys = ("role",) + self.FLAGS
+        counted = [getattr(MeetingAttendees, key) for key in keys]
+        deltas = [0] * len(COUNTERS)
+
+        def count(row, sign=1):
+            for i, value in enumerate(attendee_counters(row)):
+                deltas[i] += sign * value
+
+        for kind, internal_user_id in attendees.changes:
+            if kind == ADDED:
+                attendee = attendees.get(internal_user_id)
+                statement = (
+                    insert(MeetingAttendees)
+                    .values(
+                        meeting_id=live_meeting.id,
+                        **{key: attendee.get(key) for key in MeetingAttendees.ATTENDEE_KEYS},
+                    )
+                    .on_conflict_do_nothing()
+                    .returning(*counted)
+                )
+
+                for row in session.execute(statement):
+                    count(row._mapping)
+            elif kind == REMOVED:
+                statement = (
+                    delete(MeetingAttendees)
+                    .where(
+                        MeetingAttendees.meeting_id == live_meeting.id,
+                        MeetingAttendees.internal_user_id == internal_user_id,
+                    )
+                    .returning(*counted)
+                    .execution_options(synchronize_session=False)
+                )
+
+                for row in session.execute(statement):
+                    count(row._mapping, -1)
+            else:
+                attendee = attendees.get(internal_user_id)
+                # The row as it was before the UPDATE, locked so it is not
+                # changed in between.
+                old = (
+                    select(MeetingAttendees.internal_user_id, *counted)
+                    .where(
+                        MeetingAttendees.meeting_id == live_meeting.id,
+                        MeetingAttendees.internal_user_id == internal_user_id,
+                    )
+                    .with_for_update()
+                    .subquery("old")
+                )
+                statement = (
+                    update(MeetingAttendees)
+                    .where(
+                        MeetingAttendees.meeting_id == live_meeting.id,
+                        MeetingAttendees.internal_user_id == old.c.internal_user_id,
+                    )
+                    .values({flag: attendee[flag] for flag in self.FLAGS})
+                    .returning(*[old.c[column.key] for column in counted], *counted)
+                    .execution_options(synchronize_session=False)
+                )
+
+                # Each row is the old attendee followed by the new one.
+                size = len(keys)
+
+                for row in session.execute(statement):
+                    count(dict(zip(keys, row[:size])), -1)
+                    count(dict(zip(keys, row[size:])))
+
+        if live_meeting.recounted:
+            return {
+                "participant_count": _count_attendees(
+                    MeetingAttendees.role.is_distinct_from("TRANSFER")
+                ),
+                "transfer_count": _count_attendees(MeetingAttendees.role == "TRANSFER"),
+                "moderator_count": _count_attendees(MeetingAttendees.role == "MODERATOR"),
+                "listener_count": _count_attendees(MeetingAttendees.is_listening_only),
+                "voice_participant_count": _count_attendees(MeetingAttendees.has_joined_voice),
+                "video_count": _count_attendees(MeetingAttendees.has_video),
+            }
+
+        # Counters are never set to the values kept in memory.
+        return {
+            counter: getattr(Meetings, counter) + delta if delta else getattr(Meetings, counter)
+            for counter, delta in zip(COUNTERS, deltas)
+        }
+
+    def values(self, live_meeting):
+        """Implementation of abstract values method from AttendeeStore."""
+        return {}
+
+
+def _count_attendees(condition):
+    return (
+        select(func.count())
+        .where(MeetingAttendees.meeting_id == Meetings.id, condition)
+        .scalar_subquery()
+    )
+
+
+def _jsonb(value):
+    return cast(literal(value, JSONB), JSONB)
+
+
+"""Attendee stores that can be selected by name."""
+ATTENDEE_STORES = {
+    "json": JsonAttendeeStore,
+    "jsonb": JsonbAttendeeStore,
+    "table": TableAttendeeStore,
+}
+
+
+def get_attendee_store(name):
+    """Build the attendee store called `name`.
+
+    Raises
+    ------
+    ValueError
+        If there is no attendee store called `name`.
+    """
+    try:
+        return ATTENDEE_STORES[name]()
+    except KeyError as err:
+        raise ValueError(
+            f"unknown attendee store '{name}' (expected one of: {', '.join(ATTENDEE_STORES)})"
+        ) from err
@@ -1,9 +1,17 @@
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
+import psycopg2
+from psycopg2 import extensions
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from mconf_aggr.aggregator import cfg
+from mconf_aggr.webhook.instruments import (
+    current_cost,
+    current_handler,
+    db_queries_total,
+    db_sessions_total,
+)
 
 
 class DatabaseConnector:
@@ -28,6 +36,7 @@ class DatabaseConnector:
         configure the session.
         """
         engine = create_engine(cls._build_uri(), echo=False)
+        instrument(engine)
         cls.Session = sessionmaker()
         cls.Session.configure(bind=engine)
 
@@ -45,6 +54,7 @@ class DatabaseConnector:
         def session_scope(raise_exception=True):
             """Provide a transactional scope around a series of operations."""
             session = cls.Session()
+            db_sessions_total.inc()
             try:
                 yield session
                 session.commit()
@@ -66,3 +76,53 @@ class DatabaseConnector:
         port = cfg.config["MCONF_WEBHOOK_DATABASE_PORT"]
 
         return f"postgresql://{user}:{password}@{host}:{port}/{database}"
+
+
+def instrument(engine):
+    """Count and measure the statements run through an engine.
+
+    Statements are counted by `current_handler` and added to `current_cost`
+    when an event is being measured.
+    """
+    event.listen(engine, "before_cursor_execute", _count_query)
+    event.listen(engine, "after_cursor_execute", _end_query)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    db_queries_total.labels(current_handler.get()).inc()
+    cost = current_cost.get()
+
+    if cost is not None:
+        cost.start()
+
+
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    cost = current_cost.get()
+
+    if cost is not None:
+        cost.end(cursor.rowcount)
+
+
+def make_psycopg_cooperative():
+    """Make psycopg2 yield to other greenlets while waiting for the database.
+
+    Under gevent, subscriber threads are greenlets sharing a single OS thread.
+    Without a wait callback, every query blocks the whole process, so writer
+    threads cannot overlap their round-trips and requests stall meanwhile.
+    """
+    extensions.set_wait_callback(_gevent_wait_callback)
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
@@ -5,10 +5,15 @@ which event was received by the `update` method on `WebhookDataWriter` and passe
 `update` on `DataProcessor`.
 
 """
+import datetime
+import time
+
 import sqlalchemy
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm.attributes import flag_modified
 
 from mconf_aggr.aggregator.aggregator import AggregatorCallback, CallbackError
+from mconf_aggr.aggregator.retry import Failure
 from mconf_aggr.aggregator.utils import time_logger
 from mconf_aggr.logger import get_logger
 from mconf_aggr.webhook.database import DatabaseConnector
@@ -21,11 +26,21 @@ from mconf_aggr.webhook.database_model import (
     SharedSecrets,
     UsersEvents,
 )
+from mconf_aggr.webhook.event_mapper import map_webhook_event
 from mconf_aggr.webhook.exceptions import (
     DatabaseNotReadyError,
     InvalidWebhookEventError,
+    WebhookConflictError,
     WebhookDatabaseError,
 )
+from mconf_aggr.webhook.instruments import (
+    current_handler,
+    events_total,
+    measure_queries,
+    stage_seconds,
+)
+from mconf_aggr.webhook.live_meetings import LiveMeeting, live_meetings
+from mconf_aggr.webhook.reference_data import reference_data
 
 session_scope = DatabaseConnector.get_session_scope()
 
@@ -50,7 +65,7 @@ class DatabaseEventHandler:
             Session used by SQLAlchemy to interact with the database.
         """
         self.session = session
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
     def handle(self, event):
         """This method is meant to be implemented downstream.
@@ -62,6 +77,42 @@ class DatabaseEventHandler:
         """
         raise NotImplementedError()
 
+    def _update_live_meeting(self, int_meeting_id, update):
+        """Apply `update` to a running meeting and write it to the database.
+
+        The meeting comes from the live meetings cache. If the cached copy
+        turns out to be stale, it is reloaded and `update` is applied again.
+
+        Parameters
+        ----------
+        int_meeting_id : str
+            Internal meeting id of the meeting.
+        update : callable
+            Function that receives the `LiveMeeting` and updates it in place.
+
+        Returns
+        -------
+        LiveMeeting
+            The updated meeting or None if there is no such running meeting.
+
+        Raises
+        ------
+        WebhookConflictError
+            If the meeting keeps changing while it is being updated.
+        """
+        for _ in range(2):
+            live_meeting = live_meetings.fetch(self.session, int_meeting_id)
+
+            if live_meeting is None:
+                return None
+
+            update(live_meeting)
+
+            if live_meetings.write(self.session, live_meeting):
+                return live_meeting
+
+        raise WebhookConflictError(f"meeting '{int_meeting_id}' changed while being updated")
+
 
 class MeetingCreatedHandler(DatabaseEventHandler):
     """This class handles meeting-created events."""
@@ -70,7 +121,7 @@ class MeetingCreatedHandler(DatabaseEventHandler):
         def __init__(self, metadata, default_value="", logger=None):
             self._metadata = metadata
             self._default_value = default_value
-            self._logger = logger or get_logger()
+            self._logger = logger or get_logger(__name__)
 
         def __getattr__(self, name):
             field = name.replace("_", "-")
@@ -99,18 +150,7 @@ class MeetingCreatedHandler(DatabaseEventHandler):
         )
 
         # Create tables meetings_events and meetings.
-        if (
-            self.session.query(MeetingsEvents)
-            .filter(MeetingsEvents.internal_meeting_id == event.internal_meeting_id)
-            .first()
-        ):
-            self.logger.warning(
-                f"Meeting with internal-meeting-id '{event.internal_meeting_id}' \
-                                already exists."
-            )
-            return
-
-        new_meetings_events = MeetingsEvents(**event._asdict())
+        new_meetings_events = event.to_model(MeetingsEvents)
         new_meetings_events.has_forcibly_ended = False
         new_meetings_events.unique_users = 0
         new_meetings_events.start_time = event.create_time
@@ -126,12 +166,9 @@ class MeetingCreatedHandler(DatabaseEventHandler):
             new_meetings_events.parent_meeting_id = None
 
         if metadata.mconf_shared_secret_guid and not metadata.mconf_secret_name:
-            new_meetings_events.shared_secret_name = (
-                self.session.query(SharedSecrets)
-                .filter(SharedSecrets.guid == metadata.mconf_shared_secret_guid)
-                .first()
-                .name
-            )
+            new_meetings_events.shared_secret_name = _fetch_shared_secret_by_guid(
+                self.session, metadata.mconf_shared_secret_guid
+            ).name
 
         if not metadata.mconf_shared_secret_guid:
             self.logger.info(
@@ -143,10 +180,8 @@ class MeetingCreatedHandler(DatabaseEventHandler):
                 # Find the secret using mconflb-institution-name which corresponds
                 # to the shared secret name. The use of term 'institution' is
                 # misleading here
-                found_secret = (
-                    self.session.query(SharedSecrets)
-                    .filter(SharedSecrets.name == metadata.mconflb_institution_name)
-                    .first()
+                found_secret = _fetch_shared_secret_by_name(
+                    self.session, metadata.mconflb_institution_name
                 )
                 new_meetings_events.shared_secret_guid = found_secret.guid
                 self.logger.info(
@@ -157,10 +192,8 @@ class MeetingCreatedHandler(DatabaseEventHandler):
                 # We found the secret, try to find its institution to complete
                 # the table with information
                 try:
-                    found_institution = (
-                        self.session.query(Institutions)
-                        .filter(Institutions.guid == found_secret.institution_guid)
-                        .first()
+                    found_institution = _fetch_institution(
+                        self.session, found_secret.institution_guid
                     )
                     new_meetings_events.institution_guid = found_institution.guid
                     new_meetings_events.shared_secret_name = found_secret.name
@@ -181,24 +214,13 @@ class MeetingCreatedHandler(DatabaseEventHandler):
                 )
 
         if not metadata.mconf_server_guid and not metadata.mconf_server_url:
-            servers_table = (
-                self.session.query(Servers).filter(Servers.name == event.server_url).first()
-            )
+            servers_table = _fetch_server(self.session, event.server_url)
 
             new_meetings_events.server_url, new_meetings_events.server_guid = (
                 servers_table.name,
                 servers_table.guid,
             )
 
-        # running external meeting id must be unique
-        if (
-            self.session.query(Meetings)
-            .filter(Meetings.ext_meeting_id == event.external_meeting_id)
-            .first()
-        ):
-            self.logger.warning(f"Meeting with external-meeting-id '{event.external_meeting_id}'")
-            return
-
         new_meeting = Meetings(
             running=False,
             has_user_joined=False,
@@ -215,9 +237,22 @@ class MeetingCreatedHandler(DatabaseEventHandler):
             transfer=False,
             transfer_count=0,
         )
-        new_meeting.meeting_event = new_meetings_events
 
-        self.session.add(new_meeting)
+        # Insert both rows in one statement, which inserts nothing if the
+        # meeting already exists or its external meeting id is running,
+        # e.g. on duplicate deliveries.
+        new_ids = self.session.execute(_insert_meeting(new_meetings_events, new_meeting)).first()
+
+        if not new_ids:
+            self.logger.warning(
+                f"Meeting with internal-meeting-id '{event.internal_meeting_id}' already "
+                f"exists or with external-meeting-id '{event.external_meeting_id}' is running."
+            )
+            return
+
+        # Start caching the meeting.
+        new_meeting.id, new_meeting.meeting_event_id = new_ids
+        live_meetings.put(LiveMeeting.from_row(new_meeting))
 
 
 class MeetingEndedHandler(DatabaseEventHandler):
@@ -237,37 +272,32 @@ class MeetingEndedHandler(DatabaseEventHandler):
         int_id = event.internal_meeting_id
         self.logger.info(f"Processing meeting-ended event for internal-meeting-id: '{int_id}'.")
 
-        # Table meetings_events to be updated.
-        meetings_event = (
-            self.session.query(MeetingsEvents)
-            .filter(MeetingsEvents.internal_meeting_id == int_id)
-            .first()
-        )
+        live_meetings.evict(int_id)
 
-        if meetings_event:
-            # Update all users that don't have a leave time to the meeting's end time
-            (
-                self.session.query(UsersEvents)
-                .filter(
-                    UsersEvents.meeting_event_id == meetings_event.id,
-                    UsersEvents.leave_time.is_(None),
-                )
-                .update({"leave_time": event.end_time}, synchronize_session="fetch")
-            )
-            # make sure the users events are updated before deleting the meeting
-            self.session.commit()
+        # Close the meeting in one statement, so it is never left half closed
+        # and no row is loaded to do it.
+        ended = self.session.execute(_end_meeting(int_id, event.end_time)).first()
 
-            meetings_event.end_time = event.end_time
+        if not ended:
+            self.logger.warning(f"No meeting found with internal-meeting-id '{int_id}'.")
+            return
 
-            self.session.add(meetings_event)
+        meeting_event_id, users_closed, meeting_ids = ended
+        self.logger.info(f"Meeting '{int_id}' ended with {users_closed} user(s) still in it.")
 
-            # Table meetings to be updated.
-            meetings_table = (
-                self.session.query(Meetings).filter(Meetings.int_meeting_id == int_id).first()
-            )
+        # The statement bypasses the session, so its copies of the rows are stale.
+        meetings_event = self.session.identity_map.get(
+            self.session.identity_key(MeetingsEvents, meeting_event_id)
+        )
+        if meetings_event is not None:
+            self.session.expire(meetings_event)
 
-            if meetings_table:
-                self.session.delete(meetings_table)
+        for meeting_id in meeting_ids or ():
+            meetings_table = self.session.identity_map.get(
+                self.session.identity_key(Meetings, meeting_id)
+            )
+            if meetings_table is not None:
+                self.session.expunge(meetings_table)
 
 
 class UserJoinedHandler(DatabaseEventHandler):
@@ -291,8 +321,6 @@ class UserJoinedHandler(DatabaseEventHandler):
                          '{event.internal_user_id}'.'"
         )
 
-        users_events_table = self._get_users_events(event)
-
         # Create attendee JSON for meetings table.
         attendee = {
             "external_user_id": event.external_user_id,
@@ -307,80 +335,28 @@ class UserJoinedHandler(DatabaseEventHandler):
             "guest": event.guest,
         }
 
-        # Query for meetings_events to link with users_events table.
-        meetings_event = (
-            self.session.query(MeetingsEvents)
-            .filter(MeetingsEvents.internal_meeting_id == int_id)
-            .first()
-        )
-
-        if meetings_event:
-            users_events_table.meeting_event = meetings_event
+        def join(live_meeting):
+            live_meeting.add_attendee(attendee)
+            self._update_meeting(live_meeting)
 
-            # Table meetings to be updated.
-            meetings_table = (
-                self.session.query(Meetings).filter(Meetings.int_meeting_id == int_id).first()
-            )
-
-            if meetings_table:
-                meetings_table.attendees = self._attendee_json(meetings_table.attendees, attendee)
-                self._update_meeting(meetings_table)
-
-                # SQLAlchemy was not considering the attendees array as modified, so it
-                # had to be forced.
-                flag_modified(meetings_table, "attendees")
+        # Table meetings to be updated.
+        live_meeting = self._update_live_meeting(int_id, join)
 
-                self.session.add(users_events_table)
-                self.session.add(meetings_table)
-                self.session.flush()
-            else:
+        if not live_meeting:
+            if _fetch_meetings_event(self.session, int_id):
                 self.logger.warning(f"No meeting found for user '{event.internal_user_id}'.")
                 raise WebhookDatabaseError(f"no meeting found for user '{event.internal_user_id}'")
 
-            # Update unique_users in table meetings_events.
-            users_joined = (
-                self.session.query(UsersEvents)
-                .join(UsersEvents.meeting_event)
-                .filter(MeetingsEvents.internal_meeting_id == int_id)
-                .count()
-            )
-
-            meetings_event.unique_users = users_joined
+            return
 
-            # Meeting starts when first user joins it.
-            if users_joined == 1:
-                meetings_event.start_time = event.join_time
+        # Table users_events linked to meetings_events.
+        users_events_table = self._get_users_events(event)
+        users_events_table.meeting_event_id = live_meeting.meeting_event_id
 
-            self.session.add(meetings_event)
+        self.session.execute(_insert_user(users_events_table))
 
     def _get_users_events(self, raw_event):
-        event_dict = raw_event._asdict()
-
-        column_names = set(column.key for column in UsersEvents.__table__.columns)
-        keys = event_dict.keys()
-
-        for key in list(keys):
-            if key not in column_names:
-                del event_dict[key]
-
-        users_events = UsersEvents(**event_dict)
-
-        return users_events
-
-    def _attendee_json(self, base, new):
-        if not base:
-            arr = []
-            arr.append(new)
-
-            return arr
-        else:
-            arr = base
-            for elem in arr:
-                if elem["internal_user_id"] == new["internal_user_id"]:
-                    return arr
-            arr.append(new)
-
-            return arr
+        return raw_event.to_model(UsersEvents)
 
     def _update_meeting(self, meetings_table):
         meetings_table.running = True
@@ -409,41 +385,24 @@ class UserLeftHandler(DatabaseEventHandler):
                          '{user_id}' in meeting '{int_id}'."
         )
 
-        # Table meetings to be updated.
-        meetings_table = (
-            self.session.query(Meetings)
-            .join(Meetings.meeting_event)
-            .filter(MeetingsEvents.internal_meeting_id == int_id)
-            .first()
-        )
-
-        if meetings_table:
-            self._remove_attendee(meetings_table, user_id)
-            self._update_meeting(meetings_table)
+        def leave(live_meeting):
+            live_meeting.remove_attendee(user_id)
+            self._update_meeting(live_meeting)
 
-            # Mark meetings.attendees as modified for SQLAlchemy.
-            flag_modified(meetings_table, "attendees")
-
-            self.session.add(meetings_table)
-        else:
+        # Table meetings to be updated.
+        if not self._update_live_meeting(int_id, leave):
             self.logger.warning(f"No meeting found with internal-meeting-id '{int_id}'.")
 
         # Table users_events to be updated.
-        users_table = (
-            self.session.query(UsersEvents).filter(UsersEvents.internal_user_id == user_id).first()
+        users_updated = (
+            self.session.query(UsersEvents)
+            .filter(UsersEvents.internal_user_id == user_id)
+            .update({"leave_time": event.leave_time}, synchronize_session=False)
         )
 
-        if users_table:
-            # Update table users_events.
-            users_table.leave_time = event.leave_time
-        else:
+        if not users_updated:
             self.logger.warning(f"No user found with internal-user-id '{user_id}'.")
 
-    def _remove_attendee(self, meetings_table, user_id):
-        for idx, attendee in enumerate(meetings_table.attendees):
-            if attendee["internal_user_id"] == user_id:
-                del meetings_table.attendees[idx]
-
     def _update_meeting(self, meetings_table):
         _update_meeting(meetings_table)
 
@@ -471,33 +430,21 @@ class UserEventHandler(DatabaseEventHandler):
                          '{user_id}' on meeting '{int_id}'."
         )
 
-        # Table meetings to be updated.
-        meetings_table = (
-            self.session.query(Meetings)
-            .join(Meetings.meeting_event)
-            .filter(MeetingsEvents.internal_meeting_id == int_id)
-            .first()
-        )
-
-        if meetings_table:
-            self._update_attendees(meetings_table.attendees, event, user_id)
-            self._update_meeting(meetings_table)
+        def update(live_meeting):
+            if event.event_name == self.event_type:
+                live_meeting.update_attendee(
+                    user_id, lambda attendee: self._update_attendee(attendee, event)
+                )
 
-            flag_modified(meetings_table, "attendees")
+            self._update_meeting(live_meeting)
 
-            self.session.add(meetings_table)
-        else:
+        # Table meetings to be updated.
+        if not self._update_live_meeting(int_id, update):
             self.logger.warning(f"No meeting found with internal-meeting-id '{int_id}'.")
 
     def _update_meeting(self, meetings_table):
         _update_meeting(meetings_table)
 
-    def _update_attendees(self, base, update, user_id):
-        for attendee in base:
-            if attendee["internal_user_id"] == user_id:
-                if update.event_name == self.event_type:
-                    self._update_attendee(attendee, update)
-
     def _update_attendee(self, attendee, update):
         raise NotImplementedError("Give specific behavior for the user event")
 
@@ -586,19 +533,16 @@ class RapArchiveHandler(DatabaseEventHandler):
 
         # Meeting was set to be recorded.
         if recorded:
-            recording = _fetch_or_create_recording(self.session, event, Status.PROCESSING)
-
             meetings_event = _fetch_meetings_event(self.session, int_id)
+            values = {"current_step": event.current_step}
 
             if meetings_event:
-                _update_recording_with_meetings_event_data(recording, meetings_event)
+                values.update(_meetings_event_data(meetings_event))
             else:
                 self.logger.warning(f"No meeting found for recording '{event.record_id}'.")
 
-            recording.current_step = event.current_step
-
-            self.session.add(recording)
-            self.logger.info(f"Records_row: {recording}")
+            _upsert_recording(self.session, event, Status.PROCESSING, meetings_event, values)
+            self.logger.info(f"Recording '{record_id}' upserted with {values}.")
 
 
 class RapHandler(DatabaseEventHandler):
@@ -625,39 +569,35 @@ class RapHandler(DatabaseEventHandler):
             + f"'{record_id}'."
         )
 
-        recording = _fetch_or_create_recording(self.session, event, Status.DELETED)
+        meetings_event = _fetch_meetings_event(self.session, int_id)
+        values = {"current_step": event.current_step}
 
         # Assume the requester server to be the new host of the recording.
         if event_type == "rap-sanity-started":
-            recording = self._handle_rap_sanity_started(server_url, recording)
+            values.update(self._handle_rap_sanity_started(server_url, record_id))
             # if int_id != record_id, then it's not the first recording in the
             # group. In this case, se status to PROCESSING to match the first
             # recording.
             if int_id != record_id:
-                recording.status = Status.PROCESSING
-
-        meetings_event = _fetch_meetings_event(self.session, int_id)
+                values["status"] = Status.PROCESSING
 
         if meetings_event:
-            _update_recording_with_meetings_event_data(recording, meetings_event)
+            values.update(_meetings_event_data(meetings_event))
         else:
             self.logger.warning(f"No meeting found for recording '{event.record_id}'.")
 
-        recording.current_step = event.current_step
+        _upsert_recording(self.session, event, Status.DELETED, meetings_event, values)
+        self.logger.info(f"Recording '{record_id}' upserted with {values}.")
 
-        self.session.add(recording)
-        self.logger.info(f"Records_row: {recording}")
-
-    def _handle_rap_sanity_started(self, server_url, recording):
-        server_id_result = self.session.query(Servers.id).filter(Servers.name == server_url).first()
+    def _handle_rap_sanity_started(self, server_url, record_id):
+        server_id_result = _fetch_server(self.session, server_url)
         if server_id_result:
-            if server_id_result.id != recording.server_id:
-                self.logger.info(f"Recording host was updated to '{server_url}'.")
-            recording.server_id = server_id_result.id
-        else:
-            self.logger.warning(f"No server found for recording '{recording.record_id}'.")
+            self.logger.info(f"Recording host is '{server_url}'.")
+            return {"server_id": server_id_result.id}
 
-        return recording
+        self.logger.warning(f"No server found for recording '{record_id}'.")
+
+        return {}
 
 
 class RapProcessHandler(DatabaseEventHandler):
@@ -924,26 +864,12 @@ class MeetingTransferHandler(DatabaseEventHandler):
 
 
 def _update_meeting(meetings_table):
-    """Common updates on table meetings."""
+    """Common updates on table meetings.
+
+    Attendee counters are kept up to date by `LiveMeeting` as attendees change.
+    """
 
-    meetings_table.transfer_count = sum(
-        1 for attendee in meetings_table.attendees if attendee["role"] == "TRANSFER"
-    )
-    meetings_table.participant_count = len(meetings_table.attendees) - meetings_table.transfer_count
     meetings_table.has_user_joined = meetings_table.participant_count != 0
-    meetings_table.moderator_count = sum(
-        1 for attendee in meetings_table.attendees if attendee["role"] == "MODERATOR"
-    )
-    meetings_table.transfer_count = sum(
-        1 for attendee in meetings_table.attendees if attendee["role"] == "TRANSFER"
-    )
-    meetings_table.listener_count = sum(
-        1 for attendee in meetings_table.attendees if attendee["is_listening_only"]
-    )
-    meetings_table.voice_participant_count = sum(
-        1 for attendee in meetings_table.attendees if attendee["has_joined_voice"]
-    )
-    meetings_table.video_count = sum(1 for a in meetings_table.attendees if a["has_video"])
 
 
 def _upsert_playback(records_table, event_playback):
@@ -988,30 +914,98 @@ def _fetch_recording(session, record_id):
     return recording
 
 
-def _fetch_or_create_recording(session, event, first_status):
-    int_id = event.internal_meeting_id
-    record_id = event.record_id
-    recording = session.query(Recordings).filter(Recordings.record_id == record_id).first()
+def _upsert_recording(session, event, first_status, meetings_event, values):
+    """Create the recording of an event or update it, in a single statement.
+
+    Parameters
+    ----------
+    session : sqlalchemy.Session
+        Session to run the statement.
+    event : event_mapper.RapEvent
+        Recording event.
+    first_status : str
+        Status of a new recording, unless `values` has one. An existing
+        recording only changes from deleted to processing.
+    meetings_event : MeetingsEvents
+        Meeting of the recording, or None if it is not found. A new recording
+        gets its unique users as participants.
+    values : dict
+        Values of columns of `Recordings` set on the recording either way.
+
+    Returns
+    -------
+    int
+        Id of the recording.
+    """
+    now = datetime.datetime.now()
 
-    # Recording does not exist yet. Create it.
-    if not recording:
-        recording = Recordings(**event._asdict())
-
-        # Start as deleted since we don't yet know if
-        # this meeting was recorded or not
-        recording.status = first_status
-        recording.playback = []
-        recording.workflow = {}
-        recording.participants = int(
-            session.query(UsersEvents.id)
-            .join(MeetingsEvents)
-            .filter(MeetingsEvents.internal_meeting_id == int_id)
-            .count()
-        )
-    elif recording.status == Status.DELETED:
-        recording.status = Status.PROCESSING
+    new_recording = event.to_model(Recordings)
+    new_recording.status = first_status
+    new_recording.playback = []
+    new_recording.workflow = {}
+    new_recording.participants = (meetings_event.unique_users or 0) if meetings_event else 0
+    new_recording.created_at = now
 
-    return recording
+    for key, value in values.items():
+        setattr(new_recording, key, value)
+
+    new_recording.updated_at = now
+
+    statement = insert(Recordings).values(_column_values(new_recording))
+
+    update_values = {key: statement.excluded[key] for key in values}
+    update_values["updated_at"] = now
+    update_values.setdefault(
+        "status",
+        sqlalchemy.case(
+            (Recordings.status == Status.DELETED, Status.PROCESSING), else_=Recordings.status
+        ),
+    )
+
+    recording_id = session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[Recordings.record_id], set_=update_values
+        ).returning(Recordings.id)
+    ).scalar()
+
+    # The statement bypasses the session, so its copy of the recording is stale.
+    recording = session.identity_map.get(session.identity_key(Recordings, recording_id))
+    if recording is not None:
+        session.expire(recording)
+
+    return recording_id
+
+
+def _fetch_server(session, name):
+    """Get a server by name from reference data, falling back to the database."""
+    return (
+        reference_data.snapshot.server(name)
+        or session.query(Servers).filter(Servers.name == name).first()
+    )
+
+
+def _fetch_shared_secret_by_guid(session, guid):
+    """Get a shared secret by guid from reference data, falling back to the database."""
+    return (
+        reference_data.snapshot.shared_secret_by_guid(guid)
+        or session.query(SharedSecrets).filter(SharedSecrets.guid == guid).first()
+    )
+
+
+def _fetch_shared_secret_by_name(session, name):
+    """Get a shared secret by name from reference data, falling back to the database."""
+    return (
+        reference_data.snapshot.shared_secret_by_name(name)
+        or session.query(SharedSecrets).filter(SharedSecrets.name == name).first()
+    )
+
+
+def _fetch_institution(session, guid):
+    """Get an institution by guid from reference data, falling back to the database."""
+    return (
+        reference_data.snapshot.institution(guid)
+        or session.query(Institutions).filter(Institutions.guid == guid).first()
+    )
 
 
 def _fetch_meetings_event(session, internal_meeting_id):
@@ -1023,16 +1017,156 @@ def _fetch_meetings_event(session, internal_meeting_id):
     return meetings_event
 
 
-def _update_recording_with_meetings_event_data(recording, meetings_event):
-    recording.end_time = meetings_event.end_time
-    recording.external_meeting_id = meetings_event.external_meeting_id
-    recording.internal_meeting_id = meetings_event.internal_meeting_id
-    recording.is_breakout = meetings_event.is_breakout
-    recording.meeting_event_id = meetings_event.id
-    recording.parent_meeting_id = meetings_event.parent_meeting_id
-    recording.r_institution_guid = meetings_event.institution_guid
-    recording.r_shared_secret_guid = meetings_event.shared_secret_guid
-    recording.start_time = meetings_event.start_time
+def _meetings_event_data(meetings_event):
+    """Values of the columns of a recording taken from its meeting."""
+    return {
+        "end_time": meetings_event.end_time,
+        "external_meeting_id": meetings_event.external_meeting_id,
+        "internal_meeting_id": meetings_event.internal_meeting_id,
+        "is_breakout": meetings_event.is_breakout,
+        "meeting_event_id": meetings_event.id,
+        "parent_meeting_id": meetings_event.parent_meeting_id,
+        "r_institution_guid": meetings_event.institution_guid,
+        "r_shared_secret_guid": meetings_event.shared_secret_guid,
+        "start_time": meetings_event.start_time,
+    }
+
+
+def _column_values(row):
+    """Values set on a new model instance, by column, to insert it with Core."""
+    values = {}
+
+    for attribute in sqlalchemy.inspect(row).mapper.column_attrs:
+        value = getattr(row, attribute.key)
+
+        if value is not None:
+            values[attribute.columns[0]] = value
+
+    return values
+
+
+def _insert_meeting(meetings_events, meeting):
+    """Statement inserting a meeting into tables meetings_events and meetings.
+
+    Rows are inserted only if no meeting has the internal meeting id of
+    `meetings_events` and no running meeting has the external meeting id of
+    `meeting`. It returns the ids of the `meetings` row and of its
+    `meetings_events` row, or no row if nothing was inserted.
+    """
+    now = datetime.datetime.now()
+    meetings_events.created_at = meetings_events.updated_at = now
+    meeting.created_at = meeting.updated_at = now
+
+    # Values are cast as a SELECT list does not take the types of the columns.
+    event_values = _column_values(meetings_events)
+    new_event = (
+        insert(MeetingsEvents)
+        .from_select(
+            list(event_values),
+            sqlalchemy.select(
+                *(sqlalchemy.cast(value, column.type) for column, value in event_values.items())
+            ).where(~sqlalchemy.exists().where(Meetings.ext_meeting_id == meeting.ext_meeting_id)),
+            include_defaults=False,
+        )
+        .on_conflict_do_nothing(index_elements=[MeetingsEvents.internal_meeting_id])
+        .returning(MeetingsEvents.id)
+        .cte("new_event")
+    )
+
+    meeting_values = _column_values(meeting)
+    new_meeting = (
+        insert(Meetings)
+        .from_select(
+            list(meeting_values) + [Meetings.__table__.c.meeting_event_id],
+            sqlalchemy.select(
+                *(sqlalchemy.cast(value, column.type) for column, value in meeting_values.items()),
+                new_event.c.id,
+            ),
+            include_defaults=False,
+        )
+        .returning(Meetings.id, Meetings.meeting_event_id)
+        .cte("new_meeting")
+    )
+
+    return sqlalchemy.select(new_meeting.c.id, new_meeting.c.meeting_event_id)
+
+
+def _end_meeting(internal_meeting_id, end_time):
+    """Statement ending a meeting.
+
+    It sets the end time of the meeting in table meetings_events, sets it as
+    the leave time of the users that did not leave it, in table users_events,
+    and deletes it from table meetings, along with its attendees. It returns
+    the id of the `meetings_events` row, the number of users closed and the
+    ids of the `meetings` rows deleted, or no row if the meeting is not found.
+    """
+    now = datetime.datetime.now()
+
+    ended = (
+        sqlalchemy.update(MeetingsEvents)
+        .where(MeetingsEvents.internal_meeting_id == internal_meeting_id)
+        .values(end_time=end_time, updated_at=now)
+        .returning(MeetingsEvents.id)
+        .cte("ended")
+    )
+    closed = (
+        sqlalchemy.update(UsersEvents)
+        .where(UsersEvents.meeting_event_id == ended.c.id, UsersEvents.leave_time.is_(None))
+        .values(leave_time=end_time, updated_at=now)
+        .returning(UsersEvents.id)
+        .cte("closed")
+    )
+    dropped = (
+        sqlalchemy.delete(Meetings)
+        .where(
+            Meetings.int_meeting_id == internal_meeting_id,
+            sqlalchemy.select(ended.c.id).exists(),
+        )
+        .returning(Meetings.id)
+        .cte("dropped")
+    )
+
+    return sqlalchemy.select(
+        ended.c.id,
+        sqlalchemy.select(sqlalchemy.func.count()).select_from(closed).scalar_subquery(),
+        sqlalchemy.select(sqlalchemy.func.array_agg(dropped.c.id)).scalar_subquery(),
+    )
+
+
+def _insert_user(users_events):
+    """Statement inserting a user into table users_events and counting it.
+
+    The meeting of the user, in table meetings_events, counts one more
+    unique user and starts if it is the first one. Both are decided by the
+    database from the count before this user, so concurrent joins can not
+    miss either. A user already inserted is neither inserted nor counted
+    again.
+    """
+    now = datetime.datetime.now()
+    users_events.created_at = users_events.updated_at = now
+
+    new_user = (
+        insert(UsersEvents)
+        .values(_column_values(users_events))
+        .on_conflict_do_nothing(index_elements=[UsersEvents.internal_user_id])
+        .returning(UsersEvents.meeting_event_id)
+        .cte("new_user")
+    )
+    users_before = sqlalchemy.func.coalesce(MeetingsEvents.unique_users, 0)
+
+    return (
+        sqlalchemy.update(MeetingsEvents)
+        .where(MeetingsEvents.id == new_user.c.meeting_event_id)
+        .values(
+            unique_users=users_before + 1,
+            start_time=sqlalchemy.case(
+                (users_before == 0, users_events.join_time), else_=MeetingsEvents.start_time
+            ),
+            updated_at=now,
+        )
+        .add_cte(new_user)
+        .execution_options(synchronize_session=False)
+    )
 
 
 class DataProcessor:
@@ -1047,12 +1181,42 @@ class DataProcessor:
             Session used by SQLAlchemy to interact with the database.
         """
         self.session = session
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
     def update(self, event):
+        """Persist an event.
+
+        Its pending changes are flushed before returning, so that the
+        statements they take are measured along with those of the handler.
+
+        Parameters
+        ----------
+        event : event_mapper.WebhookEvent
+            Event to be handled and written to database.
+
+        Returns
+        -------
+        instruments.QueryCost
+            Database statements, rows and seconds spent on the event.
+        """
         event_handler = self._select_handler(event.event_type)
+        token = current_handler.set(event_handler.__class__.__name__)
+        start = time.perf_counter()
 
-        event_handler.handle(event)
+        try:
+            with measure_queries(event.event_type) as cost:
+                event_handler.handle(event)
+                self.session.flush()
+        except Exception:
+            events_total.labels(event.event_type, "failed").inc()
+            raise
+        else:
+            events_total.labels(event.event_type, "handled").inc()
+        finally:
+            stage_seconds.labels("handle", event.event_type).observe(time.perf_counter() - start)
+            current_handler.reset(token)
+
+        return cost
 
     def _select_handler(self, event_type):
         """Event dispatcher.
@@ -1153,38 +1317,75 @@ class WebhookDataWriter(AggregatorCallback):
     When finished, its `teardown` can be called to close any opened resource.
     """
 
-    def __init__(self, connector=None, logger=None):
+    def __init__(
+        self, connector=None, reference_data_refresh_interval=0, dead_letters=None, logger=None
+    ):
         """Constructor of the WebhookDataWriter.
 
         Parameters
         ----------
         connector : Database connector (driver).
             If not supplied, it will instantiate a new `PostgresConnector`.
+        reference_data_refresh_interval : float
+            Seconds between checks for changes in reference data. Zero or less
+            loads it only on setup.
+        dead_letters : dead_letter.DeadLetterStore
+            Store of the events given up on. If not supplied, they are only
+            logged.
         """
-        self.logger = logger or get_logger()
+        self.reference_data_refresh_interval = reference_data_refresh_interval
+        self.dead_letters = dead_letters
+        self.logger = logger or get_logger(__name__)
 
     def setup(self):
-        """Setup any resources needed to iteract with the database."""
+        """Setup any resources needed to iteract with the database.
+
+        Reference data is loaded here, so handlers find servers, shared secrets
+        and institutions in memory from the first event on.
+        """
         self.logger.info("Setting up WebhookDataWriter")
 
+        try:
+            with session_scope() as session:
+                reference_data.load(session)
+        except Exception as err:
+            self.logger.warning(f"Unable to load reference data: {err}")
+
+        reference_data.start(session_scope, self.reference_data_refresh_interval)
+
     def teardown(self):
         """Release any resources used to iteract with the database."""
         self.logger.info("Tearing down WebhookDataWriter")
 
+        reference_data.stop()
+
+        if self.dead_letters is not None:
+            self.dead_letters.close()
+
     def run(self, data):
         """Run main logic of the writer.
 
         This method is intended to run in a separate thread by the aggregator
         whenever new data must be persisted.
 
-        data : event_mapper.WebhookEvent
+        data : event_mapper.WebhookEvent or dict
             This is a single event to be handled and persisted into database.
+            Events published with deferred mapping are mapped here.
 
         Raises
         ------
         aggregator.aggregator.CallbackError
-            If any error occur while persisting event into database.
+            If any error occur while persisting event into database. Errors
+            of the connection to the database and conflicting updates may be
+            retried.
         """
+        events = self._map_deferred([data])
+
+        if not events:
+            return
+
+        (data,) = events
+
         try:
             with time_logger(
                 self.logger.info, "Processing information to database took {elapsed}s."
@@ -1194,18 +1395,146 @@ class WebhookDataWriter(AggregatorCallback):
         except sqlalchemy.exc.OperationalError as err:
             self.logger.error(f"Operational error on database. Not persisting data: {err}")
 
-            raise CallbackError() from err
+            raise CallbackError(failures=[Failure(data, err, True)]) from err
         except WebhookDatabaseError as err:
             self.logger.error(
                 f"An error occurred while persisting data. \
                               Not persisting data: {err}"
             )
 
-            raise CallbackError() from err
+            raise CallbackError(failures=[Failure(data, err, _is_transient(err))]) from err
         except Exception as err:
             self.logger.error(f"Unknown error on database handler. Not persisting data: {err}")
 
-            raise CallbackError() from err
+            raise CallbackError(failures=[Failure(data, err, _is_transient(err))]) from err
+
+    def run_batch(self, batch):
+        """Run main logic of the writer for a batch of events.
+
+        All events of the batch are persisted in a single transaction, each one
+        inside its own savepoint. An event that fails is rolled back alone and
+        the others are still committed, at the cost of a single commit for the
+        whole batch.
+
+        batch : list of event_mapper.WebhookEvent or dict
+            Events to be handled and persisted into database, in order.
+            Events published with deferred mapping are mapped here.
+
+        Raises
+        ------
+        aggregator.aggregator.CallbackError
+            If any event of the batch could not be persisted, with the
+            failures of all of them.
+        """
+        failures = []
+        batch = self._map_deferred(batch)
+
+        try:
+            with time_logger(
+                self.logger.info,
+                "Processing {size} events to database took {elapsed}s.",
+                size=len(batch),
+            ):
+                with session_scope() as session:
+                    for data in batch:
+                        try:
+                            with session.begin_nested():
+                                DataProcessor(session).update(data)
+                        except sqlalchemy.exc.OperationalError as err:
+                            if err.connection_invalidated:
+                                # The transaction is gone, there is no point
+                                # in going on with the batch.
+                                raise
+
+                            failures.append(Failure(data, err, True))
+                            self.logger.error(
+                                f"Operational error on database. Not persisting event: {err}"
+                            )
+                        except Exception as err:
+                            failures.append(Failure(data, err, _is_transient(err)))
+                            self.logger.error(
+                                f"An error occurred while persisting event. "
+                                f"Not persisting event: {err}"
+                            )
+        except Exception as err:
+            if isinstance(err, sqlalchemy.exc.OperationalError):
+                self.logger.error(
+                    f"Operational error on database. Not persisting {len(batch)} event(s): {err}"
+                )
+            else:
+                self.logger.error(
+                    f"Unknown error on database handler. Not persisting {len(batch)} event(s): {err}"
+                )
+
+            # Nothing of the batch was committed.
+            transient = _is_transient(err)
+            failures = [Failure(data, err, transient) for data in batch]
+
+            raise CallbackError(failures=failures) from err
+
+        if failures:
+            raise CallbackError(
+                f"{len(failures)} of {len(batch)} event(s) were not persisted", failures=failures
+            )
+
+    def dead_letter(self, data, error, attempts):
+        """Add an event given up on to the dead-letter store.
+
+        Parameters
+        ----------
+        data : event_mapper.WebhookEvent or dict
+            The event given up on.
+        error : Exception
+            Its last error, or None if it was never run.
+        attempts : int
+            Number of times it was run.
+        """
+        if self.dead_letters is None:
+            super().dead_letter(data, error, attempts)
+            return
+
+        try:
+            self.dead_letters.add(data, error, attempts)
+        except Exception as err:
+            self.logger.error(f"Unable to add event to the dead-letter store: {err}")
+            super().dead_letter(data, error, attempts)
+
+    def _map_deferred(self, batch):
+        """Map the events of `batch` published with deferred mapping.
+
+        Returns
+        -------
+        list of event_mapper.WebhookEvent
+            The events of `batch` in order, without the ones that are not valid
+            webhook events. It is not worth retrying them, so they are only
+            logged.
+        """
+        events = []
+
+        for data in batch:
+            if isinstance(data, dict):
+                start = time.perf_counter()
+
+                try:
+                    data = map_webhook_event(data)
+                except Exception as err:
+                    self.logger.warning(f"Not persisting invalid webhook event: {err}")
+                    events_total.labels("unknown", "invalid").inc()
+                    continue
+
+                stage_seconds.labels("map", data.event_type).observe(time.perf_counter() - start)
+
+            events.append(data)
+
+        return events
+
+
+def _is_transient(err):
+    """Whether persisting an event that failed with `err` may succeed later."""
+    if isinstance(err, sqlalchemy.exc.DBAPIError):
+        return isinstance(err, sqlalchemy.exc.OperationalError) or err.connection_invalidated
+
+    return isinstance(err, (WebhookConflictError, sqlalchemy.exc.TimeoutError))
 
 
 class AuthenticationHandler:
@@ -1219,7 +1548,7 @@ class AuthenticationHandler:
         logger : loguru.Logger
             If not supplied, it will instantiate a new logger.
         """
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
     def secret(self, server):
         """Get a shared secret for a given server in the database.
@@ -1232,24 +1561,76 @@ class AuthenticationHandler:
         Returns
         -------
         token : str
-            Token of the server as retrieved from database.
+            Token of the server as retrieved from database or None if it could
+            not be found or retrieved.
+        """
+        try:
+            return self.fetch_secret(server)
+        except DatabaseNotReadyError:
+            return None
+
+    def fetch_secret(self, server):
+        """Get a shared secret for a given server in the database.
+
+        Unlike `secret`, it tells a missing server from a failing database.
+
+        Parameters
+        ----------
+        server : str
+            Server for which it should get a token from database.
+
+        Returns
+        -------
+        token : str
+            Token of the server as retrieved from database or None if there is
+            no such server.
+
+        Raises
+        ------
+        DatabaseNotReadyError
+            If the database could not be queried.
         """
-        found_secret = None
         with session_scope() as session:
             try:
                 server = session.query(Servers.secret).filter(Servers.name == server).first()
             except sqlalchemy.exc.OperationalError as err:
                 self.logger.error(f"Operational error on database while validating token: {err}")
-                server = None
+
+                raise DatabaseNotReadyError()
             except Exception as err:
                 self.logger.warning(f"Unknown error while validating token: {err}")
-                server = None
 
-            if server:
-                # If it found a row for the given server, extract its secret column.
-                found_secret = server.secret
+                raise DatabaseNotReadyError()
+
+            # If it found a row for the given server, extract its secret column.
+            return server.secret if server else None
+
+    def secrets(self):
+        """Get the shared secrets of all servers in the database.
+
+        Returns
+        -------
+        secrets : dict
+            Token of each server, keyed by server name.
+
+        Raises
+        ------
+        DatabaseNotReadyError
+            If the database could not be queried.
+        """
+        with session_scope() as session:
+            try:
+                servers = session.query(Servers.name, Servers.secret).all()
+            except sqlalchemy.exc.OperationalError as err:
+                self.logger.error(f"Operational error on database while gathering secrets: {err}")
+
+                raise DatabaseNotReadyError()
+            except Exception as err:
+                self.logger.warning(f"Unknown error while gathering secrets: {err}")
+
+                raise DatabaseNotReadyError()
 
-        return found_secret
+            return {server.name: server.secret for server in servers}
 
 
 class WebhookServerHandler:
@@ -1263,7 +1644,7 @@ class WebhookServerHandler:
         logger : loguru.Logger
             If not supplied, it will instantiate a new logger.
         """
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
     def servers(self):
         """Get all available servers from database.
@@ -7,6 +7,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     Enum,
+    FetchedValue,
     ForeignKey,
     Integer,
     String,
@@ -60,7 +61,9 @@ class Meetings(Base):
     moderator_count : Column of type Integer
         Number of moderators on the meeting.
     attendees : Column of type JSON
-        Each attendee on the meeting, especified on the format:
+        Stored as json, or as jsonb once opt-in migration 5 is applied (the
+        type is the same to SQLAlchemy). Each attendee on the meeting,
+        especified on the format:
 
         [
             {
@@ -111,8 +114,8 @@ class Meetings(Base):
 
     m_shared_secret_guid = Column(String)
     m_institution_guid = Column(String)
-    ext_meeting_id = Column(String)
-    int_meeting_id = Column(String)
+    ext_meeting_id = Column(String)  # Indexed by migration 002.
+    int_meeting_id = Column(String)  # Indexed by migration 002.
     transfer = Column(Boolean)
     transfer_count = Column(Integer)
 
@@ -157,6 +160,101 @@ class Meetings(Base):
         )
 
 
+class MeetingAttendees(Base):
+    """Table meeting_attendees in the database.
+
+    Each row in this table represents an attendee of a running meeting. It is
+    an alternative to `Meetings.attendees`, used by the table attendee store,
+    and is created by opt-in migration 6. Rows are removed along with their
+    meeting.
+    It inherits from Base - a base class to represent tables by SQLAlchemy.
+
+    Attributes
+    ----------
+    meeting_id : Column of type Integer
+        Primary key and Foreign Key. Identifier of the associated Meetings
+        table (instatiated by id).
+    internal_user_id : Column of type String
+        Primary key. Internal user ID of the attendee.
+    position : Column of type BigInteger
+        Generated by the database. Orders attendees by the time they joined.
+    external_user_id : Column of type String
+        External user ID of the attendee.
+    full_name : Column of type String
+        Name of the attendee.
+    role : Column of type String
+        Role of the attendee.
+    is_presenter : Column of type Boolean
+        Indicates if the attendee is the presenter.
+    is_listening_only : Column of type Boolean
+        Indicates if the attendee is only listening.
+    has_joined_voice : Column of type Boolean
+        Indicates if the attendee has joined the voice chat.
+    has_video : Column of type Boolean
+        Indicates if the attendee is sharing video.
+    user_data : Column of type JSON
+        Information about the attendee metadata.
+    guest : Column of type Boolean
+        Indicates if the attendee is a guest.
+    """
+
+    __tablename__ = "meeting_attendees"
+
+    meeting_id = Column(Integer, ForeignKey("meetings.id", ondelete="CASCADE"), primary_key=True)
+    internal_user_id = Column(String, primary_key=True)
+    position = Column(BigInteger, server_default=FetchedValue())
+
+    external_user_id = Column(String)
+    full_name = Column(String)
+    role = Column(String)
+    is_presenter = Column(Boolean)
+    is_listening_only = Column(Boolean)
+    has_joined_voice = Column(Boolean)
+    has_video = Column(Boolean)
+    user_data = Column(JSON)
+    guest = Column(Boolean)
+
+    """Columns holding the keys of an attendee in `Meetings.attendees`."""
+    ATTENDEE_KEYS = (
+        "external_user_id",
+        "internal_user_id",
+        "full_name",
+        "role",
+        "is_presenter",
+        "is_listening_only",
+        "has_joined_voice",
+        "has_video",
+        "user_data",
+        "guest",
+    )
+
+    def __repr__(self):
+        return (
+            "<MeetingAttendees("
+            + "meeting_id="
+            + str(self.meeting_id)
+            + ", internal_user_id="
+            + str(self.internal_user_id)
+            + ", position="
+            + str(self.position)
+            + ", full_name="
+            + str(self.full_name)
+            + ", role="
+            + str(self.role)
+            + ", is_presenter="
+            + str(self.is_presenter)
+            + ", is_listening_only="
+            + str(self.is_listening_only)
+            + ", has_joined_voice="
+            + str(self.has_joined_voice)
+            + ", has_video="
+            + str(self.has_video)
+            + ", guest="
+            + str(self.guest)
+            + ")>"
+        )
+
+
 class MeetingsEvents(Base):
     """Table meetings_events in the database.
 
@@ -242,7 +340,7 @@ class MeetingsEvents(Base):
 
     id = Column(Integer, primary_key=True)
 
-    shared_secret_guid = Column(String)  # Index?
+    shared_secret_guid = Column(String)  # Indexed by migration 001.
     shared_secret_name = Column(String(50))
     server_guid = Column(String)
     server_url = Column(String(255))
@@ -251,9 +349,9 @@ class MeetingsEvents(Base):
     created_at = Column(DateTime, default=datetime.datetime.now)
     updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
 
-    external_meeting_id = Column(String(255))  # Index?
-    internal_meeting_id = Column(String(255), unique=True)  # Index?
-    parent_meeting_id = Column(String(255))  # Index?
+    external_meeting_id = Column(String(255))  # Indexed by migration 001.
+    internal_meeting_id = Column(String(255), unique=True)
+    parent_meeting_id = Column(String(255))  # Partially indexed by migration 001.
     name = Column(String(255))
     create_time = Column(BigInteger)
     create_date = Column(String(50))
@@ -531,6 +629,7 @@ class UsersEvents(Base):
     __tablename__ = "users_events"
 
     id = Column(Integer, primary_key=True)
+    # Indexed, and partially for users with no leave time, by migration 003.
     meeting_event_id = Column(Integer, ForeignKey("meetings_events.id"))
     meeting_event = relationship("MeetingsEvents")
 
@@ -610,7 +709,7 @@ class Servers(Base):
     id = Column(Integer, primary_key=True)
     guid = Column(String, unique=True)
     institution_guid = Column(String, ForeignKey("institutions.guid"), unique=True)
-    name = Column(String(50))
+    name = Column(String(50))  # Indexed by migration 004.
     secret = Column(String(50))
     ip = Column(String(15))
     enabled = Column(Boolean)
@@ -672,7 +771,7 @@ class SharedSecrets(Base):
     id = Column(Integer, primary_key=True)
     guid = Column(String, unique=True)
     institution_guid = Column(String, ForeignKey("institutions.guid"), unique=True)
-    name = Column(String)
+    name = Column(String)  # Indexed by migration 004.
     secret = Column(String)
     scope = Column(String)
     created_at = Column(DateTime, default=datetime.datetime.now)
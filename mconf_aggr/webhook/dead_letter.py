@@ -0,0 +1,331 @@
+"""This module provides the dead-letter store of webhook events.
+
+Events the writer gives up on are appended to the store instead of only
+being logged, so they can be replayed once the cause of their failure is
+fixed. The store is a directory of JSON Lines files, one per day (UTC), each
+line holding one event with the class and message of its last error and the
+number of times it was run.
+
+Events are replayed with:
+
+    python -m mconf_aggr.webhook.dead_letter replay [FILE ...]
+
+Replaying reads the files (the files of past days if none is given) and
+persists their events through `DataProcessor`, in batches of one transaction
+each, with events split by meeting over parallel workers so that each
+meeting keeps its order. Events failing again are appended to the store with
+one more attempt, and the files are renamed with a `.replayed` suffix once
+all their events are handled. The file of the current day is still being
+written by the aggregator, so it is only replayed the day after. If replaying
+stops before the end, the files are left as they are and replayed again as a
+whole, so their events may be persisted twice.
+"""
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import glob
+import os
+import sys
+import threading
+import zlib
+
+from mconf_aggr.json_codec import json_codec
+from mconf_aggr.logger import get_logger
+from mconf_aggr.webhook.event_mapper import (
+    EVENT_SPECS,
+    WebhookEvent,
+    map_webhook_event,
+    meeting_partition_key,
+)
+
+FILE_PREFIX = "dead-letter-"
+FILE_SUFFIX = ".jsonl"
+REPLAYED_SUFFIX = ".replayed"
+
+"""An event given up on."""
+DeadLetter = collections.namedtuple("DeadLetter", ("time", "error", "message", "attempts", "event"))
+
+
+class DeadLetterStore:
+    """Append-only store of the events given up on."""
+
+    def __init__(self, directory, logger=None):
+        """Constructor of the DeadLetterStore.
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the files of the store. It is created if needed.
+        logger : loguru.Logger
+            If not supplied, it will instantiate a new logger.
+        """
+        self.directory = directory
+        self.logger = logger or get_logger(__name__)
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, event, error, attempts):
+        """Append an event to the store.
+
+        Parameters
+        ----------
+        event : event_mapper.WebhookEvent or dict
+            The event, mapped or as received.
+        error : Exception
+            Last error of the event, or None if it was never run.
+        attempts : int
+            Number of times the event was run.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        letter = DeadLetter(
+            now.isoformat(),
+            type(error).__name__ if error is not None else None,
+            str(error) if error is not None else None,
+            attempts,
+            event,
+        )
+        line = encode(letter) + "\n"
+
+        with self._lock:
+            path = self._day_path(now)
+
+            if path != self._path:
+                self._open(path)
+
+            self._file.write(line)
+            self._file.flush()
+
+    def files(self):
+        """Paths of the files of the store not replayed yet, oldest first."""
+        return sorted(glob.glob(os.path.join(self.directory, f"{FILE_PREFIX}*{FILE_SUFFIX}")))
+
+    def closed_files(self):
+        """Paths of the files of past days not replayed yet, oldest first.
+
+        They are not written anymore, unlike the file of the current day.
+        """
+        current = self._day_path(datetime.datetime.now(datetime.timezone.utc))
+
+        return [path for path in self.files() if path < current]
+
+    def close(self):
+        """Close the file being written."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._path = None
+
+    def _day_path(self, now):
+        return os.path.join(self.directory, f"{FILE_PREFIX}{now:%Y-%m-%d}{FILE_SUFFIX}")
+
+    def _open(self, path):
+        if self._file is not None:
+            self._file.close()
+
+        self._file = open(path, "a", encoding="utf-8")
+        self._path = path
+
+    def __repr__(self):
+        return "{!s}(directory={!r})".format(self.__class__.__name__, self.directory)
+
+
+def encode(letter):
+    """Encode a dead letter as a line of JSON (without the line break)."""
+    event = letter.event
+
+    if isinstance(event, dict):
+        encoded_event = {"raw": event}
+    else:
+        encoded_event = {
+            "event_type": event.event_type,
+            "server_url": event.server_url,
+            "fields": event.event._asdict(),
+        }
+
+    return json_codec.dumps(dict(letter._asdict(), event=encoded_event))
+
+
+def decode(line):
+    """Decode a line of JSON into a dead letter with its event mapped.
+
+    Raises
+    ------
+    ValueError
+        If the line is not a valid dead letter.
+    """
+    try:
+        data = json_codec.loads(line)
+        event = data["event"]
+
+        if "raw" in event:
+            mapped = map_webhook_event(event["raw"])
+        else:
+            record = EVENT_SPECS[event["event_type"]][0]
+            mapped = WebhookEvent(
+                event["event_type"], record(**event["fields"]), event["server_url"]
+            )
+
+        return DeadLetter(data["time"], data["error"], data["message"], data["attempts"], mapped)
+    except Exception as err:
+        raise ValueError(f"invalid dead letter: {err}") from err
+
+
+def read(paths, logger=None):
+    """Read the dead letters of files, skipping invalid lines.
+
+    Returns
+    -------
+    list of DeadLetter
+        The dead letters in the order they were written.
+    """
+    logger = logger or get_logger(__name__)
+    letters = []
+
+    for path in paths:
+        with open(path, encoding="utf-8") as letters_file:
+            for number, line in enumerate(letters_file, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    letters.append(decode(line))
+                except ValueError as err:
+                    logger.error(f"Skipping line {number} of '{path}': {err}")
+
+    return letters
+
+
+def replay(letters, store, batch_size=500, workers=4, logger=None):
+    """Persist dead letters again.
+
+    Letters are split by meeting into `workers` parallel partitions, keeping
+    their order within each meeting, and each partition is persisted in
+    batches of `batch_size` events, each batch in one transaction with a
+    savepoint per event. Events failing again are added to `store`.
+
+    Returns
+    -------
+    tuple
+        Number of events persisted and number of events failing again.
+    """
+    logger = logger or get_logger(__name__)
+    workers = max(1, workers)
+    partitions = [[] for _ in range(workers)]
+
+    for letter in letters:
+        key = meeting_partition_key(letter.event)
+        index = zlib.crc32(str(key).encode("utf-8")) % workers if key is not None else 0
+        partitions[index].append(letter)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(lambda partition: _replay_partition(partition, batch_size), partitions)
+        )
+
+    failures = [failure for failed in results for failure in failed]
+
+    for letter, error in failures:
+        store.add(letter.event, error, letter.attempts + 1)
+
+    replayed = len(letters) - len(failures)
+    logger.info(f"Replayed {replayed} dead letter(s), {len(failures)} failed again.")
+
+    return replayed, len(failures)
+
+
+def _replay_partition(letters, batch_size):
+    # Imported here: the handlers need a configured database, the store not.
+    from mconf_aggr.webhook.database_handler import DataProcessor, session_scope
+
+    failures = []
+
+    for start in range(0, len(letters), batch_size):
+        end = start + batch_size
+        batch = letters[start:end]
+        batch_failures = []
+
+        try:
+            with session_scope() as session:
+                for letter in batch:
+                    try:
+                        with session.begin_nested():
+                            DataProcessor(session).update(letter.event)
+                    except Exception as err:
+                        batch_failures.append((letter, err))
+        except Exception as err:
+            # Nothing of the batch was committed.
+            batch_failures = [(letter, err) for letter in batch]
+
+        failures.extend(batch_failures)
+
+    return failures
+
+
+def main(argv=None):
+    """Command line entry point to replay dead letters."""
+    import mconf_aggr.aggregator.cfg as cfg
+    from mconf_aggr.webhook.attendee_store import get_attendee_store
+    from mconf_aggr.webhook.database import DatabaseConnector
+    from mconf_aggr.webhook.live_meetings import live_meetings
+    from mconf_aggr.webhook.reference_data import reference_data
+
+    parser = argparse.ArgumentParser(description="Manage the dead-letter store of webhook events.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="persist dead letters again")
+    replay_parser.add_argument(
+        "files", nargs="*", help="files to replay (default: the files of past days)"
+    )
+    replay_parser.add_argument(
+        "--directory",
+        default=cfg.config["MCONF_WEBHOOK_DEAD_LETTER_DIR"],
+        help="directory of the store (default: MCONF_WEBHOOK_DEAD_LETTER_DIR)",
+    )
+    replay_parser.add_argument("--batch-size", type=int, default=500)
+    replay_parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if not args.directory:
+        parser.error("no store directory, set MCONF_WEBHOOK_DEAD_LETTER_DIR or --directory")
+
+    logger = get_logger(__name__)
+    store = DeadLetterStore(args.directory)
+    paths = args.files or store.closed_files()
+    current = store._day_path(datetime.datetime.now(datetime.timezone.utc))
+
+    # Events failing again are appended to it too.
+    if any(os.path.realpath(path) == os.path.realpath(current) for path in paths):
+        parser.error(f"'{current}' is still being written, replay it tomorrow")
+
+    letters = read(paths)
+    logger.info(f"Replaying {len(letters)} dead letter(s) from {len(paths)} file(s).")
+
+    # Events must be written as the aggregator writes them.
+    json_codec.use(cfg.config["MCONF_WEBHOOK_JSON_CODEC"])
+    live_meetings.maxsize = cfg.config["MCONF_WEBHOOK_LIVE_MEETINGS_CACHE_SIZE"]
+    live_meetings.recount_interval = cfg.config["MCONF_WEBHOOK_ATTENDEES_RECOUNT_INTERVAL"]
+    live_meetings.attendee_store = get_attendee_store(cfg.config["MCONF_WEBHOOK_ATTENDEES_STORE"])
+    reference_data.max_rows = cfg.config["MCONF_WEBHOOK_REFERENCE_DATA_MAX_ROWS"]
+    DatabaseConnector.connect()
+
+    with DatabaseConnector.get_session_scope()() as session:
+        reference_data.load(session)
+
+    try:
+        _, failed = replay(letters, store, args.batch_size, args.workers, logger=logger)
+    finally:
+        store.close()
+
+    for path in paths:
+        os.rename(path, path + REPLAYED_SUFFIX)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
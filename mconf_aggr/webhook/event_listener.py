@@ -2,17 +2,25 @@
 
 It will receive, validate, parse and send the parsed data to be processed.
 """
+import hmac
 import json
+import time
 
 import falcon
 
 import mconf_aggr.aggregator.cfg as cfg
-from mconf_aggr.aggregator.aggregator import PublishError
+from mconf_aggr.aggregator.aggregator import ChannelFull, PublishError
 from mconf_aggr.aggregator.utils import RequestTimeLogger, time_logger
+from mconf_aggr.json_codec import json_codec
 from mconf_aggr.logger import get_logger
-from mconf_aggr.webhook.database_handler import AuthenticationHandler
-from mconf_aggr.webhook.event_mapper import map_webhook_event
-from mconf_aggr.webhook.exceptions import RequestProcessingError, WebhookError
+from mconf_aggr.webhook.event_mapper import map_webhook_event, validate_webhook_event
+from mconf_aggr.webhook.exceptions import (
+    RequestProcessingError,
+    ServiceUnavailableError,
+    WebhookError,
+)
+from mconf_aggr.webhook.instruments import events_total, stage_seconds
+from mconf_aggr.webhook.secret_cache import secret_cache
 
 """Falcon follows the REST architectural style, meaning (among
 other things) that you think in terms of resources and state
@@ -27,6 +35,8 @@ class AuthMiddleware:
     It is used before the request is handled.
     """
 
+    logger = get_logger(__name__)
+
     def __call__(self, req, resp, resource, params):
         """Make this class callable.
 
@@ -59,8 +69,6 @@ class AuthMiddleware:
         * http://self-issued.info/docs/draft-ietf-oauth-v2-bearer.html
         * https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/WWW-Authenticate
         """
-        self.logger = get_logger()
-
         self.logger.info(f"Received request: '{req.params}'")
 
         auth_required = cfg.config["MCONF_WEBHOOK_AUTH_REQUIRED"]
@@ -104,16 +112,19 @@ class AuthMiddleware:
         """Return True if it can find a token for the given host and
         the token found, when prefixed with an authentication preamble (Bearer),
         matches exactly the token received. Otherwise, it returns False.
+
+        Secrets come from the shared `secret_cache` unless `handler` is supplied.
+        Tokens are compared in constant time.
         """
         if not handler:
-            handler = AuthenticationHandler()
+            handler = secret_cache
 
         secret = handler.secret(host)
 
         if secret:
             expected = "Bearer " + secret
 
-            if expected == token:
+            if hmac.compare_digest(expected.encode(), token.encode()):
                 return True
 
         return False
@@ -127,17 +138,21 @@ class WebhookEventListener:
     It could handle POST, GET, PUT and DELETE requests as well.
     """
 
-    def __init__(self, event_handler, logger=None):
+    def __init__(self, event_handler, retry_after=5, logger=None):
         """Constructor of the WebhookEventListener.
 
         Parameters
         ----------
         event_handler : WebhookEventHandler.
+        retry_after : int
+            Seconds the sender is asked to wait before retrying events that
+            could not be accepted.
         logger : loguru.Logger
             If not supplied, it will instantiate a new logger.
         """
         self.event_handler = event_handler
-        self.logger = logger or get_logger()
+        self.retry_after = retry_after
+        self.logger = logger or get_logger(__name__)
 
     @falcon.before(AuthMiddleware())
     def on_post(self, req, resp):
@@ -153,7 +168,7 @@ class WebhookEventListener:
         with RequestTimeLogger.time_logger_requests(
             self.logger.info,
             "Processing webhook event took {elapsed}s.",
-        ):
+        ), stage_seconds.labels("request", "").time():
             server_url = req.get_param("domain")
             event = req.get_param("event")
 
@@ -161,24 +176,31 @@ class WebhookEventListener:
                 "Webhook event received from '{}' (last hop: '{}').".format(server_url, req.host)
             )
 
-            # Always responds with HTTP status code 200 in order to prevent
-            # the sending webhook endpoint from stopping requesting.
+            # Responds with HTTP status code 200 in order to prevent the
+            # sending webhook endpoint from stopping requesting, unless events
+            # could not be accepted for now and should be sent again.
             try:
                 self.logger.debug("Processing event")
                 self.event_handler.process_event(server_url, event)
+            except ServiceUnavailableError as err:
+                self.logger.warning(f"Asking to retry event in {self.retry_after}s: {err}")
+                response = WebhookResponse(str(err))
+                resp.text = json_codec.dumps(response.error)
+                resp.status = falcon.HTTP_503
+                resp.set_header("Retry-After", str(self.retry_after))
             except WebhookError as err:
                 self.logger.error(f"An error occurred while processing event: {err}")
                 response = WebhookResponse(str(err))
-                resp.text = json.dumps(response.error)
+                resp.text = json_codec.dumps(response.error)
                 resp.status = falcon.HTTP_200
             except Exception as err:
                 self.logger.error(f"An unexpected error occurred while processing event: {err}")
                 response = WebhookResponse(str(err))
-                resp.text = json.dumps(response.error)
+                resp.text = json_codec.dumps(response.error)
                 resp.status = falcon.HTTP_200
             else:
                 response = WebhookResponse("Event processed successfully")
-                resp.text = json.dumps(response.success)
+                resp.text = json_codec.dumps(response.success)
                 resp.status = falcon.HTTP_200
 
 
@@ -221,7 +243,7 @@ class WebhookEventHandler:
     It's called by the WebhookvEventListener everytime it gets a new message.
     """
 
-    def __init__(self, publisher, channel, logger=None):
+    def __init__(self, publisher, channel, deferred_mapping=False, logger=None):
         """Constructor of WebhookEventHandler.
 
         Parameters
@@ -229,12 +251,16 @@ class WebhookEventHandler:
         publisher : aggregator.Publisher
         channel : str
             Channel where event will be published.
+        deferred_mapping : bool
+            If True, only the envelope of events is validated and they are
+            published as decoded, leaving the mapping to the writer.
         logger : loguru.Logger
             If not supplied, it will instantiate a new logger.
         """
         self.publisher = publisher
         self.channel = channel
-        self.logger = logger or get_logger()
+        self.deferred_mapping = deferred_mapping
+        self.logger = logger or get_logger(__name__)
 
     def stop(self):
         pass
@@ -242,7 +268,14 @@ class WebhookEventHandler:
     def process_event(self, server_url, event):
         """Parse and publish data to aggregator.
 
+        Events are published in order until one is refused because the
+        channel is full. The request is then failed as a whole, so events
+        published before it are received again when the sender retries.
+
         Raises
+        ------
+        ServiceUnavailableError
+            If the channel is full.
         Exception
             If any error occur during event handling.
 
@@ -260,7 +293,8 @@ class WebhookEventHandler:
         try:
             # decoded_events = self._decode(unquoted_event)
             self.logger.debug("Parsing events as a JSON file.")
-            decoded_events = self._decode(event)
+            with stage_seconds.labels("decode", "").time():
+                decoded_events = self._decode(event)
         except json.JSONDecodeError as err:
             self.logger.error(f"Error during event decoding: invalid JSON: {err}")
             raise RequestProcessingError("Event provided is not a valid JSON")
@@ -277,16 +311,28 @@ class WebhookEventHandler:
         for webhook_event in decoded_events:
             with time_logger(self.logger.info, "Handling event took {elapsed}s."):
                 webhook_event["server_url"] = server_url
+                start = time.perf_counter()
                 try:
-                    # Instance of WebhookEvent.
-                    webhook_event = map_webhook_event(webhook_event)
+                    if self.deferred_mapping:
+                        stage = "validate"
+                        event_type = validate_webhook_event(webhook_event)
+                    else:
+                        # Instance of WebhookEvent.
+                        stage = "map"
+                        webhook_event = map_webhook_event(webhook_event)
+                        event_type = webhook_event.event_type
 
                 except Exception as err:
                     self.logger.warning(f"Something went wrong: {err}")
+                    events_total.labels("unknown", "invalid").inc()
                     webhook_event = None
 
                 if webhook_event:
-                    if webhook_event.event_type in deprecated_events:
+                    published = time.perf_counter()
+                    stage_seconds.labels(stage, event_type).observe(published - start)
+
+                    if event_type in deprecated_events:
+                        events_total.labels(event_type, "deprecated").inc()
                         self.logger.info(
                             "Received event is in deprecated event list: '{}'".format(
                                 deprecated_events
@@ -298,15 +344,26 @@ class WebhookEventHandler:
                             self.logger.debug("Publishing event.")
                             self.publisher.publish(webhook_event, channel=self.channel)
 
+                        except ChannelFull as err:
+                            self.logger.warning(f"Unable to publish event: {err}")
+                            events_total.labels(event_type, "rejected").inc()
+                            raise ServiceUnavailableError(str(err)) from err
+
                         except PublishError:
                             self.logger.error("Something went wrong while publishing.")
+                            events_total.labels(event_type, "failed").inc()
                             continue
 
+                        stage_seconds.labels("enqueue", event_type).observe(
+                            time.perf_counter() - published
+                        )
+                        events_total.labels(event_type, "published").inc()
+
                 else:
                     self.logger.warning("Not publishing event from '{}'".format(server_url))
 
     def _decode(self, event):
-        return json.loads(event)
+        return json_codec.loads(event)
 
 
 def _normalize_server_url(server_url):
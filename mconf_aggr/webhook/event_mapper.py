@@ -17,11 +17,100 @@ It contains two fields `event_type` and `event`.
 """
 WebhookEvent = collections.namedtuple("WebhookEvent", ["event_type", "event", "server_url"])
 
-# The namedtuples defined below are used internally to represent webhook events.
 
-MeetingCreatedEvent = collections.namedtuple(
-    "MeetingCreatedEvent",
-    [
+class EventRecord:
+    """Base class of the internal representation of webhook events.
+
+    Subclasses list their fields in `__slots__`, so events take no per-instance
+    dict. Like namedtuples, they can be built with positional or keyword
+    arguments and compared by value.
+
+    The fields of an event matching columns of a model are computed once per
+    model, so `to_model` builds rows without going through a dict.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = tuple(cls.__slots__)
+        cls._setters = tuple(getattr(cls, name).__set__ for name in cls._fields)
+        cls._projections = {}
+
+    def __init__(self, *args, **kwargs):
+        given = len(args)
+
+        if given > len(self._fields):
+            raise TypeError(f"{self.__class__.__name__} takes {len(self._fields)} arguments")
+
+        try:
+            values = args + tuple(kwargs.pop(name) for name in self._fields[given:])
+        except KeyError as err:
+            raise TypeError(f"{self.__class__.__name__} missing argument {err}") from None
+
+        if kwargs:
+            raise TypeError(f"{self.__class__.__name__} got unexpected arguments {sorted(kwargs)}")
+
+        for setter, value in zip(self._setters, values):
+            setter(self, value)
+
+    @classmethod
+    def _make(cls, values):
+        """Make an event from a sequence with the values of all its fields."""
+        event = cls.__new__(cls)
+
+        for setter, value in zip(cls._setters, values):
+            setter(event, value)
+
+        return event
+
+    @classmethod
+    def projection(cls, model):
+        """Get the fields of the event that are columns of `model`."""
+        try:
+            return cls._projections[model]
+        except KeyError:
+            columns = {column.key for column in model.__mapper__.column_attrs}
+            projection = tuple(name for name in cls._fields if name in columns)
+            return cls._projections.setdefault(model, projection)
+
+    def to_model(self, model):
+        """Build an instance of `model` with the fields of the event that are its columns."""
+        instance = model()
+
+        for name in self.projection(model):
+            setattr(instance, name, getattr(self, name))
+
+        return instance
+
+    def __reduce__(self):
+        # Much faster to pickle than the default state of slotted objects.
+        return self.__class__, tuple(getattr(self, name) for name in self._fields)
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{!s}({!s})".format(
+            self.__class__.__name__,
+            ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields),
+        )
+
+
+# The classes defined below are used internally to represent webhook events.
+
+
+class MeetingCreatedEvent(EventRecord):
+    __slots__ = (
         "server_url",
         "external_meeting_id",
         "internal_meeting_id",
@@ -38,16 +127,19 @@ MeetingCreatedEvent = collections.namedtuple(
         "max_users",
         "is_breakout",
         "meta_data",
-    ],
-)
+    )
 
-MeetingEndedEvent = collections.namedtuple(
-    "MeetingEndedEvent", ["external_meeting_id", "internal_meeting_id", "end_time"]
-)
 
-UserJoinedEvent = collections.namedtuple(
-    "UserJoinedEvent",
-    [
+class MeetingEndedEvent(EventRecord):
+    __slots__ = (
+        "external_meeting_id",
+        "internal_meeting_id",
+        "end_time",
+    )
+
+
+class UserJoinedEvent(EventRecord):
+    __slots__ = (
         "name",
         "role",
         "internal_user_id",
@@ -58,25 +150,22 @@ UserJoinedEvent = collections.namedtuple(
         "is_presenter",
         "guest",
         "userdata",
-    ],
-)
+    )
 
 
-UserLeftEvent = collections.namedtuple(
-    "UserLeftEvent",
-    [
+class UserLeftEvent(EventRecord):
+    __slots__ = (
         "internal_user_id",
         "external_user_id",
         "internal_meeting_id",
         "external_meeting_id",
         "leave_time",
         "userdata",
-    ],
-)
+    )
 
-UserVoiceEnabledEvent = collections.namedtuple(
-    "UserVoiceEnabledEvent",
-    [
+
+class UserVoiceEnabledEvent(EventRecord):
+    __slots__ = (
         "internal_user_id",
         "external_user_id",
         "external_meeting_id",
@@ -84,45 +173,41 @@ UserVoiceEnabledEvent = collections.namedtuple(
         "has_joined_voice",
         "is_listening_only",
         "event_name",
-    ],
-)
+    )
+
 
-UserEvent = collections.namedtuple(
-    "UserEvent",
-    [
+class UserEvent(EventRecord):
+    __slots__ = (
         "internal_user_id",
         "external_user_id",
         "external_meeting_id",
         "internal_meeting_id",
         "event_name",
-    ],
-)
+    )
 
-RapProcessEvent = collections.namedtuple(
-    "RapProcessEvent",
-    [
+
+class RapProcessEvent(EventRecord):
+    __slots__ = (
         "external_meeting_id",
         "internal_meeting_id",
         "record_id",
         "workflow",
         "current_step",
-    ],
-)
+    )
 
-RapPublishEvent = collections.namedtuple(
-    "RapPublishEvent",
-    [
+
+class RapPublishEvent(EventRecord):
+    __slots__ = (
         "external_meeting_id",
         "internal_meeting_id",
         "record_id",
         "workflow",
         "current_step",
-    ],
-)
+    )
+
 
-RapPublishEndedEvent = collections.namedtuple(
-    "RapPublishEndedEvent",
-    [
+class RapPublishEndedEvent(EventRecord):
+    __slots__ = (
         "name",
         "is_breakout",
         "start_time",
@@ -137,56 +222,195 @@ RapPublishEndedEvent = collections.namedtuple(
         "record_id",
         "workflow",
         "current_step",
-    ],
-)
+    )
 
-RapPublishUnpublishHandler = collections.namedtuple(
-    "RapPublishUnpublishHandler",
-    [
+
+class RapPublishUnpublishHandler(EventRecord):
+    __slots__ = (
         "internal_meeting_id",
         "external_meeting_id",
         "record_id",
-    ],
-)
+    )
 
-RapDeletedEvent = collections.namedtuple(
-    "RapDeletedEvent",
-    [
+
+class RapDeletedEvent(EventRecord):
+    __slots__ = (
         "internal_meeting_id",
         "external_meeting_id",
         "record_id",
-    ],
-)
+    )
+
 
-RapEvent = collections.namedtuple(
-    "RapEvent",
-    [
+class RapEvent(EventRecord):
+    __slots__ = (
         "external_meeting_id",
         "internal_meeting_id",
         "record_id",
         "current_step",
-    ],
-)
-RapArchiveEvent = collections.namedtuple(
-    "RapArchiveEvent",
-    [
+    )
+
+
+class RapArchiveEvent(EventRecord):
+    __slots__ = (
         "external_meeting_id",
         "internal_meeting_id",
         "record_id",
         "recorded",
         "current_step",
-    ],
+    )
+
+
+class MeetingTransferEvent(EventRecord):
+    __slots__ = (
+        "external_meeting_id",
+        "internal_meeting_id",
+        "event_name",
+    )
+
+
+"""Marks a field filled with the type of the event instead of a value of it."""
+EVENT_TYPE = object()
+
+# Paths of the values of webhook events, from the root of the event.
+
+ATTRIBUTES = ("data", "attributes")
+MEETING = ATTRIBUTES + ("meeting",)
+USER = ATTRIBUTES + ("user",)
+RECORDING = ATTRIBUTES + ("recording",)
+TIMESTAMP = ("data", "event", "ts")
+
+MEETING_IDS = (
+    ("external_meeting_id", MEETING + ("external-meeting-id",), ""),
+    ("internal_meeting_id", MEETING + ("internal-meeting-id",), ""),
 )
+USER_IDS = (
+    ("internal_user_id", USER + ("internal-user-id",), ""),
+    ("external_user_id", USER + ("external-user-id",), ""),
+)
+
+"""Fields of each internal event.
 
-MeetingTransferEvent = collections.namedtuple(
-    "MeetingTransferEvent", ["external_meeting_id", "internal_meeting_id", "event_name"]
+Each field is a tuple (name, path, default): the value at `path` of the
+webhook event, or `default` if any key of the path is missing.
+"""
+MEETING_CREATED_FIELDS = MEETING_IDS + (
+    ("server_url", ("server_url",), ""),
+    ("parent_meeting_id", MEETING + ("parent-id",), ""),
+    ("name", MEETING + ("name",), ""),
+    ("create_time", MEETING + ("create-time",), 0),
+    ("create_date", MEETING + ("create-date",), None),
+    ("voice_bridge", MEETING + ("voice-conf",), ""),
+    ("dial_number", MEETING + ("dial-number",), ""),
+    ("attendee_pw", MEETING + ("viewer-pass",), ""),
+    ("moderator_pw", MEETING + ("moderator-pass",), ""),
+    ("duration", MEETING + ("duration",), 0),
+    ("recording", MEETING + ("record",), False),
+    ("max_users", MEETING + ("max-users",), 0),
+    ("is_breakout", MEETING + ("is-breakout",), False),
+    ("meta_data", MEETING + ("metadata",), {}),
 )
 
+MEETING_ENDED_FIELDS = MEETING_IDS + (("end_time", TIMESTAMP, 0),)
+
+USER_JOINED_FIELDS = (
+    MEETING_IDS
+    + USER_IDS
+    + (
+        ("name", USER + ("name",), ""),
+        ("role", USER + ("role",), ""),
+        ("join_time", TIMESTAMP, ""),
+        ("is_presenter", USER + ("presenter",), True),
+        ("guest", USER + ("guest",), False),
+        ("userdata", USER + ("userdata",), {}),
+    )
+)
+
+USER_LEFT_FIELDS = (
+    MEETING_IDS
+    + USER_IDS
+    + (
+        ("leave_time", TIMESTAMP, ""),
+        ("userdata", USER + ("userdata",), {}),
+    )
+)
+
+USER_VOICE_ENABLED_FIELDS = (
+    MEETING_IDS
+    + USER_IDS
+    + (
+        ("has_joined_voice", USER + ("sharing-mic",), True),
+        ("is_listening_only", USER + ("listening-only",), True),
+        ("event_name", EVENT_TYPE, None),
+    )
+)
+
+USER_FIELDS = MEETING_IDS + USER_IDS + (("event_name", EVENT_TYPE, None),)
+
+RAP_FIELDS = MEETING_IDS + (
+    ("record_id", ATTRIBUTES + ("record-id",), ""),
+    ("current_step", EVENT_TYPE, None),
+)
+
+RAP_WORKFLOW_FIELDS = RAP_FIELDS + (("workflow", ATTRIBUTES + ("workflow",), {}),)
+
+RAP_PUBLISH_ENDED_FIELDS = RAP_WORKFLOW_FIELDS + (
+    ("name", RECORDING + ("name",), ""),
+    ("is_breakout", RECORDING + ("isBreakout",), False),
+    ("start_time", RECORDING + ("start-time",), 0),
+    ("end_time", RECORDING + ("end-time",), 0),
+    ("size", RECORDING + ("size",), ""),
+    ("raw_size", RECORDING + ("raw-size",), 0),
+    ("meta_data", RECORDING + ("metadata",), {}),
+    ("playback", RECORDING + ("playback",), ""),
+    ("download", RECORDING + ("download",), ""),
+)
+
+RAP_ARCHIVE_FIELDS = RAP_FIELDS + (("recorded", ATTRIBUTES + ("recorded",), True),)
+
+RAP_RECORD_FIELDS = MEETING_IDS + (("record_id", ATTRIBUTES + ("record_id",), ""),)
+
+MEETING_TRANSFER_FIELDS = MEETING_IDS + (("event_name", EVENT_TYPE, None),)
+
+"""Internal event and fields of each type of webhook event."""
+EVENT_SPECS = {
+    "meeting-created": (MeetingCreatedEvent, MEETING_CREATED_FIELDS),
+    "meeting-ended": (MeetingEndedEvent, MEETING_ENDED_FIELDS),
+    "user-joined": (UserJoinedEvent, USER_JOINED_FIELDS),
+    "user-left": (UserLeftEvent, USER_LEFT_FIELDS),
+    "user-audio-voice-enabled": (UserVoiceEnabledEvent, USER_VOICE_ENABLED_FIELDS),
+    "user-audio-voice-disabled": (UserEvent, USER_FIELDS),
+    "user-audio-listen-only-enabled": (UserEvent, USER_FIELDS),
+    "user-audio-listen-only-disabled": (UserEvent, USER_FIELDS),
+    "user-cam-broadcast-start": (UserEvent, USER_FIELDS),
+    "user-cam-broadcast-end": (UserEvent, USER_FIELDS),
+    "user-presenter-assigned": (UserEvent, USER_FIELDS),
+    "user-presenter-unassigned": (UserEvent, USER_FIELDS),
+    "rap-publish-started": (RapPublishEvent, RAP_WORKFLOW_FIELDS),
+    "rap-post-publish-started": (RapPublishEvent, RAP_WORKFLOW_FIELDS),
+    "rap-post-publish-ended": (RapPublishEvent, RAP_WORKFLOW_FIELDS),
+    "rap-publish-ended": (RapPublishEndedEvent, RAP_PUBLISH_ENDED_FIELDS),
+    "rap-process-started": (RapProcessEvent, RAP_WORKFLOW_FIELDS),
+    "rap-process-ended": (RapProcessEvent, RAP_WORKFLOW_FIELDS),
+    "rap-post-process-started": (RapProcessEvent, RAP_WORKFLOW_FIELDS),
+    "rap-post-process-ended": (RapProcessEvent, RAP_WORKFLOW_FIELDS),
+    "rap-sanity-started": (RapEvent, RAP_FIELDS),
+    "rap-sanity-ended": (RapEvent, RAP_FIELDS),
+    "rap-post-archive-started": (RapEvent, RAP_FIELDS),
+    "rap-post-archive-ended": (RapEvent, RAP_FIELDS),
+    "rap-archive-started": (RapEvent, RAP_FIELDS),
+    "rap-archive-ended": (RapArchiveEvent, RAP_ARCHIVE_FIELDS),
+    "rap-unpublished": (RapPublishUnpublishHandler, RAP_RECORD_FIELDS),
+    "rap-published": (RapPublishUnpublishHandler, RAP_RECORD_FIELDS),
+    "rap-deleted": (RapDeletedEvent, RAP_RECORD_FIELDS),
+    "meeting-transfer-enabled": (MeetingTransferEvent, MEETING_TRANSFER_FIELDS),
+    "meeting-transfer-disabled": (MeetingTransferEvent, MEETING_TRANSFER_FIELDS),
+}
+
 
 def map_webhook_event(event):
     """Map from a webhook event received to the corresponding data structure.
 
-    This function calls the corresponding function based on the type of event received.
+    This function calls the mapper of the type of event received.
     It can be thought as an event dispatcher.
 
     Parameters
@@ -199,377 +423,179 @@ def map_webhook_event(event):
     mapped_event : event_mapper.WebhookEvent
         It encapsulates both the event type and the event itself.
     """
-    logger = get_logger()
-
-    try:
-        event_type = event["data"]["id"]
-        server_url = event["server_url"]
-    except (KeyError, TypeError) as err:
-        logger.warning("Webhook message dos not contain a valid id: {}".format(err))
-        raise InvalidWebhookMessageError("Webhook message dos not contain a valid id")
+    event_type = validate_webhook_event(event)
 
-    logger.debug("Mapping event")
-
-    if event_type == "meeting-created":
-        mapped_event = _map_create_event(event, event_type, server_url)
-
-    elif event_type == "meeting-ended":
-        mapped_event = _map_end_event(event, event_type, server_url)
-
-    elif event_type == "user-joined":
-        mapped_event = _map_user_joined_event(event, event_type, server_url)
-
-    elif event_type == "user-left":
-        mapped_event = _map_user_left_event(event, event_type, server_url)
-
-    elif event_type == "user-audio-voice-enabled":
-        mapped_event = _map_user_voice_enabled_event(event, event_type, server_url)
-
-    elif event_type in [
-        "user-audio-voice-enabled",
-        "user-audio-voice-disabled",
-        "user-audio-listen-only-enabled",
-        "user-audio-listen-only-disabled",
-        "user-cam-broadcast-start",
-        "user-cam-broadcast-end",
-        "user-presenter-assigned",
-        "user-presenter-unassigned",
-    ]:
-        mapped_event = _map_user_event(event, event_type, server_url)
-
-    elif event_type in [
-        "rap-publish-started",
-        "rap-post-publish-started",
-        "rap-post-publish-ended",
-    ]:
-        mapped_event = _map_rap_publish_event(event, event_type, server_url)
-
-    elif event_type == "rap-publish-ended":
-        mapped_event = _map_rap_publish_ended_event(event, event_type, server_url)
-
-    elif event_type in [
-        "rap-process-started",
-        "rap-process-ended",
-        "rap-post-process-started",
-        "rap-post-process-ended",
-    ]:
-        mapped_event = _map_rap_process_event(event, event_type, server_url)
-
-    elif event_type in [
-        "rap-sanity-started",
-        "rap-sanity-ended",
-        "rap-post-archive-started",
-        "rap-post-archive-ended",
-        "rap-archive-started",
-    ]:
-        mapped_event = _map_rap_event(event, event_type, server_url)
-
-    elif event_type in ["rap-archive-ended"]:
-        mapped_event = _map_rap_archive_event(event, event_type, server_url)
-
-    elif event_type in ["rap-unpublished", "rap-published"]:
-        mapped_event = _map_rap_published_unpublished_event(event, event_type, server_url)
-
-    elif event_type == "rap-deleted":
-        mapped_event = _map_rap_deleted_event(event, event_type, server_url)
-
-    elif event_type in ["meeting-transfer-enabled", "meeting-transfer-disabled"]:
-        mapped_event = _map_transfer_event(event, event_type, server_url)
-
-    else:
-        logger.warning("Webhook event id is not valid: '{}'".format(event_type))
-        raise InvalidWebhookEventError("Webhook event '{}' is not valid".format(event_type))
-
-    return mapped_event
-
-
-def _map_create_event(event, event_type, server_url):
-    """Map `meeting-created` event to internal representation"""
-
-    create_event = MeetingCreatedEvent(
-        server_url=event.get("server_url", ""),
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        parent_meeting_id=_get_nested(event, ["data", "attributes", "meeting", "parent-id"], ""),
-        name=_get_nested(event, ["data", "attributes", "meeting", "name"], ""),
-        create_time=_get_nested(event, ["data", "attributes", "meeting", "create-time"], 0),
-        create_date=_get_nested(event, ["data", "attributes", "meeting", "create-date"], None),
-        voice_bridge=_get_nested(event, ["data", "attributes", "meeting", "voice-conf"], ""),
-        dial_number=_get_nested(event, ["data", "attributes", "meeting", "dial-number"], ""),
-        attendee_pw=_get_nested(event, ["data", "attributes", "meeting", "viewer-pass"], ""),
-        moderator_pw=_get_nested(event, ["data", "attributes", "meeting", "moderator-pass"], ""),
-        duration=_get_nested(event, ["data", "attributes", "meeting", "duration"], 0),
-        recording=_get_nested(event, ["data", "attributes", "meeting", "record"], False),
-        max_users=_get_nested(event, ["data", "attributes", "meeting", "max-users"], 0),
-        is_breakout=_get_nested(event, ["data", "attributes", "meeting", "is-breakout"], False),
-        meta_data=_get_nested(event, ["data", "attributes", "meeting", "metadata"], {}),
-    )
+    get_logger(__name__).debug("Mapping event")
 
-    webhook_event = WebhookEvent(event_type, create_event, server_url)
+    return EVENT_MAPPERS[event_type](event, event_type, event["server_url"])
 
-    return webhook_event
 
+def validate_webhook_event(event):
+    """Check the envelope of a webhook event without mapping it.
 
-def _map_rap_deleted_event(event, event_type, server_url):
-    """Map `rap-deleted` event to internal representation."""
-    end_event = RapDeletedEvent(
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        record_id=_get_nested(event, ["data", "attributes", "record_id"], ""),
-    )
-
-    webhook_event = WebhookEvent(event_type, end_event, server_url)
-
-    return webhook_event
-
-
-def _map_rap_published_unpublished_event(event, event_type, server_url):
-    """Map `rap-unpublished` event to internal representation."""
-    end_event = RapPublishUnpublishHandler(
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        record_id=_get_nested(event, ["data", "attributes", "record_id"], ""),
-    )
-
-    webhook_event = WebhookEvent(event_type, end_event, server_url)
+    Parameters
+    ----------
+    event : dict
+        Dict with fields and values of the event as received by the webhook.
 
-    return webhook_event
+    Returns
+    -------
+    str
+        The type of the event.
+
+    Raises
+    ------
+    InvalidWebhookMessageError
+        If the event has no type or server URL.
+    InvalidWebhookEventError
+        If the type of the event is unknown.
+    """
+    try:
+        event_type = event["data"]["id"]
+        event["server_url"]
+    except (KeyError, TypeError) as err:
+        get_logger(__name__).warning("Webhook message dos not contain a valid id: {}".format(err))
+        raise InvalidWebhookMessageError("Webhook message dos not contain a valid id")
 
+    try:
+        known = event_type in EVENT_MAPPERS
+    except TypeError:
+        known = False
 
-def _map_end_event(event, event_type, server_url):
-    """Map `meeting-ended` event to internal representation."""
-    end_event = MeetingEndedEvent(
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        end_time=_get_nested(event, ["data", "event", "ts"], 0),
-    )
+    if not known:
+        get_logger(__name__).warning("Webhook event id is not valid: '{}'".format(event_type))
+        raise InvalidWebhookEventError("Webhook event '{}' is not valid".format(event_type))
 
-    webhook_event = WebhookEvent(event_type, end_event, server_url)
-
-    return webhook_event
-
-
-def _map_user_joined_event(event, event_type, server_url):
-    """Map `user-joined` event to internal representation."""
-    user_event = UserJoinedEvent(
-        name=_get_nested(event, ["data", "attributes", "user", "name"], ""),
-        role=_get_nested(event, ["data", "attributes", "user", "role"], ""),
-        internal_user_id=_get_nested(event, ["data", "attributes", "user", "internal-user-id"], ""),
-        external_user_id=_get_nested(event, ["data", "attributes", "user", "external-user-id"], ""),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        join_time=_get_nested(event, ["data", "event", "ts"], ""),
-        is_presenter=_get_nested(event, ["data", "attributes", "user", "presenter"], True),
-        guest=_get_nested(event, ["data", "attributes", "user", "guest"], False),
-        userdata=_get_nested(event, ["data", "attributes", "user", "userdata"], {}),
-    )
+    return event_type
 
-    webhook_event = WebhookEvent(event_type, user_event, server_url)
 
-    return webhook_event
+def meeting_partition_key(webhook_event):
+    """Partition key of a webhook event.
 
+    Events are partitioned by internal meeting id so that all events of a
+    meeting are handled in order by the same writer thread.
 
-def _map_user_left_event(event, event_type, server_url):
-    """Map `user-left` event to internal representation."""
-    user_event = UserLeftEvent(
-        internal_user_id=_get_nested(event, ["data", "attributes", "user", "internal-user-id"], ""),
-        external_user_id=_get_nested(event, ["data", "attributes", "user", "external-user-id"], ""),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        leave_time=_get_nested(event, ["data", "event", "ts"], ""),
-        userdata=_get_nested(event, ["data", "attributes", "user", "userdata"], {}),
-    )
+    Parameters
+    ----------
+    webhook_event : event_mapper.WebhookEvent or dict
+        A mapped event or a webhook event not mapped yet.
 
-    webhook_event = WebhookEvent(event_type, user_event, server_url)
-
-    return webhook_event
-
-
-def _map_user_voice_enabled_event(event, event_type, server_url):
-    """Map `user-audio-voice-enabled` event to internal representation."""
-    user_event = UserVoiceEnabledEvent(
-        internal_user_id=_get_nested(event, ["data", "attributes", "user", "internal-user-id"], ""),
-        external_user_id=_get_nested(event, ["data", "attributes", "user", "external-user-id"], ""),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        has_joined_voice=_get_nested(event, ["data", "attributes", "user", "sharing-mic"], True),
-        is_listening_only=_get_nested(
-            event, ["data", "attributes", "user", "listening-only"], True
-        ),
-        event_name=event_type,
-    )
+    Returns
+    -------
+    str
+        The internal meeting id of the event or None if it has none.
+    """
+    if isinstance(webhook_event, dict):
+        # An event waiting to be mapped by the writer.
+        try:
+            return _get_nested(webhook_event, MEETING + ("internal-meeting-id",), None) or None
+        except TypeError:
+            return None
 
-    webhook_event = WebhookEvent(event_type, user_event, server_url)
+    return getattr(webhook_event.event, "internal_meeting_id", None) or None
 
-    return webhook_event
 
+def compile_mapper(record, fields):
+    """Compile the mapper of a webhook event into an internal event.
 
-def _map_user_event(event, event_type, server_url):
-    """Map `user-*` event to internal representation."""
-    user_event = UserEvent(
-        internal_user_id=_get_nested(event, ["data", "attributes", "user", "internal-user-id"], ""),
-        external_user_id=_get_nested(event, ["data", "attributes", "user", "external-user-id"], ""),
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        event_name=event_type,
-    )
+    The paths of `fields` are merged into a tree, so the mapper looks up each
+    key shared by several fields only once per event.
 
-    webhook_event = WebhookEvent(event_type, user_event, server_url)
+    Parameters
+    ----------
+    record : type
+        Subclass of EventRecord of the internal event. Values are filled in
+        the order of its `_fields` and the event is built with `_make`.
+    fields : iterable of tuple
+        Fields of the internal event as (name, path, default).
 
-    return webhook_event
+    Returns
+    -------
+    callable
+        Function mapping (event, event_type, server_url) to an
+        event_mapper.WebhookEvent.
+    """
+    indexes = {name: index for index, name in enumerate(record._fields)}
+    type_indexes = []
+    paths = []
 
+    for name, path, default in fields:
+        if path is EVENT_TYPE:
+            type_indexes.append(indexes[name])
+        else:
+            paths.append((indexes[name], path, default))
 
-def _map_rap_process_event(event, event_type, server_url):
-    """Map `rap[-post]-process-*` event to internal representation."""
-    rap_event = RapProcessEvent(
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        record_id=_get_nested(event, ["data", "attributes", "record-id"], ""),
-        workflow=_get_nested(event, ["data", "attributes", "workflow"], {}),
-        current_step=event_type,
-    )
+    missing = set(indexes.values()) - set(type_indexes) - {index for index, _, _ in paths}
+    if missing:
+        raise ValueError(f"Fields of {record.__name__} without a path: {sorted(missing)}")
 
-    webhook_event = WebhookEvent(event_type, rap_event, server_url)
+    extract = _compile_paths(paths)
+    size = len(record._fields)
+    make = record._make
 
-    return webhook_event
+    def mapper(event, event_type, server_url):
+        values = [None] * size
+        extract(event, values)
 
+        for index in type_indexes:
+            values[index] = event_type
 
-def _map_rap_publish_event(event, event_type, server_url):
-    """Map `rap[-post]-publish-*` event to internal representation
-    (except for started)."""
-    rap_event = RapPublishEvent(
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        record_id=_get_nested(event, ["data", "attributes", "record-id"], ""),
-        workflow=_get_nested(event, ["data", "attributes", "workflow"], {}),
-        current_step=event_type,
-    )
+        return WebhookEvent(event_type, make(values), server_url)
 
-    webhook_event = WebhookEvent(event_type, rap_event, server_url)
-
-    return webhook_event
-
-
-def _map_rap_publish_ended_event(event, event_type, server_url):
-    """Map `rap-publish-ended` event to internal representation."""
-    rap_event = RapPublishEndedEvent(
-        name=_get_nested(event, ["data", "attributes", "recording", "name"], ""),
-        is_breakout=_get_nested(event, ["data", "attributes", "recording", "isBreakout"], False),
-        start_time=_get_nested(event, ["data", "attributes", "recording", "start-time"], 0),
-        end_time=_get_nested(event, ["data", "attributes", "recording", "end-time"], 0),
-        size=_get_nested(event, ["data", "attributes", "recording", "size"], ""),
-        raw_size=_get_nested(event, ["data", "attributes", "recording", "raw-size"], 0),
-        meta_data=_get_nested(event, ["data", "attributes", "recording", "metadata"], {}),
-        playback=_get_nested(event, ["data", "attributes", "recording", "playback"], ""),
-        download=_get_nested(event, ["data", "attributes", "recording", "download"], ""),
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        record_id=_get_nested(event, ["data", "attributes", "record-id"], ""),
-        workflow=_get_nested(event, ["data", "attributes", "workflow"], {}),
-        current_step=event_type,
-    )
+    return mapper
 
-    webhook_event = WebhookEvent(event_type, rap_event, server_url)
 
-    return webhook_event
+def _compile_paths(paths):
+    """Compile (index, path, default) tuples into a function filling a list of values.
 
+    Keys are looked up as `_get_nested` does, so a missing key of a path
+    yields the default of each field below it.
+    """
+    leaves = []
+    branches = collections.defaultdict(list)
 
-def _map_rap_archive_event(event, event_type, server_url):
-    """Map `rap-archive-*` event to internal representation."""
-    rap_event = RapArchiveEvent(
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        record_id=_get_nested(event, ["data", "attributes", "record-id"], ""),
-        recorded=_get_nested(event, ["data", "attributes", "recorded"], True),
-        current_step=event_type,
-    )
+    for index, path, default in paths:
+        if len(path) == 1:
+            leaves.append((index, path[0], default, isinstance(default, (dict, list))))
+        else:
+            branches[path[0]].append((index, path[1:], default))
 
-    webhook_event = WebhookEvent(event_type, rap_event, server_url)
+    branches = [
+        (key, _compile_paths(below), _compile_defaults(below)) for key, below in branches.items()
+    ]
 
-    return webhook_event
+    def extract(d, values):
+        for index, key, default, mutable in leaves:
+            if key in d:
+                values[index] = d[key]
+            else:
+                values[index] = default.copy() if mutable else default
 
+        for key, extract_below, fill_defaults in branches:
+            if key in d:
+                extract_below(d[key], values)
+            else:
+                fill_defaults(values)
 
-def _map_transfer_event(event, event_type, server_url):
-    """Map `meeting-transfer-*` event to internal representation."""
-    transfer_event = MeetingTransferEvent(
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        event_name=event_type,
-    )
+    return extract
 
-    webhook_event = WebhookEvent(event_type, transfer_event, server_url)
 
-    return webhook_event
+def _compile_defaults(paths):
+    """Compile (index, path, default) tuples into a function filling their defaults."""
+    defaults = [(index, default, isinstance(default, (dict, list))) for index, _, default in paths]
 
+    def fill_defaults(values):
+        for index, default, mutable in defaults:
+            values[index] = default.copy() if mutable else default
 
-def _map_rap_event(event, event_type, server_url):
-    """Map `rap-*` event to internal representation (except for process and publish)."""
-    rap_event = RapEvent(
-        external_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "external-meeting-id"], ""
-        ),
-        internal_meeting_id=_get_nested(
-            event, ["data", "attributes", "meeting", "internal-meeting-id"], ""
-        ),
-        record_id=_get_nested(event, ["data", "attributes", "record-id"], ""),
-        current_step=event_type,
-    )
+    return fill_defaults
 
-    webhook_event = WebhookEvent(event_type, rap_event, server_url)
 
-    return webhook_event
+"""Mapper of each type of webhook event, compiled from `EVENT_SPECS`."""
+EVENT_MAPPERS = {
+    event_type: compile_mapper(record, fields)
+    for event_type, (record, fields) in EVENT_SPECS.items()
+}
 
 
 def _get_nested(d, keys, default):
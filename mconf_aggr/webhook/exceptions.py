@@ -31,5 +31,26 @@ class WebhookDatabaseError(WebhookError):
     pass
 
 
+class WebhookConflictError(WebhookDatabaseError):
+    """Raised if data kept changing while being updated. Retrying may succeed."""
+
+    pass
+
+
+class SchemaMigrationError(WebhookError):
+    """Raised if the migrations of the schema are invalid or fail to apply."""
+
+    pass
+
+
 class DatabaseNotReadyError(WebhookError):
     """Raised if the database does not seem ready for connections."""
+
+
+class ServiceUnavailableError(WebhookError):
+    """Raised if events can not be accepted for now, e.g. because their channel is full.
+
+    The sender should retry later.
+    """
+
+    pass
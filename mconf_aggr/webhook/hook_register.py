@@ -52,7 +52,7 @@ class WebhookRegister:
         self._success_servers = []  # List of servers registered successfully.
         self._failed_servers = []  # List of servers that failed to register.
 
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
         if servers:
             # Use the servers passed as argument.
@@ -142,7 +142,7 @@ class WebhookServer:
         self._server = server
         self._secret = secret
 
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
     def create_hook(self, callback_url, get_raw=False, hook_id=None):
         """Register a webhook callback.
@@ -0,0 +1,125 @@
+"""This module provides the metrics of webhook events and of the database.
+
+Events are counted by type and outcome, and the seconds taken by each stage
+of their handling are observed by type:
+
+* `request`: a whole webhook request, with all its events.
+* `decode`: decoding the JSON of a request, with all its events.
+* `map`: mapping an event, by the listener or by the writer with deferred
+  mapping.
+* `validate`: validating the envelope of an event with deferred mapping.
+* `enqueue`: publishing an event to its channel.
+* `handle`: persisting an event in the database.
+
+Stages of a whole request have an empty event type. Database queries are
+counted by the handler running them, named by `current_handler`.
+
+The database cost of handling each event, its statements, the rows they
+returned or changed and the seconds they took, is measured by
+`measure_queries` and observed by event type.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+from mconf_aggr.metrics import metrics
+
+"""Name of the database handler running in the current thread or greenlet."""
+current_handler = contextvars.ContextVar("current_handler", default="none")
+
+"""Cost of the event being handled in the current thread or greenlet, if measured."""
+current_cost = contextvars.ContextVar("current_cost", default=None)
+
+stage_seconds = metrics.histogram(
+    "mconf_webhook_stage_seconds",
+    "Seconds taken by a stage of the handling of webhook events.",
+    ("stage", "event_type"),
+)
+events_total = metrics.counter(
+    "mconf_webhook_events_total",
+    "Webhook events by type and outcome.",
+    ("event_type", "outcome"),
+)
+db_sessions_total = metrics.counter(
+    "mconf_webhook_db_sessions_total",
+    "Database sessions opened.",
+)
+db_queries_total = metrics.counter(
+    "mconf_webhook_db_queries_total",
+    "Database queries run, by the handler running them.",
+    ("handler",),
+)
+
+event_statements = metrics.histogram(
+    "mconf_webhook_event_db_statements",
+    "Database statements run to handle a webhook event, by event type.",
+    ("event_type",),
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50),
+)
+event_rows = metrics.histogram(
+    "mconf_webhook_event_db_rows",
+    "Database rows returned or changed to handle a webhook event, by event type.",
+    ("event_type",),
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000),
+)
+event_db_seconds = metrics.histogram(
+    "mconf_webhook_event_db_seconds",
+    "Seconds taken by the database statements of a webhook event, by event type.",
+    ("event_type",),
+)
+
+
+class QueryCost:
+    """Database statements, rows and seconds spent on an event."""
+
+    __slots__ = ("statements", "rows", "seconds", "_started")
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self._started = None
+
+    def start(self):
+        """Mark the start of a statement."""
+        self._started = time.perf_counter()
+
+    def end(self, rowcount):
+        """Mark the end of the statement started last.
+
+        Parameters
+        ----------
+        rowcount : int
+            Rows the statement returned or changed, or -1 if unknown.
+        """
+        if self._started is not None:
+            self.seconds += time.perf_counter() - self._started
+            self._started = None
+
+        self.statements += 1
+        self.rows += max(rowcount, 0)
+
+    def __repr__(self):
+        return "{!s}(statements={!r}, rows={!r}, seconds={!r})".format(
+            self.__class__.__name__, self.statements, self.rows, self.seconds
+        )
+
+
+@contextmanager
+def measure_queries(event_type):
+    """Measure the database cost of handling an event.
+
+    Statements run by the current thread or greenlet within the block are
+    added to the yielded `QueryCost`, which is observed by `event_type` when
+    the block exits.
+    """
+    cost = QueryCost()
+    token = current_cost.set(cost)
+
+    try:
+        yield cost
+    finally:
+        current_cost.reset(token)
+        event_statements.labels(event_type).observe(cost.statements)
+        event_rows.labels(event_type).observe(cost.rows)
+        event_db_seconds.labels(event_type).observe(cost.seconds)
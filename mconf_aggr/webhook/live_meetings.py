@@ -0,0 +1,480 @@
+"""This module provides a process-local cache of running meetings.
+
+Users events only change the `meetings` row of a running meeting: its attendees
+and the counters derived from them. Instead of querying that row for every
+event, handlers work on a `LiveMeeting` kept in memory and write it back with a
+single UPDATE.
+
+The cache is write-through and never trusted blindly: every write is
+conditioned on the `updated_at` value the cached copy was loaded with. If the
+row was changed by anyone else (another process, a rolled back transaction,
+another handler), the write matches no row and the meeting is reloaded from the
+database.
+
+Attendee counters are kept incrementally: adding, removing or changing an
+attendee adjusts each counter by the difference it makes, instead of counting
+all attendees again. A full recount runs when a meeting is loaded and every
+`recount_interval` writes, correcting (and logging) any drift.
+"""
+import collections
+import datetime
+import threading
+
+from mconf_aggr.logger import get_logger
+from mconf_aggr.webhook.attendee_store import (
+    ADDED,
+    COUNTERS,
+    REMOVED,
+    UPDATED,
+    JsonAttendeeStore,
+    attendee_counters,
+)
+from mconf_aggr.webhook.database_model import Meetings
+
+
+def count_attendees(attendees):
+    """Count all `attendees`, returning a dict with the value of each of the `COUNTERS`."""
+    totals = [0] * len(COUNTERS)
+
+    for attendee in attendees:
+        for i, value in enumerate(attendee_counters(attendee)):
+            totals[i] += value
+
+    return dict(zip(COUNTERS, totals))
+
+
+class Attendees:
+    """Attendees of a meeting indexed by internal user id.
+
+    Attendees are kept in a dict, in the order they joined, so finding one
+    does not depend on the size of the meeting. It is stored in the database
+    as the list of attendees readers of `meetings.attendees` expect.
+
+    Changes made since the attendees were last written are kept in `changes`,
+    so an attendee store can write only what changed. Positions in the stored
+    list are only computed for the stores that need them.
+    """
+
+    def __init__(self, attendees=None):
+        """Constructor of the Attendees.
+
+        Parameters
+        ----------
+        attendees : list
+            Attendee dicts as stored in `meetings.attendees`. If a user appears
+            more than once, only the first one is kept.
+        """
+        self._attendees = {}
+        # Internal user id -> position, built when first needed after a removal.
+        self._positions = None
+        self.changes = []
+        # Whether users appearing more than once were dropped, in which case
+        # positions do not match the list stored until it is written again.
+        self.deduplicated = False
+
+        for attendee in attendees or []:
+            internal_user_id = attendee["internal_user_id"]
+
+            if internal_user_id in self._attendees:
+                self.deduplicated = True
+            else:
+                self._attendees[internal_user_id] = attendee
+
+    def get(self, internal_user_id):
+        """Get an attendee or None if there is no such user."""
+        return self._attendees.get(internal_user_id)
+
+    def add(self, attendee):
+        """Add an attendee, returning False if the user was already there."""
+        internal_user_id = attendee["internal_user_id"]
+
+        if internal_user_id in self._attendees:
+            return False
+
+        self._attendees[internal_user_id] = attendee
+        self.changes.append((ADDED, internal_user_id))
+
+        if self._positions is not None:
+            self._positions[internal_user_id] = len(self._attendees) - 1
+
+        return True
+
+    def pop(self, internal_user_id):
+        """Remove an attendee, returning it or None if there is no such user."""
+        if internal_user_id not in self._attendees:
+            return None
+
+        self.changes.append((REMOVED, internal_user_id))
+        # Attendees after it move back by one.
+        self._positions = None
+
+        return self._attendees.pop(internal_user_id)
+
+    def changed(self, internal_user_id):
+        """Record that the attendee with `internal_user_id` was updated in place."""
+        self.changes.append((UPDATED, internal_user_id))
+
+    def index(self, internal_user_id):
+        """Position of an attendee in the list stored in the database.
+
+        Positions are computed again after an attendee is removed, so the
+        first call after a removal takes time proportional to the attendees.
+        """
+        if self._positions is None:
+            self._positions = {key: position for position, key in enumerate(self._attendees)}
+
+        return self._positions[internal_user_id]
+
+    def written(self):
+        """Record that the attendees were written to the database as they are."""
+        self.changes.clear()
+        self.deduplicated = False
+
+    def to_list(self):
+        """Attendees in the list form stored in the database."""
+        return list(self._attendees.values())
+
+    def __contains__(self, internal_user_id):
+        return internal_user_id in self._attendees
+
+    def __iter__(self):
+        return iter(self._attendees.values())
+
+    def __len__(self):
+        return len(self._attendees)
+
+    def __repr__(self):
+        return "{!s}({!r})".format(self.__class__.__name__, self.to_list())
+
+
+class LiveMeeting:
+    """In-memory copy of the `meetings` row of a running meeting.
+
+    Its attributes are named after the columns of `Meetings`, so it can be
+    handled just like a row by the code that updates attendees and counters.
+    """
+
+    """Columns written back to the database on every update."""
+    COLUMNS = (
+        "running",
+        "has_user_joined",
+        "participant_count",
+        "listener_count",
+        "voice_participant_count",
+        "video_count",
+        "moderator_count",
+        "transfer_count",
+        "attendees",
+    )
+
+    def __init__(self, id, meeting_event_id, int_meeting_id, updated_at, **columns):
+        """Constructor of the LiveMeeting.
+
+        Parameters
+        ----------
+        id : int
+            Primary key of the `meetings` row.
+        meeting_event_id : int
+            Primary key of the associated `meetings_events` row.
+        int_meeting_id : str
+            Internal meeting id of the meeting.
+        updated_at : datetime.datetime
+            Value of `updated_at` the row had when it was last read or written.
+        **columns
+            Values of the columns in `COLUMNS`.
+        """
+        self.id = id
+        self.meeting_event_id = meeting_event_id
+        self.int_meeting_id = int_meeting_id
+        self.updated_at = updated_at
+
+        for column in self.COLUMNS:
+            setattr(self, column, columns.get(column))
+
+        self.attendees = Attendees(self.attendees)
+        self.updates = 0
+        # Whether the counters were recounted since the meeting was last written.
+        self.recounted = False
+
+    @classmethod
+    def columns(cls):
+        """Columns of `Meetings` needed to build a live meeting.
+
+        Loading these columns instead of `Meetings` entities bypasses the
+        session identity map, so a reload always reflects the database.
+        """
+        return [
+            Meetings.id,
+            Meetings.meeting_event_id,
+            Meetings.int_meeting_id,
+            Meetings.updated_at,
+        ] + [getattr(Meetings, column) for column in cls.COLUMNS]
+
+    @classmethod
+    def from_row(cls, meetings_table):
+        """Build a live meeting from a `Meetings` row."""
+        return cls(
+            id=meetings_table.id,
+            meeting_event_id=meetings_table.meeting_event_id,
+            int_meeting_id=meetings_table.int_meeting_id,
+            updated_at=meetings_table.updated_at,
+            **{column: getattr(meetings_table, column) for column in cls.COLUMNS},
+        )
+
+    def add_attendee(self, attendee):
+        """Add an attendee and count it in.
+
+        Returns
+        -------
+        bool
+            False if an attendee with the same internal user id was already there.
+        """
+        if not self.attendees.add(attendee):
+            return False
+
+        self._count(attendee_counters(attendee))
+
+        return True
+
+    def remove_attendee(self, internal_user_id):
+        """Remove the attendee with `internal_user_id` and count it out."""
+        attendee = self.attendees.pop(internal_user_id)
+
+        if attendee is not None:
+            self._count(attendee_counters(attendee), -1)
+
+    def update_attendee(self, internal_user_id, update):
+        """Apply `update` to the attendee with `internal_user_id`, counting what it changes.
+
+        Parameters
+        ----------
+        internal_user_id : str
+            Internal user id of the attendee.
+        update : callable
+            Function that receives the attendee dict and updates it in place.
+        """
+        attendee = self.attendees.get(internal_user_id)
+
+        if attendee is not None:
+            before = attendee_counters(attendee)
+            update(attendee)
+            self.attendees.changed(internal_user_id)
+            self._count(before, -1)
+            self._count(attendee_counters(attendee))
+
+    def recount(self):
+        """Count all attendees again, correcting the counters if they drifted.
+
+        Returns
+        -------
+        dict
+            Drift found for each counter, empty if all counters were right.
+        """
+        drift = {}
+
+        for counter, value in count_attendees(self.attendees).items():
+            if getattr(self, counter) != value:
+                drift[counter] = (getattr(self, counter), value)
+                setattr(self, counter, value)
+
+        self.updates = 0
+        self.recounted = True
+
+        return drift
+
+    def _count(self, values, sign=1):
+        for counter, value in zip(COUNTERS, values):
+            if value:
+                setattr(self, counter, getattr(self, counter) + sign * value)
+
+    def values(self):
+        """Values of the columns to be written back to the database.
+
+        Attendees are left out: how they are written depends on the attendee store.
+        """
+        return {column: getattr(self, column) for column in self.COLUMNS if column != "attendees"}
+
+    def __repr__(self):
+        return "{!s}(id={!r}, int_meeting_id={!r}, attendees={!r})".format(
+            self.__class__.__name__, self.id, self.int_meeting_id, len(self.attendees)
+        )
+
+
+class LiveMeetingCache:
+    """Cache of running meetings keyed by internal meeting id.
+
+    It holds at most `maxsize` meetings, evicting the least recently used one
+    when full. A `maxsize` of zero disables caching: meetings are loaded from
+    the database on every access, but still written with a single UPDATE.
+
+    Counters of a meeting are recounted when it is loaded and, before being
+    written, after every `recount_interval` updates. A `recount_interval` of
+    zero disables the periodic recount.
+
+    Attendees are written by `attendee_store`.
+    """
+
+    def __init__(self, maxsize=10000, recount_interval=100, attendee_store=None, logger=None):
+        """Constructor of the LiveMeetingCache.
+
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of meetings kept in memory.
+        recount_interval : int
+            Number of updates of a meeting between full recounts of its counters.
+        attendee_store : attendee_store.AttendeeStore
+            If not supplied, it will write the whole list of attendees.
+        logger : loguru.Logger
+            If not supplied, it will instantiate a new logger.
+        """
+        self.maxsize = maxsize
+        self.recount_interval = recount_interval
+        self.attendee_store = attendee_store or JsonAttendeeStore()
+        self._meetings = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.logger = logger or get_logger(__name__)
+
+    def get(self, int_meeting_id):
+        """Get a cached meeting or None if it is not cached."""
+        with self._lock:
+            live_meeting = self._meetings.get(int_meeting_id)
+            if live_meeting is not None:
+                self._meetings.move_to_end(int_meeting_id)
+
+        return live_meeting
+
+    def put(self, live_meeting):
+        """Cache a meeting, evicting the least recently used one if full."""
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._meetings[live_meeting.int_meeting_id] = live_meeting
+            self._meetings.move_to_end(live_meeting.int_meeting_id)
+
+            if len(self._meetings) > self.maxsize:
+                self._meetings.popitem(last=False)
+
+    def evict(self, int_meeting_id):
+        """Remove a meeting from the cache, if cached."""
+        with self._lock:
+            self._meetings.pop(int_meeting_id, None)
+
+    def clear(self):
+        """Remove all meetings from the cache."""
+        with self._lock:
+            self._meetings.clear()
+
+    def fetch(self, session, int_meeting_id):
+        """Get a meeting from the cache, loading it from the database on a miss.
+
+        Parameters
+        ----------
+        session : sqlalchemy.Session
+            Session used to load the meeting if it is not cached.
+        int_meeting_id : str
+            Internal meeting id of the meeting.
+
+        Returns
+        -------
+        LiveMeeting
+            The meeting or None if there is no `meetings` row for it.
+        """
+        live_meeting = self.get(int_meeting_id)
+
+        if live_meeting is None:
+            meetings_table = (
+                session.query(*LiveMeeting.columns())
+                .filter(Meetings.int_meeting_id == int_meeting_id)
+                .first()
+            )
+
+            if meetings_table is None:
+                return None
+
+            live_meeting = LiveMeeting.from_row(meetings_table)
+
+            attendees = self.attendee_store.load(session, live_meeting)
+            if attendees is not None:
+                live_meeting.attendees = Attendees(attendees)
+
+            self.recount(live_meeting)
+            self.put(live_meeting)
+
+        return live_meeting
+
+    def write(self, session, live_meeting):
+        """Write a meeting back to the database with a single UPDATE.
+
+        The UPDATE only matches the row if it was not changed since the
+        meeting was cached. Otherwise, the meeting is evicted so the next
+        access reloads it.
+
+        Parameters
+        ----------
+        session : sqlalchemy.Session
+            Session used to write the meeting.
+        live_meeting : LiveMeeting
+            The meeting to be written.
+
+        Returns
+        -------
+        bool
+            True if the row was updated. False if the cached copy was stale.
+        """
+        live_meeting.updates += 1
+
+        if self.recount_interval > 0 and live_meeting.updates >= self.recount_interval:
+            self.recount(live_meeting)
+
+        written = self.attendee_store.write(session, live_meeting)
+
+        updated_at = datetime.datetime.now()
+        values = live_meeting.values()
+        values.update(self.attendee_store.values(live_meeting))
+        values.update(written)
+        values["updated_at"] = updated_at
+
+        updated = (
+            session.query(Meetings)
+            .filter(Meetings.id == live_meeting.id, Meetings.updated_at == live_meeting.updated_at)
+            .update(values, synchronize_session=False)
+        )
+
+        if not updated:
+            self.logger.info(f"Cached meeting '{live_meeting.int_meeting_id}' is stale.")
+            self.evict(live_meeting.int_meeting_id)
+
+            return False
+
+        live_meeting.updated_at = updated_at
+        live_meeting.attendees.written()
+        live_meeting.recounted = False
+
+        return True
+
+    def recount(self, live_meeting):
+        """Recount the counters of a meeting, logging any drift found.
+
+        Returns
+        -------
+        bool
+            True if the counters were right.
+        """
+        drift = live_meeting.recount()
+
+        if drift:
+            self.logger.warning(
+                f"Counters of meeting '{live_meeting.int_meeting_id}' drifted "
+                f"(counter: (kept, counted)): {drift}."
+            )
+
+        return not drift
+
+    def __len__(self):
+        return len(self._meetings)
+
+
+"""Cache shared by all handlers of the process."""
+live_meetings = LiveMeetingCache()
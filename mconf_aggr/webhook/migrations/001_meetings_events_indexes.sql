@@ -0,0 +1,25 @@
+-- Index the columns meetings_events is looked up by.
+--
+-- Meetings are listed by shared secret and by external meeting id, and
+-- breakout rooms by the internal meeting id of their parent. Only breakout
+-- rooms have a parent, so its index leaves out the other meetings.
+--
+-- Indexes are built concurrently, without blocking writes. An interrupted
+-- build leaves an invalid index behind, which must be dropped before running
+-- the migration again.
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS meetings_events_shared_secret_guid_idx
+    ON meetings_events (shared_secret_guid);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS meetings_events_external_meeting_id_idx
+    ON meetings_events (external_meeting_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS meetings_events_parent_meeting_id_idx
+    ON meetings_events (parent_meeting_id)
+    WHERE parent_meeting_id IS NOT NULL;
+
+-- To revert:
+-- DROP INDEX CONCURRENTLY IF EXISTS meetings_events_shared_secret_guid_idx;
+-- DROP INDEX CONCURRENTLY IF EXISTS meetings_events_external_meeting_id_idx;
+-- DROP INDEX CONCURRENTLY IF EXISTS meetings_events_parent_meeting_id_idx;
@@ -0,0 +1,19 @@
+-- Index the meeting ids of running meetings.
+--
+-- Every user event loads its meeting by internal meeting id, and
+-- meeting-created checks that no running meeting has its external meeting id.
+--
+-- Indexes are built concurrently, without blocking writes. An interrupted
+-- build leaves an invalid index behind, which must be dropped before running
+-- the migration again.
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS meetings_int_meeting_id_idx
+    ON meetings (int_meeting_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS meetings_ext_meeting_id_idx
+    ON meetings (ext_meeting_id);
+
+-- To revert:
+-- DROP INDEX CONCURRENTLY IF EXISTS meetings_int_meeting_id_idx;
+-- DROP INDEX CONCURRENTLY IF EXISTS meetings_ext_meeting_id_idx;
@@ -0,0 +1,22 @@
+-- Index the users of each meeting.
+--
+-- user-joined and the recording handlers count the users of a meeting, and
+-- meeting-ended sets the leave time of those still in it. The users still in
+-- a meeting get their own partial index, which only holds the users of
+-- running meetings and so stays small as users_events grows.
+--
+-- Indexes are built concurrently, without blocking writes. An interrupted
+-- build leaves an invalid index behind, which must be dropped before running
+-- the migration again.
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_events_meeting_event_id_idx
+    ON users_events (meeting_event_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_events_meeting_event_id_open_idx
+    ON users_events (meeting_event_id)
+    WHERE leave_time IS NULL;
+
+-- To revert:
+-- DROP INDEX CONCURRENTLY IF EXISTS users_events_meeting_event_id_idx;
+-- DROP INDEX CONCURRENTLY IF EXISTS users_events_meeting_event_id_open_idx;
@@ -0,0 +1,15 @@
+-- Index the names servers and shared secrets are looked up by.
+--
+-- Handlers read them from the reference data cache and only query the
+-- tables when it is disabled or a row is not cached yet.
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS servers_name_idx
+    ON servers (name);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shared_secrets_name_idx
+    ON shared_secrets (name);
+
+-- To revert:
+-- DROP INDEX CONCURRENTLY IF EXISTS servers_name_idx;
+-- DROP INDEX CONCURRENTLY IF EXISTS shared_secrets_name_idx;
@@ -0,0 +1,17 @@
+-- Store meetings.attendees as jsonb.
+--
+-- Required by MCONF_WEBHOOK_ATTENDEES_STORE=jsonb, which writes attendee
+-- changes as partial updates of the array (removals use
+-- jsonb_path_query_array, available from PostgreSQL 12). The default store
+-- keeps working after this migration, and readers get the same array back.
+--
+-- The column type change rewrites the table under an exclusive lock. The
+-- table only holds running meetings, so it is expected to be short.
+--
+-- Applied with `upgrade --include 5`.
+-- migrate: opt-in
+
+ALTER TABLE meetings ALTER COLUMN attendees TYPE jsonb USING attendees::jsonb;
+
+-- To revert, then delete version 5 from schema_migrations:
+-- ALTER TABLE meetings ALTER COLUMN attendees TYPE json USING attendees::json;
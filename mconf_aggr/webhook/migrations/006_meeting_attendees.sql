@@ -0,0 +1,99 @@
+-- Keep attendees of running meetings in their own table.
+--
+-- Required by MCONF_WEBHOOK_ATTENDEES_STORE=table. It writes one row per
+-- attendee to meeting_attendees instead of updating meetings.attendees, and
+-- lets Postgres count them into the counters of meetings.
+--
+-- Readers expecting meetings.attendees as a list read meetings_attendees_view,
+-- which has the columns of meetings with attendees built from the table.
+-- Existing attendees are copied to the table. Going back to the json or
+-- jsonb stores leaves meetings.attendees as it was when this store was
+-- enabled, so only switch back between meetings.
+--
+-- Applied with `upgrade --include 6`.
+-- migrate: opt-in
+
+CREATE TABLE IF NOT EXISTS meeting_attendees (
+    meeting_id integer NOT NULL REFERENCES meetings (id) ON DELETE CASCADE,
+    internal_user_id varchar NOT NULL,
+    position bigserial NOT NULL,
+    external_user_id varchar,
+    full_name varchar,
+    role varchar,
+    is_presenter boolean,
+    is_listening_only boolean,
+    has_joined_voice boolean,
+    has_video boolean,
+    user_data json,
+    guest boolean,
+    PRIMARY KEY (meeting_id, internal_user_id)
+);
+
+INSERT INTO meeting_attendees (
+    meeting_id, internal_user_id, external_user_id, full_name, role, is_presenter,
+    is_listening_only, has_joined_voice, has_video, user_data, guest
+)
+SELECT
+    m.id,
+    a.attendee ->> 'internal_user_id',
+    a.attendee ->> 'external_user_id',
+    a.attendee ->> 'full_name',
+    a.attendee ->> 'role',
+    (a.attendee ->> 'is_presenter')::boolean,
+    (a.attendee ->> 'is_listening_only')::boolean,
+    (a.attendee ->> 'has_joined_voice')::boolean,
+    (a.attendee ->> 'has_video')::boolean,
+    (a.attendee -> 'user_data')::json,
+    (a.attendee ->> 'guest')::boolean
+FROM meetings m
+CROSS JOIN LATERAL jsonb_array_elements(COALESCE(m.attendees::jsonb, '[]'::jsonb))
+    WITH ORDINALITY AS a (attendee, ordinality)
+ORDER BY m.id, a.ordinality
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE VIEW meetings_attendees_view AS
+SELECT
+    m.id,
+    m.meeting_event_id,
+    m.created_at,
+    m.updated_at,
+    m.running,
+    m.has_user_joined,
+    m.participant_count,
+    m.listener_count,
+    m.voice_participant_count,
+    m.video_count,
+    m.moderator_count,
+    COALESCE(
+        (
+            SELECT json_agg(
+                json_build_object(
+                    'external_user_id', a.external_user_id,
+                    'internal_user_id', a.internal_user_id,
+                    'full_name', a.full_name,
+                    'role', a.role,
+                    'is_presenter', a.is_presenter,
+                    'is_listening_only', a.is_listening_only,
+                    'has_joined_voice', a.has_joined_voice,
+                    'has_video', a.has_video,
+                    'user_data', a.user_data,
+                    'guest', a.guest
+                )
+                ORDER BY a.position
+            )
+            FROM meeting_attendees a
+            WHERE a.meeting_id = m.id
+        ),
+        '[]'::json
+    ) AS attendees,
+    m.m_shared_secret_guid,
+    m.m_institution_guid,
+    m.ext_meeting_id,
+    m.int_meeting_id,
+    m.transfer,
+    m.transfer_count
+FROM meetings m;
+
+-- To revert, then delete version 6 from schema_migrations:
+-- DROP VIEW meetings_attendees_view;
+-- DROP TABLE meeting_attendees;
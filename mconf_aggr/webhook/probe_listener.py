@@ -6,6 +6,7 @@ import falcon
 import sqlalchemy
 
 from mconf_aggr.logger import get_logger
+from mconf_aggr.metrics import CONTENT_TYPE, metrics
 from mconf_aggr.webhook.database import DatabaseConnector
 from mconf_aggr.webhook.exceptions import DatabaseNotReadyError
 
@@ -32,7 +33,7 @@ class ProbeListener:
         logger : loguru.Logger
             If not supplied, it will instantiate a new logger.
         """
-        self.logger = logger or get_logger()
+        self.logger = logger or get_logger(__name__)
 
     def on_get(self, req, resp):
         """Handle GET requests.
@@ -104,6 +105,32 @@ class ReadinessProbeListener(ProbeListener):
         return True
 
 
+class MetricsListener:
+    """Listener for the endpoint /metrics, in the Prometheus text format."""
+
+    def __init__(self, registry=None):
+        """Constructor of MetricsListener.
+
+        Parameters
+        ----------
+        registry : metrics.Registry
+            If not supplied, the registry shared by the process is used.
+        """
+        self.registry = registry or metrics
+
+    def on_get(self, req, resp):
+        """Handle GET requests.
+
+        Parameters
+        ----------
+        req : falcon.Request
+        resp : falcon.Response
+        """
+        resp.content_type = CONTENT_TYPE
+        resp.text = self.registry.render()
+        resp.status = falcon.HTTP_200
+
+
 def _ping_database():
     with session_scope() as session:
         try:
@@ -0,0 +1,130 @@
+"""This module provides the reconciliation of counters kept by the webhook.
+
+The number of unique users of a meeting, `meetings_events.unique_users`, is
+incremented by each user-joined event instead of being counted again from
+`users_events`, and the participants of its recordings are copied from it.
+Counters may drift from the rows they count, e.g. if users are removed by
+hand or events were persisted by an older version, so they are recomputed
+offline with:
+
+    python -m mconf_aggr.webhook.reconcile unique-users [--batch-size N]
+
+Meetings are reconciled in ranges of ids, one transaction each. The meetings
+of a range are locked before they are counted, so users joining meanwhile
+wait for the range and are counted on top of the recomputed values.
+"""
+import argparse
+import sys
+
+from mconf_aggr.logger import get_logger
+
+_LOCK_MEETINGS = """
+SELECT id FROM meetings_events
+WHERE id >= %(first)s AND id < %(last)s
+ORDER BY id
+FOR UPDATE
+"""
+
+_RECOUNT_UNIQUE_USERS = """
+UPDATE meetings_events
+SET unique_users = counts.users
+FROM (
+    SELECT meetings_events.id, count(users_events.id) AS users
+    FROM meetings_events
+    LEFT JOIN users_events ON users_events.meeting_event_id = meetings_events.id
+    WHERE meetings_events.id >= %(first)s AND meetings_events.id < %(last)s
+    GROUP BY meetings_events.id
+) AS counts
+WHERE meetings_events.id = counts.id
+AND meetings_events.unique_users IS DISTINCT FROM counts.users
+RETURNING meetings_events.id, counts.users
+"""
+
+
+def unique_users(connection, batch_size=1000, logger=None):
+    """Recompute the unique users of the meetings from their users.
+
+    Parameters
+    ----------
+    connection : DB-API connection
+        Connection not in autocommit mode. Each range of meetings is
+        committed on its own.
+    batch_size : int
+        Number of meeting ids reconciled per transaction.
+    logger : loguru.Logger
+        If not supplied, it will instantiate a new logger.
+
+    Returns
+    -------
+    int
+        Number of meetings whose unique users were corrected.
+    """
+    logger = logger or get_logger(__name__)
+    corrected = 0
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT min(id), max(id) FROM meetings_events")
+        first_id, last_id = cursor.fetchone()
+        connection.commit()
+
+        if first_id is None:
+            logger.info("No meetings to reconcile.")
+            return 0
+
+        for first in range(first_id, last_id + 1, batch_size):
+            bounds = {"first": first, "last": first + batch_size}
+
+            try:
+                cursor.execute(_LOCK_MEETINGS, bounds)
+                cursor.execute(_RECOUNT_UNIQUE_USERS, bounds)
+                rows = cursor.fetchall()
+            except Exception:
+                connection.rollback()
+                raise
+
+            connection.commit()
+
+            for meeting_event_id, users in rows:
+                logger.info(
+                    f"Corrected unique users of meeting event {meeting_event_id} to {users}."
+                )
+
+            corrected += len(rows)
+
+    logger.info(f"Corrected the unique users of {corrected} meeting(s).")
+
+    return corrected
+
+
+def main(argv=None):
+    """Command line entry point to reconcile counters."""
+    import psycopg2
+
+    from mconf_aggr.webhook.database import DatabaseConnector
+
+    parser = argparse.ArgumentParser(description="Reconcile the counters of the webhook database.")
+    parser.add_argument(
+        "--database-uri", help="database to reconcile (default: MCONF_WEBHOOK_DATABASE_*)"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    unique_users_parser = subparsers.add_parser(
+        "unique-users", help="recompute the unique users of the meetings"
+    )
+    unique_users_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be positive")
+
+    connection = psycopg2.connect(args.database_uri or DatabaseConnector._build_uri())
+
+    try:
+        unique_users(connection, args.batch_size, logger=get_logger(__name__))
+    finally:
+        connection.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""This module provides a process-local cache of reference data.
+
+Handlers look up servers, shared secrets and institutions while processing
+events. These tables are small and rarely change, so they are loaded in bulk
+into an immutable, versioned `ReferenceData` snapshot that handlers consult
+before querying the database.
+
+The snapshot is replaced as a whole: when a cheap fingerprint of the tables
+changes, all of them are loaded again and a new version is published. Lookups
+never see a partially loaded snapshot and need no lock. A lookup missing from
+the snapshot falls back to the database, so a stale snapshot only costs a
+query.
+"""
+import collections
+import threading
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from mconf_aggr.logger import get_logger
+from mconf_aggr.webhook.database_model import Institutions, Servers, SharedSecrets
+
+"""Columns of each table kept in memory."""
+ServerRecord = collections.namedtuple("ServerRecord", ("id", "guid", "name"))
+SharedSecretRecord = collections.namedtuple(
+    "SharedSecretRecord", ("guid", "name", "institution_guid")
+)
+InstitutionRecord = collections.namedtuple("InstitutionRecord", ("guid", "name"))
+
+
+class ReferenceData:
+    """Immutable snapshot of servers, shared secrets and institutions."""
+
+    def __init__(self, servers=(), shared_secrets=(), institutions=(), version=0, fingerprint=None):
+        """Constructor of the ReferenceData.
+
+        Parameters
+        ----------
+        servers : iterable of ServerRecord
+        shared_secrets : iterable of SharedSecretRecord
+        institutions : iterable of InstitutionRecord
+        version : int
+            Number of the snapshot, increased every time it is loaded.
+        fingerprint : tuple
+            Fingerprint of the tables when the snapshot was loaded.
+        """
+        self.version = version
+        self.fingerprint = fingerprint
+
+        self._servers_by_name = {server.name: server for server in servers}
+        self._secrets_by_guid = {}
+        self._secrets_by_name = {}
+        self._institutions_by_guid = {institution.guid: institution for institution in institutions}
+
+        for secret in shared_secrets:
+            self._secrets_by_guid[secret.guid] = secret
+            # Keep the first secret with a name, as a query would.
+            self._secrets_by_name.setdefault(secret.name, secret)
+
+    def server(self, name):
+        """Get a server by name or None if it is not in the snapshot."""
+        return self._servers_by_name.get(name)
+
+    def shared_secret_by_guid(self, guid):
+        """Get a shared secret by guid or None if it is not in the snapshot."""
+        return self._secrets_by_guid.get(guid)
+
+    def shared_secret_by_name(self, name):
+        """Get a shared secret by name or None if it is not in the snapshot."""
+        return self._secrets_by_name.get(name)
+
+    def institution(self, guid):
+        """Get an institution by guid or None if it is not in the snapshot."""
+        return self._institutions_by_guid.get(guid)
+
+    def __len__(self):
+        return (
+            len(self._servers_by_name)
+            + len(self._secrets_by_guid)
+            + len(self._institutions_by_guid)
+        )
+
+    def __repr__(self):
+        return "{!s}(version={!r}, rows={!r})".format(
+            self.__class__.__name__, self.version, len(self)
+        )
+
+
+class ReferenceDataCache:
+    """Holder of the current `ReferenceData` snapshot.
+
+    Snapshots bigger than `max_rows` are not kept, leaving handlers to query
+    the database, so the memory used is bounded.
+    """
+
+    def __init__(self, max_rows=50000, logger=None):
+        """Constructor of the ReferenceDataCache.
+
+        Parameters
+        ----------
+        max_rows : int
+            Maximum number of rows kept in memory. Zero disables caching.
+        logger : loguru.Logger
+            If not supplied, it will instantiate a new logger.
+        """
+        self.max_rows = max_rows
+        self.logger = logger or get_logger(__name__)
+
+        self.snapshot = ReferenceData()
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def fingerprint(self, session):
+        """Get a fingerprint of the reference tables with a single query.
+
+        It is a digest of the cached columns of each table, so it changes
+        whenever any of them changes.
+        """
+        return tuple(
+            session.execute(
+                select(
+                    _digest(Servers.id, Servers.guid, Servers.name),
+                    _digest(
+                        SharedSecrets.id,
+                        SharedSecrets.guid,
+                        SharedSecrets.name,
+                        SharedSecrets.institution_guid,
+                    ),
+                    _digest(Institutions.id, Institutions.guid, Institutions.name),
+                )
+            ).first()
+        )
+
+    def load(self, session):
+        """Load all reference tables into a new snapshot.
+
+        Returns
+        -------
+        ReferenceData
+            The snapshot in use after loading.
+        """
+        if self.max_rows <= 0:
+            return self.snapshot
+
+        fingerprint = self.fingerprint(session)
+
+        servers = [
+            ServerRecord(*row) for row in session.query(Servers.id, Servers.guid, Servers.name)
+        ]
+        shared_secrets = [
+            SharedSecretRecord(*row)
+            for row in session.query(
+                SharedSecrets.guid, SharedSecrets.name, SharedSecrets.institution_guid
+            ).order_by(SharedSecrets.id)
+        ]
+        institutions = [
+            InstitutionRecord(*row) for row in session.query(Institutions.guid, Institutions.name)
+        ]
+
+        rows = len(servers) + len(shared_secrets) + len(institutions)
+
+        if rows > self.max_rows:
+            self.logger.warning(
+                f"Not caching reference data: {rows} rows exceed the limit of {self.max_rows}."
+            )
+            self.snapshot = ReferenceData(
+                version=self.snapshot.version + 1, fingerprint=fingerprint
+            )
+
+            return self.snapshot
+
+        self.snapshot = ReferenceData(
+            servers,
+            shared_secrets,
+            institutions,
+            version=self.snapshot.version + 1,
+            fingerprint=fingerprint,
+        )
+
+        self.logger.info(f"Loaded reference data: {self.snapshot}.")
+
+        return self.snapshot
+
+    def refresh(self, session):
+        """Load the reference tables again if their fingerprint changed.
+
+        Returns
+        -------
+        bool
+            True if a new snapshot was loaded.
+        """
+        if self.max_rows <= 0 or self.fingerprint(session) == self.snapshot.fingerprint:
+            return False
+
+        self.load(session)
+
+        return True
+
+    def start(self, session_scope, refresh_interval):
+        """Start checking for changes of the reference tables in background.
+
+        Parameters
+        ----------
+        session_scope : callable
+            Context manager providing a session to the database.
+        refresh_interval : float
+            Seconds between checks. Zero or less does not start checking.
+        """
+        if refresh_interval <= 0 or self.max_rows <= 0 or self._refresher is not None:
+            return
+
+        self._stop.clear()
+        self._refresher = threading.Thread(
+            target=self._refresh_forever,
+            args=(session_scope, refresh_interval),
+            name="reference-data-refresh",
+            daemon=True,
+        )
+        self._refresher.start()
+
+    def stop(self):
+        """Stop checking for changes in background."""
+        if self._refresher is None:
+            return
+
+        self._stop.set()
+        self._refresher.join()
+        self._refresher = None
+
+    def _refresh_forever(self, session_scope, refresh_interval):
+        while not self._stop.wait(refresh_interval):
+            try:
+                with session_scope() as session:
+                    self.refresh(session)
+            except Exception as err:
+                self.logger.warning(f"Unable to refresh reference data: {err}")
+
+
+def _digest(id_column, *columns):
+    """Scalar subquery with the md5 of `columns` of all rows of a table."""
+    return select(
+        func.md5(
+            func.string_agg(
+                func.concat_ws(":", id_column, *columns),
+                aggregate_order_by(literal_column("','"), id_column),
+            )
+        )
+    ).scalar_subquery()
+
+
+"""Cache shared by all handlers of the process."""
+reference_data = ReferenceDataCache()
@@ -0,0 +1,305 @@
+"""This module provides the versioned migrations of the webhook schema.
+
+Migrations are the SQL files of the `migrations` directory, named
+`<version>_<name>.sql` and applied in the order of their versions. The
+versions applied to a database are kept in its `schema_migrations` table.
+
+Each migration runs in a transaction of its own, unless it has the line
+`-- migrate: no-transaction`, which is needed by statements such as
+`CREATE INDEX CONCURRENTLY`. Its statements are then run one by one, so
+they should be safe to run again if one of them fails. Statements end with
+a `;` at the end of a line. Migrations must not begin or commit
+transactions themselves.
+
+Migrations with the line `-- migrate: opt-in` are only needed by optional
+features, such as the attendee stores other than json. They are skipped
+unless their version is included, and the versions after them are applied
+as usual. An opt-in migration is applied later by including it.
+
+Migrations are applied and listed with:
+
+    python -m mconf_aggr.webhook.schema upgrade [--target VERSION] [--include VERSION ...]
+    python -m mconf_aggr.webhook.schema status
+
+Only one process applies migrations at a time: the others wait for it.
+"""
+import argparse
+import collections
+import os
+import re
+import sys
+
+from mconf_aggr.logger import get_logger
+from mconf_aggr.webhook.exceptions import SchemaMigrationError
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+MIGRATIONS_TABLE = "schema_migrations"
+NO_TRANSACTION = "-- migrate: no-transaction"
+OPT_IN = "-- migrate: opt-in"
+
+"""Key of the advisory lock held while applying migrations."""
+LOCK_KEY = 0x6D636F6E66616767
+
+"""A migration of the schema."""
+Migration = collections.namedtuple(
+    "Migration",
+    ("version", "name", "path", "transactional", "statements", "opt_in"),
+    defaults=(False,),
+)
+
+_FILE_NAME_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+_CREATE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+    version integer PRIMARY KEY,
+    name varchar NOT NULL,
+    applied_at timestamp NOT NULL DEFAULT now()
+)
+"""
+
+
+def load(directory=MIGRATIONS_DIR):
+    """Load the migrations of a directory.
+
+    Returns
+    -------
+    list of Migration
+        The migrations ordered by version.
+
+    Raises
+    ------
+    SchemaMigrationError
+        If a file is not named as a migration or two migrations have the same
+        version.
+    """
+    migrations = {}
+
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".sql"):
+            continue
+
+        match = _FILE_NAME_RE.match(file_name)
+
+        if not match:
+            raise SchemaMigrationError(f"invalid migration file name '{file_name}'")
+
+        version, name = int(match.group(1)), match.group(2)
+
+        if version in migrations:
+            raise SchemaMigrationError(
+                f"migrations '{migrations[version].name}' and '{name}' have version {version}"
+            )
+
+        path = os.path.join(directory, file_name)
+
+        with open(path, encoding="utf-8") as migration_file:
+            sql = migration_file.read()
+
+        lines = sql.splitlines()
+        transactional = NO_TRANSACTION not in lines
+        opt_in = OPT_IN in lines
+        migrations[version] = Migration(version, name, path, transactional, split(sql), opt_in)
+
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split(sql):
+    """Split SQL into statements, leaving out comment lines.
+
+    Statements end with a `;` at the end of a line.
+    """
+    statements = []
+    lines = []
+
+    for line in sql.splitlines():
+        stripped = line.strip()
+
+        if not stripped or stripped.startswith("--"):
+            continue
+
+        lines.append(line)
+
+        if stripped.endswith(";"):
+            statements.append("\n".join(lines).strip().rstrip(";"))
+            lines = []
+
+    if lines:
+        statements.append("\n".join(lines).strip())
+
+    return statements
+
+
+def applied(connection):
+    """Versions applied to a database.
+
+    Parameters
+    ----------
+    connection : DB-API connection
+        Connection in autocommit mode.
+
+    Returns
+    -------
+    set of int
+        The versions applied.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_CREATE_TABLE)
+        cursor.execute(f"SELECT version FROM {MIGRATIONS_TABLE}")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def status(connection, migrations=None):
+    """Migrations along with whether they are applied.
+
+    Returns
+    -------
+    list of tuple
+        (migration, applied) pairs ordered by version.
+    """
+    migrations = load() if migrations is None else migrations
+    versions = applied(connection)
+
+    return [(migration, migration.version in versions) for migration in migrations]
+
+
+def upgrade(connection, migrations=None, target=None, include=(), logger=None):
+    """Apply the migrations not applied yet.
+
+    Parameters
+    ----------
+    connection : DB-API connection
+        Connection in autocommit mode.
+    migrations : list of Migration
+        Migrations to apply if needed. If not supplied, the migrations of the
+        package are loaded.
+    target : int
+        Last version to apply. If not supplied, all are applied.
+    include : iterable of int
+        Versions of the opt-in migrations to apply. The other opt-in
+        migrations are skipped.
+    logger : loguru.Logger
+        If not supplied, it will instantiate a new logger.
+
+    Returns
+    -------
+    list of Migration
+        The migrations applied.
+
+    Raises
+    ------
+    SchemaMigrationError
+        If a migration fails. The migrations before it stay applied.
+    """
+    logger = logger or get_logger(__name__)
+    migrations = load() if migrations is None else migrations
+    include = set(include)
+    done = []
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+
+        try:
+            versions = applied(connection)
+
+            for migration in migrations:
+                if migration.version in versions:
+                    continue
+
+                if target is not None and migration.version > target:
+                    break
+
+                if migration.opt_in and migration.version not in include:
+                    logger.info(
+                        f"Skipping opt-in migration {migration.version} '{migration.name}'."
+                    )
+                    continue
+
+                logger.info(f"Applying migration {migration.version} '{migration.name}'.")
+                _apply(cursor, migration)
+                done.append(migration)
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+
+    logger.info(f"Applied {len(done)} migration(s).")
+
+    return done
+
+
+def _apply(cursor, migration):
+    try:
+        if migration.transactional:
+            cursor.execute("BEGIN")
+
+        try:
+            for statement in migration.statements:
+                cursor.execute(statement)
+
+            cursor.execute(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name),
+            )
+        except Exception:
+            if migration.transactional:
+                cursor.execute("ROLLBACK")
+            raise
+
+        if migration.transactional:
+            cursor.execute("COMMIT")
+    except Exception as err:
+        raise SchemaMigrationError(
+            f"migration {migration.version} '{migration.name}' failed: {err}"
+        ) from err
+
+
+def main(argv=None):
+    """Command line entry point to migrate the schema."""
+    import psycopg2
+
+    from mconf_aggr.webhook.database import DatabaseConnector
+
+    parser = argparse.ArgumentParser(description="Migrate the schema of the webhook database.")
+    parser.add_argument(
+        "--database-uri", help="database to migrate (default: MCONF_WEBHOOK_DATABASE_*)"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = subparsers.add_parser("upgrade", help="apply the migrations not applied yet")
+    upgrade_parser.add_argument("--target", type=int, help="last version to apply")
+    upgrade_parser.add_argument(
+        "--include",
+        type=int,
+        action="append",
+        default=[],
+        metavar="VERSION",
+        help="opt-in migration to apply (can be repeated)",
+    )
+    subparsers.add_parser("status", help="list the migrations and whether they are applied")
+    args = parser.parse_args(argv)
+
+    logger = get_logger(__name__)
+    connection = psycopg2.connect(args.database_uri or DatabaseConnector._build_uri())
+    connection.autocommit = True
+
+    try:
+        if args.command == "upgrade":
+            try:
+                upgrade(connection, target=args.target, include=args.include, logger=logger)
+            except SchemaMigrationError as err:
+                logger.error(f"Unable to migrate the schema: {err}")
+                return 1
+        else:
+            for migration, is_applied in status(connection):
+                if is_applied:
+                    state = "applied"
+                elif migration.opt_in:
+                    state = "opt-in"
+                else:
+                    state = "pending"
+                print(f"{migration.version:03d} {migration.name}: {state}")
+    finally:
+        connection.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""This module provides a process-local cache of the shared secrets of servers.
+
+Every webhook request is authenticated against the secret of the server that
+sent it. Secrets rarely change, so instead of querying `servers` on every
+request they are kept in memory for `ttl` seconds. Servers not found are kept
+too, for a shorter `negative_ttl`, so requests from unknown hosts do not reach
+the database either. Their names come from the requests, so at most
+`negative_maxsize` of them are kept, the oldest being dropped first.
+
+A background thread may reload the secrets of all servers every
+`refresh_interval` seconds, so known servers never wait for the database.
+`invalidate` drops entries when a secret is known to have changed.
+"""
+import collections
+import threading
+import time
+
+from mconf_aggr.logger import get_logger
+from mconf_aggr.webhook.database_handler import AuthenticationHandler
+from mconf_aggr.webhook.exceptions import DatabaseNotReadyError
+
+
+class SecretCache:
+    """Cache of shared secrets keyed by server name.
+
+    It can be used wherever an `AuthenticationHandler` is expected.
+    """
+
+    def __init__(self, ttl=300, negative_ttl=10, negative_maxsize=10000, handler=None, logger=None):
+        """Constructor of the SecretCache.
+
+        Parameters
+        ----------
+        ttl : float
+            Seconds a secret is kept. Zero disables caching.
+        negative_ttl : float
+            Seconds a server not found is remembered as such.
+        negative_maxsize : int
+            Maximum number of servers not found remembered. Zero or less
+            remembers none.
+        handler : AuthenticationHandler
+            If not supplied, it will instantiate a new AuthenticationHandler.
+        logger : loguru.Logger
+            If not supplied, it will instantiate a new logger.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.negative_maxsize = negative_maxsize
+        self.handler = handler or AuthenticationHandler()
+        self.logger = logger or get_logger(__name__)
+
+        # Server name -> (secret, expiration). Entries are replaced, never
+        # changed, so reading one needs no lock.
+        self._secrets = {}
+        # Server not found -> expiration, in order of expiration.
+        self._unknown = collections.OrderedDict()
+        self._unknown_lock = threading.Lock()
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def secret(self, server):
+        """Get the shared secret of a server.
+
+        Parameters
+        ----------
+        server : str
+            Server for which it should get a secret.
+
+        Returns
+        -------
+        secret : str
+            Secret of the server or None if it is unknown or could not be retrieved.
+        """
+        now = time.monotonic()
+        entry = self._secrets.get(server)
+
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        if entry is None and self._unknown.get(server, 0) > now:
+            return None
+
+        try:
+            secret = self.handler.fetch_secret(server)
+        except DatabaseNotReadyError:
+            # Keep authenticating known servers while the database is unavailable.
+            return entry[0] if entry is not None else None
+
+        self._store(server, secret)
+
+        return secret
+
+    def invalidate(self, server=None):
+        """Drop the cached secret of `server` or, if not supplied, of all servers."""
+        with self._unknown_lock:
+            if server is None:
+                self._secrets = {}
+                self._unknown.clear()
+            else:
+                self._secrets.pop(server, None)
+                self._unknown.pop(server, None)
+
+    def refresh(self):
+        """Reload the secrets of all servers with a single query.
+
+        Servers no longer in the database are dropped. Unknown servers are kept
+        until they expire, and expired ones are dropped.
+
+        Returns
+        -------
+        bool
+            False if the database could not be queried.
+        """
+        try:
+            secrets = self.handler.secrets()
+        except DatabaseNotReadyError:
+            self.logger.warning("Unable to refresh secrets of servers.")
+
+            return False
+
+        now = time.monotonic()
+        expiration = now + self.ttl
+
+        with self._unknown_lock:
+            self._secrets = {server: (secret, expiration) for server, secret in secrets.items()}
+
+            for server in secrets:
+                self._unknown.pop(server, None)
+
+            self._expire_unknown(now)
+
+        self.logger.debug(f"Refreshed secrets of {len(secrets)} server(s).")
+
+        return True
+
+    def start(self, refresh_interval):
+        """Start refreshing the secrets of all servers in background.
+
+        Parameters
+        ----------
+        refresh_interval : float
+            Seconds between refreshes. Zero or less does not start refreshing.
+        """
+        if refresh_interval <= 0 or self.ttl <= 0 or self._refresher is not None:
+            return
+
+        self._stop.clear()
+        self._refresher = threading.Thread(
+            target=self._refresh_forever,
+            args=(refresh_interval,),
+            name="secret-cache-refresh",
+            daemon=True,
+        )
+        self._refresher.start()
+
+    def stop(self):
+        """Stop refreshing secrets in background."""
+        if self._refresher is None:
+            return
+
+        self._stop.set()
+        self._refresher.join()
+        self._refresher = None
+
+    def _refresh_forever(self, refresh_interval):
+        self.refresh()
+
+        while not self._stop.wait(refresh_interval):
+            self.refresh()
+
+    def _store(self, server, secret):
+        if self.ttl <= 0:
+            return
+
+        now = time.monotonic()
+
+        with self._unknown_lock:
+            if secret is not None:
+                self._secrets[server] = (secret, now + self.ttl)
+                self._unknown.pop(server, None)
+
+                return
+
+            self._secrets.pop(server, None)
+            self._expire_unknown(now)
+
+            if self.negative_ttl > 0 and self.negative_maxsize > 0:
+                self._unknown[server] = now + self.negative_ttl
+                self._unknown.move_to_end(server)
+
+                while len(self._unknown) > self.negative_maxsize:
+                    self._unknown.popitem(last=False)
+
+    def _expire_unknown(self, now):
+        while self._unknown and next(iter(self._unknown.values())) <= now:
+            self._unknown.popitem(last=False)
+
+    def __len__(self):
+        return len(self._secrets) + len(self._unknown)
+
+
+"""Cache shared by all requests of the process."""
+secret_cache = SecretCache()
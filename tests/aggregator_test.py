@@ -1,7 +1,8 @@
+import threading
 import unittest
 import unittest.mock as mock
 
-from mconf_aggr.aggregator.aggregator import Aggregator
+from mconf_aggr.aggregator.aggregator import Aggregator, PartitionedChannel
 
 
 class TestAggregator(unittest.TestCase):
@@ -24,6 +25,68 @@ class TestAggregator(unittest.TestCase):
 
         publisher_mock.update_channels.assert_called_with(channels)
 
+    def test_register_partitioned_callback(self):
+        aggregator = Aggregator()
+        callback_mock = mock.Mock()
+
+        aggregator.register_callback(
+            callback_mock, channel="partitioned", partitions=3, partition_key=lambda data: data
+        )
+
+        (subscriber,) = aggregator.channels["partitioned"]
+        self.assertIsInstance(subscriber.channel, PartitionedChannel)
+
+        aggregator.setup()
+
+        self.assertEqual(len(aggregator.threads), 3)
+        self.assertEqual(
+            set(thread.subscriber.channel for thread in aggregator.threads),
+            set(subscriber.channel.partitions),
+        )
+        self.assertTrue(
+            all(thread.subscriber.callback is callback_mock for thread in aggregator.threads)
+        )
+
+    def test_drain(self):
+        aggregator = Aggregator()
+        callback_mock = mock.Mock()
+        aggregator.register_callback(
+            callback_mock, channel="drained", partitions=2, partition_key=lambda data: data
+        )
+        aggregator.setup()
+        aggregator.start()
+        self.addCleanup(aggregator.stop)
+
+        for i in range(20):
+            aggregator.publisher.publish(i, channel="drained")
+
+        self.assertTrue(aggregator.drain(5))
+        self.assertEqual(callback_mock.run.call_count, 20)
+
+    def test_drain_timeout(self):
+        aggregator = Aggregator()
+        release = threading.Event()
+        callback_mock = mock.Mock()
+        callback_mock.run.side_effect = lambda data: release.wait(5)
+        aggregator.register_callback(callback_mock, channel="stuck")
+        aggregator.setup()
+        aggregator.start()
+
+        aggregator.publisher.publish("data", channel="stuck")
+
+        with mock.patch.object(aggregator, "logger") as logger:
+            self.assertFalse(aggregator.drain(0.05, progress_interval=0.01))
+
+        logger.warning.assert_called_once()
+        self.assertTrue(logger.info.called)
+
+        release.set()
+        aggregator.stop()
+
+    def test_register_partitioned_callback_without_key(self):
+        with self.assertRaises(ValueError):
+            Aggregator().register_callback(mock.Mock(), channel="partitioned", partitions=3)
+
     def test_remove_callback(self):
         channel_1 = "channel_1"
         channel_2 = "channel_2"
@@ -0,0 +1,228 @@
+import unittest
+import unittest.mock as mock
+
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql
+
+from mconf_aggr.webhook.attendee_store import (
+    JsonAttendeeStore,
+    JsonbAttendeeStore,
+    TableAttendeeStore,
+    get_attendee_store,
+)
+from mconf_aggr.webhook.database_model import Meetings
+from mconf_aggr.webhook.live_meetings import LiveMeeting
+
+
+def make_attendee(internal_user_id):
+    return {
+        "internal_user_id": internal_user_id,
+        "role": "VIEWER",
+        "is_presenter": False,
+        "is_listening_only": False,
+        "has_joined_voice": False,
+        "has_video": False,
+    }
+
+
+def compile_values(values):
+    statement = update(Meetings).where(Meetings.id == 1).values(**values)
+    compiled = statement.compile(dialect=postgresql.psycopg2.dialect())
+
+    return str(compiled), compiled.params
+
+
+class TestJsonAttendeeStore(unittest.TestCase):
+    def test_writes_whole_list(self):
+        live_meeting = LiveMeeting(1, 2, "mock_i", None, attendees=[make_attendee("u1")])
+
+        values = JsonAttendeeStore().values(live_meeting)
+
+        self.assertEqual(values, {"attendees": [make_attendee("u1")]})
+
+
+class TestJsonbAttendeeStore(unittest.TestCase):
+    def setUp(self):
+        self.store = JsonbAttendeeStore()
+        self.live_meeting = LiveMeeting(
+            1,
+            2,
+            "mock_i",
+            None,
+            attendees=[make_attendee("u1"), make_attendee("u2")],
+            participant_count=0,
+            transfer_count=0,
+            moderator_count=0,
+            listener_count=0,
+            voice_participant_count=0,
+            video_count=0,
+        )
+
+    def test_no_changes(self):
+        self.assertEqual(self.store.values(self.live_meeting), {})
+
+    def test_added(self):
+        self.live_meeting.add_attendee(make_attendee("u3"))
+
+        sql, params = compile_values(self.store.values(self.live_meeting))
+
+        self.assertIn("CAST(meetings.attendees AS JSONB) || CAST(%(param_1)s AS JSONB)", sql)
+        self.assertEqual(params["param_1"], [make_attendee("u3")])
+
+    def test_removed(self):
+        self.live_meeting.remove_attendee("u2")
+
+        sql, params = compile_values(self.store.values(self.live_meeting))
+
+        self.assertIn(
+            "jsonb_path_query_array(CAST(meetings.attendees AS JSONB), "
+            "%(jsonb_path_query_array_1)s, CAST(%(param_1)s AS JSONB))",
+            sql,
+        )
+        self.assertEqual(params["param_1"], {"id": "u2"})
+
+    def test_updated(self):
+        self.live_meeting.update_attendee("u2", lambda attendee: attendee.update(has_video=True))
+
+        sql, params = compile_values(self.store.values(self.live_meeting))
+
+        self.assertIn("jsonb_set(CAST(meetings.attendees AS JSONB), ARRAY[%(param_1)s]", sql)
+        self.assertEqual(params["param_1"], "1")
+        self.assertTrue(params["param_2"]["has_video"])
+
+    def test_several_changes_write_whole_list(self):
+        self.live_meeting.remove_attendee("u1")
+        self.live_meeting.add_attendee(make_attendee("u3"))
+
+        sql, params = compile_values(self.store.values(self.live_meeting))
+
+        self.assertIn("attendees=CAST(%(param_1)s AS JSONB)", sql)
+        self.assertEqual(params["param_1"], [make_attendee("u2"), make_attendee("u3")])
+
+    def test_deduplicated_attendees_write_whole_list(self):
+        live_meeting = LiveMeeting(
+            1, 2, "mock_i", None, attendees=[make_attendee("u1"), make_attendee("u1")]
+        )
+
+        sql, params = compile_values(self.store.values(live_meeting))
+
+        self.assertIn("attendees=CAST(%(param_1)s AS JSONB)", sql)
+        self.assertEqual(params["param_1"], [make_attendee("u1")])
+
+        live_meeting.attendees.written()
+
+        self.assertEqual(self.store.values(live_meeting), {})
+
+
+class TestTableAttendeeStore(unittest.TestCase):
+    def setUp(self):
+        self.store = TableAttendeeStore()
+        self.session = mock.MagicMock()
+        self.live_meeting = LiveMeeting(
+            1,
+            2,
+            "mock_i",
+            None,
+            attendees=[make_attendee("u1")],
+            participant_count=1,
+            transfer_count=0,
+            moderator_count=0,
+            listener_count=0,
+            voice_participant_count=0,
+            video_count=0,
+        )
+
+    def written(self, *rows):
+        self.session.execute.return_value = [mock.Mock(_mapping=row) for row in rows]
+
+        return self.store.write(self.session, self.live_meeting)
+
+    def executed(self):
+        (statement,), _ = self.session.execute.call_args
+
+        return str(statement.compile(dialect=postgresql.psycopg2.dialect()))
+
+    def test_load(self):
+        row = mock.MagicMock()
+        row._mapping = make_attendee("u2")
+        self.session.query().filter().order_by().all.return_value = [row]
+
+        self.assertEqual(self.store.load(self.session, self.live_meeting), [make_attendee("u2")])
+
+    def test_write_added(self):
+        self.live_meeting.add_attendee(make_attendee("u2"))
+
+        values = self.written(make_attendee("u2"))
+
+        sql = self.executed()
+        self.assertIn("INSERT INTO meeting_attendees", sql)
+        self.assertIn("ON CONFLICT DO NOTHING", sql)
+        sql, params = compile_values(values)
+        self.assertIn(
+            "participant_count=(meetings.participant_count + %(participant_count_1)s)", sql
+        )
+        self.assertEqual(params["participant_count_1"], 1)
+        self.assertIn("moderator_count=meetings.moderator_count", sql)
+
+    def test_write_removed(self):
+        self.live_meeting.remove_attendee("u1")
+
+        values = self.written(make_attendee("u1"))
+
+        self.assertIn("DELETE FROM meeting_attendees", self.executed())
+        sql, params = compile_values(values)
+        self.assertIn(
+            "participant_count=(meetings.participant_count + %(participant_count_1)s)", sql
+        )
+        self.assertEqual(params["participant_count_1"], -1)
+        self.assertIn("video_count=meetings.video_count", sql)
+
+    def test_write_removed_nothing(self):
+        self.live_meeting.remove_attendee("u1")
+
+        values = self.written()
+
+        sql, _ = compile_values(values)
+        self.assertIn("participant_count=meetings.participant_count", sql)
+
+    def test_write_updated(self):
+        self.live_meeting.update_attendee("u1", lambda attendee: attendee.update(has_video=True))
+        self.session.execute.return_value = [
+            ("VIEWER", False, False, False, False) + ("VIEWER", False, False, False, True)
+        ]
+
+        values = self.store.write(self.session, self.live_meeting)
+
+        sql = self.executed()
+        self.assertIn("UPDATE meeting_attendees SET", sql)
+        self.assertIn("FOR UPDATE", sql)
+        self.assertIn('RETURNING "old".role', sql)
+        sql, params = compile_values(values)
+        self.assertIn("video_count=(meetings.video_count + %(video_count_1)s)", sql)
+        self.assertEqual(params["video_count_1"], 1)
+        self.assertIn("participant_count=meetings.participant_count", sql)
+
+    def test_write_recounted_counts_attendee_rows(self):
+        self.live_meeting.recount()
+        self.live_meeting.add_attendee(make_attendee("u2"))
+
+        values = self.written(make_attendee("u2"))
+
+        sql, params = compile_values(values)
+        self.assertIn("video_count=(SELECT count(*)", sql)
+        self.assertIn("WHERE meeting_attendees.meeting_id = meetings.id", sql)
+        self.assertIn("meeting_attendees.role IS DISTINCT FROM", sql)
+
+    def test_values(self):
+        self.assertEqual(self.store.values(self.live_meeting), {})
+
+
+class TestGetAttendeeStore(unittest.TestCase):
+    def test_get_attendee_store(self):
+        self.assertIsInstance(get_attendee_store("json"), JsonAttendeeStore)
+        self.assertIsInstance(get_attendee_store("jsonb"), JsonbAttendeeStore)
+        self.assertIsInstance(get_attendee_store("table"), TableAttendeeStore)
+
+    def test_unknown_attendee_store(self):
+        with self.assertRaises(ValueError):
+            get_attendee_store("xml")
@@ -0,0 +1,63 @@
+"""Benchmark of writing and reading dead letters.
+
+It adds mapped `user-joined` events to a dead-letter store and reads them
+back, as a replay does before persisting them.
+
+Usage:
+    python tests/benchmarks/dead_letter_bench.py [--number N]
+"""
+import argparse
+import tempfile
+import time
+
+from mconf_aggr.webhook.dead_letter import DeadLetterStore, read
+from mconf_aggr.webhook.event_mapper import map_webhook_event
+from mconf_aggr.webhook.exceptions import WebhookDatabaseError
+
+EVENT = {
+    "server_url": "https://server",
+    "data": {
+        "type": "event",
+        "id": "user-joined",
+        "attributes": {
+            "meeting": {
+                "internal-meeting-id": "a06b8d0a4ad67cd4dda53e70bd6a1cd64bd6aa53-1588102596395",
+                "external-meeting-id": "random-6279108",
+            },
+            "user": {
+                "internal-user-id": "w_kolmsnvmsnyj",
+                "external-user-id": "w_kolmsnvmsnyj",
+                "name": "User 1234",
+                "role": "MODERATOR",
+                "presenter": True,
+                "userdata": {"bbb_client_title": "Mconf"},
+            },
+        },
+        "event": {"ts": 1588102596395},
+    },
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000, help="dead letters")
+    args = parser.parse_args()
+
+    event = map_webhook_event(EVENT)
+    error = WebhookDatabaseError("no meeting found for user")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = DeadLetterStore(directory)
+
+        start = time.perf_counter()
+        for _ in range(args.number):
+            store.add(event, error, 1)
+        store.close()
+        added = time.perf_counter() - start
+
+        start = time.perf_counter()
+        letters = read(store.files())
+        elapsed = time.perf_counter() - start
+
+    print(f"add: {added / args.number * 1e6:.2f} us/letter")
+    print(f"read: {elapsed / len(letters) * 1e6:.2f} us/letter")
@@ -0,0 +1,106 @@
+"""Microbenchmark of the event mapper.
+
+It compares the compiled mapper of each benchmarked event type with mapping
+the same fields by walking each path from the root with `_get_nested`, as
+the mapper did before it was compiled.
+
+Usage:
+    python tests/benchmarks/event_mapper_bench.py [--number N]
+"""
+import argparse
+import timeit
+
+from mconf_aggr.webhook.event_mapper import (
+    EVENT_MAPPERS,
+    EVENT_SPECS,
+    EVENT_TYPE,
+    WebhookEvent,
+    _get_nested,
+)
+
+MEETING = {
+    "external-meeting-id": "random-6279108",
+    "internal-meeting-id": "a06b8d0a4ad67cd4dda53e70bd6a1cd64bd6aa53-1588102596395",
+    "name": "random-6279108",
+    "create-time": 1588102596395,
+    "create-date": "Tue Apr 28 19:36:36 UTC 2020",
+    "voice-conf": "77032",
+    "dial-number": "613-555-1234",
+    "viewer-pass": "ap",
+    "moderator-pass": "mp",
+    "duration": 0,
+    "record": False,
+    "max-users": 0,
+    "is-breakout": False,
+    "metadata": {"mconf-institution-guid": "guid", "mconf-server-guid": "guid"},
+}
+
+USER = {
+    "internal-user-id": "w_kolmsnvmsnyj",
+    "external-user-id": "w_kolmsnvmsnyj",
+    "name": "User 1234",
+    "role": "MODERATOR",
+    "presenter": True,
+    "guest": False,
+    "userdata": {"bbb_client_title": "Mconf"},
+}
+
+EVENTS = {
+    "meeting-created": {"meeting": MEETING},
+    "user-joined": {"meeting": MEETING, "user": USER},
+    "user-cam-broadcast-start": {"meeting": MEETING, "user": USER},
+    "rap-archive-started": {"meeting": MEETING, "record-id": "record-id"},
+}
+
+
+def make_event(event_type, attributes):
+    return {
+        "server_url": "https://server",
+        "data": {
+            "type": "event",
+            "id": event_type,
+            "attributes": attributes,
+            "event": {"ts": 1588102596395},
+        },
+    }
+
+
+def legacy_mapper(record, fields):
+    def mapper(event, event_type, server_url):
+        return WebhookEvent(
+            event_type,
+            record(
+                **{
+                    name: event_type if path is EVENT_TYPE else _get_nested(event, path, default)
+                    for name, path, default in fields
+                }
+            ),
+            server_url,
+        )
+
+    return mapper
+
+
+def bench(number):
+    for event_type, attributes in EVENTS.items():
+        event = make_event(event_type, attributes)
+        compiled = EVENT_MAPPERS[event_type]
+        legacy = legacy_mapper(*EVENT_SPECS[event_type])
+
+        assert compiled(event, event_type, "") == legacy(event, event_type, "")
+
+        before = timeit.timeit(lambda: legacy(event, event_type, ""), number=number)
+        after = timeit.timeit(lambda: compiled(event, event_type, ""), number=number)
+
+        print(
+            f"{event_type}: {before / number * 1e6:.2f} us -> {after / number * 1e6:.2f} us"
+            f" ({before / after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000, help="repetitions")
+    args = parser.parse_args()
+
+    bench(args.number)
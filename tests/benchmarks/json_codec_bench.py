@@ -0,0 +1,85 @@
+"""Benchmark of the JSON codecs.
+
+It decodes and encodes the sample payloads of `docs/events.md` and the
+events posted by `tests/black-box/events.py` with each available codec,
+wrapped in a list as webhooks send them.
+
+Usage:
+    python tests/benchmarks/json_codec_bench.py [--number N]
+"""
+import argparse
+import inspect
+import json
+import os
+import re
+import sys
+import timeit
+import types
+
+from mconf_aggr.json_codec import CODECS, JsonCodec
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def docs_events():
+    with open(os.path.join(ROOT, "docs", "events.md")) as docs:
+        return [json.loads(block) for block in re.findall(r"```json\n(.*?)```", docs.read(), re.S)]
+
+
+def black_box_events():
+    """Collect the events of the black-box tests instead of posting them."""
+    events = []
+    utils = types.ModuleType("utility.utils")
+    utils.post_event = events.append
+    utils.timestamp_now = lambda: 1588102596395
+    sys.modules.setdefault("utility", types.ModuleType("utility"))
+    sys.modules["utility.utils"] = utils
+    sys.path.insert(0, os.path.join(ROOT, "tests", "black-box"))
+
+    import events as black_box
+
+    named = types.SimpleNamespace(name="name", guid="guid")
+    special = {"index": 0, "shared_secret": named, "institution": named}
+
+    for name, post in inspect.getmembers(black_box, inspect.isfunction):
+        if not name.startswith("post_") or post.__module__ != black_box.__name__:
+            continue
+
+        args = {
+            parameter: special.get(parameter, parameter)
+            for parameter in inspect.signature(post).parameters
+        }
+        post(**args)
+
+    return events
+
+
+def bench(payloads, number):
+    encoded = [json.dumps([payload]) for payload in payloads]
+    size = sum(map(len, encoded))
+    print(f"{len(payloads)} payloads, {size} bytes")
+
+    for name in CODECS[1:]:
+        try:
+            codec = JsonCodec(name)
+        except ValueError as err:
+            print(f"{name}: {err}")
+            continue
+
+        loads = timeit.timeit(lambda: [codec.loads(data) for data in encoded], number=number)
+        dumps = timeit.timeit(
+            lambda: [codec.dumps([payload]) for payload in payloads], number=number
+        )
+
+        print(
+            f"{name}: loads {loads / number / len(payloads) * 1e6:.2f} us/payload,"
+            f" dumps {dumps / number / len(payloads) * 1e6:.2f} us/payload"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="repetitions")
+    args = parser.parse_args()
+
+    bench(docs_events() + black_box_events(), args.number)
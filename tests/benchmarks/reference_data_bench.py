@@ -0,0 +1,77 @@
+"""Cold-start benchmark of the reference data cache.
+
+It measures how long it takes to build a `ReferenceData` snapshot of a given
+size and how long lookups take afterwards. With `--database`, it also loads
+the snapshot from the database configured by the `MCONF_WEBHOOK_DATABASE_*`
+variables and compares it with querying each server by name.
+
+Usage:
+    python tests/benchmarks/reference_data_bench.py [--rows N] [--database]
+"""
+import argparse
+import timeit
+
+from mconf_aggr.webhook.reference_data import (
+    InstitutionRecord,
+    ReferenceData,
+    ReferenceDataCache,
+    ServerRecord,
+    SharedSecretRecord,
+)
+
+
+def build_rows(rows):
+    servers = [ServerRecord(i, f"server-guid-{i}", f"https://server-{i}") for i in range(rows)]
+    shared_secrets = [
+        SharedSecretRecord(f"secret-guid-{i}", f"secret-{i}", f"institution-guid-{i}")
+        for i in range(rows)
+    ]
+    institutions = [InstitutionRecord(f"institution-guid-{i}", f"name-{i}") for i in range(rows)]
+
+    return servers, shared_secrets, institutions
+
+
+def bench_memory(rows, number):
+    servers, shared_secrets, institutions = build_rows(rows)
+
+    build = timeit.timeit(
+        lambda: ReferenceData(servers, shared_secrets, institutions), number=number
+    )
+    snapshot = ReferenceData(servers, shared_secrets, institutions)
+    lookup = timeit.timeit(lambda: snapshot.server(f"https://server-{rows // 2}"), number=100_000)
+
+    print(f"build snapshot of {3 * rows} rows: {build / number * 1000:.3f} ms")
+    print(f"server lookup: {lookup / 100_000 * 1_000_000:.3f} us")
+
+
+def bench_database(number):
+    from mconf_aggr.webhook.database import DatabaseConnector
+    from mconf_aggr.webhook.database_model import Servers
+
+    DatabaseConnector().connect()
+    session_scope = DatabaseConnector.get_session_scope()
+    cache = ReferenceDataCache()
+
+    with session_scope() as session:
+        load = timeit.timeit(lambda: cache.load(session), number=number)
+        names = [server.name for server in session.query(Servers.name)]
+        query = timeit.timeit(
+            lambda: [session.query(Servers).filter(Servers.name == n).first() for n in names],
+            number=number,
+        )
+
+    print(f"load snapshot of {len(cache.snapshot)} rows: {load / number * 1000:.3f} ms")
+    print(f"query {len(names)} servers one by one: {query / number * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000, help="rows per table")
+    parser.add_argument("--number", type=int, default=20, help="repetitions")
+    parser.add_argument("--database", action="store_true", help="also load from the database")
+    args = parser.parse_args()
+
+    bench_memory(args.rows, args.number)
+
+    if args.database:
+        bench_database(args.number)
@@ -0,0 +1,90 @@
+"""Benchmark of publishing to in-memory and spooled channels.
+
+It publishes mapped `user-joined` events and, with `--deferred`, the raw
+decoded events published with deferred mapping, from `--publishers` threads
+at once like concurrent webhook requests. Publishing to a spooled channel
+waits for the data to be on disk, so it reports both the time per event over
+all publishers and the time each publish takes.
+
+Usage:
+    python tests/benchmarks/spool_bench.py [--number N] [--publishers N] [--deferred]
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+from mconf_aggr.aggregator.aggregator import Channel, SpoolChannel
+from mconf_aggr.webhook.event_mapper import map_webhook_event
+
+EVENT = {
+    "server_url": "https://server",
+    "data": {
+        "type": "event",
+        "id": "user-joined",
+        "attributes": {
+            "meeting": {
+                "internal-meeting-id": "a06b8d0a4ad67cd4dda53e70bd6a1cd64bd6aa53-1588102596395",
+                "external-meeting-id": "random-6279108",
+            },
+            "user": {
+                "internal-user-id": "w_kolmsnvmsnyj",
+                "external-user-id": "w_kolmsnvmsnyj",
+                "name": "User 1234",
+                "role": "MODERATOR",
+                "presenter": True,
+                "userdata": {"bbb_client_title": "Mconf"},
+            },
+        },
+        "event": {"ts": 1588102596395},
+    },
+}
+
+
+def bench(channel, data, number, publishers):
+    latencies = []
+
+    def publish():
+        elapsed = 0
+
+        for _ in range(number // publishers):
+            start = time.perf_counter()
+            channel.publish(data)
+            elapsed += time.perf_counter() - start
+
+        latencies.append(elapsed / (number // publishers))
+
+    threads = [threading.Thread(target=publish) for _ in range(publishers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    channel.close()
+
+    return (
+        f"{elapsed / number * 1e6:.2f} us/event,"
+        f" {sum(latencies) / len(latencies) * 1e6:.0f} us/publish"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000, help="events published")
+    parser.add_argument("--publishers", type=int, default=50, help="concurrent publishers")
+    parser.add_argument("--deferred", action="store_true", help="publish raw events")
+    args = parser.parse_args()
+
+    data = EVENT if args.deferred else map_webhook_event(EVENT)
+
+    print(f"Channel: {bench(Channel('bench'), data, args.number, args.publishers)}")
+
+    for fsync_interval in (0.01, 0):
+        with tempfile.TemporaryDirectory() as directory:
+            channel = SpoolChannel("bench", directory, fsync_interval=fsync_interval)
+            number = args.number if fsync_interval else args.number // 100
+            print(
+                f"SpoolChannel (fsync every {fsync_interval * 1000:g} ms):"
+                f" {bench(channel, data, number, args.publishers)}"
+            )
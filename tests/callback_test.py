@@ -1,6 +1,6 @@
 import unittest
 
-from mconf_aggr.aggregator.aggregator import AggregatorCallback
+from mconf_aggr.aggregator.aggregator import AggregatorCallback, CallbackError
 
 
 class TestCallback(unittest.TestCase):
@@ -18,3 +18,21 @@ class TestCallback(unittest.TestCase):
     def test_run(self):
         with self.assertRaises(NotImplementedError):
             self.callback.run(None)
+
+    def test_run_batch(self):
+        with self.assertRaises(NotImplementedError):
+            self.callback.run_batch([None])
+
+    def test_run_batch_calls_run(self):
+        processed = []
+
+        class Callback(AggregatorCallback):
+            def run(self, data):
+                if data is None:
+                    raise CallbackError()
+                processed.append(data)
+
+        with self.assertRaises(CallbackError):
+            Callback().run_batch([1, None, 2])
+
+        self.assertEqual(processed, [1, 2])
@@ -1,9 +1,17 @@
+import threading
+import time
 import unittest
+import unittest.mock as mock
 from contextlib import contextmanager
 
 from loguru import logger
 
-from mconf_aggr.aggregator.aggregator import Channel
+from mconf_aggr.aggregator.aggregator import (
+    Channel,
+    ChannelClosed,
+    ChannelFull,
+    PartitionedChannel,
+)
 
 
 @contextmanager
@@ -70,6 +78,78 @@ class TestChannel(unittest.TestCase):
 
         self.assertTrue(self.channel.empty())
 
+    def test_pop_batch(self):
+        for i in range(4):
+            self.channel.publish(i)
+
+        self.assertEqual(self.channel.pop_batch(3), [0, 1, 2])
+        self.assertEqual(self.channel.pop_batch(3), [3])
+        self.assertTrue(self.channel.empty())
+
+    def test_pop_batch_timeout(self):
+        self.channel.publish(1)
+
+        start = time.monotonic()
+        self.assertEqual(self.channel.pop_batch(3, timeout=0.05), [1])
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_pop_batch_closed(self):
+        self.channel.publish(1)
+        self.channel.close()
+
+        self.assertEqual(self.channel.pop_batch(3, timeout=1), [1])
+
+    def test_join_waits_for_ack(self):
+        self.channel.publish(1)
+        self.channel.publish(2)
+
+        self.assertFalse(self.channel.join(0))
+
+        self.channel.pop_batch(2)
+
+        self.assertFalse(self.channel.join(0))
+
+        self.channel.ack()
+
+        self.assertTrue(self.channel.join(0))
+
+    def test_join_is_notified(self):
+        self.channel.publish(1)
+
+        def consume():
+            time.sleep(0.01)
+            self.channel.pop()
+            self.channel.ack()
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+
+        self.assertTrue(self.channel.join(5))
+        consumer.join()
+
+    def test_leftovers(self):
+        self.channel.publish(1)
+        self.channel.publish(2)
+        self.channel.close()
+
+        self.assertEqual(self.channel.leftovers(), [1, 2])
+        self.assertTrue(self.channel.empty())
+
+    def test_wait_and_oldest_age(self):
+        self.assertEqual(self.channel.oldest_age(), 0)
+
+        with mock.patch("mconf_aggr.aggregator.aggregator.time.monotonic", return_value=10):
+            self.channel.publish(1)
+
+        with mock.patch("mconf_aggr.aggregator.aggregator.time.monotonic", return_value=12.5):
+            self.assertEqual(self.channel.oldest_age(), 2.5)
+
+            *_, total, count = self.channel._wait._value.values()
+            self.assertEqual(self.channel.pop(), 1)
+
+        # The wait is observed in the histogram of the channel.
+        self.assertEqual(self.channel._wait._value.values()[-2:], [total + 2.5, count + 1])
+
     def test_log_unwritten(self):
         self.channel.publish(1)
 
@@ -79,3 +159,136 @@ class TestChannel(unittest.TestCase):
                 "WARNING:mconf_aggr.aggregator.aggregator:There is data not consumed in channel test_channel.\n",
                 cm,
             )
+
+
+class TestChannelOverflow(unittest.TestCase):
+    def test_block_times_out(self):
+        channel = Channel("test_channel", maxsize=1, timeout=0.01)
+        channel.publish(1)
+
+        with self.assertRaises(ChannelFull):
+            channel.publish(2)
+
+    def test_reject(self):
+        channel = Channel("test_channel", maxsize=1, overflow="reject")
+        channel.publish(1)
+
+        with self.assertRaises(ChannelFull):
+            channel.publish(2)
+
+        self.assertEqual(channel.pop(), 1)
+        channel.publish(3)
+        self.assertEqual(channel.pop(), 3)
+
+    def test_drop_oldest(self):
+        channel = Channel("test_channel", maxsize=2, overflow="drop-oldest")
+        for i in range(4):
+            channel.publish(i)
+
+        self.assertEqual(channel.pop_batch(10), [2, 3])
+        self.assertEqual(channel.dropped, 2)
+
+    def test_drop_oldest_keeps_closing_signal(self):
+        channel = Channel("test_channel", maxsize=1, overflow="drop-oldest")
+        channel.close()
+
+        with self.assertRaises(ChannelFull):
+            channel.publish(1)
+
+        with self.assertRaises(ChannelClosed):
+            channel.pop()
+
+    def test_spill_keeps_order(self):
+        channel = Channel("test_channel", maxsize=2, overflow="spill")
+        for i in range(5):
+            channel.publish({"value": i})
+
+        self.assertEqual(channel.qsize(), 2)
+        self.assertEqual(channel.pop(), {"value": 0})
+
+        channel.publish({"value": 5})
+        channel.close()
+
+        self.assertEqual([data["value"] for data in channel.pop_batch(10)], [1, 2, 3, 4, 5])
+
+    def test_spill_leftovers(self):
+        channel = Channel("test_channel", maxsize=2, overflow="spill")
+        for i in range(5):
+            channel.publish(i)
+
+        self.assertEqual(channel.leftovers(), [0, 1, 2, 3, 4])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            Channel("test_channel", overflow="unknown")
+
+
+class TestPartitionedChannel(unittest.TestCase):
+    def setUp(self):
+        self.channel = PartitionedChannel(
+            name="test_channel", partitions=4, key=lambda data: data["key"]
+        )
+
+    def test_partitions(self):
+        self.assertEqual(len(self.channel.partitions), 4)
+        self.assertEqual(
+            [partition.name for partition in self.channel.partitions],
+            ["test_channel-0", "test_channel-1", "test_channel-2", "test_channel-3"],
+        )
+
+    def test_same_key_same_partition(self):
+        for i in range(10):
+            self.channel.publish({"key": "meeting-1", "value": i})
+
+        partition = self.channel.partition_for({"key": "meeting-1"})
+
+        self.assertEqual(partition.qsize(), 10)
+        self.assertEqual([partition.pop()["value"] for i in range(10)], list(range(10)))
+
+    def test_keys_spread_over_partitions(self):
+        for i in range(100):
+            self.channel.publish({"key": f"meeting-{i}"})
+
+        self.assertEqual(self.channel.qsize(), 100)
+        self.assertTrue(all(not partition.empty() for partition in self.channel.partitions))
+
+    def test_none_key_first_partition(self):
+        self.channel.publish({"key": None})
+
+        self.assertEqual(self.channel.partitions[0].qsize(), 1)
+
+    def test_empty(self):
+        self.assertTrue(self.channel.empty())
+
+        self.channel.publish({"key": "meeting-1"})
+
+        self.assertFalse(self.channel.empty())
+
+    def test_join(self):
+        for i in range(10):
+            self.channel.publish({"key": f"meeting-{i}"})
+
+        self.assertFalse(self.channel.join(0))
+
+        for partition in self.channel.partitions:
+            while not partition.empty():
+                partition.pop()
+            partition.ack()
+
+        self.assertTrue(self.channel.join(0))
+
+    def test_partitions_bounded(self):
+        channel = PartitionedChannel(
+            name="test_channel", partitions=2, key=lambda data: data, maxsize=3, overflow="reject"
+        )
+
+        self.assertTrue(
+            all(
+                partition.queue.maxsize == 3 and partition.overflow == "reject"
+                for partition in channel.partitions
+            )
+        )
+
+    def test_invalid_partitions(self):
+        with self.assertRaises(ValueError):
+            PartitionedChannel(name="test_channel", partitions=0, key=lambda data: data)
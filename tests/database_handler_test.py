@@ -3,9 +3,11 @@ import time
 import unittest
 import unittest.mock as mock
 import uuid
+from contextlib import contextmanager
 from unittest.mock import MagicMock
 
 import sqlalchemy
+from sqlalchemy.dialects import postgresql
 
 from mconf_aggr.aggregator import cfg
 from mconf_aggr.aggregator.aggregator import CallbackError
@@ -38,8 +40,30 @@ from mconf_aggr.webhook.event_mapper import (
     RapEvent,
     UserJoinedEvent,
     WebhookEvent,
+    map_webhook_event,
 )
-from mconf_aggr.webhook.exceptions import InvalidWebhookEventError, WebhookDatabaseError
+from mconf_aggr.webhook.exceptions import (
+    InvalidWebhookEventError,
+    WebhookConflictError,
+    WebhookDatabaseError,
+)
+from mconf_aggr.webhook.instruments import current_handler, events_total
+from mconf_aggr.webhook.live_meetings import LiveMeeting, live_meetings
+from mconf_aggr.webhook.reference_data import (
+    ReferenceData,
+    ServerRecord,
+    reference_data,
+)
+
+
+def compile_statement(statement):
+    return statement.compile(dialect=postgresql.dialect())
+
+
+def executed_statement(session):
+    args, kwargs = session.execute.call_args
+
+    return compile_statement(args[0])
 
 
 class SessionMock(mock.Mock):
@@ -85,50 +109,77 @@ class TestMeetingCreatedHandler(unittest.TestCase):
         )
 
     def test_meeting_created_handle(self):
+        live_meetings.clear()
+        self.addCleanup(live_meetings.clear)
+
         server = MagicMock()
         server.name = "mocked-server"
         server.guid = "mocked-guid"
         self.handler.session.query().filter().first.side_effect = [
-            False,
             "mocked-secret",
             server,
-            False,
         ]
+        self.handler.session.execute().first.return_value = (10, 20)
 
         self.handler.handle(self.event)
 
-        meetings = self.handler.session.get_first_add_arg
-        meetings_events = meetings.meeting_event
+        # Both rows are inserted by a single statement.
+        self.handler.session.add.assert_not_called()
+        statement = executed_statement(self.handler.session)
+        self.assertIn("INSERT INTO meetings_events", str(statement))
+        self.assertIn("ON CONFLICT (internal_meeting_id) DO NOTHING", str(statement))
+        self.assertIn("WHERE NOT (EXISTS (SELECT * \nFROM meetings", str(statement))
+        self.assertIn("INSERT INTO meetings", str(statement))
+
+        values = list(statement.params.values())
+        for value in [
+            "mocked-server",
+            "mocked-guid",
+            "mock_e",
+            "mock_i",
+            "mock_n",
+            "Mock Date",
+            "000-000-0000",
+            "mp",
+            {"mock_data": "mock", "another_mock": "mocked"},
+            [],
+        ]:
+            self.assertIn(value, values)
 
-        self.handler.session.add.assert_called_once()
+        live_meeting = live_meetings.get("mock_i")
+        self.assertEqual((live_meeting.id, live_meeting.meeting_event_id), (10, 20))
+        self.assertEqual(live_meeting.running, False)
+        self.assertEqual(live_meeting.has_user_joined, False)
+        self.assertEqual(live_meeting.participant_count, 0)
+        self.assertEqual(live_meeting.moderator_count, 0)
+        self.assertEqual(len(live_meeting.attendees), 0)
+
+    def test_meeting_created_duplicate(self):
+        live_meetings.clear()
+        self.addCleanup(live_meetings.clear)
 
-        self.assertIsInstance(meetings, Meetings)
-        self.assertIsInstance(meetings_events, MeetingsEvents)
-
-        self.assertEqual(meetings.running, False)
-        self.assertEqual(meetings.has_user_joined, False)
-        self.assertEqual(meetings.participant_count, 0)
-        self.assertEqual(meetings.listener_count, 0)
-        self.assertEqual(meetings.voice_participant_count, 0)
-        self.assertEqual(meetings.video_count, 0)
-        self.assertEqual(meetings.moderator_count, 0)
-        self.assertEqual(meetings.attendees, [])
-
-        self.assertEqual(meetings_events.server_url, "mocked-server")
-        self.assertEqual(meetings_events.external_meeting_id, "mock_e")
-        self.assertEqual(meetings_events.internal_meeting_id, "mock_i")
-        self.assertEqual(meetings_events.name, "mock_n")
-        self.assertEqual(meetings_events.create_time, 0)
-        self.assertEqual(meetings_events.create_date, "Mock Date")
-        self.assertEqual(meetings_events.voice_bridge, "")
-        self.assertEqual(meetings_events.dial_number, "000-000-0000")
-        self.assertEqual(meetings_events.attendee_pw, "")
-        self.assertEqual(meetings_events.moderator_pw, "mp")
-        self.assertEqual(meetings_events.duration, 0)
-        self.assertEqual(meetings_events.recording, False)
-        self.assertEqual(meetings_events.max_users, 0)
-        self.assertEqual(meetings_events.is_breakout, False)
-        self.assertEqual(meetings_events.meta_data, {"mock_data": "mock", "another_mock": "mocked"})
+        self.handler.session.query().filter().first.side_effect = [None, MagicMock()]
+        self.handler.session.execute().first.return_value = None
+
+        self.handler.handle(self.event)
+
+        self.assertIsNone(live_meetings.get("mock_i"))
+
+    def test_meeting_created_uses_reference_data(self):
+        live_meetings.clear()
+        self.addCleanup(live_meetings.clear)
+
+        snapshot = ReferenceData(servers=[ServerRecord(1, "cached-guid", "localhost")])
+        self.handler.session.query().filter().first.side_effect = [None]
+        self.handler.session.execute().first.return_value = (10, 20)
+
+        with mock.patch.object(reference_data, "snapshot", snapshot):
+            self.handler.handle(self.event)
+
+        values = list(executed_statement(self.handler.session).params.values())
+
+        self.assertIn("localhost", values)
+        self.assertIn("cached-guid", values)
 
 
 class TestMeetingEndedHandler(unittest.TestCase):
@@ -148,82 +199,55 @@ class TestMeetingEndedHandler(unittest.TestCase):
         )
 
     def test_meeting_ended_no_meeting_event(self):
-        self.handler.session.query().filter().first.return_value = None
+        self.handler.session.execute().first.return_value = None
 
         self.handler.handle(self.event)
 
         self.handler.session.add.assert_not_called()
+        self.handler.session.delete.assert_not_called()
 
     def test_meeting_ended_no_meeting(self):
-        meetings_events = MeetingsEvents(
-            server_url="localhost",
-            external_meeting_id="mock_e",
-            internal_meeting_id="mock_i",
-            name="mock_n",
-            create_time=0,
-            create_date="Mock Date",
-            voice_bridge="",
-            dial_number="000-000-0000",
-            attendee_pw="",
-            moderator_pw="mp",
-            duration=0,
-            recording=False,
-            max_users=0,
-            is_breakout=False,
-            meta_data={"mock_data": "mock", "another_mock": "mocked"},
-        )
-
-        self.handler.session.query().filter().first.side_effect = [
-            meetings_events,
-            None,
-        ]
+        self.handler.session.execute().first.return_value = (20, 0, None)
 
         self.handler.handle(self.event)
 
         self.handler.session.delete.assert_not_called()
+        self.handler.session.expunge.assert_not_called()
 
     def test_meeting_ended_succeeds(self):
-        meetings_events = MeetingsEvents(
-            server_url="localhost",
-            external_meeting_id="mock_e",
-            internal_meeting_id="mock_i",
-            name="mock_n",
-            create_time=0,
-            create_date="Mock Date",
-            voice_bridge="",
-            dial_number="000-000-0000",
-            attendee_pw="",
-            moderator_pw="mp",
-            duration=0,
-            recording=False,
-            max_users=0,
-            is_breakout=False,
-            meta_data={"mock_data": "mock", "another_mock": "mocked"},
-        )
-
-        meetings = Meetings(
-            running=False,
-            has_user_joined=False,
-            participant_count=0,
-            listener_count=0,
-            voice_participant_count=0,
-            video_count=0,
-            moderator_count=0,
-            attendees=[],
+        live_meetings.clear()
+        self.addCleanup(live_meetings.clear)
+        live_meetings.put(
+            LiveMeeting(
+                id=10,
+                meeting_event_id=20,
+                int_meeting_id="mock_i",
+                updated_at=None,
+                attendees=[],
+            )
         )
-
-        self.handler.session.query().filter().first.return_value = meetings_events
-        self.handler.session.query().get = mock.Mock(side_effect=[meetings_events, meetings])
+        self.handler.session.execute.return_value.first.return_value = (20, 3, [10])
 
         self.handler.handle(self.event)
 
-        meetings_events = self.handler.session.get_first_add_arg
-        meetings = self.handler.session.get_first_delete_arg()
+        # The meeting is closed by a single statement, without loading rows
+        # nor committing.
+        self.handler.session.execute.assert_called_once()
+        self.handler.session.query.assert_not_called()
+        self.handler.session.commit.assert_not_called()
+        self.handler.session.add.assert_not_called()
+        self.handler.session.delete.assert_not_called()
 
-        self.assertEqual(meetings_events.end_time, self.event.event.end_time)
+        statement = executed_statement(self.handler.session)
+        sql = str(statement)
+        self.assertIn("UPDATE meetings_events SET", sql)
+        self.assertIn("UPDATE users_events SET", sql)
+        self.assertIn("users_events.leave_time IS NULL", sql)
+        self.assertIn("DELETE FROM meetings", sql)
+        self.assertIn(self.event.event.end_time, statement.params.values())
+        self.assertIn("mock_i", statement.params.values())
 
-        self.handler.session.add.assert_called_once_with(meetings_events)
-        self.handler.session.delete.assert_called_once_with(meetings)
+        self.assertIsNone(live_meetings.get("mock_i"))
 
 
 class TestMeetingTransferHandler(unittest.TestCase):
@@ -272,6 +296,7 @@ class TestMeetingTransferHandler(unittest.TestCase):
         )
 
         meetings = Meetings(
+            int_meeting_id="madeup-internal-meeting-id",
             running=False,
             has_user_joined=False,
             transfer=False,
@@ -315,6 +340,7 @@ class TestMeetingTransferHandler(unittest.TestCase):
         )
 
         meetings = Meetings(
+            int_meeting_id="madeup-internal-meeting-id",
             running=False,
             has_user_joined=False,
             transfer=True,
@@ -341,6 +367,8 @@ class TestMeetingTransferHandler(unittest.TestCase):
 
 class TestUserJoinedHandler(unittest.TestCase):
     def setUp(self):
+        live_meetings.clear()
+
         session_mock = SessionMock()
 
         self.handler = UserJoinedHandler(session_mock)
@@ -396,7 +424,7 @@ class TestUserJoinedHandler(unittest.TestCase):
         self.handler.handle(self.event)
 
         self.handler.session.add.assert_not_called()
-        self.handler.session.flush.assert_not_called()
+        self.handler.session.execute.assert_not_called()
 
     def test_user_joined_no_meeting(self):
         meetings_events = MeetingsEvents(
@@ -418,33 +446,40 @@ class TestUserJoinedHandler(unittest.TestCase):
         )
 
         self.handler.session.query().filter().first.side_effect = [
-            meetings_events,
             None,
+            meetings_events,
         ]
 
         with self.assertRaises(WebhookDatabaseError):
             self.handler.handle(self.event)
 
     def test_user_joined_succeeds(self):
-        meetings_events = MeetingsEvents(
-            server_url="localhost",
-            external_meeting_id="mock_e",
-            internal_meeting_id="mock_i",
-            name="mock_n",
-            create_time=0,
-            create_date="Mock Date",
-            voice_bridge="",
-            dial_number="000-000-0000",
-            attendee_pw="",
-            moderator_pw="mp",
-            duration=0,
-            recording=False,
-            max_users=0,
-            is_breakout=False,
-            meta_data={"mock_data": "mock", "another_mock": "mocked"},
+        meetings = Meetings(
+            int_meeting_id="madeup-internal-meeting-id",
+            running=False,
+            has_user_joined=False,
+            participant_count=0,
+            listener_count=0,
+            voice_participant_count=0,
+            video_count=0,
+            moderator_count=0,
+            attendees=[],
         )
 
+        self.handler.session.query().filter().first.side_effect = [meetings]
+
+        self.handler.handle(self.event)
+
+        self.handler.session.execute.assert_called_once()
+
+        live_meeting = live_meetings.get("madeup-internal-meeting-id")
+        self.assertTrue(live_meeting.running)
+        self.assertEqual(live_meeting.participant_count, 1)
+        self.assertEqual(live_meeting.moderator_count, 1)
+
+    def test_user_joined_increments_unique_users(self):
         meetings = Meetings(
+            int_meeting_id="madeup-internal-meeting-id",
             running=False,
             has_user_joined=False,
             participant_count=0,
@@ -455,37 +490,47 @@ class TestUserJoinedHandler(unittest.TestCase):
             attendees=[],
         )
 
-        self.handler.session.query().filter().first.side_effect = [
-            meetings_events,
-            meetings,
-        ]
-        self.handler.session.query().get.return_value = meetings
+        self.handler.session.query().filter().first.side_effect = [meetings]
 
         self.handler.handle(self.event)
 
-        self.assertEqual(self.handler.session.add.call_count, 3)
-        self.handler.session.flush.assert_called_once()
-
-    def test_user_joined_succeeds_transfer(self):
-        meetings_events = MeetingsEvents(
-            server_url="localhost",
-            external_meeting_id="mock_e",
-            internal_meeting_id="mock_i",
-            name="mock_n",
-            create_time=0,
-            create_date="Mock Date",
-            voice_bridge="",
-            dial_number="000-000-0000",
-            attendee_pw="",
-            moderator_pw="mp",
-            duration=0,
-            recording=False,
-            max_users=0,
-            is_breakout=False,
-            meta_data={"mock_data": "mock", "another_mock": "mocked"},
+        # Users are not counted again: the database increments the counter
+        # in the statement inserting the user.
+        self.handler.session.query().join().filter().count.assert_not_called()
+        statement = executed_statement(self.handler.session)
+        sql = str(statement)
+        self.assertIn("INSERT INTO users_events", sql)
+        self.assertIn("ON CONFLICT (internal_user_id) DO NOTHING", sql)
+        self.assertIn("unique_users=(coalesce(meetings_events.unique_users, ", sql)
+        self.assertIn("start_time=CASE WHEN (coalesce(meetings_events.unique_users, ", sql)
+        self.assertIn("FROM new_user WHERE meetings_events.id = new_user.meeting_event_id", sql)
+        self.assertIn("madeup-internal-user-id", statement.params.values())
+        self.assertIn(self.event.event.join_time, statement.params.values())
+
+    def test_user_joined_cached_meeting(self):
+        meetings = Meetings(
+            int_meeting_id="madeup-internal-meeting-id",
+            running=False,
+            has_user_joined=False,
+            participant_count=0,
+            listener_count=0,
+            voice_participant_count=0,
+            video_count=0,
+            moderator_count=0,
+            attendees=[],
         )
 
+        self.handler.session.query().filter().first.side_effect = [meetings]
+
+        self.handler.handle(self.event)
+        self.handler.handle(self.transferEvent)
+
+        # The meeting is only loaded by the first event.
+        self.assertEqual(self.handler.session.query().filter().first.call_count, 1)
+
+    def test_user_joined_succeeds_transfer(self):
         meetings = Meetings(
+            int_meeting_id="madeup-internal-meeting-id",
             running=False,
             transfer=True,
             transfer_count=0,
@@ -498,19 +543,14 @@ class TestUserJoinedHandler(unittest.TestCase):
             attendees=[],
         )
 
-        self.handler.session.query().filter().first.side_effect = [
-            meetings_events,
-            meetings,
-        ]
-        self.handler.session.query().get.return_value = meetings
+        self.handler.session.query().filter().first.side_effect = [meetings]
 
         self.handler.handle(self.transferEvent)
-        self.handler.session.add.call_args_list
 
-        self.assertEqual(self.handler.session.add.call_count, 3)
-        self.assertEqual(meetings.transfer_count, 1)
-        self.assertEqual(meetings.participant_count, 0)
-        self.handler.session.flush.assert_called_once()
+        live_meeting = live_meetings.get("madeup-internal-meeting-id")
+        self.handler.session.execute.assert_called_once()
+        self.assertEqual(live_meeting.transfer_count, 1)
+        self.assertEqual(live_meeting.participant_count, 0)
 
 
 class TestRapHandler(unittest.TestCase):
@@ -569,64 +609,61 @@ class TestRapHandler(unittest.TestCase):
                     ),
                 )
 
-                if event_type == "rap-archive-started":
+                if event_type == "rap-sanity-started":
                     self.handler.session.query().filter().first.side_effect = [
-                        False,  # no recording found
                         self.meetings_event,
-                    ]
-                elif event_type == "rap-sanity-started":
-                    self.handler.session.query().filter().first.side_effect = [
-                        # return the previous created record from rap-archive-started
-                        # when j = 0. Return false (meeting not found for others)
-                        self.recording[0] if j == 0 else False,
                         self.server,
-                        self.meetings_event,
                     ]
                 else:
                     self.handler.session.query().filter().first.side_effect = [
-                        # return the previous created record from rap-archive-started
-                        # and rap-sanity-started
-                        self.recording[j],
                         self.meetings_event,
                     ]
 
-                self.handler.session.query().join().filter().count.side_effect = [
-                    7 + j,  # participant_cound
-                ]
+                # New recordings get the unique users of their meeting.
+                self.meetings_event.unique_users = 7 + j
                 self.handler.handle(event)
 
-                self.recording[j] = self.handler.session.get_first_add_arg
-
+                # The recording is created or updated by a single statement.
+                self.handler.session.add.assert_not_called()
                 self.call_count += 1
-                self.assertEqual(self.handler.session.add.call_count, self.call_count)
+                self.assertEqual(self.handler.session.execute.call_count, self.call_count)
+
+                statement = executed_statement(self.handler.session)
+                recording = statement.params
+                self.assertIn("ON CONFLICT (record_id) DO UPDATE", str(statement))
 
-                self.assertIsInstance(self.recording[j], Recordings)
-                self.assertEqual(self.recording[j].current_step, event_type)
-                if event_type == "rap-archive-started":
-                    self.assertEqual(self.recording[j].status, Status.DELETED)
+                self.assertEqual(recording["record_id"], event.event.record_id)
+                self.assertEqual(recording["current_step"], event_type)
+                # Split recordings are processing from 'rap-sanity-started' on.
+                # Other events keep the status of an existing recording,
+                # unless it was deleted.
+                if event_type == "rap-sanity-started":
+                    self.assertEqual(recording["status"], Status.PROCESSING)
+                    self.assertIn("status = excluded.status", str(statement))
                 else:
-                    # status is set to processing during 'rap-sanity-started'
-                    # and not updated anymore (in this event handler)
-                    self.assertNotEqual(self.recording[j].status, Status.DELETED)
+                    self.assertEqual(recording["status"], Status.DELETED)
+                    self.assertIn("status = CASE WHEN (recordings.status = ", str(statement))
 
-                self.assertEqual(self.recording[j].playback, [])
-                self.assertEqual(self.recording[j].workflow, {})
-                self.assertEqual(self.recording[j].participants, 7 + j)
+                self.assertEqual(recording["playback"], [])
+                self.assertEqual(recording["workflow"], {})
+                self.assertEqual(recording["participants"], 7 + j)
                 if event_type == "rap-sanity-started":
-                    self.assertEqual(self.recording[j].server_id, self.server.id)
+                    self.assertEqual(recording["server_id"], self.server.id)
+                else:
+                    self.assertNotIn("server_id", recording)
 
-                _compare_recording_meetings_event(self, self.recording[j], self.meetings_event)
+                _compare_recording_meetings_event(self, recording, self.meetings_event)
 
 
 def _compare_recording_meetings_event(test, recording, meetings_event):
-    test.assertEqual(recording.start_time, meetings_event.start_time)
-    test.assertEqual(recording.end_time, meetings_event.end_time)
-    test.assertEqual(recording.external_meeting_id, meetings_event.external_meeting_id)
-    test.assertEqual(recording.internal_meeting_id, meetings_event.internal_meeting_id)
-    test.assertEqual(recording.is_breakout, meetings_event.is_breakout)
-    test.assertEqual(recording.meeting_event_id, meetings_event.id)
-    test.assertEqual(recording.r_institution_guid, meetings_event.institution_guid)
-    test.assertEqual(recording.r_shared_secret_guid, meetings_event.shared_secret_guid)
+    test.assertEqual(recording["start_time"], meetings_event.start_time)
+    test.assertEqual(recording["end_time"], meetings_event.end_time)
+    test.assertEqual(recording["external_meeting_id"], meetings_event.external_meeting_id)
+    test.assertEqual(recording["internal_meeting_id"], meetings_event.internal_meeting_id)
+    test.assertEqual(recording["is_breakout"], meetings_event.is_breakout)
+    test.assertEqual(recording["meeting_event_id"], meetings_event.id)
+    test.assertEqual(recording["r_institution_guid"], meetings_event.institution_guid)
+    test.assertEqual(recording["r_shared_secret_guid"], meetings_event.shared_secret_guid)
 
 
 class TestDataProcessor(unittest.TestCase):
@@ -731,6 +768,36 @@ class TestDataProcessor(unittest.TestCase):
 
         handler_mock.handle.assert_called_once_with(event)
 
+    def test_update_is_instrumented(self):
+        event = WebhookEvent(event_type="valid-event-type", event=None, server_url="localhost")
+        handled = events_total.labels("valid-event-type", "handled")
+        failed = events_total.labels("valid-event-type", "failed")
+        counts = handled.get(), failed.get()
+        handler_mock = mock.Mock()
+        running = []
+        handler_mock.handle.side_effect = lambda event: running.append(current_handler.get())
+        self.data_processor._select_handler = mock.MagicMock(return_value=handler_mock)
+
+        self.data_processor.update(event)
+
+        handler_mock.handle.side_effect = WebhookDatabaseError()
+        with self.assertRaises(WebhookDatabaseError):
+            self.data_processor.update(event)
+
+        self.assertEqual(running, ["Mock"])
+        self.assertEqual(current_handler.get(), "none")
+        self.assertEqual((handled.get(), failed.get()), (counts[0] + 1, counts[1] + 1))
+
+    def test_update_flushes_and_returns_cost(self):
+        event = WebhookEvent(event_type="valid-event-type", event=None, server_url="localhost")
+        handler_mock = mock.Mock()
+        self.data_processor._select_handler = mock.MagicMock(return_value=handler_mock)
+
+        cost = self.data_processor.update(event)
+
+        self.session_mock.flush.assert_called_once_with()
+        self.assertEqual(cost.statements, 0)
+
     # The WebhookDataWriter class doesn't seem to be used by the aggregator. Check with the team to see if there is
     # use for it.
 
@@ -744,8 +811,22 @@ class TestWebhookDataWriter(unittest.TestCase):
         with mock.patch("mconf_aggr.webhook.database_handler.DataProcessor") as data_processor_mock:
             data_processor_mock.update = mock.MagicMock()
             with self.assertRaises(CallbackError):
-                self.webhook_data_writer.run({})
-                data_processor_mock.update.assert_called_with({})
+                self.webhook_data_writer.run("event")
+                data_processor_mock.update.assert_called_with("event")
+
+    def test_run_maps_deferred_event(self):
+        event = {
+            "server_url": "localhost",
+            "data": {"id": "meeting-ended", "attributes": {"meeting": {}}},
+        }
+
+        with mock.patch("mconf_aggr.webhook.database_handler.session_scope"), mock.patch(
+            "mconf_aggr.webhook.database_handler.DataProcessor"
+        ) as data_processor_mock:
+            self.webhook_data_writer.run(event)
+            self.webhook_data_writer.run({"data": {"id": "invalid"}, "server_url": "localhost"})
+
+        data_processor_mock.return_value.update.assert_called_once_with(map_webhook_event(event))
 
     def test_run_operational_error(self):
         self.connector_mock.update = mock.MagicMock(
@@ -761,6 +842,28 @@ class TestWebhookDataWriter(unittest.TestCase):
         with self.assertRaises(CallbackError):
             self.webhook_data_writer.run(None)
 
+    def test_run_failure_is_transient(self):
+        errors = [
+            (sqlalchemy.exc.OperationalError(None, None, None), True),
+            (WebhookConflictError(), True),
+            (WebhookDatabaseError(), False),
+            (Exception(), False),
+        ]
+
+        for error, transient in errors:
+            with self.subTest(error=error), mock.patch(
+                "mconf_aggr.webhook.database_handler.session_scope"
+            ), mock.patch(
+                "mconf_aggr.webhook.database_handler.DataProcessor"
+            ) as data_processor_mock:
+                data_processor_mock.return_value.update.side_effect = error
+
+                with self.assertRaises(CallbackError) as cm:
+                    self.webhook_data_writer.run("event")
+
+                [failure] = cm.exception.failures
+                self.assertEqual((failure.data, failure.transient), ("event", transient))
+
     def test_run_exception(self):
         self.connector_mock.update = mock.MagicMock(side_effect=Exception)
 
@@ -768,6 +871,65 @@ class TestWebhookDataWriter(unittest.TestCase):
             self.webhook_data_writer.run(None)
 
 
+class TestWebhookDataWriterBatch(unittest.TestCase):
+    def setUp(self):
+        self.webhook_data_writer = WebhookDataWriter()
+        self.session_mock = mock.MagicMock()
+
+        @contextmanager
+        def session_scope_mock():
+            yield self.session_mock
+
+        patcher = mock.patch(
+            "mconf_aggr.webhook.database_handler.session_scope", session_scope_mock
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run_batch_savepoint_per_event(self):
+        with mock.patch("mconf_aggr.webhook.database_handler.DataProcessor") as data_processor_mock:
+            self.webhook_data_writer.run_batch(["event_1", "event_2", "event_3"])
+
+            data_processor_mock.return_value.update.assert_has_calls(
+                [mock.call("event_1"), mock.call("event_2"), mock.call("event_3")]
+            )
+
+        self.assertEqual(self.session_mock.begin_nested.call_count, 3)
+
+    def test_run_batch_failed_event(self):
+        with mock.patch("mconf_aggr.webhook.database_handler.DataProcessor") as data_processor_mock:
+            data_processor_mock.return_value.update.side_effect = [
+                None,
+                WebhookDatabaseError(),
+                None,
+            ]
+
+            with self.assertRaises(CallbackError) as cm:
+                self.webhook_data_writer.run_batch(["event_1", "event_2", "event_3"])
+
+            self.assertEqual(data_processor_mock.return_value.update.call_count, 3)
+
+        [failure] = cm.exception.failures
+        self.assertEqual((failure.data, failure.transient), ("event_2", False))
+
+    def test_run_batch_connection_lost(self):
+        error = sqlalchemy.exc.OperationalError(None, None, None, connection_invalidated=True)
+
+        with mock.patch("mconf_aggr.webhook.database_handler.DataProcessor") as data_processor_mock:
+            data_processor_mock.return_value.update.side_effect = error
+
+            with self.assertRaises(CallbackError) as cm:
+                self.webhook_data_writer.run_batch(["event_1", "event_2", "event_3"])
+
+            data_processor_mock.return_value.update.assert_called_once_with("event_1")
+
+        # Nothing was committed, so all events may be retried.
+        self.assertEqual(
+            [(failure.data, failure.transient) for failure in cm.exception.failures],
+            [("event_1", True), ("event_2", True), ("event_3", True)],
+        )
+
+
 class TestPostgresConnector(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,266 @@
+import contextlib
+import os
+import tempfile
+import unittest
+import unittest.mock as mock
+
+import mconf_aggr.aggregator.cfg as cfg
+from mconf_aggr.webhook.database_handler import WebhookDataWriter
+from mconf_aggr.webhook.dead_letter import (
+    REPLAYED_SUFFIX,
+    DeadLetter,
+    DeadLetterStore,
+    decode,
+    main,
+    read,
+    replay,
+)
+from mconf_aggr.webhook.event_mapper import map_webhook_event
+from mconf_aggr.webhook.exceptions import WebhookDatabaseError
+
+CONFIG = {
+    "MCONF_WEBHOOK_DEAD_LETTER_DIR": None,
+    "MCONF_WEBHOOK_JSON_CODEC": "auto",
+    "MCONF_WEBHOOK_LIVE_MEETINGS_CACHE_SIZE": 10000,
+    "MCONF_WEBHOOK_ATTENDEES_RECOUNT_INTERVAL": 100,
+    "MCONF_WEBHOOK_ATTENDEES_STORE": "json",
+    "MCONF_WEBHOOK_REFERENCE_DATA_MAX_ROWS": 50000,
+}
+
+
+def raw_event(internal_meeting_id="mock_i"):
+    return {
+        "server_url": "localhost",
+        "data": {
+            "type": "event",
+            "id": "meeting-created",
+            "attributes": {
+                "meeting": {
+                    "external-meeting-id": "mock_e",
+                    "internal-meeting-id": internal_meeting_id,
+                    "name": "mock_n",
+                    "metadata": {"mock_data": "mock"},
+                },
+                "event": {"ts": 1502810164922},
+            },
+        },
+    }
+
+
+class TestDeadLetterStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = DeadLetterStore(self.directory.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_mapped_event_round_trip(self):
+        event = map_webhook_event(raw_event())
+        self.store.add(event, WebhookDatabaseError("no meeting found"), 3)
+
+        [letter] = read(self.store.files())
+
+        self.assertEqual(letter.event, event)
+        self.assertEqual(letter.error, "WebhookDatabaseError")
+        self.assertEqual(letter.message, "no meeting found")
+        self.assertEqual(letter.attempts, 3)
+
+    def test_raw_event_is_mapped_when_read(self):
+        self.store.add(raw_event(), None, 0)
+
+        [letter] = read(self.store.files())
+
+        self.assertEqual(letter.event, map_webhook_event(raw_event()))
+        self.assertIsNone(letter.error)
+
+    def test_one_file_per_day(self):
+        self.store.add(raw_event(), None, 0)
+        self.store.add(raw_event(), None, 0)
+
+        [path] = self.store.files()
+
+        self.assertRegex(os.path.basename(path), r"^dead-letter-\d{4}-\d{2}-\d{2}\.jsonl$")
+        self.assertEqual(len(read([path])), 2)
+
+    def test_invalid_lines_are_skipped(self):
+        self.store.add(raw_event(), None, 0)
+        self.store.close()
+
+        [path] = self.store.files()
+        with open(path, "a") as letters_file:
+            letters_file.write("not json\n\n")
+
+        self.assertEqual(len(read([path])), 1)
+
+    def test_decode_invalid_event(self):
+        with self.assertRaises(ValueError):
+            decode('{"time": null, "error": null, "message": null, "attempts": 1, "event": {}}')
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.session.begin_nested.side_effect = contextlib.nullcontext
+        self.updated = []
+        self.fail_on = set()
+        self.store = mock.Mock()
+
+        def update(event):
+            if event.event.internal_meeting_id in self.fail_on:
+                raise WebhookDatabaseError("no meeting found")
+            self.updated.append(event.event.internal_meeting_id)
+
+        processor = mock.Mock()
+        processor.return_value.update.side_effect = update
+
+        patches = [
+            mock.patch("mconf_aggr.webhook.database_handler.DataProcessor", processor),
+            mock.patch(
+                "mconf_aggr.webhook.database_handler.session_scope",
+                lambda: contextlib.nullcontext(self.session),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def letters(self, *meeting_ids):
+        return [
+            DeadLetter(
+                None, "WebhookDatabaseError", "", 1, map_webhook_event(raw_event(meeting_id))
+            )
+            for meeting_id in meeting_ids
+        ]
+
+    def test_keeps_order_within_meeting(self):
+        meeting_ids = [f"m{index % 5}-{index}" for index in range(50)]
+
+        result = replay(self.letters(*meeting_ids), self.store, batch_size=7, workers=3)
+
+        self.assertEqual(result, (50, 0))
+        self.assertCountEqual(self.updated, meeting_ids)
+        for meeting_id in set(meeting_ids):
+            positions = [self.updated.index(m) for m in meeting_ids if m == meeting_id]
+            self.assertEqual(positions, sorted(positions))
+        self.store.add.assert_not_called()
+
+    def test_failures_are_added_again(self):
+        self.fail_on = {"b"}
+        letters = self.letters("a", "b", "c")
+
+        result = replay(letters, self.store, batch_size=2, workers=2)
+
+        self.assertEqual(result, (2, 1))
+        self.store.add.assert_called_once()
+        event, error, attempts = self.store.add.call_args.args
+        self.assertEqual(event, letters[1].event)
+        self.assertIsInstance(error, WebhookDatabaseError)
+        self.assertEqual(attempts, 2)
+
+    def test_failed_transaction_fails_batch(self):
+        letters = self.letters("a", "b", "c")
+
+        @contextlib.contextmanager
+        def failing_scope():
+            yield self.session
+            raise RuntimeError("commit failed")
+
+        with mock.patch("mconf_aggr.webhook.database_handler.session_scope", failing_scope):
+            result = replay(letters, self.store, batch_size=10, workers=1)
+
+        self.assertEqual(result, (0, 3))
+        self.assertEqual(self.store.add.call_count, 3)
+
+    def run_main(self, directory, *files):
+        with mock.patch("mconf_aggr.webhook.database.DatabaseConnector") as connector, mock.patch(
+            "mconf_aggr.webhook.reference_data.reference_data"
+        ), mock.patch("mconf_aggr.webhook.live_meetings.live_meetings"), mock.patch.object(
+            cfg, "config", CONFIG
+        ):
+            connector.get_session_scope.return_value = lambda: contextlib.nullcontext(self.session)
+
+            return main(["replay", "--directory", directory, "--workers", "1", *files])
+
+    def past_file(self, directory, *meeting_ids):
+        store = DeadLetterStore(directory)
+        for meeting_id in meeting_ids:
+            store.add(map_webhook_event(raw_event(meeting_id)), None, 1)
+        store.close()
+        [path] = store.files()
+        past_path = os.path.join(directory, "dead-letter-2020-01-01.jsonl")
+        os.rename(path, past_path)
+
+        return past_path
+
+    def test_main_renames_replayed_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.past_file(directory, "a")
+
+            status = self.run_main(directory)
+
+            self.assertEqual(status, 0)
+            self.assertEqual(self.updated, ["a"])
+            self.assertFalse(os.path.exists(path))
+            self.assertTrue(os.path.exists(path + REPLAYED_SUFFIX))
+            self.assertEqual(DeadLetterStore(directory).files(), [])
+
+    def test_main_leaves_file_of_current_day(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.past_file(directory, "a")
+            # A running aggregator keeps writing to it.
+            store = DeadLetterStore(directory)
+            self.addCleanup(store.close)
+            store.add(map_webhook_event(raw_event("b")), None, 1)
+            [current] = store.files()[1:]
+
+            self.assertEqual(self.run_main(directory), 0)
+            store.add(map_webhook_event(raw_event("c")), None, 1)
+
+            self.assertEqual(self.updated, ["a"])
+            self.assertEqual(store.files(), [current])
+            self.assertEqual(len(read([current])), 2)
+
+            with self.assertRaises(SystemExit):
+                self.run_main(directory, current)
+
+    def test_main_keeps_files_when_replay_stops(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.past_file(directory, "a")
+
+            with mock.patch("mconf_aggr.webhook.dead_letter.replay", side_effect=KeyboardInterrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.run_main(directory)
+
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(DeadLetterStore(directory).closed_files(), [path])
+
+
+class TestWriterDeadLetter(unittest.TestCase):
+    def test_adds_to_store(self):
+        store = mock.Mock()
+        writer = WebhookDataWriter(connector=mock.Mock(), dead_letters=store)
+        error = WebhookDatabaseError("no meeting found")
+
+        writer.dead_letter("event", error, 2)
+
+        store.add.assert_called_once_with("event", error, 2)
+
+    def test_logs_when_store_fails(self):
+        store = mock.Mock()
+        store.add.side_effect = OSError("disk full")
+        logger = mock.Mock()
+        writer = WebhookDataWriter(connector=mock.Mock(), dead_letters=store, logger=logger)
+
+        writer.dead_letter("event", None, 1)
+
+        logger.error.assert_called()
+
+    def test_teardown_closes_store(self):
+        store = mock.Mock()
+        writer = WebhookDataWriter(connector=mock.Mock(), dead_letters=store)
+
+        writer.teardown()
+
+        store.close.assert_called_once_with()
@@ -6,6 +6,7 @@ from unittest.mock import MagicMock, call
 import falcon
 
 import mconf_aggr.aggregator.cfg as cfg
+from mconf_aggr.aggregator.aggregator import ChannelFull
 from mconf_aggr.webhook.event_listener import (
     AuthMiddleware,
     WebhookEventHandler,
@@ -13,7 +14,12 @@ from mconf_aggr.webhook.event_listener import (
     WebhookResponse,
     _normalize_server_url,
 )
-from mconf_aggr.webhook.exceptions import RequestProcessingError, WebhookError
+from mconf_aggr.webhook.exceptions import (
+    RequestProcessingError,
+    ServiceUnavailableError,
+    WebhookError,
+)
+from mconf_aggr.webhook.instruments import events_total
 
 
 class TestListener(unittest.TestCase):
@@ -88,6 +94,20 @@ class TestListener(unittest.TestCase):
 
         self.assertEqual(resp_mock.status, falcon.HTTP_200)
 
+    def test_service_unavailable(self):
+        req_mock = mock.Mock()
+        resp_mock = mock.Mock()
+
+        event_handler_mock = mock.Mock()
+        event_handler_mock.process_event = MagicMock(side_effect=ServiceUnavailableError)
+        event_listener = WebhookEventListener(event_handler_mock, retry_after=7)
+
+        event_listener.on_post(req_mock, resp_mock)
+
+        self.assertEqual(json.loads(resp_mock.text)["status"], "Error")
+        self.assertEqual(resp_mock.status, falcon.HTTP_503)
+        resp_mock.set_header.assert_called_once_with("Retry-After", "7")
+
 
 class TestResponse(unittest.TestCase):
     def setUp(self):
@@ -162,6 +182,15 @@ class TestAuthMiddleware(unittest.TestCase):
         token = "Bearer 123456"
         self.assertFalse(self.auth_middleware._token_is_valid(host, token, handler_mock))
 
+    def test_token_is_valid_uses_secret_cache(self):
+        with mock.patch("mconf_aggr.webhook.event_listener.secret_cache") as cache_mock:
+            cache_mock.secret.return_value = "123456"
+
+            self.assertTrue(self.auth_middleware._token_is_valid("localhost", "Bearer 123456"))
+            self.assertFalse(self.auth_middleware._token_is_valid("localhost", "Bearer 654321"))
+
+        cache_mock.secret.assert_called_with("localhost")
+
 
 class TestWebhookEventHandler(unittest.TestCase):
     def setUp(self):
@@ -210,6 +239,52 @@ class TestWebhookEventHandler(unittest.TestCase):
 
             self.event_handler.publisher.publish.assert_has_calls(calls, any_order=False)
 
+    def test_channel_full_raises(self):
+        self.publisher_mock.publish = mock.MagicMock(side_effect=ChannelFull)
+
+        with mock.patch("mconf_aggr.webhook.event_listener.map_webhook_event"):
+            with self.assertRaises(ServiceUnavailableError):
+                self.event_handler.process_event("localhost", self.event)
+
+        self.publisher_mock.publish.assert_called_once()
+
+    def test_events_are_counted(self):
+        published = events_total.labels("meeting-ended", "published")
+        invalid = events_total.labels("unknown", "invalid")
+        counts = published.get(), invalid.get()
+        event_handler = WebhookEventHandler(
+            self.publisher_mock, self.channel_mock, deferred_mapping=True
+        )
+        event = {"data": {"id": "meeting-ended", "attributes": {}}}
+
+        event_handler.process_event("localhost", json.dumps([event, {"data": {}}]))
+
+        self.assertEqual((published.get(), invalid.get()), (counts[0] + 1, counts[1] + 1))
+
+    def test_deferred_mapping_publishes_decoded_events(self):
+        event_handler = WebhookEventHandler(
+            self.publisher_mock, self.channel_mock, deferred_mapping=True
+        )
+        event = {"data": {"id": "meeting-ended", "attributes": {}}}
+
+        with mock.patch("mconf_aggr.webhook.event_listener.map_webhook_event") as mapper_mock:
+            event_handler.process_event("localhost", json.dumps([event, {"data": {}}]))
+
+        mapper_mock.assert_not_called()
+        self.publisher_mock.publish.assert_called_once_with(
+            dict(event, server_url="https://localhost"), channel=self.channel_mock
+        )
+
+    def test_deferred_mapping_filters_deprecated_events(self):
+        cfg.config = {"MCONF_WEBHOOK_DEPRECATED_EVENTS": ["meeting-ended"]}
+        event_handler = WebhookEventHandler(
+            self.publisher_mock, self.channel_mock, deferred_mapping=True
+        )
+
+        event_handler.process_event("localhost", '[{"data": {"id": "meeting-ended"}}]')
+
+        self.publisher_mock.publish.assert_not_called()
+
     def test_normalize_server_url(self):
         server_url = "my-server.com"
         self.assertEqual(_normalize_server_url(server_url), "https://my-server.com")
@@ -1,9 +1,15 @@
+import pickle
 import unittest
 import unittest.mock as mock
 
+from mconf_aggr.webhook.database_model import MeetingsEvents, Recordings
 from mconf_aggr.webhook.event_mapper import (
+    EVENT_MAPPERS,
+    EVENT_SPECS,
+    EVENT_TYPE,
     MeetingCreatedEvent,
     MeetingEndedEvent,
+    RapArchiveEvent,
     RapPublishEndedEvent,
     RapPublishEvent,
     UserEvent,
@@ -12,7 +18,10 @@ from mconf_aggr.webhook.event_mapper import (
     UserVoiceEnabledEvent,
     WebhookEvent,
     _get_nested,
+    compile_mapper,
     map_webhook_event,
+    meeting_partition_key,
+    validate_webhook_event,
 )
 from mconf_aggr.webhook.exceptions import (
     InvalidWebhookEventError,
@@ -97,9 +106,8 @@ class TestMapping(unittest.TestCase):
             ),
         )
 
-        with mock.patch(
-            "mconf_aggr.webhook.event_mapper._map_create_event"
-        ) as _map_create_event_mock:
+        _map_create_event_mock = mock.Mock()
+        with mock.patch.dict(EVENT_MAPPERS, {"meeting-created": _map_create_event_mock}):
             map_webhook_event(event)
             _map_create_event_mock.assert_called_with(event, "meeting-created", "localhost")
 
@@ -133,7 +141,8 @@ class TestMapping(unittest.TestCase):
             ),
         )
 
-        with mock.patch("mconf_aggr.webhook.event_mapper._map_end_event") as _map_end_event_mock:
+        _map_end_event_mock = mock.Mock()
+        with mock.patch.dict(EVENT_MAPPERS, {"meeting-ended": _map_end_event_mock}):
             map_webhook_event(event)
             _map_end_event_mock.assert_called_with(event, "meeting-ended", "mocked-server")
 
@@ -181,9 +190,8 @@ class TestMapping(unittest.TestCase):
             ),
         )
 
-        with mock.patch(
-            "mconf_aggr.webhook.event_mapper._map_user_joined_event"
-        ) as _map_user_joined_event_mock:
+        _map_user_joined_event_mock = mock.Mock()
+        with mock.patch.dict(EVENT_MAPPERS, {"user-joined": _map_user_joined_event_mock}):
             map_webhook_event(event)
             _map_user_joined_event_mock.assert_called_with(event, "user-joined", "mocked-server")
 
@@ -224,9 +232,8 @@ class TestMapping(unittest.TestCase):
             ),
         )
 
-        with mock.patch(
-            "mconf_aggr.webhook.event_mapper._map_user_left_event"
-        ) as _map_user_left_event_mock:
+        _map_user_left_event_mock = mock.Mock()
+        with mock.patch.dict(EVENT_MAPPERS, {"user-left": _map_user_left_event_mock}):
             map_webhook_event(event)
             _map_user_left_event_mock.assert_called_with(event, "user-left", "mocked-server")
 
@@ -270,9 +277,10 @@ class TestMapping(unittest.TestCase):
             ),
         )
 
-        with mock.patch(
-            "mconf_aggr.webhook.event_mapper._map_user_voice_enabled_event"
-        ) as _map_user_voice_enabled_event_mock:
+        _map_user_voice_enabled_event_mock = mock.Mock()
+        with mock.patch.dict(
+            EVENT_MAPPERS, {"user-audio-voice-enabled": _map_user_voice_enabled_event_mock}
+        ):
             map_webhook_event(event)
             _map_user_voice_enabled_event_mock.assert_called_with(
                 event, "user-audio-voice-enabled", "mocked-server"
@@ -314,7 +322,8 @@ class TestMapping(unittest.TestCase):
             ),
         )
 
-        with mock.patch("mconf_aggr.webhook.event_mapper._map_user_event") as _map_user_event_mock:
+        _map_user_event_mock = mock.Mock()
+        with mock.patch.dict(EVENT_MAPPERS, {"user-audio-voice-disabled": _map_user_event_mock}):
             map_webhook_event(event)
             _map_user_event_mock.assert_called_with(
                 event, "user-audio-voice-disabled", "mocked-server"
@@ -397,9 +406,10 @@ class TestMapping(unittest.TestCase):
             ),
         )
 
-        with mock.patch(
-            "mconf_aggr.webhook.event_mapper._map_rap_publish_ended_event"
-        ) as _map_rap_publish_ended_event_mock:
+        _map_rap_publish_ended_event_mock = mock.Mock()
+        with mock.patch.dict(
+            EVENT_MAPPERS, {"rap-publish-ended": _map_rap_publish_ended_event_mock}
+        ):
             map_webhook_event(event)
             _map_rap_publish_ended_event_mock.assert_called_with(
                 event, "rap-publish-ended", "mocked-server"
@@ -438,9 +448,8 @@ class TestMapping(unittest.TestCase):
             ),
         )
 
-        with mock.patch(
-            "mconf_aggr.webhook.event_mapper._map_rap_publish_event"
-        ) as _map_rap_event_mock:
+        _map_rap_event_mock = mock.Mock()
+        with mock.patch.dict(EVENT_MAPPERS, {"rap-publish-started": _map_rap_event_mock}):
             map_webhook_event(event)
             _map_rap_event_mock.assert_called_with(event, "rap-publish-started", "mocked-server")
 
@@ -478,3 +487,145 @@ class TestMapping(unittest.TestCase):
         got = _get_nested(d, ["key1", "key2"], True)
 
         self.assertEqual(got, expected)
+
+    def test_validate_webhook_event(self):
+        event = {"server_url": "localhost", "data": {"id": "meeting-ended"}}
+
+        self.assertEqual(validate_webhook_event(event), "meeting-ended")
+
+        with self.assertRaises(InvalidWebhookMessageError):
+            validate_webhook_event({"data": {"id": "meeting-ended"}})
+
+        with self.assertRaises(InvalidWebhookEventError):
+            validate_webhook_event({"server_url": "localhost", "data": {"id": ["invalid"]}})
+
+
+class TestEventRecord(unittest.TestCase):
+    def test_positional_and_keyword_arguments(self):
+        event = MeetingEndedEvent("mock_e", internal_meeting_id="mock_i", end_time=0)
+
+        self.assertEqual(event, MeetingEndedEvent._make(["mock_e", "mock_i", 0]))
+        self.assertNotEqual(event, MeetingEndedEvent("mock_e", "other", 0))
+        self.assertEqual(
+            event._asdict(),
+            {"external_meeting_id": "mock_e", "internal_meeting_id": "mock_i", "end_time": 0},
+        )
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(TypeError):
+            MeetingEndedEvent("mock_e", "mock_i")
+
+        with self.assertRaises(TypeError):
+            MeetingEndedEvent("mock_e", "mock_i", 0, unknown=1)
+
+        with self.assertRaises(TypeError):
+            MeetingEndedEvent("mock_e", "mock_i", 0, 1)
+
+    def test_has_no_dict(self):
+        event = MeetingEndedEvent("mock_e", "mock_i", 0)
+
+        self.assertFalse(hasattr(event, "__dict__"))
+
+    def test_pickle(self):
+        event = MeetingEndedEvent("mock_e", "mock_i", 0)
+
+        self.assertEqual(pickle.loads(pickle.dumps(event)), event)
+
+    def test_projection(self):
+        self.assertEqual(
+            RapArchiveEvent.projection(Recordings),
+            ("external_meeting_id", "internal_meeting_id", "record_id", "current_step"),
+        )
+        self.assertIs(
+            RapArchiveEvent.projection(Recordings), RapArchiveEvent.projection(Recordings)
+        )
+
+    def test_to_model(self):
+        event = MeetingEndedEvent("mock_e", "mock_i", 1502810164922)
+
+        meetings_events = event.to_model(MeetingsEvents)
+
+        self.assertIsInstance(meetings_events, MeetingsEvents)
+        self.assertEqual(meetings_events.internal_meeting_id, "mock_i")
+        self.assertEqual(meetings_events.end_time, 1502810164922)
+
+
+class TestCompileMapper(unittest.TestCase):
+    def test_matches_get_nested(self):
+        event = {
+            "server_url": "localhost",
+            "data": {
+                "attributes": {
+                    "meeting": {"internal-meeting-id": "mock_i", "metadata": {"k": "v"}},
+                    "user": {"internal-user-id": "u1", "presenter": False},
+                    "record-id": "r1",
+                },
+                "event": {"ts": 1502810164922},
+            },
+        }
+
+        for event_type, (record, fields) in EVENT_SPECS.items():
+            expected = record(
+                **{
+                    name: event_type if path is EVENT_TYPE else _get_nested(event, path, default)
+                    for name, path, default in fields
+                }
+            )
+
+            got = EVENT_MAPPERS[event_type](event, event_type, "localhost")
+
+            self.assertEqual(got, WebhookEvent(event_type, expected, "localhost"), event_type)
+
+    def test_missing_prefix_uses_defaults(self):
+        got = EVENT_MAPPERS["user-joined"]({"data": {}}, "user-joined", "localhost")
+
+        self.assertEqual(got.event.internal_meeting_id, "")
+        self.assertEqual(got.event.join_time, "")
+        self.assertTrue(got.event.is_presenter)
+
+    def test_mutable_defaults_are_not_shared(self):
+        mapper = EVENT_MAPPERS["meeting-created"]
+
+        first = mapper({}, "meeting-created", "localhost").event
+        first.meta_data["key"] = "value"
+        second = mapper({}, "meeting-created", "localhost").event
+
+        self.assertEqual(second.meta_data, {})
+
+    def test_field_without_path(self):
+        with self.assertRaises(ValueError):
+            compile_mapper(MeetingEndedEvent, (("end_time", ("data", "event", "ts"), 0),))
+
+
+class TestPartitionKey(unittest.TestCase):
+    def test_meeting_partition_key(self):
+        event = WebhookEvent(
+            event_type="meeting-ended",
+            server_url="localhost",
+            event=MeetingEndedEvent(
+                external_meeting_id="mock_e", internal_meeting_id="mock_i", end_time=0
+            ),
+        )
+
+        self.assertEqual(meeting_partition_key(event), "mock_i")
+
+    def test_meeting_partition_key_missing(self):
+        event = WebhookEvent(
+            event_type="meeting-ended",
+            server_url="localhost",
+            event=MeetingEndedEvent(
+                external_meeting_id="mock_e", internal_meeting_id="", end_time=0
+            ),
+        )
+
+        self.assertIsNone(meeting_partition_key(event))
+
+    def test_meeting_partition_key_not_mapped(self):
+        event = {"data": {"id": "meeting-ended", "attributes": {"meeting": {}}}}
+
+        self.assertIsNone(meeting_partition_key(event))
+
+        event["data"]["attributes"]["meeting"]["internal-meeting-id"] = "mock_i"
+
+        self.assertEqual(meeting_partition_key(event), "mock_i")
+        self.assertIsNone(meeting_partition_key({"data": None}))
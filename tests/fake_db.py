@@ -0,0 +1,57 @@
+"""Fake DB-API objects to test code running SQL without a database.
+
+`FakeCursor` records the statements executed and returns the rows it is given,
+and `connection_with` wraps it in a connection whose `commit` and `rollback`
+calls can be checked.
+"""
+import unittest.mock as mock
+
+
+class FakeCursor:
+    """Cursor recording the statements it executes.
+
+    Parameters
+    ----------
+    fetchone : iterable
+        Rows returned by the successive calls of `fetchone`.
+    fetchall : iterable of list
+        Rows returned by the successive calls of `fetchall`.
+    fail_on : callable
+        Called with each statement and its parameters. The statement raises
+        RuntimeError when it returns true.
+    """
+
+    def __init__(self, fetchone=(), fetchall=(), fail_on=None):
+        self.executed = []
+        self._fetchone = list(fetchone)
+        self._fetchall = list(fetchall)
+        self._fail_on = fail_on
+
+    @property
+    def statements(self):
+        """Statements executed, without their parameters."""
+        return [statement for statement, _ in self.executed]
+
+    def execute(self, statement, parameters=None):
+        self.executed.append((statement.strip(), parameters))
+        if self._fail_on is not None and self._fail_on(statement, parameters):
+            raise RuntimeError(f"failed: {statement.strip()}")
+
+    def fetchone(self):
+        return self._fetchone.pop(0)
+
+    def fetchall(self):
+        return self._fetchall.pop(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def connection_with(cursor):
+    """A connection whose cursors are `cursor`."""
+    connection = mock.Mock()
+    connection.cursor.return_value = cursor
+    return connection
@@ -0,0 +1,125 @@
+"""Check the counters the webhook handlers keep instead of counting rows.
+
+It handles a meeting with two users joining and its recording in a seeded
+database, with some events delivered twice, then puts its unique users off
+and reconciles them. It also handles users events with attendees kept in
+`meeting_attendees`, whose counters are adjusted instead of recounted.
+"""
+import unittest.mock as mock
+
+import psycopg2
+
+from mconf_aggr.webhook import reconcile
+from mconf_aggr.webhook.attendee_store import TableAttendeeStore
+from mconf_aggr.webhook.event_mapper import map_webhook_event
+from mconf_aggr.webhook.live_meetings import live_meetings
+from mconf_aggr.webhook.reference_data import ReferenceData, reference_data
+from tests.query_checks import DATABASE_URI, EVENTS, QueryRecorder, SeededDatabaseTest
+
+CREATED, BREAKOUT_CREATED, FIRST_JOINED, SECOND_JOINED = EVENTS[:4]
+(ARCHIVE_ENDED,) = [raw for raw in EVENTS if raw["data"]["id"] == "rap-archive-ended"]
+USERS_EVENTS = [raw for raw in EVENTS if raw["data"]["id"].startswith("user-")]
+
+
+class CountersTest(SeededDatabaseTest):
+    schema_name = "mconf_aggr_counters"
+
+    def test_unique_users_counted_and_reconciled(self):
+        live_meetings.clear()
+        self.addCleanup(live_meetings.clear)
+
+        with mock.patch.object(reference_data, "snapshot", ReferenceData()):
+            self.handle([CREATED, BREAKOUT_CREATED, FIRST_JOINED, SECOND_JOINED, ARCHIVE_ENDED])
+            # Duplicate deliveries change nothing.
+            self.handle([CREATED, FIRST_JOINED, ARCHIVE_ENDED])
+
+        with self.engine.connect() as connection:
+            unique_users, start_time = connection.exec_driver_sql(
+                "SELECT unique_users, start_time FROM meetings_events"
+                " WHERE internal_meeting_id = 'plans-internal'"
+            ).one()
+            participants, status = connection.exec_driver_sql(
+                "SELECT participants, status FROM recordings WHERE record_id = 'plans-internal'"
+            ).one()
+            meetings = connection.exec_driver_sql(
+                "SELECT count(*) FROM meetings WHERE int_meeting_id = 'plans-internal'"
+            ).scalar_one()
+
+        self.assertEqual(unique_users, 2)
+        self.assertEqual(start_time, map_webhook_event(FIRST_JOINED).event.join_time)
+        self.assertEqual((participants, status), (2, "processing"))
+        self.assertEqual(meetings, 1)
+
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "UPDATE meetings_events SET unique_users = 99"
+                " WHERE internal_meeting_id = 'plans-internal'"
+            )
+            connection.exec_driver_sql(
+                "UPDATE meetings_events SET unique_users = NULL WHERE id = 1"
+            )
+
+        connection = psycopg2.connect(DATABASE_URI, options=f"-csearch_path={self.schema_name}")
+        try:
+            corrected = reconcile.unique_users(connection, batch_size=700, logger=mock.Mock())
+        finally:
+            connection.close()
+
+        self.assertEqual(corrected, 2)
+
+        with self.engine.connect() as connection:
+            counts = connection.exec_driver_sql(
+                "SELECT internal_meeting_id, unique_users FROM meetings_events"
+                " WHERE id = 1 OR starts_with(internal_meeting_id, 'plans-') ORDER BY id"
+            ).all()
+
+        self.assertEqual(
+            counts, [("seed-internal-1", 10), ("plans-internal", 2), ("plans-breakout-internal", 0)]
+        )
+
+
+class TableAttendeeCountersTest(SeededDatabaseTest):
+    schema_name = "mconf_aggr_attendee_counters"
+
+    def test_counters_adjusted_by_attendee_rows(self):
+        live_meetings.clear()
+        self.addCleanup(live_meetings.clear)
+        self.addCleanup(setattr, live_meetings, "attendee_store", live_meetings.attendee_store)
+        live_meetings.attendee_store = TableAttendeeStore()
+
+        with mock.patch.object(reference_data, "snapshot", ReferenceData()):
+            self.handle([CREATED])
+            # The meeting is loaded by the first user joining.
+            live_meetings.clear()
+
+            with QueryRecorder(self.engine) as recorder:
+                self.handle(USERS_EVENTS)
+
+        with self.engine.connect() as connection:
+            counters = connection.exec_driver_sql(
+                "SELECT participant_count, moderator_count, listener_count,"
+                " voice_participant_count, video_count FROM meetings"
+                " WHERE int_meeting_id = 'plans-internal'"
+            ).one()
+            counted = connection.exec_driver_sql(
+                "SELECT count(*), count(*) FILTER (WHERE role = 'MODERATOR'),"
+                " count(*) FILTER (WHERE is_listening_only),"
+                " count(*) FILTER (WHERE has_joined_voice), count(*) FILTER (WHERE has_video)"
+                " FROM meeting_attendees JOIN meetings ON meetings.id = meeting_id"
+                " WHERE int_meeting_id = 'plans-internal'"
+            ).one()
+
+        self.assertEqual(tuple(counters), tuple(counted))
+        self.assertEqual(tuple(counters), (1, 1, 0, 0, 0))
+
+        meeting_updates = [
+            statement
+            for statement, _ in recorder.statements
+            if statement.lstrip().startswith("UPDATE meetings SET")
+        ]
+        # Only the first write after the meeting is loaded recounts its attendees.
+        self.assertGreater(len(meeting_updates), 1)
+        self.assertEqual(
+            [statement for statement in meeting_updates if "count(" in statement],
+            meeting_updates[:1],
+        )
@@ -0,0 +1,55 @@
+"""Check the most database statements each type of webhook event takes.
+
+It handles one event of each type in a seeded database, with the caches of
+running meetings and reference data in use as they are in production. An
+event taking more statements than the budget of its type fails the check:
+lower budgets along with the handlers, raise them only on purpose.
+"""
+import unittest.mock as mock
+
+from mconf_aggr.webhook.live_meetings import live_meetings
+from mconf_aggr.webhook.reference_data import ReferenceData, reference_data
+from tests.query_checks import EVENTS, QueryBudgetMixin, SeededDatabaseTest
+
+"""Most statements an event of each type may take."""
+BUDGETS = {
+    "meeting-created": 1,
+    "meeting-ended": 1,
+    "user-joined": 2,
+    "user-left": 2,
+    "user-audio-voice-enabled": 1,
+    "user-audio-voice-disabled": 1,
+    "user-audio-listen-only-enabled": 1,
+    "user-audio-listen-only-disabled": 1,
+    "user-cam-broadcast-start": 1,
+    "user-cam-broadcast-end": 1,
+    "user-presenter-assigned": 1,
+    "user-presenter-unassigned": 1,
+    "meeting-transfer-enabled": 2,
+    "meeting-transfer-disabled": 2,
+    "rap-archive-ended": 2,
+    "rap-sanity-started": 2,
+    "rap-process-started": 2,
+    "rap-process-ended": 2,
+    "rap-publish-started": 2,
+    "rap-publish-ended": 3,
+    "rap-unpublished": 2,
+    "rap-published": 2,
+    "rap-deleted": 2,
+}
+
+
+class QueryBudgetTest(QueryBudgetMixin, SeededDatabaseTest):
+    schema_name = "mconf_aggr_query_budget"
+
+    def test_events_within_budget(self):
+        live_meetings.clear()
+        self.addCleanup(live_meetings.clear)
+
+        with mock.patch.object(reference_data, "snapshot", ReferenceData()):
+            with self.Session() as session:
+                reference_data.load(session)
+
+            costs = self.handle(EVENTS)
+
+        self.assertQueryBudget(costs, BUDGETS)
@@ -0,0 +1,44 @@
+"""Check that no query of the webhook handlers scans a whole table.
+
+It handles one event of each type in a seeded database and explains every
+statement they ran, with sequential scans disabled so that any scan left
+means no index can serve it.
+"""
+import unittest.mock as mock
+
+from mconf_aggr.webhook.live_meetings import live_meetings
+from mconf_aggr.webhook.reference_data import ReferenceData, reference_data
+from tests.query_checks import (
+    EVENTS,
+    QueryRecorder,
+    SeededDatabaseTest,
+    explain,
+    seq_scans,
+)
+
+
+class QueryPlansTest(SeededDatabaseTest):
+    schema_name = "mconf_aggr_query_plans"
+
+    def test_handler_queries_use_indexes(self):
+        live_meetings.clear()
+
+        # Handlers query the database instead of the caches.
+        with mock.patch.object(live_meetings, "maxsize", 0), mock.patch.object(
+            reference_data, "snapshot", ReferenceData()
+        ), QueryRecorder(self.engine) as recorder:
+            self.handle(EVENTS)
+
+        scans = []
+
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+
+            for statement, parameters in recorder.unique():
+                tables = sorted(set(seq_scans(explain(connection, statement, parameters))))
+
+                if tables:
+                    scans.append(f"{', '.join(tables)}: {statement}")
+
+        self.assertNotEqual(recorder.unique(), [])
+        self.assertEqual(scans, [], "statements scanning whole tables:\n" + "\n".join(scans))
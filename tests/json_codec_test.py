@@ -0,0 +1,61 @@
+import json
+import unittest
+import unittest.mock as mock
+
+import mconf_aggr.json_codec as json_codec_module
+from mconf_aggr.json_codec import JsonCodec
+
+EVENT = {"data": {"id": "user-joined", "attributes": {"user": {"name": "Usuário"}}}}
+
+
+class TestJsonCodec(unittest.TestCase):
+    def test_auto_prefers_orjson(self):
+        codec = JsonCodec("auto")
+
+        self.assertEqual(codec.name, "json" if json_codec_module.orjson is None else "orjson")
+
+    def test_auto_without_orjson(self):
+        with mock.patch.object(json_codec_module, "orjson", None):
+            codec = JsonCodec("auto")
+
+        self.assertEqual(codec.name, "json")
+        self.assertIs(codec.loads, json.loads)
+
+    def test_orjson_not_installed(self):
+        with mock.patch.object(json_codec_module, "orjson", None):
+            with self.assertRaises(ValueError):
+                JsonCodec("orjson")
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            JsonCodec("yaml")
+
+    def test_codecs_agree(self):
+        for name in ("json", "orjson"):
+            if name == "orjson" and json_codec_module.orjson is None:
+                continue
+
+            with self.subTest(codec=name):
+                codec = JsonCodec(name)
+                encoded = codec.dumps([EVENT])
+
+                self.assertIsInstance(encoded, str)
+                self.assertEqual(json.loads(encoded), [EVENT])
+                self.assertEqual(codec.loads(json.dumps([EVENT])), [EVENT])
+
+    def test_invalid_json_raises_json_error(self):
+        for name in ("json", "orjson"):
+            if name == "orjson" and json_codec_module.orjson is None:
+                continue
+
+            with self.subTest(codec=name):
+                with self.assertRaises(json.JSONDecodeError):
+                    JsonCodec(name).loads("[{")
+
+    def test_orjson_falls_back_to_json(self):
+        if json_codec_module.orjson is None:
+            self.skipTest("orjson is not installed")
+
+        self.assertEqual(
+            JsonCodec("orjson").loads('{"big": 100000000000000000000}')["big"], 10**20
+        )
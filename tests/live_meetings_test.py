@@ -0,0 +1,264 @@
+import datetime
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.webhook.database_model import Meetings
+from mconf_aggr.webhook.live_meetings import (
+    Attendees,
+    LiveMeeting,
+    LiveMeetingCache,
+    count_attendees,
+)
+
+
+def make_attendee(internal_user_id, role="VIEWER", **flags):
+    attendee = {
+        "internal_user_id": internal_user_id,
+        "role": role,
+        "is_listening_only": False,
+        "has_joined_voice": False,
+        "has_video": False,
+    }
+    attendee.update(flags)
+
+    return attendee
+
+
+def make_meeting(int_meeting_id, attendees=None):
+    return LiveMeeting(
+        id=1,
+        meeting_event_id=2,
+        int_meeting_id=int_meeting_id,
+        updated_at=datetime.datetime(2020, 1, 1),
+        running=True,
+        attendees=attendees,
+        **count_attendees(attendees or []),
+    )
+
+
+class TestAttendees(unittest.TestCase):
+    def test_keeps_join_order(self):
+        attendees = Attendees([make_attendee("u2"), make_attendee("u1")])
+        attendees.add(make_attendee("u3"))
+
+        self.assertEqual([a["internal_user_id"] for a in attendees.to_list()], ["u2", "u1", "u3"])
+
+    def test_ignores_duplicated_users(self):
+        first = make_attendee("u1", role="MODERATOR")
+
+        attendees = Attendees([first, make_attendee("u1")])
+
+        self.assertEqual(len(attendees), 1)
+        self.assertIs(attendees.get("u1"), first)
+        self.assertFalse(attendees.add(make_attendee("u1")))
+        self.assertTrue(attendees.deduplicated)
+        self.assertFalse(Attendees([first]).deduplicated)
+
+    def test_pop(self):
+        attendees = Attendees([make_attendee("u1")])
+
+        self.assertEqual(attendees.pop("u1")["internal_user_id"], "u1")
+        self.assertIsNone(attendees.pop("u1"))
+        self.assertNotIn("u1", attendees)
+        self.assertEqual(attendees.to_list(), [])
+        self.assertEqual(attendees.changes, [("removed", "u1")])
+
+    def test_index(self):
+        attendees = Attendees([make_attendee("u1"), make_attendee("u2"), make_attendee("u3")])
+
+        self.assertEqual(attendees.index("u3"), 2)
+        attendees.add(make_attendee("u4"))
+        self.assertEqual(attendees.index("u4"), 3)
+        attendees.pop("u2")
+        self.assertEqual([attendees.index(key) for key in ("u1", "u3", "u4")], [0, 1, 2])
+        attendees.add(make_attendee("u2"))
+        self.assertEqual(attendees.index("u2"), 3)
+
+
+class TestLiveMeeting(unittest.TestCase):
+    def test_from_row(self):
+        meetings = Meetings(
+            id=1,
+            meeting_event_id=2,
+            int_meeting_id="mock_i",
+            running=True,
+            moderator_count=1,
+            attendees=[{"internal_user_id": "u1"}],
+        )
+
+        live_meeting = LiveMeeting.from_row(meetings)
+
+        self.assertEqual(live_meeting.id, 1)
+        self.assertEqual(live_meeting.meeting_event_id, 2)
+        self.assertEqual(live_meeting.moderator_count, 1)
+        self.assertEqual(live_meeting.attendees.to_list(), meetings.attendees)
+
+    def test_values(self):
+        live_meeting = make_meeting("mock_i")
+
+        values = live_meeting.values()
+
+        self.assertEqual(set(values), set(LiveMeeting.COLUMNS) - {"attendees"})
+        self.assertTrue(values["running"])
+
+    def test_add_attendee(self):
+        live_meeting = make_meeting("mock_i")
+
+        self.assertTrue(live_meeting.add_attendee(make_attendee("u1", role="MODERATOR")))
+        self.assertTrue(live_meeting.add_attendee(make_attendee("u2", role="TRANSFER")))
+        self.assertFalse(live_meeting.add_attendee(make_attendee("u1")))
+
+        self.assertEqual(live_meeting.participant_count, 1)
+        self.assertEqual(live_meeting.transfer_count, 1)
+        self.assertEqual(live_meeting.moderator_count, 1)
+        self.assertEqual(len(live_meeting.attendees), 2)
+
+    def test_remove_attendee(self):
+        live_meeting = make_meeting(
+            "mock_i", [make_attendee("u1", has_video=True), make_attendee("u2", has_video=True)]
+        )
+
+        live_meeting.remove_attendee("u1")
+        live_meeting.remove_attendee("unknown")
+
+        self.assertEqual(live_meeting.participant_count, 1)
+        self.assertEqual(live_meeting.video_count, 1)
+        self.assertEqual([a["internal_user_id"] for a in live_meeting.attendees], ["u2"])
+
+    def test_update_attendee(self):
+        live_meeting = make_meeting("mock_i", [make_attendee("u1", is_listening_only=True)])
+
+        def join_voice(attendee):
+            attendee["has_joined_voice"] = True
+            attendee["is_listening_only"] = False
+
+        live_meeting.update_attendee("u1", join_voice)
+
+        self.assertEqual(live_meeting.voice_participant_count, 1)
+        self.assertEqual(live_meeting.listener_count, 0)
+        self.assertEqual(live_meeting.recount(), {})
+
+    def test_recount_corrects_drift(self):
+        live_meeting = make_meeting("mock_i", [make_attendee("u1"), make_attendee("u2")])
+        live_meeting.participant_count = 5
+
+        drift = live_meeting.recount()
+
+        self.assertEqual(drift, {"participant_count": (5, 2)})
+        self.assertEqual(live_meeting.participant_count, 2)
+
+
+class TestLiveMeetingCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LiveMeetingCache(maxsize=2)
+        self.session = mock.MagicMock()
+
+    def test_put_get(self):
+        live_meeting = make_meeting("mock_i")
+
+        self.cache.put(live_meeting)
+
+        self.assertIs(self.cache.get("mock_i"), live_meeting)
+        self.assertIsNone(self.cache.get("other"))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put(make_meeting("m1"))
+        self.cache.put(make_meeting("m2"))
+        self.cache.get("m1")
+        self.cache.put(make_meeting("m3"))
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNotNone(self.cache.get("m1"))
+        self.assertIsNone(self.cache.get("m2"))
+
+    def test_disabled(self):
+        cache = LiveMeetingCache(maxsize=0)
+
+        cache.put(make_meeting("mock_i"))
+
+        self.assertEqual(len(cache), 0)
+
+    def test_fetch_miss_loads_meeting(self):
+        self.session.query().filter().first.return_value = Meetings(
+            id=1, meeting_event_id=2, int_meeting_id="mock_i", attendees=[]
+        )
+
+        live_meeting = self.cache.fetch(self.session, "mock_i")
+
+        self.assertEqual(live_meeting.id, 1)
+        self.assertIs(self.cache.get("mock_i"), live_meeting)
+
+    def test_fetch_recounts_loaded_meeting(self):
+        self.session.query().filter().first.return_value = Meetings(
+            id=1,
+            meeting_event_id=2,
+            int_meeting_id="mock_i",
+            participant_count=0,
+            transfer_count=0,
+            moderator_count=0,
+            listener_count=0,
+            voice_participant_count=0,
+            video_count=0,
+            attendees=[make_attendee("u1")],
+        )
+
+        live_meeting = self.cache.fetch(self.session, "mock_i")
+
+        self.assertEqual(live_meeting.participant_count, 1)
+
+    def test_write_recounts_periodically(self):
+        cache = LiveMeetingCache(recount_interval=2)
+        live_meeting = make_meeting("mock_i", [make_attendee("u1")])
+        live_meeting.participant_count = 5
+
+        cache.write(self.session, live_meeting)
+        self.assertEqual(live_meeting.participant_count, 5)
+
+        cache.write(self.session, live_meeting)
+        self.assertEqual(live_meeting.participant_count, 1)
+
+    def test_fetch_hit_does_not_query(self):
+        live_meeting = make_meeting("mock_i")
+        self.cache.put(live_meeting)
+
+        self.assertIs(self.cache.fetch(self.session, "mock_i"), live_meeting)
+        self.session.query().filter().first.assert_not_called()
+
+    def test_fetch_no_meeting(self):
+        self.session.query().filter().first.return_value = None
+
+        self.assertIsNone(self.cache.fetch(self.session, "mock_i"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_write(self):
+        live_meeting = make_meeting("mock_i")
+        loaded_at = live_meeting.updated_at
+        self.cache.put(live_meeting)
+        self.session.query().filter().update.return_value = 1
+
+        self.assertTrue(self.cache.write(self.session, live_meeting))
+
+        args, kwargs = self.session.query().filter().update.call_args
+        self.assertEqual(args[0]["updated_at"], live_meeting.updated_at)
+        self.assertEqual(args[0]["attendees"], [])
+        self.assertGreater(live_meeting.updated_at, loaded_at)
+        self.assertIs(self.cache.get("mock_i"), live_meeting)
+
+    def test_write_clears_attendee_changes(self):
+        live_meeting = make_meeting("mock_i")
+        live_meeting.add_attendee(make_attendee("u1"))
+
+        self.cache.write(self.session, live_meeting)
+
+        self.assertEqual(live_meeting.attendees.changes, [])
+
+    def test_write_stale(self):
+        live_meeting = make_meeting("mock_i")
+        loaded_at = live_meeting.updated_at
+        self.cache.put(live_meeting)
+        self.session.query().filter().update.return_value = 0
+
+        self.assertFalse(self.cache.write(self.session, live_meeting))
+
+        self.assertEqual(live_meeting.updated_at, loaded_at)
+        self.assertIsNone(self.cache.get("mock_i"))
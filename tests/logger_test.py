@@ -0,0 +1,118 @@
+import threading
+import unittest
+import unittest.mock as mock
+
+from loguru import logger
+
+import mconf_aggr.logger as logging
+from mconf_aggr.logger import LevelFilter, QueueSink, get_logger, parse_levels
+
+
+def make_record(name, level, **extra):
+    return {"name": name, "level": logger.level(level), "extra": extra}
+
+
+class TestGetLogger(unittest.TestCase):
+    def test_configures_once(self):
+        get_logger()
+
+        with mock.patch.object(logging, "setup_logger") as setup_logger:
+            get_logger()
+            get_logger(__name__)
+
+        setup_logger.assert_not_called()
+
+    def test_child_logger_is_reused(self):
+        child = get_logger("mconf_aggr.some_module")
+
+        self.assertIs(get_logger("mconf_aggr.some_module"), child)
+        self.assertIsNot(get_logger("mconf_aggr.other_module"), child)
+
+    def test_keeps_other_sinks(self):
+        output = []
+        handler_id = logger.add(output.append, format="{message}")
+
+        try:
+            get_logger(__name__).info("message")
+        finally:
+            logger.remove(handler_id)
+
+        self.assertEqual(output, ["message\n"])
+
+
+class TestLevelFilter(unittest.TestCase):
+    def test_default_level(self):
+        level_filter = LevelFilter("INFO")
+
+        self.assertTrue(level_filter(make_record("mconf_aggr.main", "INFO")))
+        self.assertFalse(level_filter(make_record("mconf_aggr.main", "DEBUG")))
+
+    def test_module_level(self):
+        level_filter = LevelFilter("INFO", {"mconf_aggr.webhook": "DEBUG"})
+
+        self.assertTrue(level_filter(make_record("mconf_aggr.webhook.event_mapper", "DEBUG")))
+        self.assertFalse(level_filter(make_record("mconf_aggr.webhook_other", "DEBUG")))
+
+    def test_child_logger_name(self):
+        level_filter = LevelFilter("INFO", {"mconf_aggr.webhook": "ERROR"})
+
+        record = make_record("mconf_aggr.main", "INFO", logger_name="mconf_aggr.webhook.x")
+
+        self.assertFalse(level_filter(record))
+
+    def test_parse_levels(self):
+        self.assertEqual(
+            parse_levels("mconf_aggr.webhook=debug, mconf_aggr.aggregator = WARNING,"),
+            {"mconf_aggr.webhook": "DEBUG", "mconf_aggr.aggregator": "WARNING"},
+        )
+        self.assertEqual(parse_levels(None), {})
+
+
+class TestQueueSink(unittest.TestCase):
+    def test_writes_in_background(self):
+        output = []
+        sink = QueueSink(output.append)
+
+        sink("first")
+        sink("second")
+        sink.stop()
+
+        self.assertEqual(output, ["first", "second"])
+
+    def test_drops_when_full(self):
+        release = threading.Event()
+        output = []
+
+        def blocking_sink(message):
+            release.wait()
+            output.append(message)
+
+        sink = QueueSink(blocking_sink, maxsize=1)
+        sink("first")
+        # Wait for the writer to take the first message.
+        while not sink._queue.empty():
+            pass
+        sink("second")
+        sink("third")
+        release.set()
+        sink.stop()
+
+        self.assertEqual(output, ["first", "second"])
+        self.assertEqual(sink.dropped, 1)
+
+
+class TestSetupLogger(unittest.TestCase):
+    def tearDown(self):
+        logging.setup_logger()
+
+    def test_handler_level_is_lowest_configured_level(self):
+        output = []
+
+        logging.setup_logger(level="WARNING", sink=output.append, levels={"tests": "INFO"})
+        logger.debug("dropped")
+        logger.bind(logger_name="tests.module").info("kept")
+        logger.info("filtered")
+
+        self.assertEqual(len(output), 1)
+        self.assertIn("kept", output[0])
+        self.assertEqual(logger._core.min_level, logger.level("INFO").no)
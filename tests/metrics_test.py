@@ -0,0 +1,163 @@
+import threading
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.metrics import CONTENT_TYPE, Registry
+from mconf_aggr.webhook.database import _count_query, _end_query
+from mconf_aggr.webhook.instruments import (
+    current_handler,
+    db_queries_total,
+    event_statements,
+    measure_queries,
+)
+from mconf_aggr.webhook.probe_listener import MetricsListener
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter("events_total", "Events.", ("type",))
+        counter.labels("a").inc()
+        counter.labels("a").inc(2)
+        counter.labels("b").inc()
+
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP events_total Events.\n"
+            "# TYPE events_total counter\n"
+            'events_total{type="a"} 3\n'
+            'events_total{type="b"} 1\n',
+        )
+
+    def test_counter_sums_threads(self):
+        counter = self.registry.counter("events_total", "Events.")
+
+        def increment():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.labels().get(), 4000)
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+
+        self.assertEqual(
+            self.registry.render().splitlines()[2:],
+            [
+                'latency_seconds_bucket{le="0.1"} 2',
+                'latency_seconds_bucket{le="1"} 3',
+                'latency_seconds_bucket{le="+Inf"} 4',
+                "latency_seconds_sum 2.65",
+                "latency_seconds_count 4",
+            ],
+        )
+
+    def test_histogram_time(self):
+        histogram = self.registry.histogram("latency_seconds", "Latency.", ("stage",))
+
+        with self.assertRaises(RuntimeError):
+            with histogram.labels("map").time():
+                raise RuntimeError()
+
+        self.assertIn('latency_seconds_count{stage="map"} 1', self.registry.render())
+
+    def test_get_or_create(self):
+        counter = self.registry.counter("events_total", "Events.", ("type",))
+
+        self.assertIs(self.registry.counter("events_total", "Events.", ("type",)), counter)
+
+        with self.assertRaises(ValueError):
+            self.registry.histogram("events_total", "Events.", ("type",))
+
+    def test_labels_mismatch(self):
+        counter = self.registry.counter("events_total", "Events.", ("type",))
+
+        with self.assertRaises(ValueError):
+            counter.labels("a", "b")
+
+    def test_callback(self):
+        self.registry.callback("depth", "Depth.", ("channel",), lambda: [(("c-0",), 3)])
+
+        self.assertIn('depth{channel="c-0"} 3', self.registry.render())
+
+        self.registry.callback("depth", "Depth.", ("channel",), lambda: [(("c-0",), 5)])
+
+        self.assertIn('depth{channel="c-0"} 5', self.registry.render())
+
+    def test_failing_callback(self):
+        def fail():
+            raise RuntimeError("gone")
+
+        self.registry.callback("depth", "Depth.", (), fail)
+        self.registry.counter("events_total", "Events.").inc()
+
+        rendered = self.registry.render()
+
+        self.assertIn("# Unable to collect depth: gone", rendered)
+        self.assertIn("events_total 1", rendered)
+
+    def test_label_escaping(self):
+        self.registry.counter("events_total", "Events.", ("type",)).labels('a"b\\c\n').inc()
+
+        self.assertIn('events_total{type="a\\"b\\\\c\\n"} 1', self.registry.render())
+
+
+class TestMetricsListener(unittest.TestCase):
+    def test_on_get(self):
+        registry = Registry()
+        registry.counter("events_total", "Events.").inc()
+        resp = mock.Mock()
+
+        MetricsListener(registry).on_get(mock.Mock(), resp)
+
+        self.assertEqual(resp.content_type, CONTENT_TYPE)
+        self.assertIn("events_total 1", resp.text)
+
+
+class TestQueryCount(unittest.TestCase):
+    def test_counts_by_current_handler(self):
+        queries = db_queries_total.labels("TestHandler")
+        before = queries.get()
+        token = current_handler.set("TestHandler")
+
+        try:
+            _count_query(None, None, "SELECT 1", {}, None, False)
+        finally:
+            current_handler.reset(token)
+
+        self.assertEqual(queries.get(), before + 1)
+
+    def test_measures_cost_of_event(self):
+        statements = event_statements.labels("test-event")
+        before = summary(statements)
+        cursor = mock.Mock()
+
+        with measure_queries("test-event") as cost:
+            for rowcount in (3, -1):
+                cursor.rowcount = rowcount
+                _count_query(None, cursor, "SELECT 1", {}, None, False)
+                _end_query(None, cursor, "SELECT 1", {}, None, False)
+
+        # Statements outside of the block are not measured.
+        _count_query(None, cursor, "SELECT 1", {}, None, False)
+        _end_query(None, cursor, "SELECT 1", {}, None, False)
+
+        self.assertEqual((cost.statements, cost.rows), (2, 3))
+        self.assertGreater(cost.seconds, 0)
+        self.assertEqual(
+            summary(statements), {"_sum": before["_sum"] + 2, "_count": before["_count"] + 1}
+        )
+
+
+def summary(histogram_child):
+    return {suffix: value for suffix, _, value in histogram_child.samples() if suffix != "_bucket"}
@@ -0,0 +1,307 @@
+"""Helpers to check the queries of the webhook handlers against PostgreSQL.
+
+`SeededDatabaseTest` creates the tables and applies the migrations in a
+schema of its own of the local database at MCONF_WEBHOOK_TEST_DATABASE_URI,
+seeds it, and drops the schema afterwards. `EVENTS` holds one event of each
+type, in an order each of them finds the rows it updates.
+"""
+import json
+import os
+import unittest
+
+import psycopg2
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from mconf_aggr.webhook import schema
+from mconf_aggr.webhook.database import instrument
+from mconf_aggr.webhook.database_handler import DataProcessor
+from mconf_aggr.webhook.database_model import Base
+from mconf_aggr.webhook.event_mapper import map_webhook_event
+
+DATABASE_URI = os.getenv("MCONF_WEBHOOK_TEST_DATABASE_URI")
+
+SEED = """
+INSERT INTO institutions (guid, name)
+SELECT 'institution-' || i, 'Institution ' || i FROM generate_series(1, 1000) i;
+
+INSERT INTO shared_secrets (guid, institution_guid, name, secret, scope)
+SELECT 'secret-' || i, 'institution-' || i, 'secret-name-' || i, 'secret', 'all'
+FROM generate_series(1, 1000) i;
+
+INSERT INTO servers (guid, institution_guid, name, secret, enabled)
+SELECT 'server-' || i, 'institution-' || i, 'server-' || i || '.example.com', 'secret', true
+FROM generate_series(1, 1000) i;
+
+INSERT INTO meetings_events (
+    shared_secret_guid, external_meeting_id, internal_meeting_id, parent_meeting_id,
+    name, start_time, end_time, unique_users
+)
+SELECT
+    'secret-' || (mod(i, 1000) + 1), 'seed-external-' || i, 'seed-internal-' || i,
+    CASE WHEN mod(i, 10) = 0 THEN 'seed-internal-' || (i - 1) END,
+    'Seed ' || i, i, i + 1, 10
+FROM generate_series(1, 20000) i;
+
+INSERT INTO users_events (
+    meeting_event_id, name, role, join_time, leave_time, internal_user_id, external_user_id
+)
+SELECT
+    1 + mod(i, 20000), 'User ' || i, 'VIEWER', i, CASE WHEN mod(i, 50) <> 0 THEN i + 1 END,
+    'seed-user-' || i, 'seed-user-' || i
+FROM generate_series(1, 200000) i;
+
+INSERT INTO meetings (
+    meeting_event_id, running, has_user_joined, participant_count, listener_count,
+    voice_participant_count, video_count, moderator_count, attendees,
+    ext_meeting_id, int_meeting_id, transfer, transfer_count
+)
+SELECT
+    id, true, true, 0, 0, 0, 0, 0, '[]', external_meeting_id, internal_meeting_id, false, 0
+FROM meetings_events WHERE mod(id, 20) = 0;
+
+INSERT INTO recordings (
+    record_id, meeting_event_id, internal_meeting_id, external_meeting_id, status,
+    playback, workflow
+)
+SELECT
+    'seed-record-' || id, id, internal_meeting_id, external_meeting_id, 'published', '[]', '{}'
+FROM meetings_events WHERE mod(id, 4) = 0;
+
+ANALYZE;
+"""
+
+SERVER_URL = "server-1.example.com"
+MEETING = {"internal-meeting-id": "plans-internal", "external-meeting-id": "plans-external"}
+CREATED = {
+    "name": "plans",
+    "create-time": 1535121789863,
+    "voice-conf": "71096",
+    "dial-number": "613-555-1234",
+    "moderator-pass": "mp",
+    "viewer-pass": "ap",
+}
+BREAKOUT = {
+    **CREATED,
+    "internal-meeting-id": "plans-breakout-internal",
+    "external-meeting-id": "plans-breakout-external",
+    "parent-id": "plans-internal",
+    "is-breakout": True,
+    "metadata": {"mconf-shared-secret-guid": "secret-2"},
+}
+USER = {
+    "internal-user-id": "plans-user",
+    "external-user-id": "plans-user",
+    "name": "Plans",
+    "role": "MODERATOR",
+    "presenter": True,
+}
+
+
+def raw_event(event_type, ts=1535121789919, **attributes):
+    return {
+        "server_url": SERVER_URL,
+        "data": {
+            "type": "event",
+            "id": event_type,
+            "attributes": attributes,
+            "event": {"ts": ts},
+        },
+    }
+
+
+def recording_event(event_type, **attributes):
+    return raw_event(event_type, meeting=MEETING, **{"record-id": "plans-internal"}, **attributes)
+
+
+EVENTS = [
+    raw_event(
+        "meeting-created",
+        meeting=dict(MEETING, **CREATED, metadata={"mconflb-institution-name": "secret-name-1"}),
+    ),
+    raw_event("meeting-created", meeting=BREAKOUT),
+    raw_event("user-joined", meeting=MEETING, user=USER),
+    raw_event("user-joined", meeting=MEETING, user=dict(USER, **{"internal-user-id": "plans-2"})),
+    raw_event("user-audio-voice-enabled", meeting=MEETING, user=USER),
+    raw_event("user-audio-voice-disabled", meeting=MEETING, user=USER),
+    raw_event("user-audio-listen-only-enabled", meeting=MEETING, user=USER),
+    raw_event("user-audio-listen-only-disabled", meeting=MEETING, user=USER),
+    raw_event("user-cam-broadcast-start", meeting=MEETING, user=USER),
+    raw_event("user-cam-broadcast-end", meeting=MEETING, user=USER),
+    raw_event("user-presenter-assigned", meeting=MEETING, user=USER),
+    raw_event("user-presenter-unassigned", meeting=MEETING, user=USER),
+    raw_event("user-left", meeting=MEETING, user=USER),
+    raw_event("meeting-transfer-enabled", meeting=MEETING),
+    raw_event("meeting-transfer-disabled", meeting=MEETING),
+    raw_event("meeting-ended", meeting=MEETING),
+    recording_event("rap-archive-ended", recorded=True),
+    recording_event("rap-sanity-started"),
+    recording_event("rap-process-started", workflow="presentation"),
+    recording_event("rap-process-ended", workflow="presentation"),
+    recording_event("rap-publish-started", workflow="presentation"),
+    recording_event(
+        "rap-publish-ended",
+        workflow="presentation",
+        recording={
+            "name": "plans",
+            "size": 1024,
+            "metadata": {"meetingId": "plans-external"},
+            "playback": {"format": "presentation", "link": "https://example.com/playback"},
+            "download": {},
+        },
+    ),
+    raw_event("rap-unpublished", meeting=MEETING, record_id="plans-internal"),
+    raw_event("rap-published", meeting=MEETING, record_id="plans-internal"),
+    raw_event("rap-deleted", meeting=MEETING, record_id="plans-internal"),
+]
+
+
+"""Statements whose plans can be explained."""
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+class QueryRecorder:
+    """Record the statements run through an engine while in its context."""
+
+    def __init__(self, engine):
+        self._engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self._engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self._engine, "before_cursor_execute", self._record)
+
+    def unique(self):
+        """The explainable statements recorded, each once with its first parameters."""
+        seen = {}
+
+        for statement, parameters in self.statements:
+            if statement.lstrip().upper().startswith(EXPLAINABLE):
+                seen.setdefault(statement, parameters)
+
+        return list(seen.items())
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0]
+
+        self.statements.append((statement, parameters))
+
+
+def explain(connection, statement, parameters):
+    """Plan of a statement, without running it."""
+    result = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)
+    plan = result.scalar()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return plan[0]["Plan"]
+
+
+def seq_scans(plan):
+    """Names of the relations read by sequential scans in a plan."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+
+@unittest.skipUnless(DATABASE_URI, "MCONF_WEBHOOK_TEST_DATABASE_URI is not set")
+class SeededDatabaseTest(unittest.TestCase):
+    """Test case with a seeded schema of its own in the local database."""
+
+    schema_name = None
+
+    @classmethod
+    def setUpClass(cls):
+        options = f"-csearch_path={cls.schema_name}"
+        cls._run(
+            f"DROP SCHEMA IF EXISTS {cls.schema_name} CASCADE; CREATE SCHEMA {cls.schema_name}"
+        )
+
+        cls.engine = sqlalchemy.create_engine(DATABASE_URI, connect_args={"options": options})
+        instrument(cls.engine)
+        Base.metadata.create_all(cls.engine)
+
+        connection = psycopg2.connect(DATABASE_URI, options=options)
+        connection.autocommit = True
+        try:
+            schema.upgrade(connection)
+        finally:
+            connection.close()
+
+        with cls.engine.begin() as connection:
+            for statement in schema.split(SEED):
+                connection.exec_driver_sql(statement)
+
+        cls.Session = sessionmaker(bind=cls.engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+        cls._run(f"DROP SCHEMA IF EXISTS {cls.schema_name} CASCADE")
+
+    @classmethod
+    def _run(cls, sql):
+        engine = sqlalchemy.create_engine(DATABASE_URI)
+        try:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(sql)
+        finally:
+            engine.dispose()
+
+    def handle(self, raw_events):
+        """Handle events in a transaction each.
+
+        Returns
+        -------
+        list of tuple
+            The type and `instruments.QueryCost` of each event.
+        """
+        costs = []
+
+        for raw in raw_events:
+            webhook_event = map_webhook_event(raw)
+            session = self.Session()
+            try:
+                costs.append(
+                    (webhook_event.event_type, DataProcessor(session).update(webhook_event))
+                )
+                session.commit()
+            finally:
+                session.close()
+
+        return costs
+
+
+class QueryBudgetMixin:
+    """Assertions on the database statements each type of event may take."""
+
+    def assertQueryBudget(self, costs, budgets):
+        """Assert that no event took more statements than the budget of its type.
+
+        Parameters
+        ----------
+        costs : list of tuple
+            The type and `instruments.QueryCost` of each event handled.
+        budgets : dict
+            Most statements an event of each type may take. Every type
+            handled must have a budget.
+        """
+        over = []
+
+        for event_type, cost in costs:
+            budget = budgets.get(event_type)
+
+            if budget is None:
+                over.append(f"{event_type}: {cost.statements} statement(s), no budget")
+            elif cost.statements > budget:
+                over.append(f"{event_type}: {cost.statements} statement(s), budget {budget}")
+
+        self.assertEqual(over, [], "events over their query budget:\n" + "\n".join(over))
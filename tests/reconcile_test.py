@@ -0,0 +1,57 @@
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.webhook import reconcile
+from tests.fake_db import FakeCursor, connection_with
+
+
+def cursor_with(bounds, corrections=(), fail_on_batch=None):
+    def fail_on(statement, parameters):
+        return parameters is not None and parameters["first"] == fail_on_batch
+
+    return FakeCursor(fetchone=[bounds], fetchall=corrections, fail_on=fail_on)
+
+
+def keywords(cursor):
+    return [statement.split()[0] for statement in cursor.statements]
+
+
+class TestUniqueUsers(unittest.TestCase):
+    def test_reconciles_in_batches(self):
+        cursor = cursor_with((3, 7), corrections=[[(4, 2)], [], [(7, 0)]])
+        connection = connection_with(cursor)
+
+        corrected = reconcile.unique_users(connection, batch_size=2, logger=mock.Mock())
+
+        self.assertEqual(corrected, 2)
+        batches = [
+            parameters
+            for statement, parameters in cursor.executed
+            if statement.startswith("UPDATE")
+        ]
+        self.assertEqual(
+            batches, [{"first": 3, "last": 5}, {"first": 5, "last": 7}, {"first": 7, "last": 9}]
+        )
+        # Meetings are locked before being counted.
+        self.assertEqual(keywords(cursor)[1:3], ["SELECT", "UPDATE"])
+        # The bounds are read in a transaction of their own, then one per batch.
+        self.assertEqual(connection.commit.call_count, 4)
+
+    def test_no_meetings(self):
+        cursor = cursor_with((None, None))
+
+        corrected = reconcile.unique_users(connection_with(cursor), logger=mock.Mock())
+
+        self.assertEqual(corrected, 0)
+        self.assertEqual(len(cursor.executed), 1)
+
+    def test_failure_rolls_back_batch(self):
+        cursor = cursor_with((1, 4), corrections=[[(1, 3)]], fail_on_batch=3)
+        connection = connection_with(cursor)
+
+        with self.assertRaises(RuntimeError):
+            reconcile.unique_users(connection, batch_size=2, logger=mock.Mock())
+
+        # The batch before the failure stays committed.
+        self.assertEqual(connection.commit.call_count, 2)
+        connection.rollback.assert_called_once()
@@ -0,0 +1,87 @@
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.webhook.reference_data import (
+    InstitutionRecord,
+    ReferenceData,
+    ReferenceDataCache,
+    ServerRecord,
+    SharedSecretRecord,
+)
+
+
+class TestReferenceData(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = ReferenceData(
+            servers=[ServerRecord(1, "server-guid", "https://server")],
+            shared_secrets=[
+                SharedSecretRecord("secret-guid", "secret", "institution-guid"),
+                SharedSecretRecord("other-guid", "secret", None),
+            ],
+            institutions=[InstitutionRecord("institution-guid", "institution")],
+            version=3,
+        )
+
+    def test_lookups(self):
+        self.assertEqual(self.snapshot.server("https://server").id, 1)
+        self.assertEqual(self.snapshot.shared_secret_by_guid("other-guid").name, "secret")
+        self.assertEqual(self.snapshot.shared_secret_by_name("secret").guid, "secret-guid")
+        self.assertEqual(self.snapshot.institution("institution-guid").name, "institution")
+
+    def test_misses(self):
+        self.assertIsNone(self.snapshot.server("https://unknown"))
+        self.assertIsNone(self.snapshot.shared_secret_by_guid("unknown"))
+        self.assertIsNone(self.snapshot.shared_secret_by_name("unknown"))
+        self.assertIsNone(self.snapshot.institution("unknown"))
+
+    def test_len(self):
+        self.assertEqual(len(self.snapshot), 4)
+
+
+class TestReferenceDataCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ReferenceDataCache()
+        self.session = mock.MagicMock()
+        self.session.execute().first.return_value = ("a", "b", "c")
+        self.session.query.side_effect = [
+            [(1, "server-guid", "https://server")],
+            mock.MagicMock(order_by=mock.MagicMock(return_value=[("secret-guid", "secret", None)])),
+            [("institution-guid", "institution")],
+        ]
+
+    def test_load(self):
+        snapshot = self.cache.load(self.session)
+
+        self.assertIs(self.cache.snapshot, snapshot)
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(snapshot.fingerprint, ("a", "b", "c"))
+        self.assertEqual(snapshot.server("https://server").guid, "server-guid")
+        self.assertEqual(snapshot.shared_secret_by_guid("secret-guid").name, "secret")
+        self.assertEqual(snapshot.institution("institution-guid").name, "institution")
+
+    def test_load_too_many_rows(self):
+        self.cache.max_rows = 2
+
+        snapshot = self.cache.load(self.session)
+
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(len(snapshot), 0)
+
+    def test_disabled(self):
+        self.cache.max_rows = 0
+
+        self.assertEqual(self.cache.load(self.session).version, 0)
+        self.assertFalse(self.cache.refresh(self.session))
+        self.session.query.assert_not_called()
+
+    def test_refresh_unchanged(self):
+        self.cache.load(self.session)
+
+        self.assertFalse(self.cache.refresh(self.session))
+        self.assertEqual(self.cache.snapshot.version, 1)
+
+    def test_refresh_changed(self):
+        self.cache.snapshot = ReferenceData(version=1, fingerprint=("old", "b", "c"))
+
+        self.assertTrue(self.cache.refresh(self.session))
+        self.assertEqual(self.cache.snapshot.version, 2)
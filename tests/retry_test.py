@@ -0,0 +1,207 @@
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.aggregator.aggregator import (
+    CallbackError,
+    Channel,
+    Subscriber,
+    SubscriberThread,
+)
+from mconf_aggr.aggregator.retry import Failure, RetryPolicy, RetryScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_delay_grows_exponentially_up_to_max(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5, jitter=0)
+
+        self.assertEqual([policy.delay(attempts) for attempts in range(1, 6)], [1, 2, 4, 5, 5])
+
+    def test_jitter(self):
+        policy = RetryPolicy(base_delay=4, jitter=0.5)
+
+        with mock.patch("mconf_aggr.aggregator.retry.random.random", return_value=1):
+            self.assertEqual(policy.delay(1), 2)
+
+
+class TestRetryScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        policy = RetryPolicy(max_attempts=3, base_delay=1, jitter=0)
+        self.retry = RetryScheduler(policy, key=lambda data: data[0], clock=self.clock)
+
+    def test_transient_failure_is_retried(self):
+        self.assertIsNone(self.retry.failed(Failure("a1", "error", True)))
+        self.assertEqual(self.retry.next_due_in(), 1)
+        self.assertEqual(self.retry.due(), [])
+
+        self.clock.now = 1
+
+        self.assertEqual(self.retry.due(), [("a", "a1", 1)])
+
+        self.retry.succeeded("a")
+
+        self.assertEqual(self.retry.pending(), 0)
+        self.assertIsNone(self.retry.next_due_in())
+
+    def test_permanent_failure_is_given_up(self):
+        self.assertEqual(self.retry.failed(Failure("a1", "error", False)), ("a1", "error", 1))
+        self.assertEqual(self.retry.pending(), 0)
+
+    def test_attempts_are_capped(self):
+        self.retry.failed(Failure("a1", "error", True))
+        self.clock.now = 1
+        self.retry.due()
+        self.assertIsNone(self.retry.retry_failed("a", Failure("a1", "error", True)))
+
+        self.clock.now = 3
+        self.retry.due()
+
+        self.assertEqual(
+            self.retry.retry_failed("a", Failure("a1", "last", True)), ("a1", "last", 3)
+        )
+
+    def test_later_data_with_same_key_is_held_back(self):
+        self.retry.failed(Failure("a1", "error", True))
+
+        self.assertTrue(self.retry.hold("a2"))
+        self.assertFalse(self.retry.hold("b1"))
+        self.assertEqual(self.retry.pending(), 2)
+
+        self.clock.now = 1
+        self.retry.due()
+        self.retry.succeeded("a")
+
+        # The data held back is due at once.
+        self.assertEqual(self.retry.due(), [("a", "a2", 0)])
+
+    def test_drain(self):
+        self.retry.failed(Failure("a1", "error", True))
+        self.retry.hold("a2")
+
+        self.assertEqual(self.retry.drain(), [("a1", 1, "error"), ("a2", 0, None)])
+        self.assertEqual(self.retry.pending(), 0)
+
+
+class TestSubscriberThreadRetry(unittest.TestCase):
+    def test_retries_until_success(self):
+        channel = Channel("channel")
+        callback_mock = mock.Mock()
+        callback_mock.run.side_effect = [
+            CallbackError(failures=[Failure("a1", "error", True)]),
+            None,
+            None,
+        ]
+        policy = RetryPolicy(base_delay=0.01, jitter=0)
+        thread = SubscriberThread(
+            Subscriber(channel, callback_mock, retry_policy=policy, retry_key=lambda d: d[0]),
+            errorevent=None,
+        )
+
+        channel.publish("a1")
+        channel.publish("a2")
+        thread.start()
+
+        while callback_mock.run.call_count < 3:
+            thread.join(0.01)
+
+        thread.exit()
+
+        self.assertEqual(
+            callback_mock.run.call_args_list, [mock.call("a1"), mock.call("a1"), mock.call("a2")]
+        )
+        callback_mock.dead_letter.assert_not_called()
+
+    def test_gives_up_on_permanent_failure(self):
+        channel = Channel("channel")
+        callback_mock = mock.Mock()
+        error = CallbackError()
+        callback_mock.run.side_effect = error
+        thread = SubscriberThread(Subscriber(channel, callback_mock), errorevent=None)
+
+        channel.publish("a1")
+        thread.start()
+        thread.exit()
+
+        callback_mock.dead_letter.assert_called_once_with("a1", error, 1)
+
+    def run_thread(self, channel, callback_mock, max_attempts=8):
+        policy = RetryPolicy(max_attempts=max_attempts, base_delay=0.01, jitter=0)
+        thread = SubscriberThread(
+            Subscriber(channel, callback_mock, retry_policy=policy), errorevent=None
+        )
+        thread.start()
+        self.addCleanup(thread.exit)
+
+        return thread
+
+    def test_join_after_successful_retry(self):
+        channel = Channel("channel")
+        callback_mock = mock.Mock()
+        callback_mock.run.side_effect = [
+            CallbackError(failures=[Failure("a1", "error", True)]),
+            None,
+        ]
+
+        channel.publish("a1")
+        self.run_thread(channel, callback_mock)
+
+        self.assertTrue(channel.join(2))
+        self.assertEqual(callback_mock.run.call_count, 2)
+
+    def test_join_after_giving_up_on_retry(self):
+        channel = Channel("channel")
+        callback_mock = mock.Mock()
+        error = CallbackError(failures=[Failure("a1", "error", True)])
+        callback_mock.run.side_effect = error
+
+        channel.publish("a1")
+        self.run_thread(channel, callback_mock, max_attempts=2)
+
+        self.assertTrue(channel.join(2))
+        callback_mock.dead_letter.assert_called_once_with("a1", "error", 2)
+
+    def test_retry_reporting_several_failures(self):
+        channel = Channel("channel")
+        callback_mock = mock.Mock()
+        error = CallbackError(failures=[Failure("a1", "error", True), Failure("b1", "error", True)])
+        callback_mock.run.side_effect = [
+            CallbackError(failures=[Failure("a1", "error", True)]),
+            error,
+            None,
+        ]
+
+        channel.publish("a1")
+        self.run_thread(channel, callback_mock)
+
+        self.assertTrue(channel.join(2))
+        # Its own failure is retried once more, then succeeds.
+        self.assertEqual(callback_mock.run.call_count, 3)
+        callback_mock.dead_letter.assert_not_called()
+
+    def test_retry_raising_unexpected_error(self):
+        channel = Channel("channel")
+        callback_mock = mock.Mock()
+        error = RuntimeError("unexpected")
+        callback_mock.run.side_effect = [
+            CallbackError(failures=[Failure("a1", "error", True)]),
+            error,
+            None,
+        ]
+
+        channel.publish("a1")
+        thread = self.run_thread(channel, callback_mock)
+
+        self.assertTrue(channel.join(2))
+        callback_mock.dead_letter.assert_called_once_with("a1", error, 2)
+
+        channel.publish("a2")
+        self.assertTrue(channel.join(2))
+        self.assertTrue(thread.is_alive())
@@ -0,0 +1,204 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.webhook import schema
+from mconf_aggr.webhook.exceptions import SchemaMigrationError
+from tests.fake_db import FakeCursor, connection_with
+
+
+def cursor_with(applied=(), fail_on=None):
+    return FakeCursor(
+        fetchall=[[(version,) for version in applied]],
+        fail_on=lambda statement, _: fail_on is not None and fail_on in statement,
+    )
+
+
+def migration(version, *statements, transactional=True, opt_in=False):
+    return schema.Migration(version, f"m{version}", None, transactional, list(statements), opt_in)
+
+
+class TestLoad(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, file_name, sql="SELECT 1;\n"):
+        with open(os.path.join(self.directory.name, file_name), "w") as migration_file:
+            migration_file.write(sql)
+
+    def test_ordered_by_version(self):
+        self.write("010_later.sql")
+        self.write("002_sooner.sql", "-- Comment.\n-- migrate: no-transaction\nSELECT 2;\n")
+        self.write("011_optional.sql", "-- migrate: opt-in\nSELECT 11;\n")
+        self.write("README.md")
+
+        migrations = schema.load(self.directory.name)
+
+        self.assertEqual([m.version for m in migrations], [2, 10, 11])
+        self.assertEqual([m.name for m in migrations], ["sooner", "later", "optional"])
+        self.assertFalse(migrations[0].transactional)
+        self.assertTrue(migrations[1].transactional)
+        self.assertEqual([m.opt_in for m in migrations], [False, False, True])
+        self.assertTrue(migrations[2].transactional)
+        self.assertEqual(migrations[0].statements, ["SELECT 2"])
+
+    def test_invalid_file_name(self):
+        self.write("indexes.sql")
+
+        with self.assertRaises(SchemaMigrationError):
+            schema.load(self.directory.name)
+
+    def test_duplicate_version(self):
+        self.write("001_a.sql")
+        self.write("1_b.sql")
+
+        with self.assertRaises(SchemaMigrationError):
+            schema.load(self.directory.name)
+
+    def test_package_migrations(self):
+        migrations = schema.load()
+
+        self.assertEqual([m.version for m in migrations], list(range(1, len(migrations) + 1)))
+        self.assertEqual(
+            [m.name for m in migrations if m.opt_in],
+            ["meetings_attendees_jsonb", "meeting_attendees"],
+        )
+        for loaded in migrations:
+            if loaded.opt_in:
+                self.assertTrue(loaded.transactional)
+                continue
+            self.assertFalse(loaded.transactional)
+            for statement in loaded.statements:
+                self.assertIn("CONCURRENTLY IF NOT EXISTS", statement)
+
+
+class TestSplit(unittest.TestCase):
+    def test_statements_end_at_line_end(self):
+        sql = (
+            "-- Header.\n"
+            "CREATE INDEX a\n"
+            "    ON t (c)\n"
+            "    WHERE c IS NOT NULL;\n"
+            "\n"
+            "INSERT INTO t VALUES ('x;y');\n"
+            "-- DROP INDEX a;\n"
+        )
+
+        self.assertEqual(
+            schema.split(sql),
+            [
+                "CREATE INDEX a\n    ON t (c)\n    WHERE c IS NOT NULL",
+                "INSERT INTO t VALUES ('x;y')",
+            ],
+        )
+
+    def test_last_statement_without_semicolon(self):
+        self.assertEqual(schema.split("SELECT 1;\nSELECT 2\n"), ["SELECT 1", "SELECT 2"])
+
+
+class TestUpgrade(unittest.TestCase):
+    def test_applies_pending_in_order(self):
+        cursor = cursor_with(applied=[1])
+        migrations = [
+            migration(1, "ONE"),
+            migration(2, "TWO"),
+            migration(3, "THREE", transactional=False),
+        ]
+
+        done = schema.upgrade(connection_with(cursor), migrations, logger=mock.Mock())
+
+        self.assertEqual([m.version for m in done], [2, 3])
+        statements = [
+            s.split(" (")[0] for s in cursor.statements if not s.startswith(("CREATE", "SELECT"))
+        ]
+        self.assertEqual(
+            statements,
+            ["BEGIN", "TWO", "INSERT INTO schema_migrations", "COMMIT"]
+            + ["THREE", "INSERT INTO schema_migrations"],
+        )
+        self.assertTrue(cursor.statements[0].startswith("SELECT pg_advisory_lock"))
+        self.assertTrue(cursor.statements[-1].startswith("SELECT pg_advisory_unlock"))
+
+    def test_stops_at_target(self):
+        cursor = cursor_with()
+        migrations = [migration(1, "ONE"), migration(2, "TWO")]
+
+        done = schema.upgrade(connection_with(cursor), migrations, target=1, logger=mock.Mock())
+
+        self.assertEqual([m.version for m in done], [1])
+        self.assertNotIn("TWO", cursor.statements)
+
+    def test_skips_opt_in_not_included(self):
+        cursor = cursor_with()
+        migrations = [
+            migration(1, "ONE"),
+            migration(2, "TWO", opt_in=True),
+            migration(3, "THREE", opt_in=True),
+            migration(4, "FOUR"),
+        ]
+
+        done = schema.upgrade(connection_with(cursor), migrations, include=[3], logger=mock.Mock())
+
+        self.assertEqual([m.version for m in done], [1, 3, 4])
+        self.assertNotIn("TWO", cursor.statements)
+
+    def test_includes_opt_in_after_later_versions(self):
+        cursor = cursor_with(applied=[1, 3])
+        migrations = [migration(1, "ONE"), migration(2, "TWO", opt_in=True), migration(3, "THREE")]
+
+        done = schema.upgrade(connection_with(cursor), migrations, include=[2], logger=mock.Mock())
+
+        self.assertEqual([m.version for m in done], [2])
+
+    def test_failure_rolls_back_and_unlocks(self):
+        cursor = cursor_with(fail_on="TWO")
+        migrations = [migration(1, "ONE"), migration(2, "TWO"), migration(3, "THREE")]
+
+        with self.assertRaises(SchemaMigrationError):
+            schema.upgrade(connection_with(cursor), migrations, logger=mock.Mock())
+
+        self.assertEqual(cursor.statements[cursor.statements.index("TWO") + 1], "ROLLBACK")
+        self.assertNotIn("THREE", cursor.statements)
+        self.assertTrue(cursor.statements[-1].startswith("SELECT pg_advisory_unlock"))
+
+    def test_status(self):
+        cursor = cursor_with(applied=[2])
+        migrations = [migration(1, "ONE"), migration(2, "TWO")]
+
+        result = schema.status(connection_with(cursor), migrations)
+
+        self.assertEqual(
+            [(m.version, is_applied) for m, is_applied in result], [(1, False), (2, True)]
+        )
+
+
+class TestMain(unittest.TestCase):
+    def run_main(self, *argv, applied=()):
+        cursor = cursor_with(applied=applied)
+        migrations = [migration(1, "ONE"), migration(2, "TWO", opt_in=True), migration(3, "THREE")]
+        output = io.StringIO()
+
+        with mock.patch(
+            "psycopg2.connect", return_value=connection_with(cursor)
+        ), mock.patch.object(schema, "load", return_value=migrations), contextlib.redirect_stdout(
+            output
+        ):
+            code = schema.main(["--database-uri", "postgresql://", *argv])
+
+        self.assertEqual(code, 0)
+        return cursor, output.getvalue().splitlines()
+
+    def test_status_lists_opt_in(self):
+        _, lines = self.run_main("status", applied=[1])
+
+        self.assertEqual(lines, ["001 m1: applied", "002 m2: opt-in", "003 m3: pending"])
+
+    def test_upgrade_includes_opt_in(self):
+        cursor, _ = self.run_main("upgrade", "--include", "2")
+
+        self.assertIn("TWO", cursor.statements)
+        self.assertIn("THREE", cursor.statements)
@@ -0,0 +1,129 @@
+import time
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.webhook.exceptions import DatabaseNotReadyError
+from mconf_aggr.webhook.secret_cache import SecretCache
+
+
+class TestSecretCache(unittest.TestCase):
+    def setUp(self):
+        self.handler = mock.Mock()
+        self.handler.fetch_secret.side_effect = lambda server: {"https://known": "123"}.get(server)
+        self.handler.secrets.return_value = {"https://known": "123"}
+
+        self.cache = SecretCache(ttl=300, negative_ttl=10, handler=self.handler)
+
+    def tearDown(self):
+        self.cache.stop()
+
+    def test_secret_is_cached(self):
+        self.assertEqual(self.cache.secret("https://known"), "123")
+        self.assertEqual(self.cache.secret("https://known"), "123")
+
+        self.handler.fetch_secret.assert_called_once_with("https://known")
+
+    def test_unknown_server_is_cached(self):
+        self.assertIsNone(self.cache.secret("https://unknown"))
+        self.assertIsNone(self.cache.secret("https://unknown"))
+
+        self.handler.fetch_secret.assert_called_once_with("https://unknown")
+
+    def test_expired_secret_is_fetched_again(self):
+        self.cache.negative_ttl = 0.01
+
+        self.cache.secret("https://unknown")
+        time.sleep(0.02)
+        self.cache.secret("https://unknown")
+
+        self.assertEqual(self.handler.fetch_secret.call_count, 2)
+
+    def test_disabled(self):
+        self.cache.ttl = 0
+
+        self.cache.secret("https://known")
+        self.cache.secret("https://known")
+
+        self.assertEqual(self.handler.fetch_secret.call_count, 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_database_error_is_not_cached(self):
+        self.handler.fetch_secret.side_effect = DatabaseNotReadyError
+
+        self.assertIsNone(self.cache.secret("https://known"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_database_error_keeps_expired_secret(self):
+        self.cache.ttl = 0.01
+        self.cache.secret("https://known")
+        time.sleep(0.02)
+        self.handler.fetch_secret.side_effect = DatabaseNotReadyError
+
+        self.assertEqual(self.cache.secret("https://known"), "123")
+
+    def test_invalidate(self):
+        self.cache.secret("https://known")
+        self.cache.secret("https://unknown")
+
+        self.cache.invalidate("https://known")
+        self.assertEqual(len(self.cache), 1)
+
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_refresh(self):
+        self.cache.secret("https://unknown")
+        self.cache._secrets["https://removed"] = ("old", time.monotonic() + 300)
+
+        self.assertTrue(self.cache.refresh())
+
+        self.assertEqual(self.cache.secret("https://known"), "123")
+        self.assertIsNone(self.cache.secret("https://removed"))
+        self.handler.fetch_secret.assert_has_calls(
+            [mock.call("https://unknown"), mock.call("https://removed")]
+        )
+
+    def test_found_server_is_not_unknown(self):
+        self.handler.fetch_secret.side_effect = [None, "456"]
+        self.cache.negative_ttl = 0.01
+
+        self.assertIsNone(self.cache.secret("https://new"))
+        time.sleep(0.02)
+
+        self.assertEqual(self.cache.secret("https://new"), "456")
+        self.assertEqual(len(self.cache), 1)
+
+    def test_refresh_drops_expired_unknown_servers(self):
+        self.cache.negative_ttl = 0.01
+        for index in range(100):
+            self.cache.secret(f"https://unknown-{index}")
+        time.sleep(0.02)
+
+        self.assertTrue(self.cache.refresh())
+
+        self.assertEqual(len(self.cache), 1)
+
+    def test_unknown_servers_are_bounded(self):
+        self.cache.negative_maxsize = 10
+        for index in range(100):
+            self.cache.secret(f"https://unknown-{index}")
+
+        self.assertEqual(len(self.cache), 10)
+        # The oldest ones were dropped.
+        self.cache.secret("https://unknown-99")
+        self.cache.secret("https://unknown-0")
+        self.assertEqual(self.handler.fetch_secret.call_count, 101)
+
+    def test_refresh_database_error(self):
+        self.handler.secrets.side_effect = DatabaseNotReadyError
+
+        self.assertFalse(self.cache.refresh())
+
+    def test_start_refreshes_in_background(self):
+        self.cache.start(refresh_interval=0.01)
+        time.sleep(0.05)
+        self.cache.stop()
+
+        self.assertGreater(self.handler.secrets.call_count, 1)
+        self.assertEqual(self.cache.secret("https://known"), "123")
+        self.handler.fetch_secret.assert_not_called()
@@ -0,0 +1,276 @@
+import os
+import tempfile
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.aggregator.aggregator import (
+    ChannelFull,
+    PartitionedChannel,
+    PublishError,
+    SpoolChannel,
+    Subscriber,
+    SubscriberThread,
+)
+from mconf_aggr.aggregator.spool import SpoolLog
+
+
+class TestSpoolLog(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open_log(self, **kwargs):
+        log = SpoolLog(self.directory, **kwargs)
+        self.addCleanup(log.close)
+
+        return log
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".log"))
+
+    def test_append_offsets(self):
+        log = self.open_log()
+
+        self.assertEqual([log.append(b"a"), log.append(b"b")], [0, 1])
+        self.assertEqual(log.pending(), 2)
+
+    def test_replay_not_acknowledged(self):
+        log = self.open_log()
+        for payload in (b"a", b"b", b"c"):
+            log.append(payload)
+        log.ack(0)
+        log.close()
+
+        log = self.open_log()
+
+        self.assertEqual(list(log.replay()), [(1, b"b"), (2, b"c")])
+        self.assertEqual(log.append(b"d"), 3)
+
+    def test_rotates_and_removes_acknowledged_segments(self):
+        log = self.open_log(segment_bytes=1)
+        for payload in (b"a", b"b", b"c"):
+            log.append(payload)
+            log.sync()
+
+        self.assertEqual(len(self.segments()), 3)
+
+        log.ack(1)
+        log.sync()
+
+        self.assertEqual(self.segments(), ["00000000000000000002.log"])
+
+    def test_acknowledged_log_starts_after_ack(self):
+        log = self.open_log(segment_bytes=1)
+        log.append(b"a")
+        log.sync()
+        log.append(b"b")
+        log.ack(1)
+        log.close()
+
+        log = self.open_log()
+
+        self.assertEqual(list(log.replay()), [])
+        self.assertEqual(log.append(b"c"), 2)
+
+    def test_drops_incomplete_record(self):
+        log = self.open_log()
+        log.append(b"a")
+        log.append(b"b")
+        log.close()
+
+        path = os.path.join(self.directory, self.segments()[0])
+        os.truncate(path, os.path.getsize(path) - 1)
+
+        log = self.open_log()
+
+        self.assertEqual(list(log.replay()), [(0, b"a")])
+        self.assertEqual(log.append(b"c"), 1)
+        log.sync()
+        self.assertEqual(list(log.replay()), [(0, b"a"), (1, b"c")])
+
+    def test_append_is_written_by_sync(self):
+        log = self.open_log(encode=str.encode)
+        log.append("a")
+
+        self.assertEqual(list(log.replay()), [])
+
+        log.sync()
+
+        self.assertEqual(list(log.replay()), [(0, b"a")])
+
+    def test_failed_sync_keeps_records(self):
+        log = self.open_log()
+        log.append(b"a")
+
+        with mock.patch("mconf_aggr.aggregator.spool.os.write", side_effect=OSError):
+            with self.assertRaises(OSError):
+                log.sync()
+
+        log.sync()
+
+        self.assertEqual(list(log.replay()), [(0, b"a")])
+
+    def test_sync_on_every_append(self):
+        with mock.patch("mconf_aggr.aggregator.spool._fsync") as fsync_mock:
+            log = self.open_log(fsync_interval=0)
+            log.append(b"a")
+
+        fsync_mock.assert_called()
+
+    def test_wait_synced_writes_without_flusher(self):
+        log = self.open_log()
+        offset = log.append(b"a")
+
+        log.wait_synced(offset)
+
+        self.assertEqual(log.synced, 0)
+        self.assertEqual(list(log.replay()), [(0, b"a")])
+
+    def test_wait_synced_waits_for_flusher(self):
+        log = self.open_log(fsync_interval=0.05)
+        log.start()
+        offset = log.append(b"a")
+
+        self.assertEqual(log.synced, -1)
+
+        log.wait_synced(offset)
+
+        self.assertEqual(list(log.replay()), [(0, b"a")])
+
+    def test_wait_synced_raises_when_sync_fails(self):
+        log = self.open_log(fsync_interval=0.01, logger=mock.Mock())
+        offset = log.append(b"a")
+
+        with mock.patch("mconf_aggr.aggregator.spool.os.write", side_effect=OSError("full")):
+            log.start()
+
+            with self.assertRaisesRegex(OSError, "full"):
+                log.wait_synced(offset)
+
+        # The record is kept and written by the next sync.
+        log.wait_synced(offset)
+        self.assertEqual(list(log.replay()), [(0, b"a")])
+
+    def test_synced_after_reopen(self):
+        log = self.open_log()
+        log.append(b"a")
+        log.close()
+
+        self.assertEqual(self.open_log().synced, 0)
+
+    def test_append_after_close(self):
+        log = self.open_log()
+        log.close()
+
+        with self.assertRaises(OSError):
+            log.append(b"a")
+
+
+class TestSpoolChannel(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open_channel(self, **kwargs):
+        channel = SpoolChannel("test_channel", self.directory, **kwargs)
+        self.addCleanup(channel.log.close)
+
+        return channel
+
+    def test_publish_pop(self):
+        channel = self.open_channel()
+
+        channel.publish({"event": 1})
+        channel.publish({"event": 2})
+
+        self.assertEqual(channel.pop(), {"event": 1})
+        self.assertEqual(channel.pop_batch(10), [{"event": 2}])
+
+    def test_replays_data_not_acknowledged(self):
+        channel = self.open_channel()
+        for i in range(3):
+            channel.publish(i)
+        self.assertEqual(channel.pop(), 0)
+        channel.ack()
+        channel.close()
+
+        # Replayed data is queued regardless of the size of the channel.
+        channel = self.open_channel(maxsize=1)
+
+        self.assertEqual(channel.qsize(), 2)
+        self.assertEqual(channel.pop_batch(10), [1, 2])
+
+    def test_reject_when_full(self):
+        channel = self.open_channel(maxsize=1, overflow="reject")
+        channel.publish(1)
+
+        with self.assertRaises(ChannelFull):
+            channel.publish(2)
+
+        # Refused data is not in the log.
+        self.assertEqual(channel.log.next_offset, 1)
+        self.assertEqual(channel.pop(), 1)
+        channel.publish(3)
+        self.assertEqual(channel.pop(), 3)
+
+    def test_leftovers_stay_in_log(self):
+        channel = self.open_channel()
+        channel.publish(1)
+        channel.publish(2)
+
+        self.assertEqual(channel.leftovers(), [])
+        channel.close()
+
+        channel = self.open_channel()
+
+        self.assertEqual(channel.pop_batch(10), [1, 2])
+
+    def test_unsupported_policy(self):
+        with self.assertRaises(ValueError):
+            SpoolChannel("test_channel", self.directory, overflow="drop-oldest")
+
+    def test_publish_returns_once_written(self):
+        channel = self.open_channel(fsync_interval=0.05)
+
+        channel.publish(1)
+
+        self.assertEqual(channel.log.synced, 0)
+        self.assertEqual(len(list(channel.log.replay())), 1)
+
+    def test_publish_fails_when_not_written(self):
+        channel = self.open_channel()
+
+        with mock.patch.object(channel.log, "wait_synced", side_effect=OSError):
+            with self.assertRaises(PublishError):
+                channel.publish(1)
+
+    def test_publish_after_close(self):
+        channel = self.open_channel()
+        channel.close()
+
+        with self.assertRaises(PublishError):
+            channel.publish(1)
+
+    def test_partitioned(self):
+        def factory(name, **kwargs):
+            return SpoolChannel(name, self.directory, **kwargs)
+
+        channel = PartitionedChannel("test_channel", 2, key=lambda data: data, factory=factory)
+        self.addCleanup(channel.close)
+
+        self.assertEqual(sorted(os.listdir(self.directory)), ["test_channel-0", "test_channel-1"])
+
+    def test_subscriber_acknowledges(self):
+        channel = self.open_channel()
+        callback_mock = mock.Mock()
+        thread = SubscriberThread(Subscriber(channel, callback_mock), errorevent=None)
+
+        channel.publish("data")
+        thread.start()
+        thread.exit()
+
+        callback_mock.run.assert_called_once_with("data")
+        self.assertEqual(channel.log.acked, 0)
+        self.assertEqual(channel.log.pending(), 0)
@@ -42,3 +42,34 @@ class TestPublisher(unittest.TestCase):
             raise
         finally:
             self.thread.exit()
+
+    def test_run_batch_callback(self):
+        callback_mock = mock.Mock()
+        channel = Channel("channel_2")
+        subscriber = Subscriber(channel, callback_mock, batch_size=10, batch_timeout=0)
+        thread = SubscriberThread(subscriber=subscriber, errorevent=None)
+
+        for i in range(3):
+            channel.publish(i)
+
+        thread.start()
+        thread.exit()
+
+        callback_mock.run_batch.assert_called_once_with([0, 1, 2])
+        callback_mock.run.assert_not_called()
+
+    def test_leftovers_are_dead_lettered(self):
+        for data in ("a", "b"):
+            self.thread.subscriber.channel.publish(data)
+
+        # Exiting before running anything.
+        self.thread._stopevent.set()
+        self.thread.start()
+        self.thread.join()
+
+        callback_mock = self.thread.subscriber.callback
+        callback_mock.run.assert_not_called()
+        self.assertEqual(
+            callback_mock.dead_letter.call_args_list,
+            [mock.call("a", None, 0), mock.call("b", None, 0)],
+        )
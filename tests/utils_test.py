@@ -0,0 +1,67 @@
+import signal
+import threading
+import unittest
+import unittest.mock as mock
+
+from mconf_aggr.aggregator.utils import RequestTimeLogger, signal_handler
+
+
+class TestRequestTimeLogger(unittest.TestCase):
+    def test_wait_idle(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def handle():
+            with RequestTimeLogger.time_logger_requests(mock.Mock(), "{elapsed}"):
+                started.set()
+                release.wait(5)
+
+        request = threading.Thread(target=handle)
+        request.start()
+        started.wait(5)
+
+        self.assertFalse(RequestTimeLogger.wait_idle(0.01))
+
+        release.set()
+
+        self.assertTrue(RequestTimeLogger.wait_idle(5))
+        request.join()
+
+    def test_failed_request_is_done(self):
+        with self.assertRaises(RuntimeError):
+            with RequestTimeLogger.time_logger_requests(mock.Mock(), "{elapsed}"):
+                raise RuntimeError()
+
+        self.assertEqual(RequestTimeLogger.current_requests_count, 0)
+
+
+class TestSignalHandler(unittest.TestCase):
+    def test_drains_then_stops(self):
+        aggregator = mock.Mock()
+        liveness_probe = mock.Mock()
+
+        with mock.patch("mconf_aggr.aggregator.utils.exit", create=True) as exit_mock:
+            signal_handler(aggregator, liveness_probe, signal.SIGTERM, 10, 2)
+
+        liveness_probe.close.assert_called_once_with()
+        ((timeout, progress_interval), _) = aggregator.drain.call_args
+        self.assertLessEqual(timeout, 10)
+        self.assertEqual(progress_interval, 2)
+        aggregator.stop.assert_called_once_with()
+        exit_mock.assert_called_once_with(0)
+
+    def test_no_deadline_without_persistence(self):
+        aggregator = mock.Mock()
+
+        with mock.patch("mconf_aggr.aggregator.utils.exit", create=True):
+            signal_handler(aggregator, mock.Mock(), signal.SIGTERM, 10, 2, persistent=False)
+
+        aggregator.drain.assert_called_once_with(None, 2)
+
+    def test_ignores_other_signals(self):
+        aggregator = mock.Mock()
+
+        signal_handler(aggregator, mock.Mock(), signal.SIGINT)
+
+        aggregator.drain.assert_not_called()
+        aggregator.stop.assert_not_called()